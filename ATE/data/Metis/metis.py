@@ -3,241 +3,347 @@ Created on Aug 7, 2019
 
 @author: hoeren
 '''
+import contextlib
+import json
+import mmap
 import os
+import tempfile
 
+import numpy as np
 from tqdm import tqdm
 
-from ATE.data import STDF
-from ATE.data.STDF.utils import endian_and_version_from_file
+from ATE.data.Metis.store import stores
+from ATE.data.STDF import instrumentation
+from ATE.data.STDF.instrumentation import Progress
+from ATE.data.STDF.columns import ColumnExtractor
+from ATE.data.STDF.sidecar import get_STDF_index
+from ATE.data.STDF.sidecar import parts_of
+from ATE.data.STDF.utils import MIR_from_file
 from ATE.data.STDF.utils import is_STDF
-from ATE.data.STDF.utils import records_from_file
 from ATE.data.STDF.utils import STDFError
-from ATE.data.STDF.utils import TS_from_record
-from ATE.data.STDF.utils import ts_to_id
-from ATE.utils.compression import get_deflated_file_size
+from ATE.utils.compression import decompressed_blocks
 
+# the columns of the dynamic data-frame that describe the part (the rest are the tests)
+meta_columns = ['PART', 'HEAD_NUM', 'SITE_NUM', 'PART_FLG', 'NUM_TEST', 'HARD_BIN', 'SOFT_BIN', 'X_COORD', 'Y_COORD', 'TEST_T', 'PART_ID']
 
-class Metis(object):
-    '''
-    The Metis class interacts between STDF and the Pandas structures.
-    '''
-
-    def __init__(self):
-        self.df = None
-
-    def __call__(self, FileName, progress=True):
-        self.import_stdf(FileName, progress)
-
-    def import_stdf(self, FileName, progress=True):
-        '''
-        This method will add FileName to this Metis object.
-        '''
-        index = {}
-        offset = 0
-
-
-
-        if is_STDF(FileName):
-            endian, version = endian_and_version_from_file(FileName)
-            index['version'] = version
-            index['endian'] = endian
-            index['records'] = {}
-            index['indexes'] = {}
-            index['parts'] = {}
-            PIP = {} # parts in process
-            PN = 1
-
-            TS2ID = ts_to_id(version)
-
-        # indexing the stdf file
-            if progress:
-                desc= "Indexing STDF file '%s'" % os.path.basename(FileName)
-                total = get_deflated_file_size(FileName)
-                progress_bar = tqdm(total=total, desc=desc, leave=False, unit='b')
-
-            for _, REC_TYP, REC_SUB, REC in records_from_file(FileName):
-                REC_ID = TS2ID[(REC_TYP, REC_SUB)]
-                REC_LEN = len(REC)
-                if REC_ID not in index['records']:
-                    index['records'][REC_ID] = []
-                index['indexes'][offset] = REC
-                index['records'][REC_ID].append(offset)
-                if REC_ID in ['PIR', 'PRR', 'PTR', 'FTR', 'MPR']:
-                    if REC_ID == 'PIR':
-                        pir = STDF.PIR(index['version'], index['endian'], REC)
-                        pir_HEAD_NUM = pir.get_value('HEAD_NUM')
-                        pir_SITE_NUM = pir.get_value('SITE_NUM')
-                        if (pir_HEAD_NUM, pir_SITE_NUM) in PIP:
-                            raise Exception("One should not be able to reach this point !")
-                        PIP[(pir_HEAD_NUM, pir_SITE_NUM)] = PN
-                        index['parts'][PN]=[]
-                        index['parts'][PN].append(offset)
-                        PN+=1
-                    elif REC_ID == 'PRR':
-                        prr = STDF.PRR(index['version'], index['endian'], REC)
-                        prr_HEAD_NUM = prr.get_value('HEAD_NUM')
-                        prr_SITE_NUM = prr.get_value('SITE_NUM')
-                        if (prr_HEAD_NUM, prr_SITE_NUM) not in PIP:
-                            raise Exception("One should not be able to reach this point!")
-                        pn = PIP[(prr_HEAD_NUM, prr_SITE_NUM)]
-                        index['parts'][pn].append(offset)
-                        del PIP[(prr_HEAD_NUM, prr_SITE_NUM)]
-                    elif REC_ID == 'PTR': #TODO: move this one to be the first to be checked, as this will be the most common one!
-                        ptr = STDF.PTR(index['version'], index['endian'], REC)
-                        ptr_HEAD_NUM = ptr.get_value('HEAD_NUM')
-                        ptr_SITE_NUM = ptr.get_value('SITE_NUM')
-                        if (ptr_HEAD_NUM, ptr_SITE_NUM) not in PIP:
-                            raise Exception("One should not be able to reach this point!")
-                        pn = PIP[(ptr_HEAD_NUM, ptr_SITE_NUM)]
-                        index['parts'][pn].append(offset)
-                    elif REC_ID == 'FTR':
-                        ftr = STDF.FTR(index['version'], index['endian'], REC)
-                        ftr_HEAD_NUM = ftr.get_value('HEAD_NUM')
-                        ftr_SITE_NUM = ftr.get_value('SITE_NUM')
-                        if (ftr_HEAD_NUM, ftr_SITE_NUM) not in PIP:
-                            raise Exception("One should not be able to reach this point!")
-                        pn = PIP[(ftr_HEAD_NUM, ftr_SITE_NUM)]
-                        index['parts'][pn].append(offset)
-                    elif REC_ID == 'MPR':
-                        mpr = STDF.MPR(index['version'], index['endian'], REC)
-                        mpr_HEAD_NUM = mpr.get_value('HEAD_NUM')
-                        mpr_SITE_NUM = mpr.get_value('SITE_NUM')
-                        if (mpr_HEAD_NUM, mpr_SITE_NUM) not in PIP:
-                            raise Exception("One should not be able to reach this point!")
-                        pn = PIP[(mpr_HEAD_NUM, mpr_SITE_NUM)]
-                        index['parts'][pn].append(offset)
-                    else:
-                        raise Exception("One should not be able to reach this point! (%s)" % REC_ID)
-                if progress:
-                    progress_bar.update(REC_LEN)
-                offset += REC_LEN
-
-        # analyzing TDR's
-            if progress:
-                progress_bar.close()
-                desc = "Analyzing TDF's "
-                total = len(index['records']['TSR'])
-                progress_bar = tqdm(total=total, desc=desc, leave=False, unit='tests')
-
-            TEST_NUM_NAM = {}
-
-            for tsr_offset in index['records']['TSR']:
-                tsr = STDF.TSR(index['version'], index['endian'], index['indexes'][tsr_offset])
-                TEST_NUM = tsr.get_value('TEST_NUM')
-                TEST_NAM = tsr.get_value('TEST_NAM')
-                TEST_TYP = tsr.get_value('TEST_TYP').upper()
-                if TEST_NUM not in TEST_NUM_NAM:
-                    TEST_NUM_NAM[TEST_NUM] = []
-                if (TEST_NAM, TEST_TYP) not in TEST_NUM_NAM[TEST_NUM]:
-                    TEST_NUM_NAM[TEST_NUM].append((TEST_NAM, TEST_TYP))
-                if progress:
-                    progress_bar.update()
-
-        # creating dataframe
-            if progress:
-                progress_bar.close()
-                desc = "Creating dataframe "
-                total = len(TEST_NUM_NAM)
-                progress_bar = tqdm(total=total, desc=desc, leave=False, unit='tests')
-
-            ROW_index = sorted(list(index['parts']))
-            TEST_ITM_index = ['LOT_ID', 'MOD_COD', 'X_POS', 'Y_POS'] #TODO: add more ...
-            TEST_NAM_index = ['Meta'] * len(TEST_ITM_index)
-            TEST_NUM_index = ['Meta'] * len(TEST_ITM_index)
-            for TEST_NUM in sorted(TEST_NUM_NAM):
-                TEST_TYP = TEST_NUM_NAM[TEST_NUM][1]
-                if TEST_TYP == 'P':
-                    PTR_FIELDS = ['LO_SPEC', 'LO_LIMIT', 'RESULT', 'HI_LIMIT', 'HI_LIMIT', 'UNITS', 'PF']
-                    TEST_ITM_index+=PTR_FIELDS
-                    TEST_NAM_index+=[TEST_NUM_NAM[TEST_NUM][1]]*len(PTR_FIELDS)
-                    TEST_NUM_index+=[TEST_NUM]*len(PTR_FIELDS)
-                elif TEST_TYP == 'F':
-
-                    TEST_NUM_index+=[TEST_NUM]*5
-                    TEST_NAM_index+=[TEST_NUM_NAM[TEST_NUM][1]]*5     # VECT_NAME TIME_SET NUM_FAIL X_FAIL_AD Y_FAIL_AD PF
-                elif TEST_TYP == 'M':
-                    pass
-                else:
-                    raise STDFError("Test Type '%s' is unknown" % TEST_TYP)
-                if progress:
-                    progress_bar.update()
-
-        # filling the dataframe
-
+# the test records, and the field that goes in the 'T<TEST_NUM>' column (None = only the flags)
+test_records = {'PTR' : 'RESULT', 'MPR' : None, 'FTR' : 'NUM_FAIL'}
+test_types = {'PTR' : 'P', 'MPR' : 'M', 'FTR' : 'F'}
 
+# TEST_FLG value of a test that is not executed for a part
+not_tested = 0xFF
 
-            # print("\n\n\n")
 
-
-            # for record_offset in index['parts'][1]:
-            #     record = index['indexes'][record_offset]
-            #     T, S = TS_from_record(record)
-            #     ID = TS2ID[(T,S)]
-            #     if ID == 'PTR':
-            #         ptr = STDF.PTR(index['version'], index['endian'], record)
-            #         print(ptr)
-            #     if ID == 'PIR':
-            #         pir = STDF.PIR(index['version'], index['endian'], record)
-            #         print(pir)
-            #     if ID == 'PRR':
-            #         prr = STDF.PRR(index['version'], index['endian'], record)
-            #         print(prr)
+def test_column(TEST_NUM):
+    return 'T%d' % TEST_NUM
 
 
+def flag_column(TEST_NUM):
+    return 'T%d_FLG' % TEST_NUM
 
 
+@contextlib.contextmanager
+def _mapped(FileName, index, directory):
+    '''
+    Maps the (uncompressed) data of FileName, a compressed file is first inflated to a temporary file in directory.
+    '''
+    temporary = None
+    if index.meta['compressed']:
+        fd, temporary = tempfile.mkstemp(suffix='.std', dir=directory)
+        os.close(fd)
+        with open(temporary, 'wb') as target:
+            for data in decompressed_blocks(FileName): # multi block files are inflated in parallel
+                target.write(data)
+    try:
+        with open(temporary or FileName, 'rb') as fd:
+            buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+    finally:
+        if temporary is not None:
+            os.remove(temporary)
 
-    #         if progress:
-    #             description = "Constructing data-frame"
-    #             constructing_progress = tqdm(total=len(index['parts']), ascii=True, position=2, disable=not progress, desc=description, leave=False, unit='parts')
-    #
-    #         for part in index['parts']:
-    #             for record_offset in index['parts'][part]:
-    #                 Type, SubType = TS_from_record(index['indexes'][record_offset])
-    #                 ID = TS2ID[(Type, SubType)]
-    #                 if ID == 'FTR':
-    #                     ftr = FTR(index['version'], index['endian'], index['indexes'][record_offset])
-    #
-    #
-    #                 if ID == 'PTR':
-    #                     ptr = PTR(index['version'], index['endian'], index['indexes'][record_offset])
-    #
-    #                 if ID == 'MPR':
-    #                     ptr = MPR(index['version'], index['endian'], index['indexes'][record_offset])
-    #
-    #
-    #
-    #             constructing_progress.update()
 
+class Metis(object):
+    '''
+    The Metis class interacts between STDF and the Pandas structures.
 
+    An imported STDF file (a lot) is stored as a parts x tests table, in chunks of parts, in an on-disk columnar
+    store (see ATE.data.Metis.store). The data that is the same for all parts (MIR) is kept as 'static' data.
+    Columns (tests, part meta data, static data) are pulled in the dynamic data-frame only when asked for.
 
+        metis = Metis('/data/metis')
+        lot = metis.import_stdf('lot1.std.xz')
+        df = metis.pull_in(['LOT_ID', 'SOFT_BIN', 1000, 1010])  # 1000 -> column 'T1000'
+        for chunk in metis.iter_chunks(['HARD_BIN', 'T1000']):  # out-of-core processing
+            ...
+    '''
 
+    def __init__(self, directory=None, backend='npy', chunk_size=64 * 1024 * 1024):
+        '''
+        directory : the store directory, defaults to the environment variable 'METIS_DIR' (or ~/.metis)
+        backend   : 'npy' or 'hdf5' (needs h5py)
+        chunk_size: the (approximate) maximum number of bytes of a chunk of parts in memory
+        '''
+        if directory is None:
+            directory = os.environ.get('METIS_DIR', os.path.join(os.path.expanduser('~'), '.metis'))
+        if backend not in stores:
+            raise STDFError("Unsupported Metis backend '%s' (supported : %s)" % (backend, list(stores)))
+        self.directory = directory
+        self.store = stores[backend](directory)
+        self.chunk_size = chunk_size
+        self.df = None
+        self.pulled = []
 
+    def __call__(self, FileName, progress=True):
+        return self.import_stdf(FileName, progress)
 
+    def lots(self):
+        '''
+        Returns the names of the lots in the store.
+        '''
+        return self.store.lots()
 
-            if progress:
-                # progress_bar.close()
-                progress_bar.close()
-    #             constructing_progress.close()
+    def manifest(self, lot):
+        return self.store.read_manifest(lot)
 
-            return index, TEST_NUM_NAM
+    def import_stdf(self, FileName, progress=True, lot=None, workers=1):
+        '''
+        This method will add FileName to this Metis object, it returns the name of the lot (default the file name
+        without extensions). The (sidecar) index of the file is used to build the table chunk by chunk.
+        progress is a bool (a progress bar) or a callable that gets throttled progress reports
+        (see ATE.data.STDF.instrumentation.Progress, stage 'import', in parts).
+        '''
+        if not is_STDF(FileName):
+            raise STDFError("'%s' is not an STDF file" % FileName)
+        if lot is None:
+            lot = os.path.basename(FileName).split('.')[0]
+        index = get_STDF_index(FileName, content_hash=False, workers=workers)
+        endian, version = index.endian, index.version
+
+        TEST_NUMs = np.asarray(index.test_numbers(), dtype=np.int64)
+        test_type = self._test_types(index)
+        PIR = np.asarray(index.column('parts/PIR'))
+        PRR = np.asarray(index.column('parts/PRR'))
+        PIR_HEAD_NUM = np.asarray(index.column('parts/HEAD_NUM'))
+        PIR_SITE_NUM = np.asarray(index.column('parts/SITE_NUM'))
+        parts = len(PIR)
+
+        bytes_per_part = 5 * len(TEST_NUMs) + 64
+        chunk_parts = max(1, self.chunk_size // bytes_per_part)
+        chunks = list(range(0, parts, chunk_parts))
+
+        manifest = {
+            'source' : os.path.abspath(FileName),
+            'size' : index.meta['size'],
+            'mtime' : index.meta['mtime'],
+            'hash' : index.meta['hash'],
+            'endian' : endian,
+            'version' : version,
+            'parts' : parts,
+            'chunks' : [],
+            'meta' : list(meta_columns),
+            'tests' : {str(TEST_NUM) : test_type[TEST_NUM] for TEST_NUM in TEST_NUMs.tolist()},
+            'static' : self._static(FileName),
+        }
+        self.store.create(lot)
+
+        extractors = {REC_ID : ColumnExtractor(version, endian, REC_ID) for REC_ID in list(test_records) + ['PRR']}
+        record_offsets = {REC_ID : np.asarray(index.offsets(REC_ID)).astype(np.int64) for REC_ID in test_records}
+        if callable(progress):
+            progress_bar = Progress(progress)
+        else:
+            progress_bar = tqdm(total=parts, desc="Importing '%s'" % os.path.basename(FileName), leave=False, unit='parts', disable=not progress)
+        with _mapped(FileName, index, self.directory) as buffer:
+            for chunk, first in enumerate(chunks):
+                last = min(first + chunk_parts, parts)
+                columns = self._meta_chunk(buffer, extractors['PRR'], first, last, PIR_HEAD_NUM, PIR_SITE_NUM, PRR)
+
+                values = np.full((last - first, len(TEST_NUMs)), np.nan, dtype=np.float32)
+                flags = np.full((last - first, len(TEST_NUMs)), not_tested, dtype=np.uint8)
+                low = PIR[first]
+                closed = PRR[first:last]
+                high = len(buffer) if (closed < 0).any() else closed.max() + 1
+                for REC_ID, field in test_records.items():
+                    offsets = record_offsets[REC_ID]
+                    offsets = offsets[np.searchsorted(offsets, low):np.searchsorted(offsets, high)]
+                    if not len(offsets):
+                        continue
+                    fields = ['TEST_NUM', 'HEAD_NUM', 'SITE_NUM', 'TEST_FLG'] + ([field] if field else [])
+                    records = extractors[REC_ID].extract(buffer, offsets, fields)
+                    part = parts_of(offsets, records['HEAD_NUM'], records['SITE_NUM'], PIR, PIR_HEAD_NUM, PIR_SITE_NUM)
+                    mine = (part >= first) & (part < last)
+                    rows = part[mine] - first
+                    cols = np.searchsorted(TEST_NUMs, records['TEST_NUM'][mine])
+                    flags[rows, cols] = records['TEST_FLG'][mine]
+                    if field:
+                        values[rows, cols] = records[field][mine]
+
+                for col, TEST_NUM in enumerate(TEST_NUMs.tolist()):
+                    columns[test_column(TEST_NUM)] = np.ascontiguousarray(values[:, col])
+                    columns[flag_column(TEST_NUM)] = np.ascontiguousarray(flags[:, col])
+                self.store.write_chunk(lot, chunk, columns)
+                manifest['chunks'].append(last - first)
+                if callable(progress):
+                    progress_bar.update('import', last, parts)
+                else:
+                    progress_bar.update(last - first)
+                if instrumentation.current is not None:
+                    instrumentation.current.report('import', last, parts)
+        if not callable(progress):
+            progress_bar.close()
+        self.store.write_manifest(lot, manifest)
+        index.close()
+        return lot
+
+    def _test_types(self, index):
+        '''
+        Returns {TEST_NUM : 'P'/'M'/'F'} based on the record type of the first posting of each test.
+        '''
+        TEST_NUMs = index.test_numbers()
+        if not len(TEST_NUMs):
+            return {}
+        first = index.column('tests/offset')[index.column('tests/start')[:-1]]
+        position = np.searchsorted(index.column('offset'), first)
+        REC_SUB = index.column('REC_SUB')[position]
+        types = {10 : 'P', 15 : 'M', 20 : 'F'}
+        return {TEST_NUM : types.get(SUB, '?') for TEST_NUM, SUB in zip(TEST_NUMs.tolist(), REC_SUB.tolist())}
+
+    def _static(self, FileName):
+        '''
+        The data that is the same for all parts (MIR fields)
+        '''
+        mir = MIR_from_file(FileName)
+        retval = {}
+        for field, value in mir.to_dict().items():
+            if field.startswith('REC_') or value is None:
+                continue
+            retval[field] = value if isinstance(value, (int, float, str)) else str(value)
+        return retval
+
+    def _meta_chunk(self, buffer, extractor, first, last, HEAD_NUM, SITE_NUM, PRR):
+        '''
+        The meta columns of parts [first, last), for parts without PRR the 'Missing' values of the PRR are used.
+        '''
+        fields = ['PART_FLG', 'NUM_TEST', 'HARD_BIN', 'SOFT_BIN', 'X_COORD', 'Y_COORD', 'TEST_T', 'PART_ID']
+        closed = PRR[first:last]
+        records = extractor.extract(buffer, closed[closed >= 0], fields)
+        columns = {
+            'PART' : np.arange(first, last, dtype=np.int64),
+            'HEAD_NUM' : np.asarray(HEAD_NUM[first:last]),
+            'SITE_NUM' : np.asarray(SITE_NUM[first:last]),
+        }
+        prr = extractor.record.fields
+        for field in fields:
+            if field == 'PART_ID':
+                column = np.full(last - first, '', dtype=object)
+                column[closed >= 0] = records[field]
+                columns[field] = column.astype(str)
+            else:
+                Missing = prr[field]['Missing']
+                if isinstance(Missing, list):
+                    Missing = int(''.join(Missing), 2)
+                column = np.full(last - first, Missing, dtype=records[field].dtype)
+                column[closed >= 0] = records[field]
+                columns[field] = column
+        return columns
+
+    def columns(self, lot):
+        '''
+        Returns the (dynamic) column names of lot.
+        '''
+        manifest = self.manifest(lot)
+        retval = list(manifest['meta'])
+        for TEST_NUM in manifest['tests']:
+            retval += [test_column(int(TEST_NUM)), flag_column(int(TEST_NUM))]
+        return retval
 
-        else: #not an STDF file
-            pass
+    def _resolve(self, what):
+        '''
+        what can be a column name, a test number or a (comma separated string) list of them. '' = the meta columns.
+        '''
+        if what is None or what == '':
+            return list(meta_columns)
+        if isinstance(what, (str, int)):
+            what = [item.strip() for item in what.split(',')] if isinstance(what, str) else [what]
+        retval = []
+        for item in what:
+            if isinstance(item, (int, np.integer)) or (isinstance(item, str) and item.isdigit()):
+                item = test_column(int(item))
+            if item not in retval:
+                retval.append(item)
+        return retval
+
+    def iter_chunks(self, what='', lots=None):
+        '''
+        Yields a dictionary of NumPy arrays (one per column of what) for each chunk of each lot.
+        Static columns are broadcasted, tests that are not in a lot are not tested (nan/0xFF).
+        'LOT' is the lot name.
+        '''
+        names = self._resolve(what)
+        if lots is None:
+            lots = self.lots()
+        for lot in lots:
+            manifest = self.manifest(lot)
+            dynamic = set(self.columns(lot))
+            stored = [name for name in names if name in dynamic]
+            for chunk, rows in enumerate(manifest['chunks']):
+                data = self.store.read_chunk(lot, chunk, stored)
+                retval = {}
+                for name in names:
+                    if name in data:
+                        retval[name] = data[name]
+                    elif name == 'LOT':
+                        retval[name] = np.full(rows, lot)
+                    elif name in manifest['static']:
+                        retval[name] = np.full(rows, manifest['static'][name])
+                    elif name.startswith('T') and name.endswith('_FLG') and name[1:-4].isdigit():
+                        retval[name] = np.full(rows, not_tested, dtype=np.uint8)
+                    elif name.startswith('T') and name[1:].isdigit():
+                        retval[name] = np.full(rows, np.nan, dtype=np.float32)
+                    else:
+                        raise STDFError("Metis : unknown column '%s' in lot '%s'" % (name, lot))
+                yield retval
 
     def save(self):
         '''
-        this method saves this object in an HDF5 container.
-        ps: the target (base) directory comes from the environment variable 'metis_dir' (or so)
+        this method saves this object (the lots and the pulled in columns) in the store directory.
+        ps: the target (base) directory comes from the environment variable 'METIS_DIR' (or ~/.metis)
         '''
-        pass
+        with open(os.path.join(self.directory, 'metis.json'), 'w') as fd:
+            json.dump({'backend' : self.store.name, 'lots' : self.lots(), 'pulled' : self.pulled}, fd)
 
-    def pull_in(self, what=''):
+    def restore(self):
         '''
-        this method will pull in 'what' to the dynamic data-frame.
+        Pulls in the columns that were pulled in at the time of save()
         '''
+        with open(os.path.join(self.directory, 'metis.json'), 'r') as fd:
+            saved = json.load(fd)
+        lots = [lot for lot in saved['lots'] if lot in self.lots()]
+        return self.pull_in(saved['pulled'], lots)
 
-
+    def pull_in(self, what='', lots=None):
+        '''
+        this method will pull in 'what' to the dynamic data-frame (a dictionary of NumPy arrays).
+        Only the asked columns are read from the store.
+        '''
+        names = self._resolve(what)
+        chunks = {name : [] for name in names}
+        for chunk in self.iter_chunks(names, lots):
+            for name in names:
+                chunks[name].append(np.asarray(chunk[name]))
+        self.df = {name : (np.concatenate(chunks[name]) if chunks[name] else np.zeros(0)) for name in names}
+        self.pulled = names
+        return self.df
+
+    def to_dataframe(self):
+        '''
+        Returns the dynamic data-frame as a pandas DataFrame (needs pandas)
+        '''
+        import pandas as pd
+        return pd.DataFrame(self.df if self.df is not None else {})
 
 
 if __name__ == '__main__':
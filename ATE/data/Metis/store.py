@@ -0,0 +1,132 @@
+'''
+Created on Oct 18, 2026
+
+On-disk columnar stores for Metis.
+
+A store holds 'lots', a lot is a list of chunks (of parts) and every chunk has
+the same columns. Next to the chunks, a lot has a manifest (a dictionary with
+the columns, chunk sizes, static data, ...) that is stored as JSON.
+
+    NpyStore  : a directory per lot, a sub-directory per chunk and a .npy file
+                per column. Reading is done memory mapped, so only the touched
+                columns are paged in. (no extra dependencies)
+    HDF5Store : an .h5 file per lot (needs h5py), a group per chunk and a
+                dataset per column.
+'''
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class NpyStore(object):
+    '''
+    Columnar store based on NumPy .npy files.
+    '''
+    name = 'npy'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _lot_directory(self, lot):
+        return os.path.join(self.directory, lot)
+
+    def lots(self):
+        return sorted(lot for lot in os.listdir(self.directory) if os.path.isfile(os.path.join(self.directory, lot, 'manifest.json')))
+
+    def create(self, lot):
+        '''
+        (Re-)creates an empty lot.
+        '''
+        directory = self._lot_directory(lot)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+    def write_chunk(self, lot, chunk, columns):
+        directory = os.path.join(self._lot_directory(lot), 'chunk_%05d' % chunk)
+        os.makedirs(directory, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(directory, '%s.npy' % name), values, allow_pickle=False)
+
+    def read_chunk(self, lot, chunk, names):
+        directory = os.path.join(self._lot_directory(lot), 'chunk_%05d' % chunk)
+        return {name : np.load(os.path.join(directory, '%s.npy' % name), mmap_mode='r') for name in names}
+
+    def write_manifest(self, lot, manifest):
+        with open(os.path.join(self._lot_directory(lot), 'manifest.json'), 'w') as fd:
+            json.dump(manifest, fd)
+
+    def read_manifest(self, lot):
+        with open(os.path.join(self._lot_directory(lot), 'manifest.json'), 'r') as fd:
+            return json.load(fd)
+
+    def remove(self, lot):
+        shutil.rmtree(self._lot_directory(lot), ignore_errors=True)
+
+
+class HDF5Store(object):
+    '''
+    Columnar store based on HDF5 (needs h5py)
+    '''
+    name = 'hdf5'
+
+    def __init__(self, directory):
+        import h5py # optional dependency, only needed for this store
+        self.h5py = h5py
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _lot_file(self, lot):
+        return os.path.join(self.directory, '%s.h5' % lot)
+
+    def lots(self):
+        retval = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.h5'):
+                with self.h5py.File(os.path.join(self.directory, name), 'r') as fd:
+                    if 'manifest' in fd.attrs:
+                        retval.append(name[:-3])
+        return retval
+
+    def create(self, lot):
+        with self.h5py.File(self._lot_file(lot), 'w'):
+            pass
+
+    def write_chunk(self, lot, chunk, columns):
+        with self.h5py.File(self._lot_file(lot), 'a') as fd:
+            group = fd.create_group('chunk_%05d' % chunk)
+            for name, values in columns.items():
+                if values.dtype.kind == 'U':
+                    group.create_dataset(name, data=np.char.encode(values, 'utf-8'))
+                    group[name].attrs['unicode'] = True
+                else:
+                    group.create_dataset(name, data=values, compression='lzf')
+
+    def read_chunk(self, lot, chunk, names):
+        retval = {}
+        with self.h5py.File(self._lot_file(lot), 'r') as fd:
+            group = fd['chunk_%05d' % chunk]
+            for name in names:
+                values = group[name][()]
+                if group[name].attrs.get('unicode', False):
+                    values = np.char.decode(values, 'utf-8')
+                retval[name] = values
+        return retval
+
+    def write_manifest(self, lot, manifest):
+        with self.h5py.File(self._lot_file(lot), 'a') as fd:
+            fd.attrs['manifest'] = json.dumps(manifest)
+
+    def read_manifest(self, lot):
+        with self.h5py.File(self._lot_file(lot), 'r') as fd:
+            return json.loads(fd.attrs['manifest'])
+
+    def remove(self, lot):
+        if os.path.exists(self._lot_file(lot)):
+            os.remove(self._lot_file(lot))
+
+
+stores = {NpyStore.name : NpyStore, HDF5Store.name : HDF5Store}
@@ -0,0 +1,271 @@
+'''
+Created on Oct 18, 2026
+
+Throughput benchmarks of the STDF tooling, on a synthetic lot (see
+ATE.data.STDF.synthetic) or on a given file.
+
+Every benchmark is run 'repeat' times and the best run is kept. It reports
+the items it handled (records, parts, ...) and the (decompressed) bytes it
+went through, as items/s and MB/s:
+
+    - iterate     : cut the records out of the stream (records_from_stream)
+    - unpack      : decode a sample of PTR's into record objects
+    - unpack_lazy : the same as lazy records, reading RESULT
+    - pack        : pack the unpacked sample again
+    - index       : build the (sidecar) index, without saving it
+    - columns     : extract the PTR columns
+    - filter      : write a subset (the parts of site 0)
+    - summary     : read the summary at the end of the file
+    - yields      : a yield summary from scratch
+    - statistics  : the online test statistics
+
+The results (with the commit, the Python/NumPy versions and the platform) go
+to a JSON file, so that the throughput can be followed across commits :
+
+    python -m ATE.data.STDF.benchmark 100M results.json [compression|none] [instrument]
+
+With 'instrument' every benchmark runs instrumented (see
+ATE.data.STDF.instrumentation) and its counters are in the results too.
+'''
+import collections
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ATE.data.STDF.instrumentation import Instrumentation
+from ATE.data.STDF.instrumentation import instrumented
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.stream import records_from_stream
+
+PTR_TS = (15, 10)
+SIZE_UNITS = {'' : 1, 'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30}
+
+
+class _Context(object):
+    '''
+    The file under test and what the benchmarks share (the decompressed size, a sample of raw PTR's).
+    '''
+
+    def __init__(self, FileName, sample):
+        probe, fd = open_STDF(FileName)
+        if fd is None:
+            raise STDFError("'%s' is not an STDF file" % FileName)
+        self.FileName = FileName
+        self.endian = probe.endian
+        self.version = probe.version
+        self.directory = None
+        self.size = 0
+        self.records = 0
+        self.PTRs = []
+        self.objects = []
+        with fd:
+            for REC_LEN, REC_TYP, REC_SUB, REC in records_from_stream(fd, self.endian):
+                self.size += 4 + REC_LEN
+                self.records += 1
+                if (REC_TYP, REC_SUB) == PTR_TS and len(self.PTRs) < sample:
+                    self.PTRs.append(REC)
+        self.PTR_size = sum(len(REC) for REC in self.PTRs)
+        self._index = None
+
+    def index(self):
+        if self._index is None:
+            from ATE.data.STDF.sidecar import build_STDF_index
+            self._index = build_STDF_index(self.FileName, content_hash=False)
+        return self._index
+
+
+def bench_iterate(context):
+    probe, fd = open_STDF(context.FileName)
+    with fd:
+        count = sum(1 for _ in records_from_stream(fd, context.endian))
+    return count, context.size
+
+
+def bench_unpack(context):
+    from ATE.data.STDF.records import create_record_object
+
+    context.objects = [create_record_object(context.version, context.endian, PTR_TS, REC) for REC in context.PTRs]
+    return len(context.objects), context.PTR_size
+
+
+def bench_unpack_lazy(context):
+    from ATE.data.STDF.lazy import lazy_record_object
+
+    for REC in context.PTRs:
+        lazy_record_object(context.version, context.endian, PTR_TS, REC).get_value('RESULT')
+    return len(context.PTRs), context.PTR_size
+
+
+def bench_pack(context):
+    if not context.objects:
+        bench_unpack(context)
+    size = sum(len(obj.__repr__()) for obj in context.objects)
+    return len(context.objects), size
+
+
+def bench_index(context):
+    from ATE.data.STDF.sidecar import build_STDF_index
+
+    index = build_STDF_index(context.FileName, content_hash=False)
+    return len(index.column('offset')), context.size
+
+
+def bench_columns(context):
+    from ATE.data.STDF.columns import extract_ptr_columns
+
+    columns = extract_ptr_columns(context.FileName, index=context.index())
+    return len(columns['RESULT']), context.size
+
+
+def bench_filter(context):
+    from ATE.data.STDF.subset import subset_file
+
+    Destination = os.path.join(context.directory, 'subset.std')
+    try:
+        return subset_file(context.FileName, Destination, sites=[0]), context.size
+    finally:
+        if os.path.exists(Destination):
+            os.remove(Destination)
+
+
+def bench_summary(context):
+    from ATE.data.STDF.summary import read_summary
+
+    return read_summary(context.FileName).part_count(), context.size
+
+
+def bench_yields(context):
+    from ATE.data.STDF.yields import live_summary
+
+    live_summary(context.FileName, save=False)
+    return context.records, context.size
+
+
+def bench_statistics(context):
+    from ATE.data.STDF.statistics import statistics_from_file
+
+    statistics_from_file(context.FileName)
+    return context.records, context.size
+
+
+BENCHMARKS = collections.OrderedDict([
+    ('iterate', bench_iterate),
+    ('unpack', bench_unpack),
+    ('unpack_lazy', bench_unpack_lazy),
+    ('pack', bench_pack),
+    ('index', bench_index),
+    ('columns', bench_columns),
+    ('filter', bench_filter),
+    ('summary', bench_summary),
+    ('yields', bench_yields),
+    ('statistics', bench_statistics),
+])
+
+
+def parse_size(size):
+    '''
+    Returns the number of bytes of a size like 1000, '64K', '100M' or '10G'.
+    '''
+    text = str(size).strip().upper().rstrip('B')
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ''
+    try:
+        return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise STDFError("parse_size : '%s' is not a size" % size)
+
+
+def _commit():
+    try:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=directory, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(benchmark, context, repeat, instrument):
+    best = None
+    for _ in range(max(repeat, 1)):
+        stats = Instrumentation() if instrument else None
+        start = time.perf_counter()
+        with instrumented(stats) if instrument else contextlib.nullcontext():
+            items, size = benchmark(context)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    seconds = max(best, 1e-9)
+    retval = {'seconds' : best, 'runs' : max(repeat, 1), 'items' : int(items), 'bytes' : int(size),
+              'items_per_second' : items / seconds, 'MB_per_second' : size / seconds / (1 << 20)}
+    if instrument:
+        retval['counters'] = stats.as_dict() # (of the last run)
+    return retval
+
+
+def run_benchmarks(FileName=None, size='10M', names=None, repeat=3, sample=10000, directory=None, instrument=False, **lot_kwargs):
+    '''
+    Runs the benchmarks in names (None = all, see BENCHMARKS) on FileName, or on a synthetic lot of (about)
+    size bytes made with lot_kwargs (see write_synthetic_lot) in a temporary directory (in directory).
+    With instrument, the benchmarks run instrumented and their counters (see ATE.data.STDF.instrumentation) are added.
+    Returns {'meta' : {...}, 'benchmarks' : {name : {'seconds', 'runs', 'items', 'bytes', 'items_per_second', 'MB_per_second'}}}
+    '''
+    names = list(BENCHMARKS) if names is None else list(names)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise STDFError("run_benchmarks : unknown benchmark(s) %s" % ', '.join(unknown))
+    retval = {'meta' : {'created' : datetime.datetime.now(datetime.timezone.utc).isoformat(), 'commit' : _commit(),
+                        'python' : platform.python_version(), 'numpy' : np.__version__, 'platform' : platform.platform(),
+                        'cpu_count' : os.cpu_count(), 'repeat' : repeat, 'sample' : sample, 'instrument' : instrument},
+              'benchmarks' : collections.OrderedDict()}
+    workspace = tempfile.mkdtemp(prefix='stdf_benchmark_', dir=directory)
+    try:
+        if FileName is None:
+            from ATE.data.STDF.synthetic import parts_for_size, write_synthetic_lot
+
+            compression = lot_kwargs.get('compression')
+            FileName = os.path.join(workspace, 'lot.std' + {None : '', 'gzip' : '.gz', 'bz2' : '.bz2', 'lzma' : '.xz'}.get(compression, ''))
+            parts = lot_kwargs.pop('parts', None) or parts_for_size(parse_size(size), **lot_kwargs)
+            start = time.perf_counter()
+            retval['meta']['lot'] = write_synthetic_lot(FileName, parts=parts, **lot_kwargs)
+            retval['meta']['generate_seconds'] = time.perf_counter() - start
+        retval['meta']['FileName'] = FileName
+        retval['meta']['file_size'] = os.path.getsize(FileName)
+        context = _Context(FileName, sample)
+        context.directory = workspace
+        retval['meta'].update({'size' : context.size, 'records' : context.records, 'endian' : context.endian, 'version' : context.version})
+        for name in names:
+            retval['benchmarks'][name] = _timed(BENCHMARKS[name], context, repeat, instrument)
+        if context._index is not None:
+            context._index.close()
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return retval
+
+
+def write_results(results, FileName):
+    '''
+    Writes the results of run_benchmarks to FileName (JSON).
+    '''
+    with open(FileName, 'w') as fd:
+        json.dump(results, fd, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    size = sys.argv[1] if len(sys.argv) > 1 else '100M'
+    ResultsName = sys.argv[2] if len(sys.argv) > 2 else 'benchmark.json'
+    compression = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'none' else None
+    instrument = len(sys.argv) > 4 and sys.argv[4] == 'instrument'
+    if os.path.exists(size): # an existing STDF file
+        results = run_benchmarks(FileName=size, instrument=instrument)
+    else:
+        results = run_benchmarks(size=size, compression=compression, instrument=instrument)
+    for name, result in results['benchmarks'].items():
+        print("%-12s %10.3f s %14.0f items/s %10.1f MB/s" % (name, result['seconds'], result['items_per_second'], result['MB_per_second']))
+    write_results(results, ResultsName)
@@ -0,0 +1,361 @@
+'''
+Created on Oct 18, 2026
+
+Incremental catalog of the STDF files in a directory tree, in SQLite.
+
+The directory tree is crawled (os.scandir, one lstat per file, none per directory) and the new
+or changed files (size or mtime differ from the catalog) are handed out in
+batches to a pool of worker processes. A worker makes one (decompressing)
+pass over a file, picking up the MIR, SDR's, WIR's, WRR's, MRR and PCR's,
+counting the PRR's and hashing the (uncompressed) contents on the way. The
+main process is the only one writing to the database, one transaction per
+batch.
+
+Tables :
+    files  : path, size, mtime, is_stdf, compression, endian, version, hash, parts, good, error, cataloged
+    mir    : the MIR of a file, the most used fields as (indexed) columns, all fields as JSON
+    sdr    : the SDR's of a file
+    wafers : the WIR/WRR's of a file (one row per wafer)
+    mrr    : the MRR of a file
+
+    catalog = STDFCatalog('lots.sqlite3')
+    catalog.update('/archive', workers=16)
+    catalog.lots(PART_TYP='X', NODE_NAM='Y', since=time.time() - 7 * 24 * 3600)
+'''
+import concurrent.futures
+import json
+import os
+import sqlite3
+import time
+
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.sidecar import sidecar_extension
+from ATE.data.STDF.stream import records_from_stream
+from ATE.data.STDF.yields import yield_extension
+from ATE.utils.hashing import HashingReader
+from ATE.utils.seekable import checkpoint_extension
+
+schema = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    is_stdf INTEGER NOT NULL,
+    compression TEXT,
+    endian TEXT,
+    version TEXT,
+    hash TEXT,
+    parts INTEGER,
+    good INTEGER,
+    error TEXT,
+    cataloged REAL
+);
+CREATE TABLE IF NOT EXISTS mir (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    LOT_ID TEXT, SBLOT_ID TEXT, PART_TYP TEXT, NODE_NAM TEXT, TSTR_TYP TEXT, JOB_NAM TEXT, JOB_REV TEXT,
+    OPER_NAM TEXT, TEST_COD TEXT, FACIL_ID TEXT, FLOW_ID TEXT, SETUP_T INTEGER, START_T INTEGER,
+    fields TEXT
+);
+CREATE TABLE IF NOT EXISTS sdr (
+    file_id INTEGER REFERENCES files(id) ON DELETE CASCADE,
+    HEAD_NUM INTEGER, SITE_GRP INTEGER, HAND_ID TEXT, CARD_ID TEXT, LOAD_ID TEXT,
+    fields TEXT
+);
+CREATE TABLE IF NOT EXISTS wafers (
+    file_id INTEGER REFERENCES files(id) ON DELETE CASCADE,
+    HEAD_NUM INTEGER, WAFER_ID TEXT, START_T INTEGER, FINISH_T INTEGER, PART_CNT INTEGER, GOOD_CNT INTEGER
+);
+CREATE TABLE IF NOT EXISTS mrr (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    FINISH_T INTEGER, DISP_COD TEXT, USR_DESC TEXT, EXC_DESC TEXT
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files(hash);
+CREATE INDEX IF NOT EXISTS mir_lot ON mir(LOT_ID);
+CREATE INDEX IF NOT EXISTS mir_product ON mir(PART_TYP, START_T);
+CREATE INDEX IF NOT EXISTS mir_tester ON mir(NODE_NAM, START_T);
+CREATE INDEX IF NOT EXISTS mir_start ON mir(START_T);
+CREATE INDEX IF NOT EXISTS sdr_file ON sdr(file_id);
+CREATE INDEX IF NOT EXISTS sdr_card ON sdr(CARD_ID);
+CREATE INDEX IF NOT EXISTS wafers_file ON wafers(file_id);
+CREATE INDEX IF NOT EXISTS wafers_id ON wafers(WAFER_ID);
+'''
+
+MIR_COLUMNS = ['LOT_ID', 'SBLOT_ID', 'PART_TYP', 'NODE_NAM', 'TSTR_TYP', 'JOB_NAM', 'JOB_REV', 'OPER_NAM',
+               'TEST_COD', 'FACIL_ID', 'FLOW_ID', 'SETUP_T', 'START_T']
+SDR_COLUMNS = ['HEAD_NUM', 'SITE_GRP', 'HAND_ID', 'CARD_ID', 'LOAD_ID']
+MRR_COLUMNS = ['FINISH_T', 'DISP_COD', 'USR_DESC', 'EXC_DESC']
+
+# files next to the STDF files that are never cataloged
+ignored_extensions = [sidecar_extension, checkpoint_extension, yield_extension, '.tmp']
+
+# record types picked up while passing over a file
+_MIR, _SDR, _WIR, _WRR, _MRR, _PCR, _PRR = (1, 10), (1, 80), (2, 10), (2, 20), (1, 20), (1, 30), (5, 20)
+
+
+def _fields(record):
+    return record.to_dict(include_missing_values=True)
+
+
+def catalog_entry(FileName, content_hash=True):
+    '''
+    Returns the catalog entry (a dictionary) of FileName, this is what the workers do.
+    '''
+    stat = os.stat(FileName)
+    retval = {'path' : FileName, 'size' : stat.st_size, 'mtime' : stat.st_mtime_ns, 'is_stdf' : 0,
+              'compression' : None, 'endian' : None, 'version' : None, 'hash' : None, 'parts' : None, 'good' : None,
+              'error' : None, 'mir' : None, 'sdr' : [], 'wafers' : [], 'mrr' : None}
+    probe, fd = open_STDF(FileName)
+    if fd is None:
+        return retval
+    retval.update(is_stdf=1, compression=probe.compression, endian=probe.endian, version=probe.version)
+    wafers = []
+    open_wafers = {} # HEAD_NUM -> wafer
+    PRR_count = 0
+    PCR_count = None
+    try:
+        with fd:
+            reader = HashingReader(fd) if content_hash else fd
+            for _, REC_TYP, REC_SUB, REC in records_from_stream(reader, probe.endian):
+                TS = (REC_TYP, REC_SUB)
+                if TS == _PRR:
+                    PRR_count += 1
+                elif TS == _MIR:
+                    retval['mir'] = _fields(lazy_record_object(probe.version, probe.endian, TS, REC))
+                elif TS == _SDR:
+                    retval['sdr'].append(_fields(lazy_record_object(probe.version, probe.endian, TS, REC)))
+                elif TS == _WIR:
+                    record = lazy_record_object(probe.version, probe.endian, TS, REC)
+                    wafer = {'HEAD_NUM' : record.get_value('HEAD_NUM'), 'WAFER_ID' : record.get_value('WAFER_ID'),
+                             'START_T' : record.get_value('START_T'), 'FINISH_T' : None, 'PART_CNT' : None, 'GOOD_CNT' : None}
+                    wafers.append(wafer)
+                    open_wafers[wafer['HEAD_NUM']] = wafer
+                elif TS == _WRR: # closes the open wafer of the head (the WAFER_ID is optional in the WRR)
+                    record = lazy_record_object(probe.version, probe.endian, TS, REC)
+                    wafer = open_wafers.pop(record.get_value('HEAD_NUM'), None)
+                    if wafer is None:
+                        wafer = {'HEAD_NUM' : record.get_value('HEAD_NUM'), 'WAFER_ID' : record.get_value('WAFER_ID'), 'START_T' : None}
+                        wafers.append(wafer)
+                    for name in ['FINISH_T', 'PART_CNT', 'GOOD_CNT']:
+                        wafer[name] = record.get_value(name)
+                    if not wafer['WAFER_ID']:
+                        wafer['WAFER_ID'] = record.get_value('WAFER_ID')
+                elif TS == _MRR:
+                    retval['mrr'] = _fields(lazy_record_object(probe.version, probe.endian, TS, REC))
+                elif TS == _PCR:
+                    record = lazy_record_object(probe.version, probe.endian, TS, REC)
+                    if record.get_value('HEAD_NUM') == 255:
+                        PCR_count = (record.get_value('PART_CNT'), record.get_value('GOOD_CNT'))
+            if content_hash:
+                retval['hash'] = reader.hexdigest()
+    except Exception as e: # a corrupt file doesn't stop the crawl, it is noted in the catalog
+        retval['error'] = '%s: %s' % (type(e).__name__, e)
+    retval['wafers'] = wafers
+    retval['parts'] = PRR_count
+    if PCR_count is not None:
+        retval['parts'] = PCR_count[0] if PCR_count[0] != 4294967295 else PRR_count
+        retval['good'] = PCR_count[1] if PCR_count[1] != 4294967295 else None
+    return retval
+
+
+def _catalog_batch(FileNames, content_hash):
+    retval = []
+    for FileName in FileNames:
+        try:
+            retval.append(catalog_entry(FileName, content_hash))
+        except OSError as e: # vanished or no access
+            retval.append({'path' : FileName, 'missing' : True, 'error' : str(e)})
+    return retval
+
+
+def crawl(Root, ignored=ignored_extensions):
+    '''
+    Yields (path, size, mtime (ns)) for all (regular) files below Root, symbolic links are not followed.
+    '''
+    stack = [Root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        if os.path.splitext(entry.name)[1] in ignored:
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                        yield entry.path, stat.st_size, stat.st_mtime_ns
+                except OSError:
+                    continue
+
+
+def _json(value):
+    return json.dumps(value, default=str)
+
+
+class STDFCatalog(object):
+    '''
+    The SQLite catalog of STDF files, see update to (incrementally) fill it.
+    '''
+
+    def __init__(self, DatabaseName):
+        self.DatabaseName = DatabaseName
+        self.connection = sqlite3.connect(DatabaseName)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(schema)
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM files WHERE is_stdf = 1').fetchone()[0]
+
+    def known(self, Root=None):
+        '''
+        Returns a dictionary path -> (size, mtime) of the cataloged files (below Root)
+        '''
+        if Root is None:
+            rows = self.connection.execute('SELECT path, size, mtime FROM files')
+        else:
+            prefix = os.path.join(os.path.abspath(Root), '')
+            rows = self.connection.execute('SELECT path, size, mtime FROM files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+        return {path : (size, mtime) for path, size, mtime in rows}
+
+    def _store(self, entry):
+        cursor = self.connection.cursor()
+        cursor.execute('DELETE FROM files WHERE path = ?', (entry['path'],))
+        if entry.get('missing'):
+            return
+        cursor.execute('INSERT INTO files (path, size, mtime, is_stdf, compression, endian, version, hash, parts, good, error, cataloged) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (entry['path'], entry['size'], entry['mtime'], entry['is_stdf'], entry['compression'], entry['endian'],
+                        entry['version'], entry['hash'], entry['parts'], entry['good'], entry['error'], time.time()))
+        file_id = cursor.lastrowid
+        if entry['mir'] is not None:
+            mir = entry['mir']
+            cursor.execute('INSERT INTO mir VALUES (%s)' % ', '.join(['?'] * (len(MIR_COLUMNS) + 2)),
+                           [file_id] + [mir.get(name) for name in MIR_COLUMNS] + [_json(mir)])
+        for sdr in entry['sdr']:
+            cursor.execute('INSERT INTO sdr VALUES (%s)' % ', '.join(['?'] * (len(SDR_COLUMNS) + 2)),
+                           [file_id] + [sdr.get(name) for name in SDR_COLUMNS] + [_json(sdr)])
+        for wafer in entry['wafers']:
+            cursor.execute('INSERT INTO wafers VALUES (?, ?, ?, ?, ?, ?, ?)',
+                           (file_id, wafer['HEAD_NUM'], wafer['WAFER_ID'], wafer['START_T'], wafer['FINISH_T'], wafer['PART_CNT'], wafer['GOOD_CNT']))
+        if entry['mrr'] is not None:
+            cursor.execute('INSERT INTO mrr VALUES (?, ?, ?, ?, ?)', [file_id] + [entry['mrr'].get(name) for name in MRR_COLUMNS])
+
+    def update(self, Root, workers=None, batch_size=64, content_hash=True, prune=True, progress=False):
+        '''
+        Catalogs the new and changed files below Root with a pool of (workers) processes, unchanged files
+        (same size and mtime) are skipped. With prune, files that are gone are removed from the catalog.
+        Returns a dictionary with the number of 'cataloged', 'unchanged', 'removed' files and 'errors'.
+        '''
+        Root = os.path.abspath(Root)
+        known = self.known(Root)
+        seen = set()
+        todo = []
+        unchanged = 0
+        for path, size, mtime in crawl(Root):
+            seen.add(path)
+            if known.get(path) == (size, mtime):
+                unchanged += 1
+            else:
+                todo.append(path)
+        retval = {'cataloged' : 0, 'unchanged' : unchanged, 'removed' : 0, 'errors' : 0}
+        if prune:
+            gone = [path for path in known if path not in seen]
+            with self.connection:
+                self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in gone])
+            retval['removed'] = len(gone)
+        bar = None
+        if progress:
+            import tqdm
+            bar = tqdm.tqdm(total=len(todo), desc='cataloging', leave=False, ascii=True, unit='files')
+        if todo:
+            workers = workers if workers else os.cpu_count()
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                pending = set()
+                for start in range(0, len(todo), batch_size):
+                    pending.add(executor.submit(_catalog_batch, todo[start:start + batch_size], content_hash))
+                    if len(pending) >= 2 * workers: # bound the work in flight
+                        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        self._collect(done, retval, bar)
+                self._collect(pending, retval, bar)
+        if bar is not None:
+            bar.close()
+        return retval
+
+    def _collect(self, futures, counts, bar):
+        '''
+        Writes the entries of the (done) futures to the database, one transaction per batch.
+        '''
+        for future in futures:
+            entries = future.result()
+            with self.connection:
+                for entry in entries:
+                    self._store(entry)
+            counts['cataloged'] += sum(1 for entry in entries if not entry.get('missing'))
+            counts['errors'] += sum(1 for entry in entries if entry['error'] is not None)
+            if bar is not None:
+                bar.update(len(entries))
+
+    def query(self, sql, parameters=()):
+        '''
+        Returns the rows (as dictionaries) of an SQL query on the catalog.
+        '''
+        cursor = self.connection.execute(sql, parameters)
+        names = [description[0] for description in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def lots(self, since=None, until=None, **criteria):
+        '''
+        Returns the files (path, LOT_ID, SBLOT_ID, PART_TYP, NODE_NAM, START_T, parts, good) matching the
+        MIR criteria (eg: PART_TYP='X', NODE_NAM='Y'), START_T within [since, until) if given.
+        '''
+        conditions = ['files.is_stdf = 1']
+        parameters = []
+        for name, value in criteria.items():
+            if name not in MIR_COLUMNS:
+                raise KeyError("'%s' is not one of %s" % (name, MIR_COLUMNS))
+            conditions.append('mir.%s = ?' % name)
+            parameters.append(value)
+        if since is not None:
+            conditions.append('mir.START_T >= ?')
+            parameters.append(int(since))
+        if until is not None:
+            conditions.append('mir.START_T < ?')
+            parameters.append(int(until))
+        return self.query('SELECT files.path, mir.LOT_ID, mir.SBLOT_ID, mir.PART_TYP, mir.NODE_NAM, mir.START_T, files.parts, files.good '
+                          'FROM files JOIN mir ON mir.file_id = files.id WHERE %s ORDER BY mir.START_T' % ' AND '.join(conditions), parameters)
+
+
+def update_catalog(DatabaseName, Root, workers=None, content_hash=True, prune=True, progress=False):
+    '''
+    Updates (or creates) the catalog DatabaseName with the STDF files below Root.
+    '''
+    with STDFCatalog(DatabaseName) as catalog:
+        return catalog.update(Root, workers=workers, content_hash=content_hash, prune=prune, progress=progress)
+
+
+if __name__ == '__main__':
+    import sys
+
+    DatabaseName, Root = sys.argv[1:3]
+    for attempt in ['first', 'second']:
+        start = time.time()
+        result = update_catalog(DatabaseName, Root)
+        print("%s run : %s in %.3f seconds" % (attempt, result, time.time() - start))
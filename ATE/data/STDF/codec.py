@@ -0,0 +1,1079 @@
+'''
+Created on Oct 18, 2026
+
+Pre-compiled (un)packing plans for the STDF records.
+
+The first time a record class is (un)packed for a given version and endian,
+its field list is compiled into a plan: a list of steps, each step covering
+one or more consecutive fields.
+
+    - consecutive fixed width fields (U*x, I*x, R*x, C*#, B*#) are merged
+      into a single struct.Struct, so they are (un)packed with one call.
+    - variable length fields (C*n, B*n, D*n, kxTYPE, V*n, ...) get a small
+      dedicated step.
+
+The plans are cached on (record class, version, endian), so building them is
+a one time cost. STDR._unpack and STDR.__repr__ go through this module.
+
+Big arrays (kxU/kxI/kxR, the D*n and B*n bits and the N*1 nibbles of FTR, STR
+and PLR) are (un)packed with NumPy, so a 1024 pin FTR is a handful of C-level
+calls. The array functions (numerical_array, bit_array, nibble_array and their
+inverses) are public, they return/take NumPy arrays for callers that want to
+work on the fail data directly.
+'''
+import re
+import struct
+
+import numpy as np
+
+from ATE.data.STDF import instrumentation
+from ATE.data.STDF.records import STDFError
+
+# struct codes for the fixed width numerical types
+numerical_codes = {
+    'U*1' : 'B', 'U*2' : 'H', 'U*4' : 'I', 'U*8' : 'Q',
+    'I*1' : 'b', 'I*2' : 'h', 'I*4' : 'i', 'I*8' : 'q',
+    'R*4' : 'f', 'R*8' : 'd',
+}
+
+# struct codes for unsigned integers of a given size (used by the '*f' types)
+unsigned_codes = {1 : 'B', 2 : 'H', 4 : 'I', 8 : 'Q'}
+
+# V*n type codes (STDF V4 spec, page 62)
+Vn_types = {
+     0 : 'B*0',  # Special pad field
+     1 : 'U*1',  # One byte unsigned integer
+     2 : 'U*2',  # Two byte unsigned integer
+     3 : 'U*4',  # Four byte unsigned integer
+     4 : 'I*1',  # One byte signed integer
+     5 : 'I*2',  # Two byte signed integer
+     6 : 'I*4',  # Four byte signed integer
+     7 : 'R*4',  # Four byte floating point number
+     8 : 'R*8',  # Eight byte floating point number
+    10 : 'C*n',  # Variable length ASCII character string (first byte is string length in bytes)
+    11 : 'B*n',  # Variable length binary data string (first byte is string length in bytes)
+    12 : 'D*n',  # Bit encoded data (first two bytes of string are length in bits)
+    13 : 'N*1',  # Unsigned nibble
+}
+Vn_codes = {Vn_types[code] : code for code in Vn_types}
+
+numpy_threshold = 32 # arrays (bytes for the bits and nibbles) from this size on are done with NumPy, below it plain python is faster
+
+_type_regex = re.compile(r'^(x?)([A-Z])\*?([0-9]+|n|f)$')
+
+_plans = {}
+
+
+def split_type(TypeFormat):
+    '''
+    Splits a type format like 'xU*2' into (is_array, Type, Size) = (True, 'U', '2')
+    Also the (sloppy) formats without '*' (like 'U1' or 'xCn') are accepted.
+    '''
+    match = _type_regex.match(TypeFormat)
+    if match is None:
+        raise STDFError("Unsupported type-format '%s'" % TypeFormat)
+    array, Type, Size = match.groups()
+    return array == 'x', Type, Size
+
+
+#
+# conversions between the python representation and the packed representation
+#
+
+_bit_lists = [[('1' if (byte >> (7 - bit)) & 1 else '0') for bit in range(8)] for byte in range(256)]
+_bit_lists_lsb = [[('1' if (byte >> bit) & 1 else '0') for bit in range(8)] for byte in range(256)]
+_bit_strings = np.array(['0', '1'])
+
+
+def _numerical_code(TypeFormat, caller):
+    _, Type, Size = split_type(TypeFormat)
+    code = numerical_codes.get('%s*%s' % (Type, Size))
+    if code is None:
+        raise STDFError("%s : '%s' is not a numerical type" % (caller, TypeFormat))
+    return code
+
+
+def _array_from(data, code, count, endian, offset=0):
+    return np.frombuffer(data, dtype=np.dtype(endian + code), count=count, offset=offset)
+
+
+def _array_bytes(values, code, endian):
+    dtype = np.dtype(endian + code)
+    values = np.asarray(values)
+    if dtype.kind in 'iu' and len(values):
+        if values.dtype.kind not in 'iub':
+            raise STDFError("can not pack %s values as '%s'" % (values.dtype, code))
+        info = np.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            raise STDFError("values out of range for '%s'" % code)
+    return values.astype(dtype, copy=False).tobytes()
+
+
+def numerical_array(data, TypeFormat, count, endian, offset=0):
+    '''
+    kxU/kxI/kxR : returns count elements of TypeFormat (like 'U*2' or 'xR*4') at offset in data as a (read only) NumPy array.
+    '''
+    return _array_from(data, _numerical_code(TypeFormat, 'numerical_array'), count, endian, offset)
+
+
+def bytes_from_numerical_array(values, TypeFormat, endian):
+    '''
+    Inverse of numerical_array : returns the packed values (a sequence or a NumPy array).
+    '''
+    return _array_bytes(values, _numerical_code(TypeFormat, 'bytes_from_numerical_array'), endian)
+
+
+def bit_array(data, n_bits=None, lsb_first=False):
+    '''
+    B*x (lsb_first=False) and D*n (lsb_first=True) : returns the (first n_bits) bits of data as a NumPy uint8 array of 0/1.
+    '''
+    return np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8), count=n_bits, bitorder='little' if lsb_first else 'big')
+
+
+def _small_integers(values):
+    '''
+    Returns a list of small (0..255) integers or '0'/'1' strings as a NumPy uint8 array (via bytes, which is
+    a lot faster than np.asarray on a list), None if that is not possible.
+    '''
+    try:
+        if len(values) and isinstance(values[0], str):
+            return np.frombuffer(''.join(values).encode('ascii'), dtype=np.uint8) - ord('0')
+        return np.frombuffer(bytes(values), dtype=np.uint8)
+    except (TypeError, ValueError, UnicodeEncodeError):
+        return None
+
+
+def bytes_from_bit_array(bits, lsb_first=False):
+    '''
+    Inverse of bit_array, bits is a sequence of 0/1 (or '0'/'1'), the last byte is padded with 0 bits.
+    '''
+    if isinstance(bits, list):
+        small = _small_integers(bits)
+        if small is not None and len(small) == len(bits):
+            bits = small
+    bits = np.asarray(bits)
+    if bits.dtype.kind == 'U':
+        bits = bits == '1'
+    elif bits.dtype.kind == 'O':
+        bits = np.array([bit in ('1', 1, True) for bit in bits], dtype=bool)
+    else:
+        bits = bits == 1
+    return np.packbits(bits, bitorder='little' if lsb_first else 'big').tobytes()
+
+
+def nibble_array(data, n_nibbles):
+    '''
+    N*x : returns the first n_nibbles nibbles of data (the low nibble of each byte first) as a NumPy uint8 array.
+    '''
+    raw = np.frombuffer(bytes(data), dtype=np.uint8)
+    retval = np.empty(2 * len(raw), dtype=np.uint8)
+    retval[0::2] = raw & 0x0F
+    retval[1::2] = raw >> 4
+    return retval[:n_nibbles]
+
+
+def bytes_from_nibble_array(nibbles):
+    '''
+    Inverse of nibble_array, an odd number of nibbles leaves the last high nibble 0.
+    '''
+    if isinstance(nibbles, list):
+        small = _small_integers(nibbles)
+        nibbles = small if small is not None else nibbles
+    nibbles = np.asarray(nibbles).astype(np.uint8) & 0x0F
+    if len(nibbles) & 1:
+        nibbles = np.append(nibbles, np.uint8(0))
+    return (nibbles[0::2] | (nibbles[1::2] << 4)).tobytes()
+
+
+def _bit_strings_of(bits):
+    return _bit_strings[bits].tolist()
+
+
+def bits_from_bytes(data):
+    '''
+    B*x : returns a list of '0'/'1' strings, most significant bit of each byte first.
+    '''
+    if len(data) >= numpy_threshold:
+        return _bit_strings_of(bit_array(data))
+    retval = []
+    for byte in data:
+        retval.extend(_bit_lists[byte])
+    return retval
+
+
+def bytes_from_bits(bits):
+    '''
+    B*x : inverse of bits_from_bytes, the last byte is padded with '0' bits.
+    '''
+    if isinstance(bits, int):
+        return bytes([bits])
+    if isinstance(bits, (bytes, bytearray)):
+        return bytes(bits)
+    if len(bits) >= 8 * numpy_threshold or isinstance(bits, np.ndarray):
+        return bytes_from_bit_array(bits)
+    retval = bytearray()
+    byte = 0
+    count = 0
+    for bit in bits:
+        byte = (byte << 1) | (1 if bit in ('1', 1, True) else 0)
+        count += 1
+        if count == 8:
+            retval.append(byte)
+            byte = 0
+            count = 0
+    if count != 0:
+        retval.append(byte << (8 - count))
+    return bytes(retval)
+
+
+def bits_from_byte(byte):
+    '''
+    B*1 : returns a (new) list of 8 '0'/'1' strings, most significant bit first.
+    '''
+    return _bit_lists[byte][:]
+
+
+def byte_from_bits(bits):
+    '''
+    B*1 : the integer value of a (8 element) bit list, an integer is passed trough.
+    '''
+    if isinstance(bits, int):
+        return bits
+    return bytes_from_bits(bits)[0] if len(bits) else 0
+
+
+def dbits_from_bytes(data, n_bits):
+    '''
+    D*n : returns a list of n_bits '0'/'1' strings, least significant bit of each byte first.
+    '''
+    if len(data) >= numpy_threshold:
+        return _bit_strings_of(bit_array(data, n_bits, lsb_first=True))
+    retval = []
+    for byte in data:
+        retval.extend(_bit_lists_lsb[byte])
+    del retval[n_bits:]
+    return retval
+
+
+def bytes_from_dbits(bits):
+    '''
+    D*n : inverse of dbits_from_bytes, the last byte is padded with '0' bits.
+    '''
+    if len(bits) >= 8 * numpy_threshold or isinstance(bits, np.ndarray):
+        return bytes_from_bit_array(bits, lsb_first=True)
+    retval = bytearray((len(bits) + 7) // 8)
+    for index, bit in enumerate(bits):
+        if bit in ('1', 1, True):
+            retval[index >> 3] |= 1 << (index & 7)
+    return bytes(retval)
+
+
+def nibbles_from_bytes(data, n_nibbles):
+    '''
+    N*x : returns a list of n_nibbles integers, the low nibble of each byte first.
+    '''
+    if len(data) >= numpy_threshold:
+        return nibble_array(data, n_nibbles).tolist()
+    retval = []
+    for byte in data:
+        retval.append(byte & 0x0F)
+        retval.append(byte >> 4)
+    del retval[n_nibbles:]
+    return retval
+
+
+def bytes_from_nibbles(nibbles):
+    '''
+    N*x : inverse of nibbles_from_bytes, an odd number of nibbles leaves the last high nibble 0.
+    '''
+    if len(nibbles) >= 2 * numpy_threshold or isinstance(nibbles, np.ndarray):
+        return bytes_from_nibble_array(nibbles)
+    retval = bytearray((len(nibbles) + 1) // 2)
+    for index, nibble in enumerate(nibbles):
+        if index & 1:
+            retval[index >> 1] |= (nibble & 0x0F) << 4
+        else:
+            retval[index >> 1] |= nibble & 0x0F
+    return bytes(retval)
+
+
+def _decode_string(data):
+    return bytes(data).decode('utf-8').strip()[:255]
+
+
+def _fixed_string_decoder(size):
+    def decode(data):
+        return bytes(data).decode('utf-8').strip()[:size].ljust(size, ' ')
+    return decode
+
+
+def _encode_string(value):
+    return value.encode('utf-8')
+
+
+def _not_enough_bytes(obj, FieldKey, needed, available):
+    return STDFError("%s._unpack(%s) : Not enough bytes in buffer (need %s while %s available)." % (obj.id, FieldKey, needed, available))
+
+
+#
+# Steps : every step has a list of field names ('names'), an unpack and a pack method
+#
+
+class _FixedStep(object):
+    '''
+    A run of consecutive fixed width fields, (un)packed with one struct.Struct
+    '''
+    fixed = True
+
+    def __init__(self, endian):
+        self.endian = endian
+        self.names = []
+        self.codes = []
+        self.decoders = []
+        self.encoders = []
+
+    def append(self, name, code, decoder=None, encoder=None):
+        self.names.append(name)
+        self.codes.append(code)
+        self.decoders.append(decoder)
+        self.encoders.append(encoder)
+
+    def compile(self):
+        self.struct = struct.Struct(self.endian + ''.join(self.codes))
+        self.size = self.struct.size
+        self.singles = [struct.Struct(self.endian + code) for code in self.codes]
+        self.converted = [(index, decoder) for index, decoder in enumerate(self.decoders) if decoder is not None]
+        self.items = list(zip(self.names, self.decoders, self.encoders))
+
+    def unpack(self, obj, fields, buffer, offset):
+        values = self.struct.unpack_from(buffer, offset)
+        if self.converted:
+            values = list(values)
+            for index, decoder in self.converted:
+                values[index] = decoder(values[index])
+        for name, value in zip(self.names, values):
+            fields[name]['Value'] = value
+        return offset + self.size
+
+    def unpack_partial(self, obj, fields, buffer, offset, end):
+        '''
+        The record is truncated somewhere in this run (optional fields at the end of a record may be omitted)
+        '''
+        for index, single in enumerate(self.singles):
+            name = self.names[index]
+            if offset >= end:
+                _set_missing(obj, fields, name)
+                continue
+            if end - offset < single.size:
+                raise _not_enough_bytes(obj, name, single.size, end - offset)
+            value = single.unpack_from(buffer, offset)[0]
+            if self.decoders[index] is not None:
+                value = self.decoders[index](value)
+            fields[name]['Value'] = value
+            offset += single.size
+        return offset
+
+    def pack(self, obj, fields):
+        values = []
+        for name, _, encoder in self.items:
+            value = _value_of(obj, fields, name)
+            if encoder is not None:
+                value = encoder(value)
+            values.append(value)
+        try:
+            return self.struct.pack(*values)
+        except struct.error as e:
+            raise STDFError("%s.pack() : can not pack %s as '%s' (%s)" % (obj.id, self.names, self.struct.format, e))
+
+
+class _VariableStep(object):
+    '''
+    One variable length field, the decoder/encoder functions do the actual work.
+    '''
+    fixed = False
+
+    def __init__(self, name, decoder, encoder, array_decoder=None):
+        self.names = [name]
+        self.name = name
+        self.decoder = decoder
+        self.encoder = encoder
+        self.array_decoder = array_decoder if array_decoder is not None else decoder
+        self.empty = None # the value of a missing field in an array unpack
+
+    def unpack(self, obj, fields, buffer, offset):
+        value, offset = self.decoder(obj, fields, buffer, offset)
+        fields[self.name]['Value'] = value
+        return offset
+
+    def unpack_array(self, obj, fields, buffer, offset):
+        value, offset = self.array_decoder(obj, fields, buffer, offset)
+        fields[self.name]['Value'] = value
+        return offset
+
+    def pack(self, obj, fields):
+        return self.encoder(obj, fields, _value_of(obj, fields, self.name))
+
+
+def _value_of(obj, fields, name):
+    field = fields[name]
+    value = field['Value']
+    if value is None:
+        value = field['Missing']
+    if value is None:
+        raise STDFError("%s.pack(%s) : Error : cannot pack uninitialized value (None) of non-optional field" % (obj.id, name))
+    return value
+
+
+def _set_missing(obj, fields, name):
+    '''
+    Sets the 'Missing' value of the field as its value, in the same (normalized) way set_value would.
+    '''
+    field = fields[name]
+    value = field['Missing']
+    if isinstance(value, int) and field['Type'] == 'B*1':
+        value = _bit_lists[value & 0xFF][:]
+    field['Value'] = value
+    obj.missing_fields += 1
+
+
+def _reference(obj, fields, Ref, FieldKey):
+    '''
+    returns the (integer) value a reference points to, a reference can be a field name or an integer.
+    '''
+    if isinstance(Ref, int):
+        return Ref
+    if isinstance(Ref, str) and Ref in fields:
+        value = fields[Ref]['Value']
+        if value is None:
+            value = fields[Ref]['Missing']
+        if isinstance(value, int):
+            return value
+    raise STDFError("%s._unpack(%s) : Unsupported Reference '%s'" % (obj.id, FieldKey, Ref))
+
+
+def _check(obj, FieldKey, buffer, offset, size):
+    if len(buffer) - offset < size:
+        raise _not_enough_bytes(obj, FieldKey, size, len(buffer) - offset)
+
+
+#
+# Step builders for the variable types, they return (decoder, encoder)
+#
+
+def _string_n(name, endian):
+    def decode(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, 1)
+        n_bytes = buffer[offset]
+        offset += 1
+        _check(obj, name, buffer, offset, n_bytes)
+        return _decode_string(buffer[offset:offset + n_bytes]), offset + n_bytes
+
+    def encode(obj, fields, value):
+        data = _encode_string(value)[:255]
+        return bytes([len(data)]) + data
+    return decode, encode
+
+
+def _string_f(name, endian, Ref):
+    def decode(obj, fields, buffer, offset):
+        n_bytes = _reference(obj, fields, Ref, name)
+        _check(obj, name, buffer, offset, n_bytes)
+        return bytes(buffer[offset:offset + n_bytes]).decode('utf-8'), offset + n_bytes
+
+    def encode(obj, fields, value):
+        return _encode_string(value)
+    return decode, encode
+
+
+def _long_string_n(name, endian):
+    length = struct.Struct(endian + 'H')
+
+    def decode(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, 2)
+        n_bytes = length.unpack_from(buffer, offset)[0]
+        offset += 2
+        _check(obj, name, buffer, offset, n_bytes)
+        return bytes(buffer[offset:offset + n_bytes]), offset + n_bytes
+
+    def encode(obj, fields, value):
+        if isinstance(value, str):
+            value = _encode_string(value)
+        return length.pack(len(value)) + bytes(value)
+    return decode, encode
+
+
+def _bits_n(name, endian):
+    def decode(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, 1)
+        n_bytes = buffer[offset]
+        offset += 1
+        _check(obj, name, buffer, offset, n_bytes)
+        return bits_from_bytes(buffer[offset:offset + n_bytes]), offset + n_bytes
+
+    def decode_array(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, 1)
+        n_bytes = buffer[offset]
+        offset += 1
+        _check(obj, name, buffer, offset, n_bytes)
+        return bit_array(buffer[offset:offset + n_bytes]), offset + n_bytes
+
+    def encode(obj, fields, value):
+        data = bytes_from_bits(value)
+        if len(data) > 255:
+            raise STDFError("%s.pack(%s) : 'B*n' can not hold more than 255 bytes" % (obj.id, name))
+        return bytes([len(data)]) + data
+    return decode, encode, decode_array
+
+
+def _dbits_n(name, endian):
+    length = struct.Struct(endian + 'H')
+
+    def decode(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, 2)
+        n_bits = length.unpack_from(buffer, offset)[0]
+        offset += 2
+        n_bytes = (n_bits + 7) // 8
+        _check(obj, name, buffer, offset, n_bytes)
+        return dbits_from_bytes(buffer[offset:offset + n_bytes], n_bits), offset + n_bytes
+
+    def decode_array(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, 2)
+        n_bits = length.unpack_from(buffer, offset)[0]
+        offset += 2
+        n_bytes = (n_bits + 7) // 8
+        _check(obj, name, buffer, offset, n_bytes)
+        return bit_array(buffer[offset:offset + n_bytes], n_bits, lsb_first=True), offset + n_bytes
+
+    def encode(obj, fields, value):
+        if len(value) > 65535:
+            raise STDFError("%s.pack(%s) : 'D*n' can not hold more than 65535 bits" % (obj.id, name))
+        return length.pack(len(value)) + bytes_from_dbits(value)
+    return decode, encode, decode_array
+
+
+def _nibbles(name, endian, n_nibbles):
+    n_bytes = (n_nibbles + 1) // 2
+
+    def decode(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, n_bytes)
+        return nibbles_from_bytes(buffer[offset:offset + n_bytes], n_nibbles), offset + n_bytes
+
+    def decode_array(obj, fields, buffer, offset):
+        _check(obj, name, buffer, offset, n_bytes)
+        return nibble_array(buffer[offset:offset + n_bytes], n_nibbles), offset + n_bytes
+
+    def encode(obj, fields, value):
+        value = list(value)[:n_nibbles]
+        value += [0] * (n_nibbles - len(value))
+        return bytes_from_nibbles(value)
+    return decode, encode, decode_array
+
+
+def _unsigned_f(name, endian, Ref):
+    def decode(obj, fields, buffer, offset):
+        size = _reference(obj, fields, Ref, name)
+        if size not in unsigned_codes:
+            raise STDFError("%s._unpack(%s) : Unsupported size %s for 'U*f'" % (obj.id, name, size))
+        _check(obj, name, buffer, offset, size)
+        return struct.unpack_from(endian + unsigned_codes[size], buffer, offset)[0], offset + size
+
+    def encode(obj, fields, value):
+        size = _reference(obj, fields, Ref, name)
+        if size not in unsigned_codes:
+            raise STDFError("%s.pack(%s) : Unsupported size %s for 'U*f'" % (obj.id, name, size))
+        return struct.pack(endian + unsigned_codes[size], value)
+    return decode, encode
+
+
+def _count(obj, fields, Ref, name):
+    '''
+    The element count of an array (kxTYPE), Ref is the name of the count field or a (count, size) tuple.
+    '''
+    if isinstance(Ref, tuple):
+        Ref = Ref[0]
+    return _reference(obj, fields, Ref, name)
+
+
+def _set_count(fields, Ref, K):
+    if isinstance(Ref, tuple):
+        Ref = Ref[0]
+    if isinstance(Ref, str) and Ref in fields:
+        fields[Ref]['Value'] = K
+
+
+def _numerical_array(name, endian, Ref, code):
+    structs = {}
+
+    def array_struct(K, code):
+        key = (K, code)
+        retval = structs.get(key)
+        if retval is None:
+            retval = struct.Struct('%s%d%s' % (endian, K, code))
+            if len(structs) < 64:
+                structs[key] = retval
+        return retval
+
+    def element_code(obj, fields):
+        if code is not None:
+            return code
+        size = _reference(obj, fields, Ref[1], name)
+        if size not in unsigned_codes:
+            raise STDFError("%s._unpack(%s) : Unsupported size %s for 'xU*f'" % (obj.id, name, size))
+        return unsigned_codes[size]
+
+    def decode(obj, fields, buffer, offset):
+        K = _count(obj, fields, Ref, name)
+        element = element_code(obj, fields)
+        if K >= numpy_threshold:
+            size = K * struct.calcsize(element)
+            _check(obj, name, buffer, offset, size)
+            return _array_from(buffer, element, K, endian, offset).tolist(), offset + size
+        array = array_struct(K, element)
+        _check(obj, name, buffer, offset, array.size)
+        return list(array.unpack_from(buffer, offset)), offset + array.size
+
+    def decode_array(obj, fields, buffer, offset):
+        K = _count(obj, fields, Ref, name)
+        element = element_code(obj, fields)
+        size = K * struct.calcsize(element)
+        _check(obj, name, buffer, offset, size)
+        return _array_from(buffer, element, K, endian, offset), offset + size
+
+    def encode(obj, fields, value):
+        K = len(value)
+        if K >= numpy_threshold or isinstance(value, np.ndarray):
+            try:
+                return _array_bytes(value, element_code(obj, fields), endian)
+            except STDFError as e:
+                raise STDFError("%s.pack(%s) : %s" % (obj.id, name, e))
+        return array_struct(K, element_code(obj, fields)).pack(*value)
+    return decode, encode, decode_array
+
+
+def _array_of(name, endian, Ref, element):
+    '''
+    kxTYPE for the types that are not fixed width numbers, element is a (decoder, encoder) tuple for one element.
+    '''
+    element_decoder, element_encoder = element[:2]
+    element_array_decoder = element[2] if len(element) > 2 else element_decoder
+
+    def decoder(element_decoder):
+        def decode(obj, fields, buffer, offset):
+            K = _count(obj, fields, Ref, name)
+            retval = []
+            for _ in range(K):
+                value, offset = element_decoder(obj, fields, buffer, offset)
+                retval.append(value)
+            return retval, offset
+        return decode
+
+    def encode(obj, fields, value):
+        return b''.join([element_encoder(obj, fields, item) for item in value])
+    return decoder(element_decoder), encode, decoder(element_array_decoder)
+
+
+def _nibble_array(name, endian, Ref):
+    '''
+    kxN*1 : k nibbles, packed 2 per byte. A value is a list of 1-element lists (cfr. STDR.set_value).
+    '''
+    def decode(obj, fields, buffer, offset):
+        K = _count(obj, fields, Ref, name)
+        n_bytes = (K + 1) // 2
+        _check(obj, name, buffer, offset, n_bytes)
+        if n_bytes >= numpy_threshold:
+            return nibble_array(buffer[offset:offset + n_bytes], K).reshape(-1, 1).tolist(), offset + n_bytes
+        nibbles = nibbles_from_bytes(buffer[offset:offset + n_bytes], K)
+        return [[nibble] for nibble in nibbles], offset + n_bytes
+
+    def decode_array(obj, fields, buffer, offset):
+        K = _count(obj, fields, Ref, name)
+        n_bytes = (K + 1) // 2
+        _check(obj, name, buffer, offset, n_bytes)
+        return nibble_array(buffer[offset:offset + n_bytes], K), offset + n_bytes
+
+    def encode(obj, fields, value):
+        if isinstance(value, np.ndarray):
+            return bytes_from_nibble_array(value.reshape(-1))
+        return bytes_from_nibbles([item[0] if isinstance(item, list) else item for item in value])
+    return decode, encode, decode_array
+
+
+class _VnTable(object):
+    '''
+    The V*n (generic data) codec for one endian, table driven by the type code : decoders[code] is a function
+    (buffer, offset) -> (value, offset) and encoders[code] a function value -> bytes (without the code byte).
+    '''
+
+    def __init__(self, endian):
+        self.endian = endian
+        self.decoders = {0 : self._pad}
+        self.encoders = {0 : lambda value: b''}
+        for code in range(1, 9):
+            number = struct.Struct(endian + numerical_codes[Vn_types[code]])
+            self.decoders[code] = self._number(number)
+            self.encoders[code] = number.pack
+        length = struct.Struct(endian + 'H')
+        self.d_length = length
+        self.decoders.update({10 : self._string, 11 : self._bits, 12 : self._dbits, 13 : self._nibble})
+        self.encoders.update({10 : self._encode_string, 11 : self._encode_bits, 12 : self._encode_dbits, 13 : lambda value: bytes([value & 0x0F])})
+
+    @staticmethod
+    def _pad(buffer, offset):
+        return None, offset
+
+    @staticmethod
+    def _number(number):
+        unpack_from = number.unpack_from
+        size = number.size
+
+        def decode(buffer, offset):
+            return unpack_from(buffer, offset)[0], offset + size
+        return decode
+
+    @staticmethod
+    def _string(buffer, offset):
+        n_bytes = buffer[offset]
+        offset += 1
+        return bytes(buffer[offset:offset + n_bytes]).decode('utf-8'), offset + n_bytes
+
+    @staticmethod
+    def _bits(buffer, offset):
+        n_bytes = buffer[offset]
+        offset += 1
+        return bits_from_bytes(buffer[offset:offset + n_bytes]), offset + n_bytes
+
+    def _dbits(self, buffer, offset):
+        n_bits = self.d_length.unpack_from(buffer, offset)[0]
+        offset += 2
+        n_bytes = (n_bits + 7) // 8
+        return dbits_from_bytes(buffer[offset:offset + n_bytes], n_bits), offset + n_bytes
+
+    @staticmethod
+    def _nibble(buffer, offset):
+        return buffer[offset] & 0x0F, offset + 1
+
+    @staticmethod
+    def _encode_string(value):
+        data = _encode_string(value)[:255]
+        return bytes([len(data)]) + data
+
+    @staticmethod
+    def _encode_bits(value):
+        data = bytes_from_bits(value)
+        if len(data) > 255:
+            raise STDFError("'B*n' can not hold more than 255 bytes")
+        return bytes([len(data)]) + data
+
+    def _encode_dbits(self, value):
+        if len(value) > 65535:
+            raise STDFError("'D*n' can not hold more than 65535 bits")
+        return self.d_length.pack(len(value)) + bytes_from_dbits(value)
+
+    def decode(self, buffer, offset=0, count=None, end=None):
+        '''
+        Decodes count (all up to end if None) V*n items at offset, returns ([(Type, Value), ...], offset).
+        '''
+        if end is None:
+            end = len(buffer)
+        decoders = self.decoders
+        retval = []
+        append = retval.append
+        while (count is None or len(retval) < count) and offset < end:
+            code = buffer[offset]
+            decoder = decoders.get(code)
+            if decoder is None:
+                raise STDFError("V*n : unsupported type '%d'" % code)
+            try:
+                value, offset = decoder(buffer, offset + 1)
+            except (IndexError, struct.error):
+                offset = end + 1
+            if offset > end:
+                raise STDFError("V*n : not enough bytes for '%s' (item %d)" % (Vn_types[code], len(retval)))
+            append((Vn_types[code], value))
+        if count is not None and len(retval) < count:
+            raise STDFError("V*n : not enough bytes for %d items (%d found)" % (count, len(retval)))
+        return retval, offset
+
+    def encode(self, items):
+        '''
+        Packs a list of (Type, Value) items (Type is the name like 'U*2' or the code) as V*n data.
+        '''
+        retval = bytearray()
+        for Type, Value in items:
+            code = Vn_codes.get(Type, Type)
+            encoder = self.encoders.get(code)
+            if encoder is None:
+                raise STDFError("V*n : unsupported type '%s'" % Type)
+            retval.append(code)
+            try:
+                retval += encoder(Value)
+            except struct.error as e:
+                raise STDFError("V*n : can not pack %s as '%s' (%s)" % (Value, Vn_types[code], e))
+        return bytes(retval)
+
+
+_Vn_tables = {}
+
+
+def Vn_table(endian):
+    '''
+    Returns the (cached) V*n codec for endian, see _VnTable.
+    '''
+    retval = _Vn_tables.get(endian)
+    if retval is None:
+        if endian not in ['<', '>']:
+            raise STDFError("V*n : unsupported endian '%s'" % endian)
+        retval = _Vn_tables[endian] = _VnTable(endian)
+    return retval
+
+
+def decode_Vn(buffer, endian, offset=0, count=None, end=None):
+    '''
+    Decodes V*n (generic data) items, returns ([(Type, Value), ...], offset). See _VnTable.decode
+    '''
+    return Vn_table(endian).decode(buffer, offset, count, end)
+
+
+def encode_Vn(items, endian):
+    '''
+    Packs a list of (Type, Value) items as V*n data. See _VnTable.encode
+    '''
+    return Vn_table(endian).encode(items)
+
+
+def _Vn(name, endian):
+    '''
+    One V*n item : a type code byte followed by the data, returned as a (type, value) tuple.
+    '''
+    table = Vn_table(endian)
+
+    def decode(obj, fields, buffer, offset):
+        try:
+            items, offset = table.decode(buffer, offset, 1)
+        except STDFError as e:
+            raise STDFError("%s._unpack(%s) : %s" % (obj.id, name, e))
+        return items[0], offset
+
+    def encode(obj, fields, value):
+        try:
+            return table.encode([value])
+        except STDFError as e:
+            raise STDFError("%s.pack(%s) : %s" % (obj.id, name, e))
+    return decode, encode
+
+
+def _Vn_array(name, endian, Ref):
+    '''
+    kxV*n (the GEN_DATA of a GDR) : all k items are decoded in one go.
+    '''
+    table = Vn_table(endian)
+
+    def decode(obj, fields, buffer, offset):
+        try:
+            return table.decode(buffer, offset, _count(obj, fields, Ref, name))
+        except STDFError as e:
+            raise STDFError("%s._unpack(%s) : %s" % (obj.id, name, e))
+
+    def encode(obj, fields, value):
+        try:
+            return table.encode(value)
+        except STDFError as e:
+            raise STDFError("%s.pack(%s) : %s" % (obj.id, name, e))
+    return decode, encode
+
+
+def _unimplemented(name, TypeFormat):
+    def decode(obj, fields, buffer, offset):
+        raise STDFError("%s._unpack(%s) : Unimplemented type '%s'" % (obj.id, name, TypeFormat))
+
+    def encode(obj, fields, value):
+        raise STDFError("%s.pack(%s) : Unimplemented type '%s'" % (obj.id, name, TypeFormat))
+    return decode, encode
+
+
+class RecordCodec(object):
+    '''
+    The compiled plan for one record class (for a given version and endian).
+    '''
+
+    def __init__(self, fields, endian):
+        self.endian = endian
+        self.header = struct.Struct(endian + 'HBB')
+        sequence = sorted(fields, key=lambda field: fields[field]['#'])
+        if sequence[:3] != ['REC_LEN', 'REC_TYP', 'REC_SUB']:
+            raise STDFError("Unsupported record definition, the first fields are '%s'" % sequence[:3])
+        self.names = sequence[3:]
+        self.steps = []
+        run = None
+        for name in self.names:
+            fixed = self._fixed(name, fields[name]['Type'])
+            if fixed is not None:
+                if run is None:
+                    run = _FixedStep(endian)
+                    self.steps.append(run)
+                run.append(name, *fixed)
+            else:
+                run = None
+                step = _VariableStep(name, *self._variable(name, fields[name]['Type'], fields[name]['Ref']))
+                step.empty = self._empty(fields[name]['Type'])
+                self.steps.append(step)
+        for step in self.steps:
+            if step.fixed:
+                step.compile()
+
+    def _fixed(self, name, TypeFormat):
+        '''
+        returns (code, decoder, encoder) for a fixed width type, None otherwise.
+        '''
+        array, Type, Size = split_type(TypeFormat)
+        if array or not Size.isdigit():
+            return None
+        key = '%s*%s' % (Type, Size)
+        if key in numerical_codes:
+            return numerical_codes[key], None, None
+        if Type == 'C':
+            return '%ss' % Size, _fixed_string_decoder(int(Size)), _encode_string
+        if Type == 'B':
+            if Size == '1':
+                return 'B', bits_from_byte, byte_from_bits
+            return '%ss' % Size, bits_from_bytes, bytes_from_bits
+        return None
+
+    def _empty(self, TypeFormat):
+        '''
+        returns the (empty) NumPy array for a missing array field, None for the other fields.
+        '''
+        array, Type, Size = split_type(TypeFormat)
+        code = numerical_codes.get('%s*%s' % (Type, Size))
+        if array and code is not None:
+            return np.zeros(0, dtype=np.dtype(self.endian + code))
+        if (array and Type in 'UN') or (not array and Type in 'BDN' and Size != '1'):
+            return np.zeros(0, dtype=np.uint8)
+        return None
+
+    def _variable(self, name, TypeFormat, Ref):
+        '''
+        returns (decoder, encoder) for a variable length type.
+        '''
+        endian = self.endian
+        array, Type, Size = split_type(TypeFormat)
+        if not array:
+            if Type == 'C' and Size == 'n': return _string_n(name, endian)
+            if Type == 'C' and Size == 'f': return _string_f(name, endian, Ref)
+            if Type == 'S' and Size == 'n': return _long_string_n(name, endian)
+            if Type == 'B' and Size == 'n': return _bits_n(name, endian)
+            if Type == 'D' and Size == 'n': return _dbits_n(name, endian)
+            if Type == 'N' and Size.isdigit(): return _nibbles(name, endian, int(Size))
+            if Type == 'U' and Size == 'f': return _unsigned_f(name, endian, Ref)
+            if Type == 'V' and Size == 'n': return _Vn(name, endian)
+            return _unimplemented(name, TypeFormat)
+        key = '%s*%s' % (Type, Size)
+        if key in numerical_codes:
+            return _numerical_array(name, endian, Ref, numerical_codes[key])
+        if Type == 'U' and Size == 'f' and isinstance(Ref, tuple) and len(Ref) == 2:
+            return _numerical_array(name, endian, Ref, None)
+        if Type == 'C' and Size == 'n': return _array_of(name, endian, Ref, _string_n(name, endian))
+        if Type == 'C' and Size == 'f' and isinstance(Ref, tuple) and len(Ref) == 2:
+            return _array_of(name, endian, Ref, _string_f(name, endian, Ref[1]))
+        if Type == 'S' and Size == 'n': return _array_of(name, endian, Ref, _long_string_n(name, endian))
+        if Type == 'N' and Size == '1': return _nibble_array(name, endian, Ref)
+        if Type == 'B' and Size == 'n': return _array_of(name, endian, Ref, _bits_n(name, endian))
+        if Type == 'D' and Size == 'n': return _array_of(name, endian, Ref, _dbits_n(name, endian))
+        if Type == 'V' and Size == 'n': return _Vn_array(name, endian, Ref)
+        return _unimplemented(name, TypeFormat)
+
+    def unpack(self, obj, record, arrays=False):
+        '''
+        Unpacks record (including the header) in the fields of obj.
+        Fields beyond the end of the record get their 'Missing' value.
+        With arrays the array fields (kxTYPE, B*n, D*n and N*x) are unpacked as NumPy arrays (see numerical_array,
+        bit_array and nibble_array), a kxB*n or kxD*n gives a list of arrays.
+        '''
+        fields = obj.fields
+        end = len(record)
+        if end < 4:
+            raise _not_enough_bytes(obj, 'REC_LEN', 4, end)
+        REC_LEN, REC_TYP, REC_SUB = self.header.unpack_from(record, 0)
+        fields['REC_LEN']['Value'] = REC_LEN
+        fields['REC_TYP']['Value'] = REC_TYP
+        fields['REC_SUB']['Value'] = REC_SUB
+        offset = 4
+        for step in self.steps:
+            if offset >= end:
+                for name in step.names:
+                    _set_missing(obj, fields, name)
+                    if arrays and not step.fixed and step.empty is not None:
+                        fields[name]['Value'] = step.empty
+            elif step.fixed and end - offset < step.size:
+                offset = step.unpack_partial(obj, fields, record, offset, end)
+            elif arrays and not step.fixed:
+                offset = step.unpack_array(obj, fields, record, offset)
+            else:
+                offset = step.unpack(obj, fields, record, offset)
+        obj.buffer = record[offset:] if offset < end else b''
+        return offset
+
+    def pack(self, obj):
+        '''
+        Packs the fields of obj, updates REC_LEN and returns the record (including the header).
+        '''
+        fields = obj.fields
+        body = b''.join([step.pack(obj, fields) for step in self.steps])
+        REC_LEN = len(body)
+        if REC_LEN > 65535:
+            raise STDFError("%s.pack() : record too long (%s bytes)" % (obj.id, REC_LEN))
+        fields['REC_LEN']['Value'] = REC_LEN
+        return self.header.pack(REC_LEN, fields['REC_TYP']['Value'], fields['REC_SUB']['Value']) + body
+
+
+def record_codec(obj):
+    '''
+    returns the (cached) RecordCodec for the record object obj.
+    '''
+    key = (obj.__class__, getattr(obj, 'version', None), obj.endian, getattr(obj, 'codec_key', None))
+    retval = _plans.get(key)
+    if instrumentation.current is not None:
+        instrumentation.current.cache('codec', retval is not None)
+    if retval is None:
+        retval = RecordCodec(obj.fields, obj.endian)
+        _plans[key] = retval
+    return retval
+
+
+if __name__ == '__main__':
+    import timeit
+
+    from ATE.data.STDF.records import FTR, MPR, PTR
+
+    endian = '<'
+    ptr = PTR('V4', endian)
+    for field, value in [('TEST_NUM', 1000), ('HEAD_NUM', 1), ('SITE_NUM', 3), ('RESULT', 1.25),
+                         ('TEST_TXT', 'Idd_standby'), ('OPT_FLAG', ['0'] * 8), ('LO_LIMIT', 0.5),
+                         ('HI_LIMIT', 2.5), ('UNITS', 'A')]:
+        ptr.set_value(field, value)
+    ftr = FTR('V4', endian)
+    ftr.set_value('TEST_NUM', 2000)
+    mpr = MPR('V4', endian)
+    mpr.set_value('TEST_NUM', 3000)
+    mpr.fields['RSLT_CNT']['Value'] = 16
+    mpr.fields['RTN_RSLT']['Value'] = [0.5] * 16
+    pins = FTR('V4', endian) # a 1024 pin functional test
+    pins.set_value('TEST_NUM', 2001)
+    for field, value in [('RTN_INDX', list(range(1024))), ('RTN_STAT', [index % 16 for index in range(1024)]),
+                         ('FAIL_PIN', [str(index % 3 // 2) for index in range(1024)])]:
+        pins.set_value(field, value)
+
+    print("%-4s %12s %12s" % ('', 'unpack [us]', 'pack [us]'))
+    for obj in [ptr, ftr, mpr, pins]:
+        record = obj.__repr__()
+        cls = obj.__class__
+        number = 2000
+        unpack = timeit.timeit(lambda: cls('V4', endian, record), number=number) / number * 1e6
+        pack = timeit.timeit(lambda: obj.__repr__(), number=number) / number * 1e6
+        print("%-4s %12.1f %12.1f" % (obj.id, unpack, pack))
+
+    from ATE.data.STDF.lazy import lazy_record_object
+    record = pins.__repr__()
+    number = 2000
+    arrays = timeit.timeit(lambda: lazy_record_object('V4', endian, 'FTR', record).get_array('FAIL_PIN'), number=number) / number * 1e6
+    print("1024 pin FTR : %.1f us to get the arrays" % arrays)
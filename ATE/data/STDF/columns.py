@@ -0,0 +1,395 @@
+'''
+Created on Oct 18, 2026
+
+Columnar extraction of STDF records straight into NumPy arrays.
+
+Instead of creating a record object per record, the fields of all records of
+one type are decoded at once : the byte position of a field is tracked as a
+NumPy array (one element per record) while walking the field list of the record
+definition, so the fixed fields (like TEST_NUM, HEAD_NUM, SITE_NUM, TEST_FLG
+and RESULT of a PTR) are plain gathers and the variable ones (C*n, kxTYPE, ...)
+only cost a vectorized position update.
+
+    columns = extract_ptr_columns(FileName, fields=['TEST_NUM', 'SITE_NUM', 'RESULT'])
+    columns['RESULT']  # numpy.float32 array, one element per PTR
+    columns['part']    # the part (index) each PTR belongs to (-1 = outside a part)
+
+Numerical arrays (kxU*2, kxR*4, ...) are returned flattened, with an extra
+'<FIELD>_start' column so that the values of record i are at
+values[start[i]:start[i + 1]]. Fields that are missing at the end of a record
+get the 'Missing' value of the record definition.
+
+The generic data (kxV*n) of the GDR's is returned the same way, as the value
+of each item (float64, NaN if not a number) with '<FIELD>_TYPE' (the V*n type
+code) and '<FIELD>_TEXT' (the C*n strings, the raw bytes of B*n and D*n) :
+
+    columns = extract_gdr_columns(FileName)
+    trims = to_matrix(columns['GEN_DATA'], columns['GEN_DATA_start'])  # one row per GDR
+'''
+import mmap
+
+import numpy as np
+
+from ATE.data.STDF.codec import split_type
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import ts_to_id
+from ATE.data.STDF.records import create_record_object
+from ATE.data.STDF.sidecar import get_STDF_index
+from ATE.data.STDF.utils import records_from_file
+
+# the NumPy dtypes of the fixed width types (B*1 is returned as its integer value)
+dtypes = {
+    'U*1' : np.uint8, 'U*2' : np.uint16, 'U*4' : np.uint32, 'U*8' : np.uint64,
+    'I*1' : np.int8, 'I*2' : np.int16, 'I*4' : np.int32, 'I*8' : np.int64,
+    'R*4' : np.float32, 'R*8' : np.float64,
+    'B*1' : np.uint8, 'N*1' : np.uint8,
+}
+
+# V*n : the NumPy dtype of the numerical type codes and the data size of the fixed size type codes (-1 = variable)
+Vn_dtypes = {1 : np.uint8, 2 : np.uint16, 3 : np.uint32, 4 : np.int8, 5 : np.int16, 6 : np.int32, 7 : np.float32, 8 : np.float64}
+Vn_sizes = np.full(256, -2, dtype=np.int64)
+Vn_sizes[[0, 1, 2, 3, 4, 5, 6, 7, 8, 13]] = [0, 1, 2, 4, 1, 2, 4, 4, 8, 1]
+Vn_sizes[[10, 11, 12]] = -1
+
+
+def _gather(data, positions, dtype, endian):
+    '''
+    Returns the values of dtype at the (byte) positions in data (a uint8 array)
+    '''
+    dtype = np.dtype(dtype).newbyteorder(endian)
+    size = dtype.itemsize
+    if size == 1:
+        return data[positions].view(dtype)
+    raw = data[positions[:, None] + np.arange(size)]
+    return raw.reshape(-1).view(dtype)
+
+
+def _missing_value(field, dtype):
+    Missing = field['Missing']
+    if isinstance(Missing, list): # B*1 as bit list
+        Missing = int(''.join(Missing), 2) if Missing else 0
+    if Missing is None:
+        Missing = 0
+    return np.array(Missing).astype(dtype)
+
+
+class ColumnExtractor(object):
+    '''
+    Vectorized decoder for the records of one type (given by their offsets in a buffer).
+    '''
+
+    def __init__(self, version, endian, REC_ID):
+        TS2ID = ts_to_id(version)
+        ID2TS = {TS2ID[TS] : TS for TS in TS2ID}
+        if REC_ID not in ID2TS:
+            raise STDFError("Unknown record '%s' for version %s" % (REC_ID, version))
+        self.REC_ID = REC_ID
+        self.endian = endian
+        self.record = create_record_object(version, endian, REC_ID, None)
+        fields = self.record.fields
+        self.sequence = sorted(fields, key=lambda field: fields[field]['#'])[3:]
+
+    def field_names(self):
+        return list(self.sequence)
+
+    def extract(self, buffer, offsets, fields=None):
+        '''
+        Returns a dictionary with for each of fields (all fields if None) a NumPy array.
+        '''
+        if fields is None:
+            fields = self.sequence
+        unknown = [field for field in fields if field not in self.sequence]
+        if unknown:
+            raise STDFError("%s has no field(s) %s" % (self.REC_ID, unknown))
+        wanted = set(fields)
+        definitions = self.record.fields
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        last = len(data) - 1
+        if self.endian == '<':
+            REC_LEN = data[offsets].astype(np.int64) | data[offsets + 1].astype(np.int64) << 8
+        else:
+            REC_LEN = data[offsets].astype(np.int64) << 8 | data[offsets + 1].astype(np.int64)
+        end = offsets + 4 + REC_LEN
+        position = offsets + 4
+        values = {}
+        retval = {}
+
+        def at(position, dtype):
+            '''gather where the field is present, the rest gets 0'''
+            size = np.dtype(dtype).itemsize
+            present = position + size <= end
+            retval = np.zeros(len(position), dtype=np.dtype(dtype).newbyteorder('='))
+            if present.any():
+                retval[present] = _gather(data, position[present], dtype, self.endian)
+            return retval, present
+
+        for name in self.sequence:
+            if not wanted:
+                break
+            field = definitions[name]
+            array, Type, Size = split_type(field['Type'])
+            key = '%s*%s' % (Type, Size)
+            if not array and key in dtypes:
+                value, present = at(position, dtypes[key])
+                if name in wanted:
+                    value[~present] = _missing_value(field, value.dtype)
+                    retval[name] = value
+                values[name] = value
+                position = position + np.dtype(dtypes[key]).itemsize
+            elif not array and Type == 'C' and Size.isdigit():
+                if name in wanted:
+                    retval[name] = self._strings(data, position, np.full(len(position), int(Size)), end, field)
+                position = position + int(Size)
+            elif not array and Type in 'CB' and Size == 'n':
+                length, _ = at(position, np.uint8)
+                if name in wanted:
+                    if Type == 'C':
+                        retval[name] = self._strings(data, position + 1, length.astype(np.int64), end, field)
+                    else:
+                        retval[name] = self._bytes(data, position + 1, length.astype(np.int64), end)
+                position = position + 1 + length
+            elif not array and Type == 'D' and Size == 'n':
+                bits, _ = at(position, np.uint16)
+                if name in wanted:
+                    retval[name] = self._bytes(data, position + 2, (bits.astype(np.int64) + 7) // 8, end)
+                position = position + 2 + (bits.astype(np.int64) + 7) // 8
+            elif array and (key in dtypes or Type == 'N'):
+                count = values.get(field['Ref'])
+                if count is None:
+                    raise STDFError("%s.%s : count field '%s' is not decoded" % (self.REC_ID, name, field['Ref']))
+                count = count.astype(np.int64)
+                if Type == 'N':
+                    size = (count + 1) // 2
+                    if name in wanted:
+                        retval[name], retval['%s_start' % name] = self._nibbles(data, position, count, end)
+                else:
+                    dtype = np.dtype(dtypes[key])
+                    size = count * dtype.itemsize
+                    if name in wanted:
+                        retval[name], retval['%s_start' % name] = self._arrays(data, position, count, dtype, end)
+                position = position + size
+            elif array and Type == 'V':
+                count = values.get(field['Ref'])
+                if count is None:
+                    raise STDFError("%s.%s : count field '%s' is not decoded" % (self.REC_ID, name, field['Ref']))
+                generic, position = self._generic(data, position, count.astype(np.int64), end)
+                if name in wanted:
+                    for suffix in generic:
+                        retval[name + suffix] = generic[suffix]
+            else:
+                raise STDFError("%s.%s : columnar extraction of '%s' is not supported" % (self.REC_ID, name, field['Type']))
+            np.minimum(position, last + 1, out=position)
+            wanted.discard(name)
+        return retval
+
+    def _strings(self, data, position, length, end, field):
+        retval = np.empty(len(position), dtype=object)
+        available = np.clip(end - position, 0, None)
+        length = np.minimum(length, available)
+        Missing = field['Missing'] if field['Missing'] is not None else ''
+        for index, (start, size, present) in enumerate(zip(position.tolist(), length.tolist(), (available > 0).tolist())):
+            retval[index] = data[start:start + size].tobytes().decode('utf-8', 'replace').strip() if present else Missing
+        return retval
+
+    def _bytes(self, data, position, length, end):
+        retval = np.empty(len(position), dtype=object)
+        length = np.minimum(length, np.clip(end - position, 0, None))
+        for index, (start, size) in enumerate(zip(position.tolist(), length.tolist())):
+            retval[index] = data[start:start + size].tobytes()
+        return retval
+
+    def _arrays(self, data, position, count, dtype, end):
+        count = np.where(position + count * dtype.itemsize <= end, count, 0)
+        start = np.zeros(len(count) + 1, dtype=np.int64)
+        np.cumsum(count, out=start[1:])
+        element = np.arange(start[-1]) - np.repeat(start[:-1], count)
+        byte = np.repeat(position, count) + element * dtype.itemsize
+        return _gather(data, byte, dtype, self.endian).astype(dtype.newbyteorder('=')), start
+
+    def _generic(self, data, position, count, end):
+        '''
+        kxV*n : the items of all records are decoded together, one item (of every record that has one) per step.
+        Returns ({'' : values, '_TYPE' : codes, '_TEXT' : strings, '_start' : start}, position after the items)
+        '''
+        position = position.copy()
+        end = np.minimum(end, len(data))
+        parts = {'record' : [], 'code' : [], 'value' : [], 'text' : []}
+        active = np.flatnonzero((count > 0) & (position < end))
+        step = 0
+        while len(active):
+            at = position[active]
+            code = data[at]
+            size = Vn_sizes[code]
+            if (size == -2).any():
+                raise STDFError("%s : unsupported type '%d' in V*n" % (self.REC_ID, code[size == -2][0]))
+            variable = np.flatnonzero(size == -1)
+            if len(variable):
+                length_at = np.minimum(at[variable] + 1, len(data) - 2)
+                length = data[length_at].astype(np.int64)
+                dbits = code[variable] == 12
+                if dbits.any():
+                    high = data[length_at[dbits] + 1].astype(np.int64)
+                    bits = length[dbits] | high << 8 if self.endian == '<' else length[dbits] << 8 | high
+                    length[dbits] = 1 + (bits + 7) // 8
+                size[variable] = 1 + length
+            after = at + 1 + size
+            ok = after <= end[active] # (a truncated item ends the record)
+            active, at, code, after = active[ok], at[ok], code[ok], after[ok]
+            value = np.full(len(active), np.nan)
+            text = np.full(len(active), None, dtype=object)
+            for type_code in np.unique(code).tolist():
+                selected = np.flatnonzero(code == type_code)
+                if type_code in Vn_dtypes:
+                    value[selected] = _gather(data, at[selected] + 1, Vn_dtypes[type_code], self.endian)
+                elif type_code == 13:
+                    value[selected] = data[at[selected] + 1] & 0x0F
+                elif type_code in [10, 11, 12]:
+                    header = 2 if type_code == 10 or type_code == 11 else 3
+                    for index, start, stop in zip(selected.tolist(), (at[selected] + header).tolist(), after[selected].tolist()):
+                        raw = data[start:stop].tobytes()
+                        text[index] = raw.decode('utf-8', 'replace') if type_code == 10 else raw
+            for key, part in [('record', active), ('code', code), ('value', value), ('text', text)]:
+                parts[key].append(part)
+            position[active] = after
+            step += 1
+            active = active[(step < count[active]) & (after < end[active])]
+        if parts['record']:
+            record = np.concatenate(parts['record'])
+            order = np.argsort(record, kind='stable') # (the items were collected per step)
+        else:
+            record = order = np.zeros(0, dtype=np.int64)
+        start = np.zeros(len(position) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(record, minlength=len(position)), out=start[1:])
+        retval = {'_start' : start}
+        for suffix, key, dtype in [('', 'value', np.float64), ('_TYPE', 'code', np.uint8), ('_TEXT', 'text', object)]:
+            retval[suffix] = np.concatenate(parts[key])[order] if parts[key] else np.zeros(0, dtype=dtype)
+        return retval, position
+
+    def _nibbles(self, data, position, count, end):
+        count = np.where(position + (count + 1) // 2 <= end, count, 0)
+        start = np.zeros(len(count) + 1, dtype=np.int64)
+        np.cumsum(count, out=start[1:])
+        element = np.arange(start[-1]) - np.repeat(start[:-1], count)
+        byte = data[np.repeat(position, count) + element // 2]
+        return np.where(element % 2 == 0, byte & 0x0F, byte >> 4).astype(np.uint8), start
+
+
+def _records_buffer(FileName, index, REC_ID):
+    '''
+    Returns (buffer, offsets) of the REC_ID records. For an uncompressed file the buffer is the mapped file,
+    for a compressed file the records of interest are collected in a bytearray while streaming.
+    '''
+    if not index.meta['compressed']:
+        with open(FileName, 'rb') as fd:
+            return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ), index.offsets(REC_ID).astype(np.int64)
+    TS2ID = ts_to_id(index.version)
+    ID2TS = {TS2ID[TS] : TS for TS in TS2ID}
+    REC_TYP, REC_SUB = ID2TS[REC_ID]
+    buffer = bytearray()
+    offsets = []
+    for _, TYP, SUB, REC in records_from_file(FileName):
+        if TYP == REC_TYP and SUB == REC_SUB:
+            offsets.append(len(buffer))
+            buffer += REC
+    return buffer, np.array(offsets, dtype=np.int64)
+
+
+def extract_columns(FileName, REC_ID, fields=None, index=None):
+    '''
+    Returns a dictionary of NumPy arrays with the requested fields of all REC_ID records in FileName.
+    Also included are 'offset' (of each record in the uncompressed data) and for PTR/MPR/FTR 'part'.
+    The (sidecar) index is used (and build if needed, it is then closed when done) to locate the records.
+    '''
+    if index is None:
+        index = get_STDF_index(FileName, content_hash=False)
+        try:
+            return extract_columns(FileName, REC_ID, fields, index)
+        finally:
+            index.close()
+    extractor = ColumnExtractor(index.version, index.endian, REC_ID)
+    buffer, offsets = _records_buffer(FileName, index, REC_ID)
+    try:
+        retval = extractor.extract(buffer, offsets, fields)
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            try:
+                buffer.close()
+            except BufferError: # (still viewed by the frames of an exception, it goes with them)
+                pass
+    retval['offset'] = index.offsets(REC_ID)
+    if REC_ID in ['PTR', 'MPR', 'FTR']:
+        test_offsets = index.column('tests/offset')
+        order = np.argsort(test_offsets, kind='stable')
+        position = np.searchsorted(test_offsets[order], retval['offset'])
+        retval['part'] = index.column('tests/part')[order][position] if len(position) else np.zeros(0, dtype=np.int64)
+    elif REC_ID in ['GDR', 'DTR']:
+        retval['part'] = open_parts(index, retval['offset'])
+    return retval
+
+
+def open_parts(index, offsets):
+    '''
+    Returns for each (record) offset the part that is open there (the last PIR before it, if its PRR comes after it), -1 if none.
+    With more sites tested in parallel this is the last part that was started.
+    '''
+    PIR = index.column('parts/PIR')
+    PRR = index.column('parts/PRR')
+    offsets = np.asarray(offsets).astype(np.int64)
+    position = np.searchsorted(PIR, offsets) - 1
+    opened = np.maximum(position, 0)
+    is_open = (position >= 0) & ((PRR[opened] < 0) | (PRR[opened] > offsets)) if len(PIR) else np.zeros(len(offsets), dtype=bool)
+    return np.where(is_open, position, -1)
+
+
+def to_matrix(values, start, fill=np.nan):
+    '''
+    Returns flattened arrays (values with the '<FIELD>_start' column) as a 2-D array (one row per record),
+    short rows are padded with fill.
+    '''
+    start = np.asarray(start, dtype=np.int64)
+    count = np.diff(start)
+    width = int(count.max()) if len(count) else 0
+    retval = np.full((len(count), width), fill, dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+    row = np.repeat(np.arange(len(count)), count)
+    retval[row, np.arange(len(values)) - start[row]] = values
+    return retval
+
+
+def extract_ptr_columns(FileName, fields=('TEST_NUM', 'HEAD_NUM', 'SITE_NUM', 'TEST_FLG', 'RESULT'), index=None):
+    '''
+    Columnar extraction of the PTR's, see extract_columns
+    '''
+    return extract_columns(FileName, 'PTR', fields, index)
+
+
+def extract_mpr_columns(FileName, fields=('TEST_NUM', 'HEAD_NUM', 'SITE_NUM', 'TEST_FLG', 'RTN_RSLT'), index=None):
+    '''
+    Columnar extraction of the MPR's, see extract_columns
+    '''
+    return extract_columns(FileName, 'MPR', fields, index)
+
+
+def extract_ftr_columns(FileName, fields=('TEST_NUM', 'HEAD_NUM', 'SITE_NUM', 'TEST_FLG', 'NUM_FAIL'), index=None):
+    '''
+    Columnar extraction of the FTR's, see extract_columns
+    '''
+    return extract_columns(FileName, 'FTR', fields, index)
+
+
+def extract_gdr_columns(FileName, fields=('FLD_CNT', 'GEN_DATA'), index=None):
+    '''
+    Columnar extraction of the GDR's, see extract_columns (and the module docstring for GEN_DATA).
+    'part' is the part that is open at the GDR (see open_parts).
+    '''
+    return extract_columns(FileName, 'GDR', fields, index)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    start = time.time()
+    columns = extract_ptr_columns(FileName)
+    print("%s PTR's extracted in %.3f seconds" % (len(columns['offset']), time.time() - start))
@@ -0,0 +1,290 @@
+'''
+Created on Oct 18, 2026
+
+Streaming decoding of the scan (STR) and memory (MTR) fail data.
+
+Every STR/MTR is unpacked with its array fields as NumPy arrays (see
+ATE.data.STDF.codec), so the fail addresses are never turned into Python
+lists. FailDataDecoder.decode returns the fails of one record :
+
+    - STR : 'CYCLE' (CYC_BASE + CYC_OFST) and 'PMR_INDX' per fail, or in the
+            chain format 'CHN_NUM', 'PAT_NUM' and 'BIT_POS' (+ BIT_BASE),
+            plus 'EXP_DATA' and 'CAP_DATA'.
+    - MTR : 'ROW_ARR', 'COL_ARR' (and 'CYCLE', 'STEP_ARR', 'PMR_ARR') per
+            fail, plus the fails in the bit stream segment. The sizes of the
+            segment (STRT_ADR, WORD_CNT and the word size) are taken from the
+            BSR the MTR refers to (BSR_IDX), so the BSR's have to come first.
+
+and the fails as 'rows' and 'columns' (uint64) : pin x cycle (or chain x bit)
+for a scan test, row x column (or word address x bit) for a memory test.
+
+The fails are collected per part and test in FailBitmap's, a FailBitmap keeps
+the distinct addresses (sorted, compacted every compact_size fails), so its
+size is bounded by the number of failing cells, not by the number of logged
+fails. fail_bitmaps reads the records in blocks (see ATE.data.STDF.stream)
+and hands over the bitmaps of a part as soon as its PRR comes by, so the
+working set is the read ahead blocks plus the fails of the open parts :
+
+    for part, HEAD_NUM, SITE_NUM, bitmaps in fail_bitmaps_from_file('memory.std'):
+        for (REC_ID, TEST_NUM), bitmap in bitmaps.items():
+            bitmap.bitmap()    # 2-D bool array
+'''
+import numpy as np
+
+from ATE.data.STDF.codec import RecordCodec, record_codec
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.records import BSR, MTR, STR, STDFError
+from ATE.data.STDF.stream import records_from_stream
+
+PIR_TS = (5, 10)
+PRR_TS = (5, 20)
+BSR_TS = (1, 97)
+STR_TS = (15, 30)
+MTR_TS = (15, 40)
+
+
+class FailBitmap(object):
+    '''
+    The fails of one test as a set of (row, column) addresses, see the module docstring.
+    '''
+
+    def __init__(self, compact_size=1 << 20):
+        self.compact_size = compact_size
+        self.rows = np.zeros(0, dtype=np.uint64)
+        self.columns = np.zeros(0, dtype=np.uint64)
+        self.fails = 0 # all logged fails (including the repeated addresses)
+        self._pending = []
+        self._buffered = 0
+
+    def add(self, rows, columns):
+        rows = np.asarray(rows, dtype=np.uint64).reshape(-1)
+        columns = np.asarray(columns, dtype=np.uint64).reshape(-1)
+        if len(rows) != len(columns):
+            raise STDFError("FailBitmap.add : %s rows for %s columns" % (len(rows), len(columns)))
+        self._pending.append((rows, columns))
+        self._buffered += len(rows)
+        self.fails += len(rows)
+        if self._buffered >= max(self.compact_size, len(self.rows)): # (so every fail is sorted O(log) times)
+            self._compact()
+
+    def _compact(self):
+        if not self._pending:
+            return
+        rows = np.concatenate([self.rows] + [pending[0] for pending in self._pending])
+        columns = np.concatenate([self.columns] + [pending[1] for pending in self._pending])
+        if len(rows) and max(rows.max(), columns.max()) < 1 << 32: # sorting one (row, column) key is a lot faster
+            keys = np.sort(rows << np.uint64(32) | columns)
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+            self.rows, self.columns = keys >> np.uint64(32), keys & np.uint64(0xFFFFFFFF)
+        else:
+            order = np.lexsort((columns, rows))
+            rows, columns = rows[order], columns[order]
+            distinct = np.ones(len(rows), dtype=bool)
+            distinct[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+            self.rows, self.columns = rows[distinct], columns[distinct]
+        self._pending = []
+        self._buffered = 0
+
+    def __len__(self):
+        self._compact()
+        return len(self.rows)
+
+    def addresses(self):
+        '''
+        Returns the (rows, columns) of the distinct fails, sorted.
+        '''
+        self._compact()
+        return self.rows, self.columns
+
+    def merge(self, other):
+        rows, columns = other.addresses()
+        self.add(rows, columns)
+        self.fails += other.fails - len(rows)
+        return self
+
+    def shape(self):
+        rows, columns = self.addresses()
+        return (int(rows.max()) + 1, int(columns.max()) + 1) if len(rows) else (0, 0)
+
+    def bitmap(self, shape=None, packed=False):
+        '''
+        Returns the fails as a 2-D array (rows x columns) of booleans, or with packed of bits (8 columns per byte,
+        like np.packbits), shape defaults to the biggest addresses. Fails outside shape are left out.
+        '''
+        rows, columns = self.addresses()
+        n_rows, n_columns = self.shape() if shape is None else shape
+        inside = (rows < n_rows) & (columns < n_columns)
+        rows, columns = rows[inside].astype(np.intp), columns[inside].astype(np.intp)
+        if not packed:
+            retval = np.zeros((n_rows, n_columns), dtype=bool)
+            retval[rows, columns] = True
+            return retval
+        retval = np.zeros((n_rows, (n_columns + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(retval, (rows, columns >> 3), (0x80 >> (columns & 7)).astype(np.uint8))
+        return retval
+
+
+class FailDataDecoder(object):
+    '''
+    Decodes the fails of STR and MTR records (and picks up the BSR's), see the module docstring.
+    '''
+
+    def __init__(self, endian, version='V4'):
+        self.endian = endian
+        self.version = version
+        self.BSR = {} # BSR_IDX : (ADDR_SIZ, WC_SIZ, WRD_SIZ)
+        self._STR = STR(version, endian)
+        self._MTR = {}
+        self._BSR = BSR(version, endian)
+        fields = MTR(version, endian).fields
+        self._MTR_head = RecordCodec({name : field for name, field in fields.items() if field['#'] <= fields['BSR_IDX']['#']}, endian)
+
+    def _values(self, obj, names):
+        return [obj.get_value(name) for name in names]
+
+    def _unsigned(self, array):
+        return np.asarray(array).astype(np.uint64)
+
+    def decode(self, REC_TYP, REC_SUB, REC):
+        '''
+        Returns the fails of an STR or MTR record (REC includes the header) as a dict, None for other records.
+        '''
+        if (REC_TYP, REC_SUB) == STR_TS:
+            return self._decode_STR(REC)
+        if (REC_TYP, REC_SUB) == MTR_TS:
+            return self._decode_MTR(REC)
+        if (REC_TYP, REC_SUB) == BSR_TS:
+            record_codec(self._BSR).unpack(self._BSR, REC)
+            BSR_IDX, ADDR_SIZ, WC_SIZ, WRD_SIZ = self._values(self._BSR, ['BSR_IDX', 'ADDR_SIZ', 'WC_SIZ', 'WRD_SIZ'])
+            self.BSR[BSR_IDX] = (ADDR_SIZ, WC_SIZ, WRD_SIZ)
+        return None
+
+    def _decode_STR(self, REC):
+        obj = self._STR
+        record_codec(obj).unpack(obj, REC, arrays=True)
+        TEST_NUM, HEAD_NUM, SITE_NUM, CYC_BASE, BIT_BASE = self._values(obj, ['TEST_NUM', 'HEAD_NUM', 'SITE_NUM', 'CYC_BASE', 'BIT_BASE'])
+        retval = {'REC_ID' : 'STR', 'TEST_NUM' : TEST_NUM, 'HEAD_NUM' : HEAD_NUM, 'SITE_NUM' : SITE_NUM}
+        retval['CYCLE'] = self._unsigned(obj.fields['CYC_OFST']['Value']) + np.uint64(CYC_BASE)
+        retval['BIT_POS'] = self._unsigned(obj.fields['BIT_POS']['Value']) + np.uint64(BIT_BASE)
+        for name in ['PMR_INDX', 'CHN_NUM', 'PAT_NUM', 'EXP_DATA', 'CAP_DATA']:
+            retval[name] = obj.fields[name]['Value']
+        if len(retval['CYCLE']) or len(retval['PMR_INDX']):
+            rows, columns = retval['PMR_INDX'], retval['CYCLE']
+        else: # chain format
+            rows, columns = retval['CHN_NUM'], retval['BIT_POS']
+        if len(rows) != len(columns):
+            raise STDFError("STR (TEST_NUM %s) : %s fail rows for %s fail columns" % (TEST_NUM, len(rows), len(columns)))
+        retval['rows'], retval['columns'] = self._unsigned(rows), self._unsigned(columns)
+        return retval
+
+    def _MTR_object(self, BSR_IDX):
+        sizes = self.BSR[BSR_IDX][:2]
+        retval = self._MTR.get(sizes)
+        if retval is None:
+            retval = self._MTR[sizes] = MTR(self.version, self.endian, None, *sizes)
+        return retval
+
+    def _decode_MTR(self, REC):
+        if len(self.BSR) == 1:
+            BSR_IDX = next(iter(self.BSR))
+        else: # the bit stream part of the record depends on the BSR it refers to
+            obj = self._MTR.get(None)
+            if obj is None:
+                obj = self._MTR[None] = MTR(self.version, self.endian)
+            self._MTR_head.unpack(obj, REC, arrays=True)
+            BSR_IDX = obj.get_value('BSR_IDX')
+        if BSR_IDX in self.BSR:
+            obj = self._MTR_object(BSR_IDX)
+            record_codec(obj).unpack(obj, REC, arrays=True)
+        elif self.BSR:
+            raise STDFError("MTR refers to BSR %s, which is not (yet) defined" % BSR_IDX)
+        # without BSR's there is no bit stream data, the fields up to BSR_IDX are unpacked already
+        TEST_NUM, HEAD_NUM, SITE_NUM, CYC_BASE = self._values(obj, ['TEST_NUM', 'HEAD_NUM', 'SITE_NUM', 'CYC_BASE'])
+        retval = {'REC_ID' : 'MTR', 'TEST_NUM' : TEST_NUM, 'HEAD_NUM' : HEAD_NUM, 'SITE_NUM' : SITE_NUM}
+        retval['CYCLE'] = self._unsigned(obj.fields['CYC_OFST']['Value']) + np.uint64(CYC_BASE)
+        for name in ['ROW_ARR', 'COL_ARR', 'STEP_ARR', 'PMR_ARR']:
+            retval[name] = obj.fields[name]['Value']
+        if len(retval['ROW_ARR']) != len(retval['COL_ARR']):
+            raise STDFError("MTR (TEST_NUM %s) : %s fail rows for %s fail columns" % (TEST_NUM, len(retval['ROW_ARR']), len(retval['COL_ARR'])))
+        rows, columns = [self._unsigned(retval['ROW_ARR'])], [self._unsigned(retval['COL_ARR'])]
+        if BSR_IDX in self.BSR:
+            WRD_SIZ = self.BSR[BSR_IDX][2]
+            STRT_ADR, WORD_CNT = self._values(obj, ['STRT_ADR', 'WORD_CNT'])
+            bits = np.asarray(obj.fields['WORDS']['Value'])
+            WORD_CNT = min(WORD_CNT, len(bits) // WRD_SIZ) if WRD_SIZ else 0
+            word, bit = np.nonzero(bits[:WORD_CNT * WRD_SIZ].reshape(WORD_CNT, WRD_SIZ))
+            retval['STRT_ADR'], retval['WORDS'] = STRT_ADR, bits
+            rows.append(word.astype(np.uint64) + np.uint64(STRT_ADR))
+            columns.append(bit.astype(np.uint64))
+        retval['rows'], retval['columns'] = np.concatenate(rows), np.concatenate(columns)
+        return retval
+
+
+def fail_bitmaps(records, endian, version='V4', compact_size=1 << 20):
+    '''
+    Generator of (part, HEAD_NUM, SITE_NUM, {(REC_ID, TEST_NUM) : FailBitmap}) for the parts with fail data in
+    records (an iterator of (REC_LEN, REC_TYP, REC_SUB, REC), like records_from_stream yields). A part is handed
+    over at its PRR, part is the number of its PIR in the file (0 based, like the parts of the sidecar index).
+    The fail data outside of a part comes last, as part -1.
+    '''
+    decoder = FailDataDecoder(endian, version)
+    open_parts = {} # (HEAD_NUM, SITE_NUM) : (part, bitmaps)
+    outside = {}
+    PIR_count = 0
+    for _, REC_TYP, REC_SUB, REC in records:
+        if (REC_TYP, REC_SUB) == PIR_TS or (REC_TYP, REC_SUB) == PRR_TS:
+            key = (REC[4], REC[5]) if len(REC) >= 6 else (1, 1)
+            if (REC_TYP, REC_SUB) == PIR_TS:
+                open_parts[key] = (PIR_count, {})
+                PIR_count += 1
+                continue
+            if key in open_parts:
+                part, bitmaps = open_parts.pop(key)
+                if bitmaps:
+                    yield part, key[0], key[1], bitmaps
+            continue
+        if REC_TYP not in (1, 15):
+            continue
+        fails = decoder.decode(REC_TYP, REC_SUB, REC)
+        if fails is None:
+            continue
+        key = (fails['HEAD_NUM'], fails['SITE_NUM'])
+        bitmaps = open_parts[key][1] if key in open_parts else outside.setdefault(key, {})
+        bitmap = bitmaps.get((fails['REC_ID'], fails['TEST_NUM']))
+        if bitmap is None:
+            bitmap = bitmaps[(fails['REC_ID'], fails['TEST_NUM'])] = FailBitmap(compact_size)
+        bitmap.add(fails['rows'], fails['columns'])
+    for (HEAD_NUM, SITE_NUM), (part, bitmaps) in sorted(open_parts.items(), key=lambda item: item[1][0]):
+        if bitmaps:
+            yield part, HEAD_NUM, SITE_NUM, bitmaps
+    for (HEAD_NUM, SITE_NUM), bitmaps in sorted(outside.items()):
+        yield -1, HEAD_NUM, SITE_NUM, bitmaps
+
+
+def fail_bitmaps_from_file(FileName, compact_size=1 << 20, block_size=1024*1024, buffers=4):
+    '''
+    Generator of the fail bitmaps of the parts of an (STDF V4, compressed or not) file, see fail_bitmaps.
+    At most buffers blocks of block_size bytes are read ahead.
+    '''
+    probe, fd = open_STDF(FileName)
+    if fd is None:
+        raise STDFError("'%s' is not an STDF file" % FileName)
+    with fd:
+        if probe.version != 'V4':
+            raise STDFError("fail_bitmaps_from_file : '%s' is a %s file, only V4 is supported" % (FileName, probe.version))
+        for retval in fail_bitmaps(records_from_stream(fd, probe.endian, block_size, buffers), probe.endian, probe.version, compact_size):
+            yield retval
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    start = time.time()
+    parts = fails = cells = 0
+    for part, HEAD_NUM, SITE_NUM, bitmaps in fail_bitmaps_from_file(FileName):
+        parts += 1
+        fails += sum(bitmap.fails for bitmap in bitmaps.values())
+        cells += sum(len(bitmap) for bitmap in bitmaps.values())
+    print("%s parts with %s fails (%s failing cells) in %.3f seconds" % (parts, fails, cells, time.time() - start))
@@ -0,0 +1,216 @@
+'''
+Created on Oct 18, 2026
+
+Opt-in instrumentation of the STDF hot paths.
+
+Nothing is measured unless an Instrumentation is enabled, the hot paths only
+check the module attribute 'current' (None when off) :
+
+    - records_from_stream (ATE.data.STDF.stream) : records and bytes read per
+      record type, and progress reports (stage 'read', in bytes).
+    - STDR._unpack and STDR.__repr__ (ATE.data.STDF.records) : the count, the
+      bytes and the time of decoding and packing per record type. The full
+      decodes of the lazy records (ATE.data.STDF.lazy) count as decoding too.
+    - the record codec and lazy schema caches, the PartReader part cache and
+      the WaferMaps map cache : hits and misses.
+
+Progress is reported through a callback, throttled to (at most) one call per
+interval seconds (the final report of a stage with a known total always goes
+through), so that the callback doesn't cost per record :
+
+    def report(progress):
+        print("%(stage)s %(done)s/%(total)s (%(rate).0f/s)" % progress)
+
+    with instrumented(progress=report, interval=1.0) as stats:
+        statistics_from_file('lot.std')
+    stats.as_dict()       # {'records' : {'PTR' : {'count', 'bytes'}}, 'decode' : ..., 'pack' : ..., 'caches' : ...}
+    stats.prometheus()    # the same in the Prometheus text format
+
+The counters are not locked, they are meant to be read when the work is done.
+'''
+import time
+
+current = None # the enabled Instrumentation, None = off
+
+PROGRESS_RECORDS = 4096 # records between progress checks in records_from_stream
+
+
+class Progress(object):
+    '''
+    Throttled progress reports : update calls callback({'stage', 'done', 'total', 'elapsed', 'rate'})
+    at most once per interval seconds, and always for the end (done >= total) of a stage.
+    '''
+
+    def __init__(self, callback, interval=0.5):
+        self.callback = callback
+        self.interval = interval
+        self.start = time.monotonic()
+        self.last = None
+        self.calls = 0
+
+    def update(self, stage, done, total=None):
+        '''
+        Reports done (of total, None = unknown) for stage, returns True if the callback was called.
+        '''
+        now = time.monotonic()
+        final = total is not None and done >= total
+        if self.last is not None and now - self.last < self.interval and not final:
+            return False
+        self.last = now
+        self.calls += 1
+        elapsed = now - self.start
+        self.callback({'stage' : stage, 'done' : done, 'total' : total, 'elapsed' : elapsed,
+                       'rate' : done / elapsed if elapsed > 0 else 0.0})
+        return True
+
+
+class Instrumentation(object):
+    '''
+    Counters of the STDF hot paths, see the module docstring.
+    '''
+
+    def __init__(self, progress=None, interval=0.5):
+        self.progress = None if progress is None else Progress(progress, interval)
+        self.reset()
+
+    def reset(self):
+        self.start = time.monotonic()
+        self.read = {}   # (REC_TYP, REC_SUB) -> [count, bytes]
+        self.decode = {} # REC_ID -> [count, bytes, seconds]
+        self.pack = {}   # REC_ID -> [count, bytes, seconds]
+        self.caches = {} # name -> [hits, misses]
+
+    def report(self, stage, done, total=None):
+        '''
+        Passes progress on to the (throttled) progress callback, if any.
+        '''
+        if self.progress is not None:
+            self.progress.update(stage, done, total)
+
+    def count_records(self, records):
+        '''
+        Generator that passes the (REC_LEN, REC_TYP, REC_SUB, REC) of records on, counting them.
+        '''
+        read = self.read
+        done = 0
+        countdown = PROGRESS_RECORDS
+        for record in records:
+            REC_LEN, REC_TYP, REC_SUB = record[0], record[1], record[2]
+            entry = read.get((REC_TYP, REC_SUB))
+            if entry is None:
+                entry = read[(REC_TYP, REC_SUB)] = [0, 0]
+            entry[0] += 1
+            entry[1] += 4 + REC_LEN
+            done += 4 + REC_LEN
+            countdown -= 1
+            if not countdown:
+                countdown = PROGRESS_RECORDS
+                self.report('read', done)
+            yield record
+        self.report('read', done, done)
+
+    def decoded(self, REC_ID, size, seconds):
+        self._timed(self.decode, REC_ID, size, seconds)
+
+    def packed(self, REC_ID, size, seconds):
+        self._timed(self.pack, REC_ID, size, seconds)
+
+    def _timed(self, table, REC_ID, size, seconds):
+        entry = table.get(REC_ID)
+        if entry is None:
+            entry = table[REC_ID] = [0, 0, 0.0]
+        entry[0] += 1
+        entry[1] += size
+        entry[2] += seconds
+
+    def cache(self, name, hit):
+        '''
+        Counts a hit (hit is True) or a miss of the cache name.
+        '''
+        entry = self.caches.get(name)
+        if entry is None:
+            entry = self.caches[name] = [0, 0]
+        entry[0 if hit else 1] += 1
+
+    def as_dict(self):
+        '''
+        Returns the counters as {'elapsed', 'records' : {REC_ID : {'count', 'bytes'}},
+        'decode'/'pack' : {REC_ID : {'count', 'bytes', 'seconds'}}, 'caches' : {name : {'hits', 'misses', 'hit_rate'}}}
+        '''
+        from ATE.data.STDF.records import ts_to_id
+
+        TS2ID = ts_to_id('V4')
+        retval = {'elapsed' : time.monotonic() - self.start, 'records' : {}, 'decode' : {}, 'pack' : {}, 'caches' : {}}
+        for TS, (count, size) in self.read.items():
+            retval['records'][TS2ID.get(TS, '%s_%s' % TS)] = {'count' : count, 'bytes' : size}
+        for name, table in [('decode', self.decode), ('pack', self.pack)]:
+            for REC_ID, (count, size, seconds) in table.items():
+                retval[name][REC_ID] = {'count' : count, 'bytes' : size, 'seconds' : seconds}
+        for name, (hits, misses) in self.caches.items():
+            retval['caches'][name] = {'hits' : hits, 'misses' : misses,
+                                      'hit_rate' : hits / float(hits + misses) if hits + misses else 0.0}
+        return retval
+
+    def prometheus(self, prefix='stdf'):
+        '''
+        Returns the counters in the Prometheus text exposition format.
+        '''
+        counters = self.as_dict()
+        metrics = [('records_total', 'Records read.', 'records', 'record', 'count'),
+                   ('record_bytes_total', 'Bytes read.', 'records', 'record', 'bytes'),
+                   ('decode_total', 'Records decoded.', 'decode', 'record', 'count'),
+                   ('decode_bytes_total', 'Bytes decoded.', 'decode', 'record', 'bytes'),
+                   ('decode_seconds_total', 'Time spent decoding records.', 'decode', 'record', 'seconds'),
+                   ('pack_total', 'Records packed.', 'pack', 'record', 'count'),
+                   ('pack_bytes_total', 'Bytes packed.', 'pack', 'record', 'bytes'),
+                   ('pack_seconds_total', 'Time spent packing records.', 'pack', 'record', 'seconds'),
+                   ('cache_hits_total', 'Cache hits.', 'caches', 'cache', 'hits'),
+                   ('cache_misses_total', 'Cache misses.', 'caches', 'cache', 'misses')]
+        lines = []
+        for metric, description, group, label, key in metrics:
+            if not counters[group]:
+                continue
+            name = '%s_%s' % (prefix, metric)
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s counter' % name)
+            for item in sorted(counters[group]):
+                lines.append('%s{%s="%s"} %s' % (name, label, item, repr(counters[group][item][key])))
+        return '\n'.join(lines) + '\n'
+
+
+def enable(instrumentation=None, progress=None, interval=0.5):
+    '''
+    Enables instrumentation (a new one if None), returns it.
+    '''
+    global current
+    current = Instrumentation(progress, interval) if instrumentation is None else instrumentation
+    return current
+
+
+def disable():
+    '''
+    Disables instrumentation, returns the Instrumentation that was enabled (or None).
+    '''
+    global current
+    retval, current = current, None
+    return retval
+
+
+class instrumented(object):
+    '''
+    Context manager that enables an Instrumentation (see enable) and restores the previous state on exit.
+    '''
+
+    def __init__(self, instrumentation=None, progress=None, interval=0.5):
+        self.instrumentation = Instrumentation(progress, interval) if instrumentation is None else instrumentation
+        self.previous = None
+
+    def __enter__(self):
+        global current
+        self.previous, current = current, self.instrumentation
+        return self.instrumentation
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global current
+        current = self.previous
+
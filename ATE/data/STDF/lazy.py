@@ -0,0 +1,259 @@
+'''
+Created on Oct 18, 2026
+
+Lazy STDF record objects.
+
+A regular record object (PTR, PRR, ...) builds its own (big) field
+dictionary and decodes all fields when it is created. A LazyRecord only holds
+the raw record and a reference to the RecordSchema of its type, which is
+shared by all records of that type (and version/endian). A field is decoded
+when it is asked for (get_value, get_fields, to_dict) and the decoded values
+are cached in the object.
+
+Fields at a fixed position (all fields before the first variable length
+field, like HEAD_NUM and SITE_NUM of a PTR) are decoded on their own with a
+single struct call, asking for any other field decodes the whole record.
+
+    for _, _, _, record in records_from_file(FileName, unpack='lazy'):
+        record.get_value('SITE_NUM')
+'''
+import time
+
+from ATE.data.STDF import instrumentation
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import create_record_object
+from ATE.data.STDF.records import ts_to_id
+
+
+class RecordSchema(object):
+    '''
+    The field definitions and the codec of a record type, shared by all its LazyRecords.
+    '''
+
+    def __init__(self, version, endian, REC_ID):
+        from ATE.data.STDF.codec import record_codec
+        template = create_record_object(version, endian, REC_ID)
+        if template is None:
+            raise STDFError("Unknown record '%s' for version %s" % (REC_ID, version))
+        self.id = template.id
+        self.version = template.version
+        self.endian = endian
+        self.info = getattr(template, 'info', '')
+        self.fields = template.fields
+        self.sequence = sorted(self.fields, key=lambda field: self.fields[field]['#'])
+        self.codec = record_codec(template)
+        # the fields with a fixed position : name -> (offset, struct, decoder)
+        self.static = {}
+        offset = 4
+        for step in self.codec.steps:
+            if not step.fixed:
+                break
+            for name, single, decoder in zip(step.names, step.singles, step.decoders):
+                self.static[name] = (offset, single, decoder)
+                offset += single.size
+
+    def name_of(self, FieldID):
+        if isinstance(FieldID, str):
+            if FieldID in self.fields:
+                return FieldID
+        elif isinstance(FieldID, int):
+            if 0 <= FieldID < len(self.sequence):
+                return self.sequence[FieldID]
+        else:
+            raise STDFError("%s.get_fields(%s) Error : '%s' is not a string or integer" % (self.id, FieldID, FieldID))
+        return None
+
+
+_schemas = {}
+
+def record_schema(version, endian, REC_ID):
+    '''
+    Returns the (cached) RecordSchema of REC_ID (a string or a (REC_TYP, REC_SUB) tuple).
+    '''
+    key = (version, endian, REC_ID)
+    retval = _schemas.get(key)
+    if instrumentation.current is not None:
+        instrumentation.current.cache('schema', retval is not None)
+    if retval is None:
+        if isinstance(REC_ID, tuple):
+            TS2ID = ts_to_id(version)
+            if REC_ID not in TS2ID:
+                raise STDFError("Unknown record %s for version %s" % (str(REC_ID), version))
+            retval = record_schema(version, endian, TS2ID[REC_ID])
+        else:
+            retval = RecordSchema(version, endian, REC_ID)
+        _schemas[key] = retval
+    return retval
+
+
+class _Target(object):
+    '''
+    What the codec unpacks into : a record object look-alike with a private copy of the field definitions.
+    '''
+
+    def __init__(self, schema):
+        self.id = schema.id
+        self.endian = schema.endian
+        self.missing_fields = 0
+        self.buffer = b''
+        self.fields = {name : {'Type' : field['Type'], 'Ref' : field['Ref'], 'Missing' : field['Missing'], 'Value' : None}
+                       for name, field in schema.fields.items()}
+
+
+class LazyRecord(object):
+    '''
+    A record that decodes its fields on first access.
+    '''
+    __slots__ = ('schema', 'record', 'values', 'arrays')
+
+    def __init__(self, schema, record):
+        self.schema = schema
+        self.record = record
+        self.values = None
+        self.arrays = None
+
+    @property
+    def id(self):
+        return self.schema.id
+
+    @property
+    def version(self):
+        return self.schema.version
+
+    @property
+    def endian(self):
+        return self.schema.endian
+
+    @property
+    def info(self):
+        return self.schema.info
+
+    def _unpack(self, arrays=False):
+        '''
+        Unpacks all fields (timed if instrumentation is on), returns the target.
+        '''
+        target = _Target(self.schema)
+        stats = instrumentation.current
+        if stats is None:
+            self.schema.codec.unpack(target, self.record, arrays=arrays)
+        else:
+            start = time.perf_counter()
+            self.schema.codec.unpack(target, self.record, arrays=arrays)
+            stats.decoded(self.schema.id, len(self.record), time.perf_counter() - start)
+        return target
+
+    def _decode(self):
+        '''
+        Decodes all fields, returns the (complete) values dictionary.
+        '''
+        target = self._unpack()
+        self.values = {name : field['Value'] for name, field in target.fields.items()}
+        return self.values
+
+    def get_value(self, FieldID):
+        name = self.schema.name_of(FieldID)
+        if name is None:
+            raise STDFError("%s.get_value(%s) Error : '%s' is not a valid key" % (self.id, FieldID, FieldID))
+        values = self.values
+        if values is not None and name in values:
+            Value = values[name]
+        elif name in self.schema.static and self.schema.static[name][0] + self.schema.static[name][1].size <= len(self.record):
+            offset, single, decoder = self.schema.static[name]
+            Value = single.unpack_from(self.record, offset)[0]
+            if decoder is not None:
+                Value = decoder(Value)
+            if values is None:
+                self.values = values = {}
+            values[name] = Value
+        else:
+            Value = self._decode()[name]
+        return self.schema.fields[name]['Missing'] if Value is None else Value
+
+    def get_array(self, FieldID):
+        '''
+        Returns the value of an array field (kxTYPE, B*n, D*n, N*x) as a NumPy array, bits as 0/1 and a kxB*n or kxD*n
+        as a list of arrays (see ATE.data.STDF.codec.RecordCodec.unpack), without building python lists.
+        Other fields are returned like get_value does.
+        '''
+        name = self.schema.name_of(FieldID)
+        if name is None:
+            raise STDFError("%s.get_array(%s) Error : '%s' is not a valid key" % (self.id, FieldID, FieldID))
+        if self.arrays is None:
+            target = self._unpack(arrays=True)
+            self.arrays = {name : field['Value'] for name, field in target.fields.items()}
+        Value = self.arrays[name]
+        return self.schema.fields[name]['Missing'] if Value is None else Value
+
+    def get_fields(self, FieldID=None):
+        '''
+        See STDR.get_fields
+        '''
+        if FieldID is None:
+            return list(self.schema.sequence)
+        name = self.schema.name_of(FieldID)
+        if name is None:
+            return (None, None, None, None, None)
+        field = self.schema.fields[name]
+        return (field['#'], field['Type'], field['Ref'], self.get_value(name), field['Text'], field['Missing'])
+
+    def is_decoded(self):
+        return self.values is not None and len(self.values) == len(self.schema.sequence)
+
+    def to_dict(self, include_missing_values=False):
+        '''
+        See STDR.to_dict
+        '''
+        values = self.values if self.is_decoded() else self._decode()
+        fields = self.schema.fields
+        return {name : values[name] for name in self.schema.sequence
+                if include_missing_values or values[name] != fields[name]['Missing']}
+
+    def to_record(self):
+        '''
+        Returns the regular (eager) record object.
+        '''
+        return create_record_object(self.version, self.endian, self.id, self.record)
+
+    def __bytes__(self):
+        return bytes(self.record)
+
+    def __len__(self):
+        return len(self.record)
+
+    def __str__(self):
+        return str(self.to_record())
+
+
+def lazy_record_object(Version, Endian, REC_ID, REC):
+    '''
+    Returns the LazyRecord for REC, REC_ID can be a 2-element tuple or a string.
+    '''
+    return LazyRecord(record_schema(Version, Endian, REC_ID), REC)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import tracemalloc
+
+    from ATE.data.STDF.utils import records_from_file
+
+    FileName = sys.argv[1]
+    records = [record for record in records_from_file(FileName) if record[1:3] == (15, 10)][:20000]
+    endian, version = '<', 'V4'
+    with open(FileName, 'rb') as fd:
+        if fd.read(6)[4] == 1:
+            endian = '>'
+
+    for mode, factory in [('eager', create_record_object), ('lazy ', lazy_record_object)]:
+        start = time.time()
+        objects = [factory(version, endian, (REC_TYP, REC_SUB), REC) for _, REC_TYP, REC_SUB, REC in records]
+        sites = set(obj.get_value('SITE_NUM') for obj in objects)
+        elapsed = time.time() - start
+        del objects
+        tracemalloc.start()
+        objects = [factory(version, endian, (REC_TYP, REC_SUB), REC) for _, REC_TYP, REC_SUB, REC in records[:1000]]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del objects
+        print("%s : %s PTR's, %s sites in %.3f seconds, %.0f bytes per object" % (mode, len(records), len(sites), elapsed, memory / 1000))
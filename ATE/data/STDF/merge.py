@@ -0,0 +1,432 @@
+'''
+Created on Oct 18, 2026
+
+Streaming merge of the STDF files of a lot (files rolled over mid-lot, retest
+files, ...) into one STDF V4 file.
+
+Every input is streamed (see ATE.data.STDF.stream) as a sequence of complete
+parts (the PIR .. PRR of a head/site with the records in between), and the
+part streams are merged (k-way, heapq) on their (estimated) time :
+
+    - the files are ordered on the START_T of their MIR and the FINISH_T of
+      their MRR (from the sidecar index or the tail of the file, see
+      ATE.data.STDF.summary, a compressed file without sidecar is streamed
+      once for it, together with its part count).
+    - if files overlap in time (eg: one file per head or per site, starting
+      at the same time), the parts are ordered on the wafer (the first,
+      second, ... wafer of their file), then on their time (interpolated
+      between START_T and FINISH_T on their index in the file) and then on
+      how far their file is (so files with the same START_T and FINISH_T
+      are interleaved), otherwise the files simply follow each other.
+
+So only the open parts of every input are in memory, not the lot. What is
+remembered of every written part is its identity (wafer/X/Y or PART_ID), so
+that retests can be resolved :
+
+    - a part supersedes the last part tested on the same wafer and X/Y
+      coordinates, or (if its PART_FLG says so) the last part with the same
+      PART_ID.
+    - retests='flag' writes all parts, the retest bit of a superseding part
+      is set, and the superseded part is taken out of the bins and GOOD_CNT
+      (but stays in PART_CNT) of the new summary.
+    - retests='drop' does not write the superseded parts at all (this needs a
+      pre-pass over the inputs to know what will be superseded).
+    - retests='keep' writes everything as is.
+
+With renumber the parts get a new PART_ID (1, 2, ... in the merged file, a
+retest gets the PART_ID of the part it supersedes). The header (MIR, SDR's,
+...) is taken from the first file (plus the header records of the other files
+that differ), the WIR/WRR's are written around the parts of a wafer, the
+summary (TSR, HBR, SBR and PCR) is made anew and one MRR (with the latest
+FINISH_T) ends the file. A wafer is never opened again once it is closed, a
+part of it that comes later (files that test the wafers in a different order)
+is written without WIR and not counted in the WRR.
+
+    merge_files(['lot_1.std', 'lot_2.std.xz', 'lot_retest.std'], 'lot.std', compression='lzma')
+'''
+import copy
+import heapq
+import itertools
+import struct
+
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.stream import records_from_stream
+from ATE.data.STDF.subset import SummaryTally
+from ATE.data.STDF.subset import TEST_TYPES
+from ATE.data.STDF.summary import count_parts
+from ATE.data.STDF.summary import read_summary
+from ATE.data.STDF.utils import is_supported_compressed_STDF_file
+from ATE.data.STDF.writer import STDFWriter
+from ATE.data.STDF.writer import _cn
+
+FAR_TS, MIR_TS, MRR_TS = (0, 10), (1, 10), (1, 20)
+PCR_TS, HBR_TS, SBR_TS, TSR_TS = (1, 30), (1, 40), (1, 50), (10, 30)
+WIR_TS, WRR_TS = (2, 10), (2, 20)
+PIR_TS, PRR_TS = (5, 10), (5, 20)
+SUMMARY_TS = set([PCR_TS, HBR_TS, SBR_TS, TSR_TS])
+retest_policies = ['flag', 'drop', 'keep']
+
+
+def _WAFER_ID(WIR):
+    '''
+    Returns the (raw) WAFER_ID of a (raw) WIR (b'' for None)
+    '''
+    if WIR is None or len(WIR) < 11:
+        return b''
+    return bytes(WIR[11:11 + WIR[10]])
+
+
+def _file_meta(FileName, endian):
+    '''
+    Returns (FINISH_T, the number of parts) of FileName, None if unknown. They come from the sidecar index if there
+    is one, from the tail of an uncompressed file (the part count only if there is a PCR) and from one streaming
+    pass over a compressed file otherwise.
+    '''
+    from ATE.data.STDF.sidecar import load_STDF_index
+
+    index = load_STDF_index(FileName)
+    if index is not None:
+        with index:
+            parts = index.part_count()
+    elif is_supported_compressed_STDF_file(FileName):
+        FINISH_T, parts = None, 0
+        probe, fd = open_STDF(FileName)
+        with fd:
+            for REC_LEN, REC_TYP, REC_SUB, REC in records_from_stream(fd, endian):
+                if (REC_TYP, REC_SUB) == PRR_TS:
+                    parts += 1
+                elif (REC_TYP, REC_SUB) == MRR_TS and REC_LEN >= 4:
+                    FINISH_T = struct.unpack_from(endian + 'I', REC, 4)[0]
+        return FINISH_T, parts
+    summary = read_summary(FileName) # (uses the sidecar of a compressed file)
+    if summary is None:
+        return None, None
+    FINISH_T = summary.MRR.get_value('FINISH_T') if summary.MRR is not None else None
+    return FINISH_T, parts if index is not None else summary.part_count()
+
+
+class _Source(object):
+    '''
+    One input file, read as a stream of complete parts.
+    '''
+
+    def __init__(self, FileName, order, tally=None):
+        self.FileName = FileName
+        self.order = order
+        self.tally = tally
+        self._open()
+        try:
+            self.START_T = struct.unpack_from(self.endian + 'I', self.MIR, 8)[0] if self.MIR is not None and len(self.MIR) >= 12 else 0
+            self.FINISH_T, self.part_count = _file_meta(FileName, self.endian)
+        except Exception:
+            self.fd.close()
+            raise
+
+    def reopened(self):
+        '''
+        Returns a copy (without tally) that streams the parts of the file again, the metadata is not read again.
+        '''
+        retval = copy.copy(self)
+        retval.tally = None
+        retval._open()
+        return retval
+
+    def _open(self):
+        '''
+        Opens the stream and reads the header (up to the first part or wafer).
+        '''
+        probe, fd = open_STDF(self.FileName)
+        if fd is None:
+            raise STDFError("'%s' is not an STDF file" % self.FileName)
+        if probe.version != 'V4':
+            fd.close()
+            raise STDFError("merge_files : '%s' is a %s file, only V4 is supported" % (self.FileName, probe.version))
+        self.endian = probe.endian
+        self.fd = fd
+        self.records = records_from_stream(fd, self.endian)
+        self.MIR = None
+        self.MRR = None
+        self.header = []   # the records in front of the first part (but the FAR and MIR)
+        self.WRRs = {}     # WAFER_ID -> WRR
+        self.first = None  # the record that ended the header
+        for record in self.records:
+            TS = (record[1], record[2])
+            if TS == FAR_TS:
+                continue
+            if TS == MIR_TS and self.MIR is None:
+                self.MIR = record[3]
+            elif TS in [PIR_TS, PRR_TS, WIR_TS, WRR_TS, MRR_TS] or TS in SUMMARY_TS or record[1] == 15:
+                self.first = record
+                break
+            else:
+                self.header.append(record[3])
+
+    def parts(self):
+        '''
+        Yields (records, WIR) for the parts of the file in the order they end (PRR), records are the raw records
+        of the part (preceded by the records that do not belong to a part) and WIR the wafer the part is on
+        (or None). The records left over at the end come last (without a PRR).
+        '''
+        open_parts = {}     # (HEAD_NUM, SITE_NUM) -> [records]
+        wafer_of_head = {}  # HEAD_NUM -> WIR
+        loose = []
+        records = self.records if self.first is None else itertools.chain([self.first], self.records)
+        try:
+            for REC_LEN, REC_TYP, REC_SUB, REC in records:
+                if REC_TYP == 15 and REC_SUB in TEST_TYPES and REC_LEN >= 6:
+                    part = open_parts.get((REC[8], REC[9]))
+                    (loose if part is None else part).append(REC)
+                    continue
+                TS = (REC_TYP, REC_SUB)
+                if TS == PIR_TS:
+                    loose.append(REC)
+                    open_parts[(REC[4], REC[5])] = loose
+                    loose = []
+                elif TS == PRR_TS:
+                    part = open_parts.pop((REC[4], REC[5]), None)
+                    if part is None:
+                        part, loose = loose, []
+                    part.append(REC)
+                    yield part, wafer_of_head.get(REC[4])
+                elif TS == WIR_TS:
+                    wafer_of_head[REC[4]] = REC
+                elif TS == WRR_TS:
+                    if REC_LEN >= 27:
+                        self.WRRs[bytes(REC[31:31 + REC[30]])] = REC
+                    wafer_of_head.pop(REC[4], None)
+                elif TS == MRR_TS:
+                    self.MRR = REC
+                elif TS in SUMMARY_TS:
+                    if self.tally is not None:
+                        self.tally.source_record(TS, REC, self.endian)
+                elif TS not in [FAR_TS, MIR_TS]:
+                    loose.append(REC)
+        finally:
+            self.fd.close()
+        for part in open_parts.values(): # parts without a PRR
+            loose.extend(part)
+        if loose:
+            yield loose, None
+
+    def keyed_parts(self, rank, interpolate):
+        '''
+        Yields ((time, rank, index), (records, WIR)) for the heap, when interpolating time is
+        (the wafer number in the file, the interpolated time, the fraction of the file).
+        '''
+        if interpolate:
+            span = self.FINISH_T - self.START_T
+            if self.part_count is None: # an uncompressed file without PCR or sidecar
+                self.part_count = count_parts(self.FileName)
+            count = max(self.part_count, 1)
+        wafers = {} # WAFER_ID -> the number of the wafer in the file
+        for index, part in enumerate(self.parts()):
+            if interpolate:
+                fraction = min(index + 1, count) / count
+                time = (wafers.setdefault(_WAFER_ID(part[1]), len(wafers)), self.START_T + span * fraction, fraction)
+            else:
+                time = 0
+            yield (time, rank, index), part
+
+
+class _Retests(object):
+    '''
+    Who supersedes who, a part supersedes the last part tested on the same wafer and X/Y coordinates or (with
+    bit 0 of its PART_FLG set) the last part with the same PART_ID.
+    '''
+
+    def __init__(self, endian):
+        self.last = {} # (WAFER_ID, X, Y) or PART_ID -> entry
+        self.I2 = struct.Struct(endian + 'hh')
+
+    def supersedes(self, PRR, WAFER_ID, entry):
+        '''
+        Registers the entry of a part, returns (the entry of the superseded part or None, the retest bit)
+        '''
+        previous, retest = None, 0
+        if len(PRR) >= 17:
+            X, Y = self.I2.unpack_from(PRR, 13)
+            if X != -32768 and Y != -32768:
+                coordinates = (WAFER_ID, X, Y)
+                previous = self.last.get(coordinates)
+                self.last[coordinates] = entry
+                retest = 0x02
+        PART_ID = bytes(PRR[22:22 + PRR[21]]) if len(PRR) > 21 else b''
+        if PART_ID:
+            if previous is None and PRR[6] & 0x01:
+                previous = self.last.get(PART_ID)
+                retest = 0x01
+            self.last[PART_ID] = entry
+        return previous, retest
+
+
+def _superseded(sources, order, interpolate):
+    '''
+    The pre-pass of retests='drop', returns the keys (rank, index) of the parts that are superseded.
+    '''
+    retests = _Retests(sources[0].endian)
+    streams = [source.reopened().keyed_parts(rank, interpolate) for rank, source in enumerate(sources)]
+    superseded = set()
+    for key, (records, WIR) in heapq.merge(*streams, key=order):
+        PRR = records[-1]
+        if PRR[2:4] != b'\x05\x14':
+            continue
+        previous, _ = retests.supersedes(PRR, _WAFER_ID(WIR), key[1:])
+        if previous is not None:
+            superseded.add(previous)
+    return superseded
+
+
+def merge_files(Sources, Destination, retests='flag', renumber=True, compression=None, **kwargs):
+    '''
+    Merges the (STDF V4) files in Sources to Destination, returns the number of parts written.
+
+    retests is 'flag', 'drop' or 'keep' (see the module docstring), with renumber the parts get a new PART_ID.
+    The other keyword arguments are passed to the STDFWriter (eg: workers, buffer_size)
+    '''
+    if retests not in retest_policies:
+        raise STDFError("merge_files : retests should be one of %s, not '%s'" % (retest_policies, retests))
+    tally = SummaryTally()
+    sources = []
+    try:
+        for order, FileName in enumerate(Sources):
+            sources.append(_Source(FileName, order, tally))
+    except Exception:
+        for source in sources:
+            source.fd.close()
+        raise
+    if not sources:
+        raise STDFError("merge_files : nothing to merge")
+    endian = sources[0].endian
+    for source in sources:
+        if source.endian != endian: # the records are copied as they are
+            for source in sources:
+                source.fd.close()
+            raise STDFError("merge_files : '%s' and '%s' have a different endian" % (sources[0].FileName, source.FileName))
+
+    sources.sort(key=lambda source: (source.START_T, source.START_T if source.FINISH_T is None else source.FINISH_T, source.order))
+    known = all(source.FINISH_T is not None for source in sources)
+    interpolate = known and any(later.START_T <= max(source.FINISH_T for source in sources[:rank])
+                                for rank, later in enumerate(sources) if rank)
+    order = lambda item: item[0]
+    superseded = _superseded(sources, order, interpolate) if retests == 'drop' else set()
+
+    U2 = struct.Struct(endian + 'H')
+    U4 = struct.Struct(endian + 'I')
+    R4 = struct.Struct(endian + 'f')
+    PRR_defaults = struct.pack(endian + 'BBBHHHhhI', 0, 0, 0, 0, 65535, 65535, -32768, -32768, 0)
+    WRR_fixed = struct.Struct(endian + 'BBIIIIII')
+    resolver = _Retests(endian)
+    wafer_of_head = {} # HEAD_NUM -> [WAFER_ID, WIR, PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT]
+    closed = set()     # (HEAD_NUM, WAFER_ID) of the wafers that are closed
+    FINISH_T = max([source.FINISH_T for source in sources if source.FINISH_T is not None] or [0])
+    written = 0
+
+    def close_wafer(write, HEAD_NUM):
+        WAFER_ID, WIR, PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT = wafer_of_head.pop(HEAD_NUM)
+        closed.add((HEAD_NUM, WAFER_ID))
+        WRR = None
+        for source in sources:
+            WRR = source.WRRs.get(WAFER_ID, WRR)
+        if WRR is not None:
+            body = WRR_fixed.pack(HEAD_NUM, WIR[5], U4.unpack_from(WRR, 6)[0], PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT,
+                                  U4.unpack_from(WRR, 26)[0]) + bytes(WRR[30:])
+        else:
+            body = WRR_fixed.pack(HEAD_NUM, WIR[5], FINISH_T, PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT, 4294967295) + _cn(WAFER_ID)
+        write(U2.pack(len(body)) + bytes(WRR_TS) + body)
+
+    with STDFWriter(Destination, endian=endian, compression=compression, part_buffers=False, **kwargs) as writer:
+        write = writer.write_raw
+        header = set()
+        for source in sources:
+            if source.MIR is not None and not header:
+                write(source.MIR)
+                header.add(bytes(source.MIR))
+            for REC in source.header:
+                if bytes(REC) not in header:
+                    write(REC)
+                    header.add(bytes(REC))
+        header = None
+
+        streams = [source.keyed_parts(rank, interpolate) for rank, source in enumerate(sources)]
+        for key, (records, WIR) in heapq.merge(*streams, key=order):
+            PRR = records[-1]
+            if PRR[2:4] != b'\x05\x14': # the left overs of a file
+                for REC in records:
+                    write(REC)
+                continue
+            if key[1:] in superseded:
+                continue
+            HEAD_NUM, SITE_NUM = PRR[4], PRR[5]
+            wafer = wafer_of_head.get(HEAD_NUM)
+            WAFER_ID = _WAFER_ID(WIR)
+            if WIR is not None and (wafer is None or wafer[0] != WAFER_ID) and (HEAD_NUM, WAFER_ID) not in closed:
+                if wafer is not None:
+                    close_wafer(write, HEAD_NUM)
+                write(WIR)
+                wafer = wafer_of_head[HEAD_NUM] = [WAFER_ID, WIR, 0, 0, 0, 0]
+            written += 1
+            PRR = bytearray(PRR[:21]) + PRR_defaults[len(PRR) - 4:] + PRR[21:]
+            PART_FLG = PRR[6]
+            counts = wafer if WIR is not None and wafer is not None and wafer[0] == WAFER_ID else [None, None, 0, 0, 0, 0]
+            entry = [HEAD_NUM, SITE_NUM, PART_FLG, U2.unpack_from(PRR, 9)[0], U2.unpack_from(PRR, 11)[0], str(written), counts]
+            if retests != 'keep':
+                previous, retest = resolver.supersedes(PRR, WAFER_ID, entry)
+                if previous is not None and previous[-1] is not None: # (a part is superseded only once)
+                    PART_FLG |= retest
+                    PRR[6] = entry[2] = PART_FLG
+                    entry[5] = previous[5]
+                    tally.supersede(*previous[:5])
+                    if not previous[2] & 0x18:
+                        previous[-1][5] -= 1
+                    previous[-1] = None
+            if renumber:
+                PART_ID = entry[5].encode('latin-1')
+                PRR = PRR[:21] + _cn(PART_ID) + PRR[22 + PRR[21]:] if len(PRR) > 21 else PRR + _cn(PART_ID)
+            U2.pack_into(PRR, 0, len(PRR) - 4)
+            for REC in records[:-1]:
+                write(REC)
+                if REC[2] == 15 and REC[3] in TEST_TYPES and len(REC) >= 10:
+                    tally.test_record(REC, U4.unpack_from(REC, 4)[0], R4)
+            write(PRR)
+            tally.part(HEAD_NUM, SITE_NUM, PART_FLG, entry[3], entry[4])
+            counts[2] += 1
+            counts[3] += 1 if PART_FLG & 0x03 else 0
+            counts[4] += 1 if PART_FLG & 0x04 else 0
+            counts[5] += 0 if PART_FLG & 0x18 else 1
+
+        for HEAD_NUM in sorted(wafer_of_head):
+            close_wafer(write, HEAD_NUM)
+        for record in tally.records(endian):
+            write(record)
+        MRR = None
+        for source in sources:
+            MRR = source.MRR if source.MRR is not None else MRR
+        if MRR is not None and len(MRR) >= 8:
+            MRR = bytearray(MRR)
+            U4.pack_into(MRR, 4, max(FINISH_T, U4.unpack_from(MRR, 4)[0]))
+        else:
+            body = U4.pack(FINISH_T) + b' ' + _cn('') + _cn('') + _cn('')
+            MRR = U2.pack(len(body)) + bytes(MRR_TS) + body
+        write(MRR)
+    return written
+
+
+if __name__ == '__main__':
+    import os
+    import shutil
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    copies = [FileName + '.%d.std' % copy for copy in range(3)]
+    for copy in copies:
+        shutil.copyfile(FileName, copy)
+    Destination = FileName + '.merged.std'
+    start = time.time()
+    parts = merge_files(copies, Destination)
+    elapsed = time.time() - start
+    size = sum(os.path.getsize(copy) for copy in copies)
+    print("merge : %s parts, %.1f MB in %.3f seconds (%.1f MB/s)" % (parts, size / 1e6, elapsed, size / 1e6 / elapsed))
+    for copy in copies + [Destination]:
+        os.remove(copy)
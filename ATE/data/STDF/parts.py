@@ -0,0 +1,247 @@
+'''
+Created on Oct 18, 2026
+
+Part addressable access to an STDF file.
+
+The PartReader uses the (sidecar) index (see ATE.data.STDF.sidecar) to find
+the records of a part : part n is opened by the n'th PIR of the file, and its
+records are, in file order :
+
+    - the PIR and the PRR (that closes the part)
+    - the test records (PTR, MPR, FTR) of the part (the postings of the index)
+    - the records in between that don't name a head/site (DTR, GDR, BPS, EPS, ...)
+
+All bytes from the PIR up to the end of the PRR are fetched with a single
+read (os.pread on uncompressed files, so there is no shared file position to
+guard), the records are decoded as lazy records (see ATE.data.STDF.lazy) and
+the decoded parts are kept in an LRU cache so that jumping between a few dies
+doesn't touch the file again. The cache is locked, so a reader can be shared
+by threads (two threads asking for the same new part may both decode it).
+
+    with PartReader('lot.std') as reader:
+        reader.part(12345)                                  # [PIR, PTR, ..., PRR]
+        for records in reader.parts_where(bin=[5, 6], site=3):
+            ...
+'''
+import collections
+import os
+import threading
+
+import numpy as np
+
+from ATE.data.STDF import instrumentation
+from ATE.data.STDF.records import STDFError
+
+PIR_TS = (5, 10)
+PRR_TS = (5, 20)
+WAFER_TS = [(2, 10), (2, 20)] # WIR, WRR
+
+
+class PartReader(object):
+    '''
+    Reads the records of individual parts of an STDF file, see the module docstring.
+    '''
+
+    def __init__(self, FileName, index=None, cache_size=1024):
+        from ATE.data.STDF.records import ts_to_id
+        from ATE.data.STDF.sidecar import get_STDF_index
+
+        self.FileName = FileName
+        self.index = get_STDF_index(FileName, content_hash=False) if index is None else index
+        self._owns_index = index is None # (an index that is passed is the caller's to close)
+        self.endian = self.index.endian
+        self.version = self.index.version
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._TS2ID = ts_to_id(self.version)
+        self._offsets = self.index.column('offset').astype(np.int64)
+        self._REC_LEN = self.index.column('REC_LEN')
+        self._TS = self.index.column('REC_TYP').astype(np.uint16) << 8 | self.index.column('REC_SUB')
+        self._PIR = self.index.column('parts/PIR')
+        self._PRR = self.index.column('parts/PRR')
+        self._record_part = None
+        self._PRR_columns = None
+        self._fd = None
+        self._seekable = None
+        if self.index.meta['compressed']:
+            from ATE.utils.seekable import open_seekable
+            self._seekable = open_seekable(FileName) # (has a file position, reads are serialized)
+        else:
+            self._fd = os.open(FileName, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._seekable is not None:
+            self._seekable.close()
+            self._seekable = None
+        if self._owns_index:
+            self._REC_LEN = self._PIR = self._PRR = self._PRR_columns = None # (views of the mapped index)
+            self.index.close()
+        self._cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._PIR)
+
+    def _read(self, offset, size):
+        if self._fd is not None and hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+        with self._lock:
+            if self._seekable is not None:
+                self._seekable.seek(offset)
+                return self._seekable.read(size)
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, size)
+
+    def _part_of_records(self):
+        '''
+        Returns for every record of the index the part of a test record, -1 for a test record outside a part
+        and -2 for all other records.
+        '''
+        if self._record_part is None:
+            retval = np.full(len(self._offsets), -2, dtype=np.int64)
+            retval[self.index.column('tests/row')] = self.index.column('tests/part')
+            self._record_part = retval
+        return self._record_part
+
+    def _window(self, n):
+        '''
+        Returns the positions (in the record index) of the records of part n.
+        '''
+        record_part = self._part_of_records()
+        first = int(np.searchsorted(self._offsets, self._PIR[n]))
+        if self._PRR[n] >= 0:
+            last = int(np.searchsorted(self._offsets, self._PRR[n]))
+        else: # not closed : up to the last test record of the part
+            following = np.flatnonzero(record_part[first:] == n)
+            last = first + (int(following[-1]) if len(following) else 0)
+        TS = self._TS[first:last + 1]
+        keep = np.where(record_part[first:last + 1] == -2, True, record_part[first:last + 1] == n)
+        for ts in [PIR_TS, PRR_TS] + WAFER_TS:
+            keep &= TS != (ts[0] << 8 | ts[1])
+        keep[0] = keep[-1] = True
+        return first + np.flatnonzero(keep)
+
+    def _decode(self, n):
+        from ATE.data.STDF.lazy import lazy_record_object
+
+        positions = self._window(n)
+        start = int(self._offsets[positions[0]])
+        stop = int(self._offsets[positions[-1]]) + 4 + int(self._REC_LEN[positions[-1]])
+        data = self._read(start, stop - start)
+        if len(data) != stop - start:
+            raise STDFError("PartReader : '%s' is shorter than its index (part %s)" % (self.FileName, n))
+        retval = []
+        for position in positions.tolist():
+            begin = int(self._offsets[position]) - start
+            code = int(self._TS[position])
+            REC_ID = self._TS2ID.get((code >> 8, code & 0xFF))
+            if REC_ID is None:
+                continue
+            retval.append(lazy_record_object(self.version, self.endian, REC_ID, data[begin:begin + 4 + int(self._REC_LEN[position])]))
+        return retval
+
+    def part(self, n):
+        '''
+        Returns the records of part n (0 based, in PIR order) as a list of (lazy) record objects in file order.
+        '''
+        if not -len(self) <= n < len(self):
+            raise STDFError("PartReader : part %s is out of range (%s parts)" % (n, len(self)))
+        n = int(n) % len(self)
+        with self._lock: # (not held while decoding, _read takes it too)
+            retval = self._cache.get(n)
+            if retval is not None:
+                self._cache.move_to_end(n)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if instrumentation.current is not None:
+            instrumentation.current.cache('parts', retval is not None)
+        if retval is not None:
+            return retval
+        retval = self._decode(n)
+        with self._lock:
+            self._cache[n] = retval
+            self._cache.move_to_end(n)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return retval
+
+    def parts(self, selection=slice(None)):
+        '''
+        Generator of the records of the parts in selection (a slice or a sequence of part numbers).
+        '''
+        if isinstance(selection, slice):
+            selection = range(*selection.indices(len(self)))
+        for n in selection:
+            yield self.part(n)
+
+    def PRR_columns(self):
+        '''
+        Returns the PRR columns (HEAD_NUM, SITE_NUM, HARD_BIN, SOFT_BIN, PART_FLG, X_COORD, Y_COORD) per part,
+        parts that are not closed get HEAD_NUM, SITE_NUM from their PIR and -1 for the other fields.
+        '''
+        if self._PRR_columns is None:
+            from ATE.data.STDF.columns import extract_columns
+
+            fields = ['HARD_BIN', 'SOFT_BIN', 'PART_FLG', 'X_COORD', 'Y_COORD']
+            PRR = extract_columns(self.FileName, 'PRR', fields, self.index)
+            closed = self._PRR >= 0
+            position = np.searchsorted(PRR['offset'].astype(np.int64), self._PRR[closed])
+            retval = {'HEAD_NUM' : self.index.column('parts/HEAD_NUM'), 'SITE_NUM' : self.index.column('parts/SITE_NUM')}
+            for field in fields:
+                retval[field] = np.full(len(self), -1, dtype=np.int32)
+                retval[field][closed] = PRR[field][position]
+            self._PRR_columns = retval
+        return self._PRR_columns
+
+    def select(self, bin=None, site=None, head=None, soft_bin=None, good=None):
+        '''
+        Returns the numbers of the parts that match all given criteria (a value or a list of values),
+        bin is the hard bin, good selects on the PART_FLG (no fail and a valid pass/fail).
+        '''
+        columns = self.PRR_columns()
+        selected = np.ones(len(self), dtype=bool)
+        for name, value in [('HARD_BIN', bin), ('SITE_NUM', site), ('HEAD_NUM', head), ('SOFT_BIN', soft_bin)]:
+            if value is not None:
+                selected &= np.isin(columns[name], np.atleast_1d(value))
+        if good is not None:
+            selected &= ((columns['PART_FLG'] >= 0) & (columns['PART_FLG'] & 0x18 == 0)) == bool(good)
+        return np.flatnonzero(selected)
+
+    def parts_where(self, bin=None, site=None, head=None, soft_bin=None, good=None):
+        '''
+        Generator of the records of the parts that match (see select).
+        '''
+        return self.parts(self.select(bin, site, head, soft_bin, good).tolist())
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    with PartReader(FileName) as reader:
+        count = len(reader)
+        numbers = [random.randrange(count) for _ in range(1000)]
+        start = time.time()
+        records = sum(len(reader.part(n)) for n in numbers)
+        print("1000 random parts (%s records) of %s in %.3f seconds" % (records, count, time.time() - start))
+        start = time.time()
+        for n in numbers:
+            reader.part(n)
+        print("again (cached) in %.3f seconds" % (time.time() - start))
+        start = time.time()
+        selected = len(reader.select(bin=1))
+        print("select bin 1 : %s parts in %.3f seconds" % (selected, time.time() - start))
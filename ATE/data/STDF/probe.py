@@ -0,0 +1,308 @@
+'''
+Created on Oct 18, 2026
+
+Single-open STDF file probe with cached metadata.
+
+Finding out what a file is (exists? compressed? STDF? endian? version?) used
+to cost a handful of stat calls, opens and (for compressed files) repeated
+decompressions from the start. STDFProbe does all of that with one stat, one
+open and one buffered read of the prefix of the file :
+
+    - the compression is sniffed from the magic number in the (raw) prefix
+    - for compressed files only the prefix is decompressed (in memory)
+    - endian and version come from the FAR in the (uncompressed) prefix
+    - the leading 'header' records (FAR, ATR, MIR, RDR, SDR) are kept, so the
+      MIR is served without opening the file again
+
+Probes are cached on (path, size, mtime, inode), a second probe of an
+unchanged file only costs a stat. open_STDF re-uses the probing handle for
+reading, so a cache miss still opens the file only once.
+
+    probe = probe_file(FileName)
+    if probe is not None and probe.is_STDF:
+        probe.endian, probe.version, probe.compression, probe.MIR()
+'''
+import bz2
+import collections
+import gzip
+import io
+import lzma
+import os
+import struct
+import threading
+import zlib
+from stat import S_ISREG
+
+from ATE.data.STDF.records import MIR
+from ATE.utils.compression import supported_compressions_extensions
+from ATE.utils.magicnumber import extension_from_magic_number
+
+prefix_size = 64 * 1024
+cache_size = 65536
+
+# the records that (may) precede the first record of the 'body'
+HEADER_TS = [(0, 10), (0, 20), (1, 10), (1, 70), (1, 80)] # FAR, ATR, MIR, RDR, SDR
+
+
+class ProbedFile(io.RawIOBase):
+    '''
+    The (decompressed) read only file object on a probed file, closing it also closes the underlying file.
+    '''
+
+    def __init__(self, raw, compression):
+        self.raw = raw
+        if compression == 'lzma':
+            self.fd = lzma.LZMAFile(raw)
+        elif compression == 'bz2':
+            self.fd = bz2.BZ2File(raw)
+        elif compression == 'gzip':
+            self.fd = gzip.GzipFile(fileobj=raw)
+        else:
+            self.fd = raw
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.fd.readinto(buffer)
+
+    def read(self, size=-1):
+        return self.fd.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.fd.seek(offset, whence)
+
+    def tell(self):
+        return self.fd.tell()
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self.fd is not self.raw:
+                    self.fd.close()
+            finally:
+                self.raw.close()
+        super().close()
+
+
+def _decompressor(compression):
+    if compression == 'lzma':
+        return lzma.LZMADecompressor()
+    if compression == 'bz2':
+        return bz2.BZ2Decompressor()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS) # gzip
+
+
+class STDFProbe(object):
+    '''
+    What is known about a file from its prefix, see probe_file.
+
+    key         : (path, size, mtime (ns), inode)
+    compression : '' (not compressed), 'lzma', 'gzip' or 'bz2'
+    is_STDF     : True if the (uncompressed) file starts with a FAR
+    endian      : '<', '>' or '?' (unknown CPU_TYPE), None if not STDF
+    version     : 'V4', ... None if not STDF
+    header      : the leading FAR, ATR, MIR, RDR and SDR records (as far as they are in the prefix)
+    '''
+
+    def __init__(self, FileName, stat):
+        self.FileName = FileName
+        self.key = (FileName, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        self.size = stat.st_size
+        self.compression = ''
+        self.is_STDF = False
+        self.endian = None
+        self.version = None
+        self.header = b''
+        self.header_complete = False
+
+    def sniff(self, fd):
+        '''
+        Fills the probe from the (raw, positioned at 0) file object fd.
+        '''
+        raw = fd.read(prefix_size)
+        extension = extension_from_magic_number(raw, supported_compressions_extensions)
+        if len(extension) == 1:
+            self.compression = supported_compressions_extensions[extension[0]]
+            decompressor = _decompressor(self.compression)
+            prefix = b''
+            data = raw
+            try: # (a bz2 block only comes out when it is complete, so read on until the FAR is out)
+                while data and len(prefix) < 6:
+                    prefix += decompressor.decompress(data, prefix_size - len(prefix))
+                    data = fd.read(prefix_size) if len(prefix) < 6 else b''
+            except (OSError, EOFError, lzma.LZMAError, zlib.error):
+                pass # a corrupt compressed file, use what came out
+            eof = getattr(decompressor, 'eof', False)
+        else:
+            prefix = raw
+            eof = len(raw) < prefix_size
+        if len(prefix) >= 6 and prefix[2] == 0 and prefix[3] == 10:
+            self.is_STDF = True
+            CPU_TYPE, STDF_VER = prefix[4], prefix[5]
+            self.endian = {1 : '>', 2 : '<'}.get(CPU_TYPE, '?')
+            self.version = 'V%s' % STDF_VER
+            self._keep_header(prefix, eof)
+
+    def _keep_header(self, prefix, eof):
+        if self.endian == '?':
+            self.header = prefix[:6]
+            return
+        unpack_from = struct.Struct(self.endian + 'HBB').unpack_from
+        offset = 0
+        while offset <= len(prefix) - 4:
+            REC_LEN, REC_TYP, REC_SUB = unpack_from(prefix, offset)
+            if (REC_TYP, REC_SUB) not in HEADER_TS:
+                self.header_complete = True
+                break
+            if offset + 4 + REC_LEN > len(prefix):
+                break
+            offset += 4 + REC_LEN
+        else:
+            self.header_complete = eof and offset == len(prefix)
+        self.header = bytes(prefix[:offset])
+
+    def is_valid_for(self, stat):
+        return self.key[1:] == (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def header_records(self):
+        '''
+        Yields (REC_LEN, REC_TYP, REC_SUB, REC) for the header records.
+        '''
+        unpack_from = struct.Struct(self.endian + 'HBB').unpack_from
+        offset = 0
+        while offset < len(self.header):
+            REC_LEN, REC_TYP, REC_SUB = unpack_from(self.header, offset)
+            yield REC_LEN, REC_TYP, REC_SUB, self.header[offset:offset + 4 + REC_LEN]
+            offset += 4 + REC_LEN
+
+    def MIR(self):
+        '''
+        Returns the MIR object from the header, None if it is not in there.
+        '''
+        for _, REC_TYP, REC_SUB, REC in self.header_records():
+            if (REC_TYP, REC_SUB) == (1, 10):
+                return MIR(self.version, self.endian, REC)
+        return None
+
+    def open(self):
+        '''
+        Returns a ProbedFile on the (decompressed) contents.
+        '''
+        return ProbedFile(open(self.FileName, 'rb'), self.compression)
+
+
+_probes = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def _stat(FileName):
+    try:
+        stat = os.stat(FileName)
+    except (OSError, TypeError, ValueError):
+        return None
+    if not S_ISREG(stat.st_mode):
+        return None
+    return stat
+
+
+def _cached(FileName, stat):
+    with _lock:
+        probe = _probes.get(FileName)
+        if probe is not None:
+            if probe.is_valid_for(stat):
+                _probes.move_to_end(FileName)
+                return probe
+            del _probes[FileName]
+    return None
+
+
+def _cache(probe):
+    with _lock:
+        _probes[probe.FileName] = probe
+        while len(_probes) > cache_size:
+            _probes.popitem(last=False)
+
+
+def probe_file(FileName):
+    '''
+    Returns the (cached) STDFProbe of FileName, None if FileName is not an existing (regular) file.
+    '''
+    FileName = os.path.abspath(FileName) if isinstance(FileName, str) else FileName
+    stat = _stat(FileName)
+    if stat is None:
+        return None
+    probe = _cached(FileName, stat)
+    if probe is None:
+        probe = STDFProbe(FileName, stat)
+        try:
+            with open(FileName, 'rb') as fd:
+                probe.sniff(fd)
+        except OSError:
+            return None
+        _cache(probe)
+    return probe
+
+
+def open_STDF(FileName):
+    '''
+    Returns (probe, fd) with fd a ProbedFile on the decompressed contents of the STDF file FileName, positioned at 0.
+    Returns (probe, None) if FileName is not an STDF file and (None, None) if it is not a (regular) file.
+    On a cache miss the file is opened only once (for probing and reading).
+    '''
+    FileName = os.path.abspath(FileName) if isinstance(FileName, str) else FileName
+    stat = _stat(FileName)
+    if stat is None:
+        return None, None
+    probe = _cached(FileName, stat)
+    try:
+        raw = open(FileName, 'rb')
+    except OSError:
+        return None, None
+    if probe is None:
+        probe = STDFProbe(FileName, stat)
+        try:
+            probe.sniff(raw)
+            raw.seek(0)
+        except OSError:
+            raw.close()
+            return None, None
+        _cache(probe)
+    if not probe.is_STDF:
+        raw.close()
+        return probe, None
+    return probe, ProbedFile(raw, probe.compression)
+
+
+def clear_probes():
+    '''
+    Empties the probe cache.
+    '''
+    with _lock:
+        _probes.clear()
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from ATE.utils.magicnumber import extension_from_magic_number_in_file
+
+    FileNames = sys.argv[1:]
+    start = time.time()
+    for FileName in FileNames:
+        extension_from_magic_number_in_file(FileName)
+        extension_from_magic_number_in_file(FileName)
+        with open_STDF(FileName)[1] or io.BytesIO() as fd:
+            fd.read(6)
+    print("magic numbers + open : %s files in %.3f seconds" % (len(FileNames), time.time() - start))
+    for attempt in ['cold', 'warm']:
+        if attempt == 'cold':
+            clear_probes()
+        start = time.time()
+        for FileName in FileNames:
+            probe_file(FileName).MIR()
+        print("probe (%s)          : %s files in %.3f seconds" % (attempt, len(FileNames), time.time() - start))
@@ -21,17 +21,17 @@ Disclaimer:
 
 License : GPL
 '''
-import bz2
 import datetime
 import io
 import os
-import pickle
 import struct
 import sys
 import time
 from abc import ABC
 from mimetypes import guess_type
 
+from ATE.data.STDF import instrumentation
+
 
 if sys.version_info[0] < 3:
     raise Exception("The STDF library is made for Python 3")
@@ -335,10 +335,8 @@ class STDR(ABC):
                 raise STDFError("%s.get_fields(%s) Error : '%s' is not a string or integer" % (self.id, FieldID, FieldID))
 
     def get_value(self, FieldID):
-        _, _, Ref, Value, _, Missing = self.get_fields(FieldID)
-        # TODO: ref value handling is missing here: for arrays (kxTYPE etc.) this returns the size of the array instead of its value for now
-        if Ref is not None:
-            return self.get_value(ref)
+        _, _, _, Value, _, Missing = self.get_fields(FieldID)
+        # for arrays (kxTYPE etc.) the Value is the list itself, Ref only names the count field
         return Missing if Value is None else Value
 
     def set_value(self, FieldID, Value):
@@ -361,11 +359,16 @@ class STDR(ABC):
             raise STDFError("%s.set_value(%s, %s) : Error : '%s' is not a string or integer." % (self.id, FieldID, Value, FieldID))
 
         Type, Ref = self.get_fields(FieldKey)[1:3]
+        if Type in ['U*f', 'xU*f']:
+            self._set_unsigned_f(FieldKey, Type, Ref, Value)
+            return
         K = None
         # TODO: the following condition should most likely be "Ref is not None", since this one is always true but initialized K to the field with '#' == 3 in case of Ref == None
         if Ref != '':
             K = self.get_fields(Ref)[3]
         Type, Bytes = Type.split("*")
+        if hasattr(Value, 'dtype') and hasattr(Value, 'tolist'): # NumPy array (see ATE.data.STDF.codec)
+            Value = Value.tolist()
 
         if Type.startswith('x'):
             if not isinstance(Value, list):
@@ -451,7 +454,7 @@ class STDR(ABC):
             elif Type == 'xR': # list of floats
                 temp = [0.0] * len(Value)
                 if ((Bytes == '4') or (Bytes == '8')):
-                    for index in len(Value):
+                    for index in range(len(Value)):
                         temp[index] = float(Value[index]) # no checking for float & double, pack will cast with appropriate precision, cast integers.
                 else:
                     raise STDFError("%s.set_value(%s, %s) Error : '%s' is an unsupported Type" % (self.id, FieldKey, Value, '*'.join((Type, Bytes))))
@@ -461,10 +464,16 @@ class STDR(ABC):
 
             elif Type == 'xC': # list of strings
                 temp = [''] * len(Value)
+                for index in range(len(Value)):
+                    if not isinstance(Value[index], str):
+                        raise STDFError("%s.set_value(%s, %s) Error : 'index[%s]' is not a string." % (self.id, FieldKey, Value, index))
                 if Bytes.isdigit():
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 elif Bytes == 'n':
-                    raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
+                    for index in range(len(Value)):
+                        if len(Value[index].encode('utf-8')) > 255:
+                            raise STDFError("%s.set_value(%s, %s) Error : 'index[%s]' is longer than 255 bytes." % (self.id, FieldKey, Value, index))
+                        temp[index] = Value[index]
                 elif Bytes == 'f':
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 else:
@@ -478,8 +487,7 @@ class STDR(ABC):
                     temp = [['0'] * (int(Bytes) * 8)] * len(Value)
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 elif Bytes == 'n':
-                    temp = [['0'] * (int() * 8)] * len(Value) #TODO: Fill in the int() statement
-                    raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
+                    temp = [self._bit_list(FieldKey, bits, 255 * 8) for bits in Value]
                 elif Bytes == 'f':
                     temp = [['0'] * (int() * 8)] * len(Value) #TODO: Fill in the int() statement
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
@@ -493,17 +501,20 @@ class STDR(ABC):
                 if Bytes.isdigit():
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 elif Bytes == 'n':
-                    raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
+                    temp = [self._bit_list(FieldKey, bits, 65535) for bits in Value]
                 elif Bytes == 'f':
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 else:
                     raise STDFError("%s.set_value(%s, %s) : Unsupported type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
-                # assign from temp to field
+                self.fields[FieldKey]['Value'] = temp
+                self.fields[Ref]['Value'] = len(temp)
                 if self.local_debug: print("%s._set_value(%s, %s) -> Value = %s, Reference '%s' = %s" % (self.id, FieldKey, Value, temp, Ref, len(temp)))
 
             elif Type == 'xN': # list of list of nibble integers
                 if not isinstance(Value, list):
                     raise STDFError("%s.set_value(%s, %s) : %s should be a list" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
+                if Bytes == '1': # a flat list of nibbles is accepted too
+                    Value = [[nibble] if isinstance(nibble, int) else nibble for nibble in Value]
                 for nibble_list in Value:
                     if not isinstance(nibble_list, list):
                         raise STDFError("%s.set_value(%s, %s) Error : %s should be a list of list(s) of nibble(s)" % (self.id, FieldKey, Value, '*'.join((Type, Bytes))))
@@ -541,12 +552,19 @@ class STDR(ABC):
                 if Bytes.isdigit():
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 elif Bytes == 'n':
-                    raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
+                    from ATE.data.STDF.codec import Vn_codes, Vn_types, encode_Vn
+                    temp = []
+                    for item in Value:
+                        if not isinstance(item, tuple) or len(item) != 2 or Vn_codes.get(item[0], item[0]) not in Vn_types:
+                            raise STDFError("%s.set_value(%s, %s) Error : '%s' is not a (type, value) tuple of a supported type" % (self.id, FieldKey, Value, item))
+                        temp.append((Vn_types[Vn_codes.get(item[0], item[0])], item[1]))
+                    encode_Vn(temp, self.endian) # raises if a value doesn't fit its type
                 elif Bytes == 'f':
                     raise STDFError("%s.set_value(%s, %s) : Unimplemented type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
                 else:
                     raise STDFError("%s.set_value(%s, %s) : Unsupported type '%s'" % (self.id, FieldKey, Value, str(K) + '*'.join((Type, Bytes))))
-                # assign from temp to field
+                self.fields[FieldKey]['Value'] = temp
+                self.fields[Ref]['Value'] = len(temp)
                 if self.local_debug: print("%s._set_value(%s, %s) -> Value = %s, Reference '%s' = %s" % (self.id, FieldKey, Value, temp, Ref, len(temp)))
 
             else:
@@ -762,6 +780,45 @@ class STDR(ABC):
             else:
                 raise STDFError("%s.set_value(%s, %s) Error : '%s' is an unsupported Type" % (self.id, FieldKey, Value, '*'.join((Type, Bytes))))
 
+    def _bit_list(self, FieldKey, bits, maximum):
+        '''
+        Returns bits (a list of '0'/'1' strings or 0/1 integers) as a list of '0'/'1' strings, for the xB and xD types.
+        '''
+        if not isinstance(bits, list):
+            raise STDFError("%s.set_value(%s) Error : '%s' is not a list of bits" % (self.id, FieldKey, bits))
+        if len(bits) > maximum:
+            raise STDFError("%s.set_value(%s) Error : more than %s bits" % (self.id, FieldKey, maximum))
+        retval = []
+        for bit in bits:
+            if bit in ('0', '1'):
+                retval.append(bit)
+            elif bit in (0, 1) and not isinstance(bit, str):
+                retval.append('1' if bit else '0')
+            else:
+                raise STDFError("%s.set_value(%s) Error : '%s' is not a bit" % (self.id, FieldKey, bit))
+        return retval
+
+    def _set_unsigned_f(self, FieldKey, Type, Ref, Value):
+        '''
+        set_value for a U*f (Ref is the size or the size field) or a kxU*f (Ref is the (count field, size field) tuple),
+        the size field must be set first.
+        '''
+        if hasattr(Value, 'dtype') and hasattr(Value, 'tolist'):
+            Value = Value.tolist()
+        Count, Size = Ref if Type == 'xU*f' else (None, Ref)
+        if isinstance(Size, str) and Size in self.fields:
+            Size = self.get_value(Size)
+        if Size not in [1, 2, 4, 8]:
+            raise STDFError("%s.set_value(%s, %s) Error : unsupported size '%s' for '%s'" % (self.id, FieldKey, Value, Size, Type))
+        if Count is not None and not isinstance(Value, list):
+            raise STDFError("%s.set_value(%s, %s) Error : '%s' is not a list." % (self.id, FieldKey, Value, Value))
+        for value in Value if Count is not None else [Value]:
+            if not isinstance(value, int) or not 0 <= value < 1 << (8 * Size):
+                raise STDFError("%s.set_value(%s, %s) Error : '%s' can not be casted into U*%s" % (self.id, FieldKey, Value, value, Size))
+        self.fields[FieldKey]['Value'] = Value
+        if Count is not None:
+            self.fields[Count]['Value'] = len(Value)
+
     def _type_size(self, FieldID):
         '''
         support function to determine the type size
@@ -978,607 +1035,6 @@ class STDR(ABC):
         if self.local_debug: print("%s._update_rec_len() = %s" % (self.id, reclen))
         self.fields['REC_LEN']['Value'] = reclen
 
-    def _pack_item(self, FieldID):
-        '''
-        Private method that packs a field from the record and returns the packed version.
-
-
-            'KxT*S'
-                K = reference in other field
-                T = Type (U, I, R, C, B, D, N, V)
-                    U = Unsigned integer
-                    I = Signed integer
-                    R = Floating point
-                    C = String
-                    S = Long string
-                    B = list of bytes
-                    D = list of bits
-                    N = list of nibbles
-                    V = variable type
-                S = Size (#, n, f)
-                    # = size is given by the number
-                    n = size is in the first byte (255=max)
-                    f = size is in another field.
-        '''
-        FieldKey = ''
-        if isinstance(FieldID, int):
-            for field in self.fields:
-                if self.fields[field]['#'] == FieldID:
-                    FieldKey = field
-            if FieldKey == '':
-                raise STDFError("%s._pack_item(%s) Error : not a valid integer key" % (self.id, FieldID))
-        elif isinstance(FieldID, str):
-            if FieldID not in self.fields:
-                raise STDFError("%s._pack_item(%s) Error : not a valid string key" % (self.id, FieldID))
-            else:
-                FieldKey = FieldID
-        else:
-            raise STDFError("%s._pack_item(%s) Error : not a string or integer key." % (self.id, FieldID))
-
-        TypeFormat, Ref, Value = self.get_fields(FieldKey)[1:4] # get Type, Reference and Value
-        if Value==None: Value=self.get_fields(FieldKey)[5] # get the 'missing' default
-
-        if Value is None:
-            # changed behavior to consistently require explicit initialization of non-optional
-            # fields (instead of crashing somewhere below when None is accessed).
-            # we could introdce a non-strict mode where we store valid data for the current
-            # type here if this is not desired.
-            raise STDFError("%s._pack_item(%s) : Error : cannot pack uninitialized value (None) of non-optional field" % (self.id, FieldKey))
-
-        Type, Size = TypeFormat.split("*")
-        if Type.startswith('x'):
-            Type = Type[1:]
-            TypeMultiplier = True
-        else:
-            TypeMultiplier = False
-        if Ref!=None:
-            if isinstance(Ref, str) and TypeMultiplier:
-                K = self.get_fields(Ref)[3]
-            elif isinstance(Ref, tuple):
-                if (len(Ref)==1 and not TypeMultiplier) or (len(Ref)==2 and TypeMultiplier):
-                    K = self.get_fields(Ref[0])[3]
-                else:
-                    raise STDFError("%s._pack_item(%s) : Unsupported Reference '%s' vs '%s'" % (self.id, FieldKey, Ref, TypeFormat))
-            else:
-                raise STDFError("%s._pack_item(%s) : Unsupported Reference '%s' vs '%s'" % (self.id, FieldKey, Ref, TypeFormat))
-        else:
-            K = 1
-        fmt = ''
-        pkg = b''
-
-        if Type == 'U': # (list of) Unsigned integer(s)
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit():
-                if Size == '1': fmt = '%sB' % self.endian   # 1 byte unsigned integer(s) 0 .. 255
-                elif Size == '2': fmt = '%sH' % self.endian # 2 byte unsigned integer(s) 0 .. 65.535
-                elif Size == '4': fmt = '%sI' % self.endian # 4 byte unsigned integer(s) 0 .. 4.294.967.295
-                elif Size == '8': fmt = '%sQ' % self.endian # 8 byte unsigned integer(s) 0 .. 18446744073709551615
-                else:
-                    if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                    else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            for i in range(K):
-                pkg+=struct.pack(fmt, ValueMask[i])
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'I': # (list of) Signed integer(s)
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit():
-                if Size == '1': fmt = '%sb' % self.endian   # 1 byte signed integer(s) -128 .. +127
-                elif Size == '2': fmt = '%sh' % self.endian # 2 byte signed integer(s) -32.768 .. +32.767
-                elif Size == '4': fmt = '%si' % self.endian # 4 byte signed integer(s) -2.147.483.648 .. +2.147.483.647
-                elif Size == '8': fmt = '%sq' % self.endian # 8 byte signed integer(s) -9.223.372.036.854.775.808 .. +9.223.372.036.854.775.807
-                else:
-                    if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                    else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            for i in range(K):
-                pkg+=struct.pack(fmt, ValueMask[i])
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'R': # (list of) floating point number(s)
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit():
-                if Size == '4': fmt = '%sf' % self.endian # (list of) 4 byte floating point number(s) [float]
-                elif Size == '8': fmt = '%sd' % self.endian # (list of) 8 byte floating point number(s) [double]
-                else:
-                    if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                    else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            for i in range(K):
-                pkg+=struct.pack(fmt, ValueMask[i])
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'C': # (list of) string(s)
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit() or Size=='f' or Size == 'n':
-                for i in range(K):
-                    if Size == 'n':
-                        pkg += struct.pack('B', len(ValueMask[i]))
-                    pkg += ValueMask[i].encode()
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'S': # (list of) long string(s)
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size=='f' or Size == 'n':
-                for i in range(K):
-                    if Size == 'n':
-                        pkg += struct.pack('%sH' % self.endian, len(ValueMask[i]))
-                    pkg += ValueMask[i]
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'B': # (list of) list of n*8 times '0' or '1'
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit() or Size=='f' or Size == 'n':
-                for i in range(K):
-                    bits_to_pack = len(ValueMask[i])
-                    bytes_to_pack = bits_to_pack // 8 # Bits to pack should always be a multiple of 8, guaranteed by set_value
-                    if Size == 'n':
-                        pkg += struct.pack('B', bytes_to_pack)
-                    for Byte in range(bytes_to_pack):
-                        byte = 0
-                        for Bit in range(8):
-                            if ValueMask[i][(Byte * 8) + Bit] == '1':
-                                byte+= pow(2, 7-Bit)
-                        pkg += struct.pack('B', byte)
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'D': # (list of) list of bits being '0' or '1'
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit() or Size == 'f' or Size == 'n':
-                for i in range(K):
-                    temp_value = ValueMask[i]
-                    bits_to_pack = len(temp_value)
-                    bytes_to_pack = int(bits_to_pack) // 8
-                    if Size == 'n':
-                        pkg += struct.pack('%sH' % self.endian, bits_to_pack)
-                    if (bits_to_pack % 8) != 0:
-                        bytes_to_pack += 1
-                        temp_value += ['0'] * (8-(bits_to_pack % 8)) # padd with '0' bits as specified in spec
-                    for Byte in range(bytes_to_pack):
-                        byte = 0
-                        for Bit in range(8):
-                            if temp_value[(Byte * 8) + Bit] == '1':
-                                byte += pow(2, Bit)
-                        pkg += struct.pack('B', byte)
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'N': # (list of) a list of nibbles
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size.isdigit() or Size == 'f' or Size == 'n':
-                for i in range(K): # number of nibble-lists
-                    temp_value = ValueMask[i]
-                    if Size == 'n':
-                        pkg += struct.pack('B', len(temp_value)) # maximum 255 nibbles!
-                    if is_odd(len(temp_value)):
-                        temp_value.append(0)
-                    for j in range(0, len(temp_value), 2):
-                        N_odd = ValueMask[i][j] & 0x0F
-                        N_even = (ValueMask[i][j+1] & 0xF0) << 4
-                        byte = N_even | N_odd
-                        pkg += struct.pack('B', byte)
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        elif Type == 'V': # (list of) variable types
-            if TypeMultiplier: ValueMask = Value
-            else: ValueMask = [Value]
-            if Size == 'n':
-                pass #TODO: Implement
-            else:
-                if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-                else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-            if self.local_debug:
-                if TypeMultiplier: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), str(K) + TypeFormat, len(pkg)))
-                else: print("%s._pack_item(%s)\n   '%s' [%s]\n   %s bytes" % (self.id, FieldKey, hexify(pkg), TypeFormat, len(pkg)))
-        else:
-            if TypeMultiplier: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, str(K) + TypeFormat))
-            else: raise STDFError("%s._pack_item(%s) : Unsupported type-format '%s'" % (self.id, FieldKey, TypeFormat))
-        return pkg
-
-    def _unpack_item(self, FieldID):
-        if len(self.buffer) == 0:
-            self.set_value(FieldID, self.fields[FieldID]['Missing'])
-            self.missing_fields += 1
-        else:
-            FieldKey = ''
-            if isinstance(FieldID, int):
-                for field in self.fields:
-                    if self.fields[field]['#'] == FieldID:
-                        FieldKey = field
-                if FieldKey == '':
-                    raise STDFError("%s._unpack_item(%s) : not a valid integer key" % (self.id, FieldID))
-            elif isinstance(FieldID, str):
-                if FieldID not in self.fields:
-                    raise STDFError("%s._unpack_item(%s) : not a valid string key" % (self.id, FieldID))
-                else:
-                    FieldKey = FieldID
-            else:
-                raise STDFError("%s._unpack_item(%s) : not a string or integer key." % (self.id, FieldID))
-
-            Type, Ref, Value = self.get_fields(FieldKey)[1:4]
-            K = self.get_fields(Ref)[3]
-            Type, Bytes = Type.split("*")
-            fmt = ''
-            pkg = self.buffer
-
-            if Type.startswith('x'):
-                result = []
-
-                if Type == 'xU': # list of unsigned integers
-                    if Bytes.isdigit():
-                        if Bytes == '1': fmt = self.endian + 'B'   # list of one byte unsigned integers 0..255
-                        elif Bytes == '2': fmt = self.endian + 'H' # list of 2 byte unsigned integers 0..65535
-                        elif Bytes == '4': fmt = self.endian + 'I' # list of 4 byte unsigned integers 0..4294967295
-                        elif Bytes == '8': fmt = self.endian + 'Q' # list of 8 byte unsigned integers 0..18446744073709551615
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    for _ in range(K):
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result.append(struct.unpack(fmt, working_buffer)[0])
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xI': # list of signed integers
-                    if Bytes.isdigit():
-                        if Bytes == '1': fmt = self.endian + 'b'   # list of one byte signed integers -127..127
-                        elif Bytes == '2': fmt = self.endian + 'h' # list of 2 byte signed integers
-                        elif Bytes == '4': fmt = self.endian + 'i' # list of 4 byte signed integers
-                        elif Bytes == '8': fmt = self.endian + 'q' # list of 8 byte signed integers
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    for _ in range(K):
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result.append(struct.unpack(fmt, working_buffer)[0])
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xR': # list of floating point numbers
-                    if Bytes.isdigit():
-                        if Bytes == '4': fmt = self.endian + 'f'   # list of 4 byte floating point numbers (float)
-                        elif Bytes == '8': fmt = self.endian + 'd' # list of 8 byte floating point numbers (double)
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    for _ in range(K):
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result.append(struct.unpack(fmt, working_buffer)[0])
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xC': # list of strings
-                    if Bytes.isdigit():
-                        if int(Bytes) <= 255:
-                            raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    for _ in range(K):
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result.append(struct.unpack(fmt, working_buffer)[0])
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xB': # list of list of '0' or '1'
-                    if Bytes.isdigit():
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xD': # list of list of '0' or '1'
-                    if Bytes.isdigit():
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xN': # list of a list of nibbles
-                    if Bytes.isdigit():
-                        result = []
-                        if int(Bytes) <= 510:
-                            if int(Bytes) == 1:
-                                byteS = 1
-                            else:
-                                byteS = int(Bytes)/2
-                                if is_odd(byteS):
-                                    byteS+=1
-                            for _i in range(K):
-                                tmp = []
-                                for _j in range(byteS):
-                                    working_buffer = self.buffer[0:1]
-                                    self.buffer = self.buffer[1:]
-                                    B = struct.unpack('B', working_buffer)[0]
-                                    N1 = B & 0x0F
-                                    N2 = (B & 0xF0) >> 4
-                                    tmp.append(N1)
-                                    tmp.append(N2)
-                                if is_odd(byteS):
-                                    tmp = tmp[0:-1] # remove the last element (which will be 0) from the list
-                                result.append(tmp)
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-
-                elif Type == 'xV': # list of 2-element tuples
-                    if Bytes.isdigit():
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._unpack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), str(K) + '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldKey, result)
-                else:
-                    raise STDFError("%s._pack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, str(K) + '*'.join((Type, Bytes))))
-            else:
-                if Type == 'U': # unsigned integer
-                    if Bytes.isdigit():
-                        if Bytes == '1': fmt = "%sB" % self.endian   # unsigned char
-                        elif Bytes == '2': fmt = "%sH" % self.endian # unsigned short
-                        elif Bytes == '4': fmt = "%sL" % self.endian # unsigned long
-                        elif Bytes == '8': fmt = "%sQ" % self.endian # unsigned long long
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                        if len(self.buffer) < int(Bytes):
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, Bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result = struct.unpack(fmt, working_buffer)[0]
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'I': # signed integer
-                    if Bytes.isdigit():
-                        if Bytes == '1': fmt = "%sb" % self.endian   # signed char
-                        elif Bytes == '2': fmt = "%sh" % self.endian # signed short
-                        elif Bytes == '4': fmt = "%sl" % self.endian # signed long
-                        elif Bytes == '8': fmt = "%sq" % self.endian # signed long long
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                        if len(self.buffer) < int(Bytes):
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, Bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result = struct.unpack(fmt, working_buffer)[0]
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'R': # float
-                    if Bytes.isdigit():
-                        if Bytes == '4': fmt = "%sf" % self.endian # float
-                        elif Bytes == '8': fmt = "%sd" % self.endian # double
-                        else:
-                            raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                        if len(self.buffer) < int(Bytes):
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, Bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result = struct.unpack(fmt, working_buffer)[0]
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'C': # string
-                    if Bytes.isdigit(): # C*1 C*2 ...
-                        if len(self.buffer) < int(Bytes):
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, Bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        result = working_buffer.decode()
-                    elif Bytes == 'n': # C*n
-                        working_buffer = self.buffer[0:1]
-                        self.buffer = self.buffer[1:]
-                        n_bytes = struct.unpack('B', working_buffer)[0]
-                        if len(self.buffer) < n_bytes:
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, n_bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:n_bytes]
-                        self.buffer = self.buffer[n_bytes:]
-                        result = working_buffer.decode('utf-8')
-                    elif Bytes == 'f': # C*f
-                        n_bytes = self.get_fields(Ref)[3]
-                        if len(self.buffer) < n_bytes:
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, n_bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:n_bytes]
-                        self.buffer = self.buffer[n_bytes:]
-                        result = working_buffer.decode()
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'B': # list of single character strings being '0' or '1' (max length = 255*8 = 2040 bits)
-                    if Bytes.isdigit(): # B*1 B*2 ...
-                        if len(self.buffer) < int(Bytes):
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, Bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        temp = struct.unpack('B' * int(Bytes), working_buffer) # temp is a list (tuple) of 'Bytes' unsigned 1 byte bytes
-                        result = ['0'] * (int(Bytes) * 8)
-                        for Byte in range(len(temp)):
-                            for Bit in range(8):
-                                mask = pow(2, 7 - Bit)
-                                if (temp[Byte] & mask) == mask :
-                                    result[(Byte * 8) + Bit] = '1'
-                    elif Bytes == 'n': # B*n
-                        working_buffer = self.buffer[0:1]
-                        self.buffer = self.buffer[1:]
-                        n_bytes = struct.unpack('B', working_buffer)[0]
-                        if len(self.buffer) < n_bytes:
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, n_bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:n_bytes]
-                        self.buffer = self.buffer[n_bytes:]
-                        temp = struct.unpack('B' * n_bytes, working_buffer)
-                        result = ['0'] * (n_bytes * 8)
-                        for Byte in range(len(temp)):
-                            for Bit in range(8):
-                                mask = pow(2, 7 - Bit)
-                                if (temp[Byte] & mask) == mask :
-                                    result[(Byte * 8) + Bit] = '1'
-                    elif Bytes == 'f': # B*f
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'D': # list of single character strings being '0' and '1'(max length = 65535 bits)
-                    if Bytes.isdigit():
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        working_buffer = self.buffer[0:2]
-                        self.buffer = self.buffer[2:]
-                        n_bits = struct.unpack('%sH' % self.endian, working_buffer)[0]
-                        n_bytes = int(n_bits/8)
-                        if n_bits % 8 != 0:
-                            n_bytes += 1
-                        result = ['0'] * (n_bytes * 8)
-                        if len(self.buffer) < n_bytes:
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, n_bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:n_bytes]
-                        self.buffer = self.buffer[n_bytes:]
-                        result = ['0'] * n_bytes
-                        for Byte in range(n_bytes):
-                            B = struct.unpack('B', working_buffer[Byte])[0]
-                            for Bit in range(8):
-                                if B & pow(2, Bit) == 1:
-                                    result[(Byte * 8) + Bit] = '1'
-                        result = result[:n_bits] # strip off the paddings
-                    elif Bytes == 'f':
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'N': # list of integers
-                    if Bytes.isdigit():
-                        if len(self.buffer) < int(Bytes):
-                            raise STDFError("%s._unpack_item(%s) : Not enough bytes in buffer (need %s while %s available)." % (self.id, FieldKey, Bytes, len(self.buffer)))
-                        working_buffer = self.buffer[0:int(Bytes)]
-                        self.buffer = self.buffer[int(Bytes):]
-                        brol = []
-                        for index in range(len(working_buffer)):
-                            B = struct.unpack("%sB" % self.endian, working_buffer[index])[0]
-                            N1 = B & 0x0F
-                            N2 = (B & 0xF0) >> 4
-                            brol.append(N1)
-                            brol.append(N2)
-                        brol = brol[:int(Bytes)]
-                        self.set_value(FieldID, brol)
-                    elif Bytes == 'n':
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._unpack_item(%s) : Unsupported type '%s'." % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                elif Type == 'V': # tuple (type, value) where type is defined in spec page 62
-                    '''
-                     0 = B*0 Special pad field
-                     1 = U*1 One byte unsigned integer
-                     2 = U*2 Two byte unsigned integer
-                     3 = U*4 Four byte unsigned integer
-                     4 = I*1 One byte signed integer
-                     5 = I*2 Two byte signed integer
-                     6 = I*4 Four byte signed integer
-                     7 = R*4 Four byte floating point number
-                     8 = R*8 Eight byte floating point number
-                    10 = C*n Variable length ASCII character string (first byte is string length in bytes)
-                    11 = B*n Variable length binary data string (first byte is string length in bytes)
-                    12 = D*n Bit encoded data (first two bytes of string are length in bits)
-                    13 = N*1 Unsigned nibble
-                    '''
-                    if Bytes.isdigit():
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    elif Bytes == 'n':
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    elif Bytes == 'f':
-                        raise STDFError("%s._pack_item(%s) : Unimplemented type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    else:
-                        raise STDFError("%s._pack_item(%s) : Unsupported type '%s'" % (self.id, FieldKey, '*'.join((Type, Bytes))))
-                    if self.local_debug: print("%s._unpack_item(%s)\n   '%s' [%s] -> %s" % (self.id, FieldKey, hexify(pkg), '*'.join((Type, Bytes)), result))
-                    self.set_value(FieldID, result)
-
-                else:
-                    raise STDFError("%s.set_value(%s, %s) : Unsupported type '%s'" % (self.id, FieldKey, Value, '*'.join((Type, Bytes))))
-
     def _unpack(self, record):
         '''
         Private method to unpack a record (including header -to-check-record-type-) and set the appropriate values in fields.
@@ -1588,121 +1044,35 @@ class STDR(ABC):
         if self.local_debug: print("%s._unpack(%s) with buffer length = %s" % (self.id, hexify(record), len(record)))
 
         if record[2] != self.fields['REC_TYP']['Value']:
-            raise STDFError("%s_unpack(%s) : REC_TYP doesn't match record" % hexify(record))
+            raise STDFError("%s_unpack(%s) : REC_TYP doesn't match record" % (self.id, hexify(record)))
 
         if record[3] != self.fields['REC_SUB']['Value']:
             raise STDFError("%s_unpack(%s) : REC_SUB doesn't match record" % (self.id, hexify(record)))
 
-        items = {}
-        for index in self.fields:
-            items[self.fields[index]['#']]=index
-        for index in range(len(items)):
-            self._unpack_item(items[index])
+        # late import, the codec module imports STDFError from this module
+        from ATE.data.STDF.codec import record_codec
+        stats = instrumentation.current
+        if stats is None:
+            record_codec(self).unpack(self, record)
+        else:
+            start = time.perf_counter()
+            record_codec(self).unpack(self, record)
+            stats.decoded(self.id, len(record), time.perf_counter() - start)
 
     def Vn_decode(self, BUFF, endian):
         '''
-        This method unpacks a V*n field
+        This method unpacks a V*n field (all items in BUFF), returns a list of (Type, Value) tuples.
+        see ATE.data.STDF.codec.decode_Vn
         '''
-        buffer_remainer = BUFF
-        buffer_endian = endian
-        retval = {}
-        index = 1
-
-        if buffer_endian not in ['<', '>']:
-            raise STDFError("Vn_decode() : unsupported endian '%s'" % buffer_endian)
-
-        return buffer_remainer #TODO: implement the tests for decoding of the V*n type and remove this bypass return statement
-
-        while len(buffer_remainer) != 0:
-            working_buffer = buffer_remainer[0:1]
-            buffer_remainer = buffer_remainer[1:]
-            local_type, = struct.unpack('b', working_buffer) # type identifier
-            if local_type == 0: # B*0 Special pad field, of length 0
-                pass
-            elif local_type == 1: # U*1 One byte unsigned integer
-                working_buffer = buffer_remainer[0:1]
-                buffer_remainer = buffer_remainer[1:]
-                retval[index]['Type'] = 'U*1'
-                retval[index]['Value'], = struct.unpack("%sB" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 2: # U*2 Two byte unsigned integer
-                working_buffer = buffer_remainer[0:2]
-                buffer_remainer = buffer_remainer[2:]
-                retval[index]['Type'] = 'U*2'
-                retval[index]['Value'], = struct.unpack("%sH" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 3: # U*4 Four byte unsigned integer
-                working_buffer = buffer_remainer[0:4]
-                buffer_remainer = buffer_remainer[4:]
-                retval[index]['Type'] = 'U*4'
-                retval[index]['Value'], = struct.unpack("%sI" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 4: # I*1 One byte signed integer
-                working_buffer = buffer_remainer[0:1]
-                buffer_remainer = buffer_remainer[1:]
-                retval[index]['Type'] = 'I*1'
-                retval[index]['Value'], = struct.unpack("%sb" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 5: # I*2 Two byte signed integer
-                working_buffer = buffer_remainer[0:2]
-                buffer_remainer = buffer_remainer[2:]
-                retval[index]['Type'] = 'I*2'
-                retval[index]['Value'], = struct.unpack("%sh" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 6: # I*4 Four byte signed integer
-                working_buffer = buffer_remainer[0:4]
-                buffer_remainer = buffer_remainer[4:]
-                retval[index]['Type'] = 'I*4'
-                retval[index]['Value'], = struct.unpack("%si" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 7: # R*4 Four byte floating point number
-                working_buffer = buffer_remainer[0:4]
-                buffer_remainer = buffer_remainer[4:]
-                retval[index]['Type'] = 'R*4'
-                retval[index]['Value'], = struct.unpack("%sf" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 8: # R*8 Eight byte floating point number
-                working_buffer = buffer_remainer[0:8]
-                buffer_remainer = buffer_remainer[8:]
-                retval[index]['Type'] = 'R*8'
-                retval[index]['Value'], = struct.unpack("%sd" % buffer_endian, working_buffer)
-                index += 1
-            elif local_type == 10: # C*n Variable length ASCII character string (first byte is string length in bytes)
-                working_buffer = buffer_remainer[0:1]
-                buffer_remainer = buffer_remainer[1:]
-                Cn_length, = struct.unpack("%sB" % buffer_endian, working_buffer)
-                working_buffer = buffer_remainer[0:Cn_length]
-                buffer_remainer = buffer_remainer[Cn_length:]
-                retval[index]['Type'] = 'C*n'
-                retval[index]['Value'] = working_buffer
-                index += 1
-            elif local_type == 11: # B*n Variable length binary data string (first byte is string length in bytes)
-                working_buffer = buffer_remainer[0:1]
-                buffer_remainer = buffer_remainer[1:]
-                Bn_length, = struct.unpack("%sB" % buffer_endian, working_buffer)
-                working_buffer = buffer_remainer[0:Bn_length]
-                buffer_remainer = buffer_remainer[Bn_length:]
-                retval[index]['Type'] = 'B*n'
-                retval[index]['Value'] = working_buffer
-                index += 1
-            elif local_type == 12: # D*n Bit encoded data (first two bytes of string are length in bits)
-                working_buffer = buffer_remainer[0:2]
-                buffer_remainer = buffer_remainer[2:]
-                Dn_length = struct.unpack("%sH" % buffer_endian, working_buffer)
-                working_buffer = buffer_remainer[0:Dn_length]
-                buffer_remainer = buffer_remainer[Dn_length:]
-                retval[index]['Type'] = 'D*n'
-                retval[index]['Value'] = working_buffer
-                index += 1
-            elif local_type == 13: # N*1 Unsigned nibble
-                working_buffer = buffer_remainer[0:1]
-                buffer_remainer = buffer_remainer[1:]
-                retval[index]['Type'] = 'N*1'
-                retval[index]['Value'], = struct.unpack("%sB" % buffer_endian, working_buffer) & 0x0F
-                index += 1
-            else:
-                raise STDFError("Vn_decode() : unsupported type '%d' in V*n" % local_type)
-        return retval
+        from ATE.data.STDF.codec import decode_Vn
+        return decode_Vn(BUFF, endian)[0]
+
+    def Vn_encode(self, items, endian):
+        '''
+        This method packs a list of (Type, Value) tuples as V*n field, the inverse of Vn_decode
+        '''
+        from ATE.data.STDF.codec import encode_Vn
+        return encode_Vn(items, endian)
 
     def __len__(self):
         retval = 0
@@ -1715,29 +1085,14 @@ class STDR(ABC):
         '''
         Method that packs the whole record and returns the packed version.
         '''
-        sequence = {}
-        header = b''
-        body = b''
-
-        # create the sequence order
-        for field in self.fields:
-            sequence[self.fields[field]['#']] = field
-
-        # pack the body
-        for item in range(3, len(sequence)):
-            body += self._pack_item(sequence[item])
-        self._update_rec_len()
-
-        # check the body length against the REC_LEN
-        if self.get_fields('REC_LEN')[3] != len(body):
-            raise STDFError("%s.pack() length error %s != %s" % (self.id, self.get_fields('REC_LEN')[3], len(body)))
-
-        # pack the header
-        for item in range(0, 3):
-            header += self._pack_item(sequence[item])
-
-        # assemble the record
-        retval = header + body
+        from ATE.data.STDF.codec import record_codec
+        stats = instrumentation.current
+        if stats is None:
+            retval = record_codec(self).pack(self)
+        else:
+            start = time.perf_counter()
+            retval = record_codec(self).pack(self)
+            stats.packed(self.id, len(retval), time.perf_counter() - start)
 
         if self.local_debug: print("%s.pack()\n   '%s'\n   %s bytes" % (self.id, hexify(retval), len(retval)))
         return retval
@@ -3046,6 +2401,7 @@ Location:
             }
         else:
             raise STDFError("%s object creation error: unsupported version '%s'" % (self.id, version))
+        self.codec_key = (BSR__ADDR_SIZ, BSR__WC_SIZ) # (the sizes are not in the record, see ATE.data.STDF.codec.record_codec)
         self._default_init(endian, record)
 
 class NMR(STDR):
@@ -3974,8 +3330,8 @@ Location:
                 'LIM_INDX' : {'#' : 35, 'Type' : 'xU*2', 'Ref' : 'LIM_CNT',                'Value' : None, 'Text' : 'Array of PMR unique limit specs       ', 'Missing' : []     },
                 'LIM_SPEC' : {'#' : 36, 'Type' : 'xU*4', 'Ref' : 'LIM_CNT',                'Value' : None, 'Text' : "Array of fail datalog limits for PMR's", 'Missing' : []     },
                 'COND_LST' : {'#' : 37, 'Type' : 'xC*n', 'Ref' : 'COND_CNT',               'Value' : None, 'Text' : 'Array of test condition (Name=value)  ', 'Missing' : []     },
-                'CYC_CNT'  : {'#' : 38, 'Type' : 'U*2',  'Ref' : None,                     'Value' : None, 'Text' : 'Count (k) of entries in CYC_OFST array', 'Missing' : 0      },
-                'CYC_OFST' : {'#' : 39, 'Type' : 'xU*f', 'Ref' : ('CYC_CNT', 'CYC_SIZE'),  'Value' : None, 'Text' : 'Array of cycle nrs relat to CYC_BASE  ', 'Missing' : []     },
+                'CYCO_CNT' : {'#' : 38, 'Type' : 'U*2',  'Ref' : None,                     'Value' : None, 'Text' : 'Count (k) of entries in CYC_OFST array', 'Missing' : 0      },
+                'CYC_OFST' : {'#' : 39, 'Type' : 'xU*f', 'Ref' : ('CYCO_CNT', 'CYC_SIZE'), 'Value' : None, 'Text' : 'Array of cycle nrs relat to CYC_BASE  ', 'Missing' : []     },
                 'PMR_CNT'  : {'#' : 40, 'Type' : 'U*2',  'Ref' : None,                     'Value' : None, 'Text' : 'Count (k) of entries in the PMR_INDX  ', 'Missing' : 0      },
                 'PMR_INDX' : {'#' : 41, 'Type' : 'xU*f', 'Ref' : ('PMR_CNT', 'PMR_SIZE'),  'Value' : None, 'Text' : 'Array of PMR Indexes (All Formats)    ', 'Missing' : []     },
                 'CHN_CNT'  : {'#' : 42, 'Type' : 'U*2',  'Ref' : None,                     'Value' : None, 'Text' : 'Count (k) of entries in the CHN_NUM   ', 'Missing' : 0      },
@@ -4449,6 +3805,10 @@ def read_record(fd, RHF):
     return REC_LEN, REC_TYP, REC_SUB, header+footer
 
 def read_indexed_record(fd, fp, RHF):
+    '''
+    This method will read the record at (uncompressed) offset fp from fd with record header format RHF.
+    fd must be seekable, for compressed files use ATE.utils.seekable.open_seekable
+    '''
     fd.seek(fp)
     header = fd.read(4)
     REC_LEN, REC_TYP, REC_SUB = struct.unpack(RHF, header)
@@ -4460,7 +3820,8 @@ class records_from_file(object):
     Generator class to run over the records in FileName.
     The return values are 4-fold : REC_LEN, REC_TYP, REC_SUB and REC
     REC is the complete record (including REC_LEN, REC_TYP & REC_SUB)
-    if unpack indicates if REC is to be the raw record or the unpacked object.
+    if unpack indicates if REC is to be the raw record or the unpacked object,
+    with unpack='lazy' REC is a LazyRecord (decoding fields on first access).
     of_interest can be a list of records to return. By default of_interest is void
     meaning all records (of FileName's STDF Version) are used.
     '''
@@ -4530,20 +3891,29 @@ class records_from_file(object):
                         raise StopIteration()
                     else:
                         if self.unpack:
-                            return REC_LEN, REC_TYP, REC_SUB, create_record_object(self.version, self.endian, (REC_TYP, REC_SUB), header+footer)
+                            return REC_LEN, REC_TYP, REC_SUB, create_record_object(self.version, self.endian, (REC_TYP, REC_SUB), header+footer, self.unpack == 'lazy')
                         else:
                             return REC_LEN, REC_TYP, REC_SUB, header+footer
 
 def objects_from_indexed_file(FileName, index, records_of_interest=None):
     '''
-     This is a Generator of records (not in order!)
+     This is a Generator of records (in file order)
+
+     index maps REC_ID to the (uncompressed) offsets of the records, this can be a dictionary or an STDFIndex (sidecar).
+     FileName may be compressed, the records are then fetched through the checkpoint index (see ATE.utils.seekable)
+     For access per part, see ATE.data.STDF.parts.PartReader
     '''
+    from ATE.utils.seekable import open_seekable
     if not isinstance(FileName, str): raise STDFError("'%s' is not a string.")
     if not os.path.exists(FileName): raise STDFError("'%s' does not exist")
-    endian = get_STDF_setup_from_file(FileName)[0]
+    fd = open_seekable(FileName)
+    fd.seek(4)
+    CPU_TYPE, STDF_VER = struct.unpack('BB', fd.read(2))
+    if CPU_TYPE == 1: endian = '>'
+    elif CPU_TYPE == 2: endian = '<'
+    else: raise STDFError("'%s' has an unsupported CPU_TYPE (%s)" % (FileName, CPU_TYPE))
     RLF = '%sH' % endian
-    version = 'V%s' % struct.unpack('B', get_bytes_from_file(FileName, 5, 1))
-    fd = open(FileName, 'rb')
+    version = 'V%s' % STDF_VER
 
     ALL = list(id_to_ts(version).keys())
     if records_of_interest==None:
@@ -4556,11 +3926,20 @@ def objects_from_indexed_file(FileName, index, records_of_interest=None):
                     roi.append(item)
     else:
         raise STDFError("objects_from_indexed_file(%s, index, records_of_interest) : Unsupported records_of_interest" % (FileName, records_of_interest))
+    positions = []
     for REC_ID in roi:
-        if REC_ID in index:
-            for fp in index[REC_ID]:
-                OBJ = create_record_object(version, endian, REC_ID, get_record_from_file_at_position(fd, fp, RLF))
-                yield OBJ
+        if hasattr(index, 'record_ids'): # STDFIndex
+            fps = index.offsets(REC_ID).tolist()
+        else:
+            fps = index.get(REC_ID, [])
+        positions.extend((fp, REC_ID) for fp in fps)
+    positions.sort()
+    try:
+        for fp, REC_ID in positions:
+            OBJ = create_record_object(version, endian, REC_ID, get_record_from_file_at_position(fd, fp, RLF))
+            yield OBJ
+    finally:
+        fd.close()
 
 # class xrecords_from_file(object):
 #     '''
@@ -4719,12 +4098,17 @@ def objects_from_indexed_file(FileName, index, records_of_interest=None):
 
 
 
-def create_record_object(Version, Endian, REC_ID, REC=None):
+def create_record_object(Version, Endian, REC_ID, REC=None, lazy=False):
     '''
     This function will create and return the appropriate Object for REC
     based on REC_ID. REC_ID can be a 2-element tuple or a string.
     If REC is not None, then the record will also be unpacked.
+    If lazy is True (and REC is not None) a LazyRecord is returned, that only
+    decodes the fields that are asked for (see ATE.data.STDF.lazy)
     '''
+    if lazy and REC is not None:
+        from ATE.data.STDF.lazy import lazy_record_object
+        return lazy_record_object(Version, Endian, REC_ID, REC)
     retval = None
     REC_TYP=-1
     REC_SUB=-1
@@ -4809,8 +4193,35 @@ def wafer_map(data, parameter=None):
         'SOFT_BIN'
         'PART_PF'
 
+    data can also be a dictionary of (NumPy) arrays with these columns.
+    Returns a dictionary {(LOT_ID, WAFER_ID) : map}, the maps are 2-D arrays with common bounds (see ATE.data.STDF.wafermap)
     '''
-    pass
+    import numpy as np
+    from ATE.data.STDF.wafermap import rasterize, bounds_of
+
+    columns = list(data.keys())
+    if parameter is None:
+        for name in ['HARD_BIN', 'SOFT_BIN', 'PART_PF']:
+            if name in columns:
+                parameter = name
+                break
+        else:
+            raise STDFError("wafer_map : no parameter given and none of 'HARD_BIN', 'SOFT_BIN' or 'PART_PF' in the data")
+    for name in ['X_COORD', 'Y_COORD', 'LOT_ID', 'WAFER_ID', parameter]:
+        if name not in columns:
+            raise STDFError("wafer_map : the data has no '%s' column" % name)
+    X_COORD, Y_COORD = np.asarray(data['X_COORD']), np.asarray(data['Y_COORD'])
+    values = np.asarray(data[parameter])
+    LOT_IDs, lots = np.unique(np.asarray(data['LOT_ID']).astype(str), return_inverse=True)
+    WAFER_IDs, wafers = np.unique(np.asarray(data['WAFER_ID']).astype(str), return_inverse=True)
+    wafers = lots.reshape(-1) * len(WAFER_IDs) + wafers.reshape(-1)
+    bounds = bounds_of(X_COORD, Y_COORD)
+    retval = {}
+    for wafer in np.unique(wafers):
+        selection = wafers == wafer
+        key = (str(LOT_IDs[wafer // len(WAFER_IDs)]), str(WAFER_IDs[wafer % len(WAFER_IDs)]))
+        retval[key] = rasterize(X_COORD[selection], Y_COORD[selection], values[selection], bounds=bounds)[0]
+    return retval
 
 
 
@@ -4822,12 +4233,10 @@ def get_bytes_from_file(FileName, Offset, Number):
     if not isinstance(Offset, int): raise STDFError("Offset is not an integer")
     if not isinstance(Number, int): raise STDFError("Number is not an integer")
     if not os.path.exists(FileName): raise STDFError("'%s' does not exist")
-    if guess_type(FileName)[1]=='gzip':
-        raise NotImplemented("Not yet implemented")
-    else:
-        with open(FileName, 'rb') as fd:
-            fd.seek(Offset)
-            retval = fd.read(Number)
+    from ATE.utils.seekable import open_seekable
+    with open_seekable(FileName) as fd:
+        fd.seek(Offset)
+        retval = fd.read(Number)
     return retval
 
 def get_record_from_file_at_position(fd, offset, REC_LEN_FMT):
@@ -4871,21 +4280,23 @@ def get_MIR_from_file(FileName):
 def get_partcount_from_file(FileName):
     '''
     This function will return the number of parts contained in FileName.
-    it must *NOT* be guaranteed that FileName exists or is an STDF File.
+    it must *NOT* be guaranteed that FileName exists or is an STDF File (None is returned if not).
+    The PCR is read from the end of the file (see ATE.data.STDF.summary), only if there is none the PRR's are counted.
     '''
+    from ATE.data.STDF.summary import count_parts
+    return count_parts(FileName)
 
-def save_STDF_index(FileName, index):
+def save_STDF_index(FileName, index=None):
     '''
+    This function saves the (sidecar) index of FileName next to it (see ATE.data.STDF.sidecar) and returns the name of the sidecar.
+    index is the STDFIndex of FileName, if None it is build.
     '''
-    if os.path.exists(FileName) and os.path.isfile(FileName):
-        Path, Name = os.path.split(FileName)
-        Base, Ext = os.path.splitext(Name)
-        if Ext in ['.stdf', '.pbz2']:
-            pickle_file = os.path.join(Path, "%s.pbz2" % Base)
-        else:
-            raise Exception("FileName should have '.stdf' or '.pbz2' extension")
-        with bz2.open(pickle_file, 'wb') as fd:
-            pickle.dump(index, fd)
+    from ATE.data.STDF.sidecar import build_STDF_index, sidecar_name
+    if index is None:
+        index = build_STDF_index(FileName)
+    elif not hasattr(index, 'save'):
+        raise STDFError("save_STDF_index(%s) : index should be an STDFIndex (see ATE.data.STDF.sidecar)" % FileName)
+    return index.save(sidecar_name(FileName))
 
 
 
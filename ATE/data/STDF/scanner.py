@@ -0,0 +1,333 @@
+'''
+Created on Oct 18, 2026
+
+Memory mapped (zero-copy) scanner for uncompressed STDF files.
+
+The REC_LEN chain is walked once, only collecting the record offsets, the
+REC_LEN, REC_TYP and REC_SUB columns are then gathered with NumPy from the
+mapping. Records are handed out as memoryview slices of the mapping, so no
+bytes are copied unless the caller does so.
+
+    scanner = STDFScanner(FileName)
+    for REC_LEN, REC_TYP, REC_SUB, REC in scanner:  # same as records_from_file
+        ...
+    for REC in scanner.records('PTR'):
+        ptr = PTR(scanner.version, scanner.endian, REC)
+'''
+import mmap
+import os
+import struct
+from array import array
+from multiprocessing import Pool
+
+import numpy as np
+
+from ATE.data.STDF.records import RecordDefinitions
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import ts_to_id
+
+# dtype of the offset index, REC_LEN is the length of the record body (without the 4 byte header)
+index_dtype = np.dtype([('offset', np.uint64), ('REC_LEN', np.uint16), ('REC_TYP', np.uint8), ('REC_SUB', np.uint8)])
+
+
+def scan_offsets(buffer, endian, start=0, stop=None):
+    '''
+    Walks the REC_LEN chain of buffer from start up to stop, and returns the record offsets as a NumPy array.
+    A record that doesn't fit completely in buffer[:stop] is not included.
+    '''
+    if stop is None:
+        stop = len(buffer)
+    unpack_from = struct.Struct(endian + 'H').unpack_from
+    offsets = array('q')
+    append = offsets.append
+    offset = start
+    end = stop - 4
+    while offset <= end:
+        next_offset = offset + 4 + unpack_from(buffer, offset)[0]
+        if next_offset > stop:
+            break
+        append(offset)
+        offset = next_offset
+    return np.frombuffer(offsets, dtype=np.int64)
+
+
+def valid_record_types(version):
+    '''
+    Returns the set of (REC_TYP, REC_SUB) tuples that are defined for version.
+    '''
+    return set(TS for TS in RecordDefinitions if version in RecordDefinitions[TS])
+
+
+def resync(buffer, endian, start, stop, valid_ts, depth=8):
+    '''
+    Returns the first offset in buffer[start:stop] that looks like a record boundary, None if there is none.
+
+    An offset is accepted if it, and the next depth-1 records of the REC_LEN chain starting there, all have a
+    (REC_TYP, REC_SUB) in valid_ts. (a chain that ends exactly at the end of buffer is also accepted)
+    '''
+    unpack_from = struct.Struct(endian + 'HBB').unpack_from
+    size = len(buffer)
+    for candidate in range(start, min(stop, size - 3)):
+        offset = candidate
+        for _ in range(depth):
+            if offset == size:
+                break
+            if offset > size - 4:
+                offset = None
+                break
+            REC_LEN, REC_TYP, REC_SUB = unpack_from(buffer, offset)
+            if (REC_TYP, REC_SUB) not in valid_ts:
+                offset = None
+                break
+            offset += 4 + REC_LEN
+        if offset is not None and offset <= size:
+            return candidate
+    return None
+
+
+def _scan_chunk(arguments):
+    '''
+    Worker of parallel_scan_offsets : returns the offsets of the records that start in [start, stop)
+    '''
+    FileName, endian, version, start, stop = arguments
+    with open(FileName, 'rb') as fd:
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        first = resync(mm, endian, start, stop, valid_record_types(version))
+        if first is None:
+            return np.zeros(0, dtype=np.int64)
+        unpack_from = struct.Struct(endian + 'H').unpack_from
+        offsets = array('q')
+        append = offsets.append
+        offset = first
+        size = len(mm)
+        while offset < stop and offset <= size - 4:
+            next_offset = offset + 4 + unpack_from(mm, offset)[0]
+            if next_offset > size:
+                break
+            append(offset)
+            offset = next_offset
+        return np.frombuffer(offsets, dtype=np.int64)
+    finally:
+        mm.close()
+
+
+def merge_chunk_offsets(buffer, endian, chunks, stops):
+    '''
+    Merges the per chunk offsets (as returned by _scan_chunk) into one chain.
+
+    Each chunk is checked to continue where the previous one ended, if not (bad resync or a record spanning the
+    complete chunk) the REC_LEN chain is followed from the end of the previous chunk until it hits an offset of
+    the chunk, from there on the chains are the same. The result is thus identical to a sequential scan.
+    '''
+    unpack_from = struct.Struct(endian + 'H').unpack_from
+    size = len(buffer)
+    merged = []
+    end = 0
+    for offsets, stop in zip(chunks, stops):
+        if not len(offsets) or offsets[0] != end:
+            walked = array('q')
+            matched = False
+            while end < stop and end <= size - 4:
+                position = np.searchsorted(offsets, end)
+                if position < len(offsets) and offsets[position] == end:
+                    matched = True
+                    break
+                next_offset = end + 4 + unpack_from(buffer, end)[0]
+                if next_offset > size:
+                    break
+                walked.append(end)
+                end = next_offset
+            merged.append(np.frombuffer(walked, dtype=np.int64))
+            offsets = offsets[position:] if matched else offsets[:0]
+        if len(offsets):
+            merged.append(offsets)
+            end = int(offsets[-1]) + 4 + unpack_from(buffer, int(offsets[-1]))[0]
+    if not merged:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(merged)
+
+
+def parallel_scan_offsets(FileName, endian, version, workers=None, chunk_size=None):
+    '''
+    Same as scan_offsets for a whole (uncompressed) file, but the file is split in chunks that are scanned by
+    a pool of worker processes, each resyncing to a record boundary at the start of its chunk.
+    '''
+    size = os.path.getsize(FileName)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1 << 20, -(-size // (workers * 4)))
+    starts = list(range(0, size, chunk_size))
+    stops = starts[1:] + [size]
+    arguments = [(FileName, endian, version, start, stop) for start, stop in zip(starts, stops)]
+    if workers > 1 and len(arguments) > 1:
+        with Pool(min(workers, len(arguments))) as pool:
+            chunks = pool.map(_scan_chunk, arguments)
+    else:
+        chunks = [_scan_chunk(argument) for argument in arguments]
+    with open(FileName, 'rb') as fd:
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return merge_chunk_offsets(mm, endian, chunks, stops)
+    finally:
+        mm.close()
+
+
+def index_from_offsets(buffer, endian, offsets):
+    '''
+    Returns the offset index (see index_dtype) for the given record offsets in buffer.
+    '''
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    retval = np.empty(len(offsets), dtype=index_dtype)
+    retval['offset'] = offsets
+    if endian == '<':
+        retval['REC_LEN'] = data[offsets].astype(np.uint16) | (data[offsets + 1].astype(np.uint16) << 8)
+    else:
+        retval['REC_LEN'] = (data[offsets].astype(np.uint16) << 8) | data[offsets + 1].astype(np.uint16)
+    retval['REC_TYP'] = data[offsets + 2]
+    retval['REC_SUB'] = data[offsets + 3]
+    return retval
+
+
+def endian_and_version_from_FAR(FAR):
+    '''
+    Returns the (endian, version) from the (first 6 bytes of the) FAR.
+    '''
+    if len(FAR) < 6 or FAR[2] != 0 or FAR[3] != 10:
+        raise STDFError("Not an STDF file (no FAR found)")
+    CPU_TYPE, STDF_VER = FAR[4], FAR[5]
+    if CPU_TYPE == 1:
+        endian = '>'
+    elif CPU_TYPE == 2:
+        endian = '<'
+    else:
+        raise STDFError("Unsupported CPU_TYPE %s in FAR" % CPU_TYPE)
+    return endian, 'V%s' % STDF_VER
+
+
+class STDFScanner(object):
+    '''
+    Memory mapped scanner for an uncompressed STDF file.
+
+    The index is a NumPy structured array (see index_dtype), build on first use.
+    If workers > 1 (None = all cpu's), the file is scanned in parallel (see parallel_scan_offsets)
+    The records are memoryview slices of the mapping.
+    '''
+
+    def __init__(self, FileName, workers=1):
+        self.FileName = FileName
+        self.workers = workers
+        self.size = os.path.getsize(FileName)
+        if self.size < 6:
+            raise STDFError("'%s' is not an STDF file" % FileName)
+        with open(FileName, 'rb') as fd:
+            self.mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        try:
+            self.endian, self.version = endian_and_version_from_FAR(self.mm[:6])
+        except STDFError:
+            self.close()
+            raise STDFError("'%s' is not an (uncompressed) STDF file" % FileName)
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        Releases the mapping. If memoryviews of records are still alive, the mapping is released when they are.
+        '''
+        if self.mm is None:
+            return
+        self._index = None
+        self.view.release()
+        try:
+            self.mm.close()
+        except BufferError: # there are still exported record views
+            pass
+        self.mm = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            if self.workers == 1:
+                offsets = scan_offsets(self.mm, self.endian)
+            else:
+                offsets = parallel_scan_offsets(self.FileName, self.endian, self.version, self.workers)
+            self._index = index_from_offsets(self.mm, self.endian, offsets)
+        return self._index
+
+    def __len__(self):
+        return len(self.index)
+
+    def record(self, n):
+        '''
+        Returns the n'th record (including header) as a memoryview.
+        '''
+        offset = int(self.index['offset'][n])
+        return self.view[offset:offset + 4 + int(self.index['REC_LEN'][n])]
+
+    def record_at(self, offset):
+        '''
+        Returns the record (including header) at offset as a memoryview.
+        '''
+        REC_LEN = struct.unpack_from(self.endian + 'H', self.mm, offset)[0]
+        return self.view[offset:offset + 4 + REC_LEN]
+
+    def mask(self, *REC_IDs):
+        '''
+        Returns a boolean mask over the index for the given record ID's (eg: 'PTR', 'FTR')
+        '''
+        TS2ID = ts_to_id(self.version)
+        ID2TS = {TS2ID[TS]: TS for TS in TS2ID}
+        index = self.index
+        retval = np.zeros(len(index), dtype=bool)
+        for REC_ID in REC_IDs:
+            if REC_ID not in ID2TS:
+                raise STDFError("Unknown record '%s' for version %s" % (REC_ID, self.version))
+            REC_TYP, REC_SUB = ID2TS[REC_ID]
+            retval |= (index['REC_TYP'] == REC_TYP) & (index['REC_SUB'] == REC_SUB)
+        return retval
+
+    def offsets(self, *REC_IDs):
+        '''
+        Returns the offsets of the given record ID's (all records if none given) as a NumPy array.
+        '''
+        if not REC_IDs:
+            return self.index['offset']
+        return self.index['offset'][self.mask(*REC_IDs)]
+
+    def records(self, *REC_IDs):
+        '''
+        Iterator over the (memoryviews of the) records of the given ID's (all records if none given).
+        '''
+        index = self.index if not REC_IDs else self.index[self.mask(*REC_IDs)]
+        view = self.view
+        for offset, REC_LEN in zip(index['offset'].tolist(), index['REC_LEN'].tolist()):
+            yield view[offset:offset + 4 + REC_LEN]
+
+    def __iter__(self):
+        '''
+        Yields (REC_LEN, REC_TYP, REC_SUB, REC) like records_from_file does, but REC is a memoryview.
+        '''
+        index = self.index
+        view = self.view
+        for offset, REC_LEN, REC_TYP, REC_SUB in zip(index['offset'].tolist(), index['REC_LEN'].tolist(), index['REC_TYP'].tolist(), index['REC_SUB'].tolist()):
+            yield REC_LEN, REC_TYP, REC_SUB, view[offset:offset + 4 + REC_LEN]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    for workers in [1, None]:
+        start = time.time()
+        with STDFScanner(FileName, workers) as scanner:
+            records = len(scanner)
+        stop = time.time()
+        print("%s records indexed in %.3f seconds (%.1f MB/s) with %s worker(s)" % (records, stop - start, os.path.getsize(FileName) / (stop - start) / 1e6, workers or os.cpu_count()))
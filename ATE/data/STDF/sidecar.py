@@ -0,0 +1,449 @@
+'''
+Created on Oct 18, 2026
+
+Persistent (sidecar) index for STDF files.
+
+Indexing a big STDF file means walking the complete REC_LEN chain, the result
+of that is saved next to the STDF file (FileName + '.sdx') so that opening the
+same file a second time only needs to read a small header.
+
+The sidecar is a binary file with a columnar layout :
+
+    header  : magic (8 bytes) + format version (U*2) + reserved (U*2) + meta length (U*4), little endian
+    meta    : utf-8 encoded JSON, padded to a multiple of 8 bytes
+    columns : raw (little endian) NumPy arrays, each 8 byte aligned
+
+The meta holds the source file size, mtime and (optional) content hash, the
+endian and version of the STDF file, the record types in the file and the
+directory of the columns. The sidecar is only used if the size and mtime of
+the source still match. The columns are only read (mapped) when they are
+accessed.
+
+Columns :
+    'offset', 'REC_LEN', 'REC_TYP', 'REC_SUB'    : the record index (offsets in the uncompressed data, U*4 below 4 GiB)
+    'parts/PIR', 'parts/PRR'                     : the PIR and PRR offset of each part (PRR = -1 if the part is not closed)
+    'parts/HEAD_NUM', 'parts/SITE_NUM'           : the head and site of each part
+    'tests/TEST_NUM'                             : the (sorted) unique test numbers of the PTR/MPR/FTR's
+    'tests/start'                                : postings of tests/TEST_NUM[i] are at [start[i]:start[i+1]]
+    'tests/row', 'tests/part'                    : the postings : record (row in the record index) and part number
+
+The record offsets are only stored once (in 'offset'), these columns are
+derived from it when they are accessed :
+    'offsets/<REC_ID>'                           : the record offsets per record type
+    'tests/offset'                               : the record offset of the postings
+'''
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import ts_to_id
+from ATE.data.STDF.scanner import STDFScanner
+from ATE.data.STDF.scanner import index_dtype
+from ATE.data.STDF.utils import is_STDF
+from ATE.data.STDF.utils import is_supported_compressed_STDF_file
+from ATE.data.STDF.utils import records_from_file
+
+sidecar_extension = '.sdx'
+sidecar_magic = b'STDF-SDX'
+sidecar_version = 3 # 2 : PRR's close the last PIR of their head/site, 3 : the offsets are stored once
+
+_header = struct.Struct('<8sHHI')
+
+# record types that open/close a part and that hold a test result
+PIR_TS = (5, 10)
+PRR_TS = (5, 20)
+TEST_TS = [(15, 10), (15, 15), (15, 20)] # PTR, MPR, FTR
+
+
+def sidecar_name(FileName):
+    '''
+    Returns the name of the sidecar index for FileName.
+    '''
+    return FileName + sidecar_extension
+
+
+def _is_ts(index, TS):
+    return (index['REC_TYP'] == TS[0]) & (index['REC_SUB'] == TS[1])
+
+
+def _scan_uncompressed(FileName, workers=1):
+    '''
+    Returns endian, version, index, HEAD_NUM, SITE_NUM and TEST_NUM (the latter 3 per record) for an uncompressed file.
+    '''
+    with STDFScanner(FileName, workers) as scanner:
+        index = scanner.index.copy()
+        data = np.frombuffer(scanner.mm, dtype=np.uint8)
+        offsets = index['offset'].astype(np.int64)
+        HEAD_NUM = np.zeros(len(index), dtype=np.uint8)
+        SITE_NUM = np.zeros(len(index), dtype=np.uint8)
+        TEST_NUM = np.zeros(len(index), dtype=np.uint32)
+
+        parts = (_is_ts(index, PIR_TS) | _is_ts(index, PRR_TS)) & (index['REC_LEN'] >= 2)
+        HEAD_NUM[parts] = data[offsets[parts] + 4]
+        SITE_NUM[parts] = data[offsets[parts] + 5]
+
+        tests = np.zeros(len(index), dtype=bool)
+        for TS in TEST_TS:
+            tests |= _is_ts(index, TS)
+        tests &= index['REC_LEN'] >= 6
+        at = offsets[tests]
+        shifts = [0, 8, 16, 24] if scanner.endian == '<' else [24, 16, 8, 0]
+        for byte, shift in enumerate(shifts):
+            TEST_NUM[tests] |= data[at + 4 + byte].astype(np.uint32) << np.uint32(shift)
+        HEAD_NUM[tests] = data[at + 8]
+        SITE_NUM[tests] = data[at + 9]
+        del data
+        return scanner.endian, scanner.version, index, HEAD_NUM, SITE_NUM, TEST_NUM
+
+
+def _scan_stream(FileName):
+    '''
+    Same as _scan_uncompressed, but for a (compressed) stream.
+    '''
+    records = records_from_file(FileName)
+    if records.fd is None:
+        raise STDFError("'%s' is not a (supported) STDF file" % FileName)
+    test_num = struct.Struct(records.endian + 'I')
+    tests = set(TEST_TS)
+    index = []
+    HEAD_NUM = []
+    SITE_NUM = []
+    TEST_NUM = []
+    offset = 0
+    for REC_LEN, REC_TYP, REC_SUB, REC in records:
+        index.append((offset, REC_LEN, REC_TYP, REC_SUB))
+        head = site = number = 0
+        TS = (REC_TYP, REC_SUB)
+        if (TS == PIR_TS or TS == PRR_TS) and REC_LEN >= 2:
+            head, site = REC[4], REC[5]
+        elif TS in tests and REC_LEN >= 6:
+            number = test_num.unpack_from(REC, 4)[0]
+            head, site = REC[8], REC[9]
+        HEAD_NUM.append(head)
+        SITE_NUM.append(site)
+        TEST_NUM.append(number)
+        offset += 4 + REC_LEN
+    return (records.endian, records.version, np.array(index, dtype=index_dtype),
+            np.array(HEAD_NUM, dtype=np.uint8), np.array(SITE_NUM, dtype=np.uint8), np.array(TEST_NUM, dtype=np.uint32))
+
+
+def parts_of(offsets, HEAD_NUM, SITE_NUM, PIR_offsets, PIR_HEAD_NUM, PIR_SITE_NUM):
+    '''
+    Returns for each record (at offsets, on HEAD_NUM/SITE_NUM) the part it belongs to, this is the index of
+    the last PIR (in PIR_offsets) before it on the same head and site, -1 if there is none.
+    '''
+    site_key = np.asarray(HEAD_NUM).astype(np.int32) << 8 | SITE_NUM
+    PIR_key = np.asarray(PIR_HEAD_NUM).astype(np.int32) << 8 | PIR_SITE_NUM
+    retval = np.full(len(offsets), -1, dtype=np.int64)
+    for key in np.unique(site_key).tolist():
+        members = np.flatnonzero(site_key == key)
+        opened = np.flatnonzero(PIR_key == key)
+        if len(opened) == 0:
+            continue
+        position = np.searchsorted(PIR_offsets[opened], offsets[members], side='right') - 1
+        retval[members] = np.where(position >= 0, opened[np.maximum(position, 0)], -1)
+    return retval
+
+
+def _record_types(version, index):
+    '''
+    Returns {REC_ID : [REC_TYP, REC_SUB, count]} of the records in the index.
+    '''
+    TS2ID = ts_to_id(version)
+    TS = index['REC_TYP'].astype(np.uint16) << 8 | index['REC_SUB']
+    codes, counts = np.unique(TS, return_counts=True)
+    retval = {}
+    for code, count in zip(codes.tolist(), counts.tolist()):
+        REC_ID = TS2ID.get((code >> 8, code & 0xFF), '%d_%d' % (code >> 8, code & 0xFF))
+        retval[REC_ID] = [code >> 8, code & 0xFF, count]
+    return retval
+
+
+def _columns_from_scan(version, index, HEAD_NUM, SITE_NUM, TEST_NUM):
+    '''
+    Builds the sidecar columns from the record index and the per record HEAD_NUM/SITE_NUM/TEST_NUM.
+    '''
+    columns = {}
+    offsets = index['offset'].astype(np.uint64)
+    size = int(offsets[-1]) + 4 + int(index['REC_LEN'][-1]) if len(index) else 0
+    columns['offset'] = offsets.astype(np.uint32) if size <= 0xFFFFFFFF else offsets
+    columns['REC_LEN'] = index['REC_LEN']
+    columns['REC_TYP'] = index['REC_TYP']
+    columns['REC_SUB'] = index['REC_SUB']
+
+    # parts : a PRR closes the last PIR before it on its head/site, a PIR that is followed by another PIR on
+    # its head/site before a PRR (an aborted part) is not closed
+    PIRs = np.flatnonzero(_is_ts(index, PIR_TS))
+    PRRs = np.flatnonzero(_is_ts(index, PRR_TS))
+    PIR_closed_by = np.full(len(PIRs), -1, dtype=np.int64)
+    closes = parts_of(PRRs, HEAD_NUM[PRRs], SITE_NUM[PRRs], PIRs, HEAD_NUM[PIRs], SITE_NUM[PIRs])
+    closing = closes >= 0
+    closed, first = np.unique(closes[closing], return_index=True) # (only the first PRR of a part)
+    PIR_closed_by[closed] = offsets[PRRs[closing][first]].astype(np.int64)
+    columns['parts/PIR'] = offsets[PIRs].astype(np.int64)
+    columns['parts/PRR'] = PIR_closed_by
+    columns['parts/HEAD_NUM'] = HEAD_NUM[PIRs]
+    columns['parts/SITE_NUM'] = SITE_NUM[PIRs]
+
+    # test postings : a test record belongs to the last part opened on its head/site
+    tests = np.zeros(len(index), dtype=bool)
+    for TS in TEST_TS:
+        tests |= _is_ts(index, TS)
+    tests = np.flatnonzero(tests)
+    part = parts_of(tests, HEAD_NUM[tests], SITE_NUM[tests], PIRs, HEAD_NUM[PIRs], SITE_NUM[PIRs])
+    order = np.lexsort((tests, TEST_NUM[tests]))
+    numbers = TEST_NUM[tests][order]
+    unique = np.unique(numbers)
+    columns['tests/TEST_NUM'] = unique
+    columns['tests/start'] = np.append(np.searchsorted(numbers, unique), len(numbers)).astype(np.int64)
+    columns['tests/row'] = tests[order].astype(np.uint32 if len(index) <= 0xFFFFFFFF else np.uint64)
+    columns['tests/part'] = part[order].astype(np.int32)
+    return columns
+
+
+class STDFIndex(object):
+    '''
+    The (sidecar) index of an STDF file, use build_STDF_index, load_STDF_index or get_STDF_index to get one.
+    '''
+
+    def __init__(self, FileName, meta, columns=None, mm=None):
+        self.FileName = FileName
+        self.meta = meta
+        self.mm = mm
+        self._columns = {} if columns is None else columns
+        self.endian = meta['endian']
+        self.version = meta['version']
+
+    def close(self):
+        if self.mm is not None:
+            self._columns = {}
+            try:
+                self.mm.close()
+            except BufferError: # columns are still referenced
+                pass
+            self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.meta['records']
+
+    def names(self):
+        '''
+        Returns a list of the stored column names (see the module docstring for the derived ones).
+        '''
+        return list(self.meta['columns'])
+
+    def column(self, name):
+        '''
+        Returns the column 'name' as a (read only) NumPy array.
+        '''
+        retval = self._columns.get(name)
+        if retval is None:
+            if name in self.meta['columns']:
+                dtype, offset, count = self.meta['columns'][name]
+                retval = np.frombuffer(self.mm, dtype=np.dtype(dtype), count=count, offset=offset)
+            else:
+                retval = self._derived(name)
+                if retval is None:
+                    raise STDFError("'%s' is not a column of the index of '%s'" % (name, self.FileName))
+            self._columns[name] = retval
+        return retval
+
+    def _derived(self, name):
+        '''
+        Returns the derived column 'name', None if there is no such column.
+        '''
+        kind, _, REC_ID = name.partition('/')
+        if kind == 'offsets' and REC_ID in self.meta['record_types']:
+            REC_TYP, REC_SUB, _ = self.meta['record_types'][REC_ID]
+            return self.column('offset')[(self.column('REC_TYP') == REC_TYP) & (self.column('REC_SUB') == REC_SUB)]
+        if name == 'tests/offset':
+            return self.column('offset')[self.column('tests/row')]
+        return None
+
+    @property
+    def index(self):
+        '''
+        The record index as a structured array (see ATE.data.STDF.scanner.index_dtype)
+        '''
+        retval = np.empty(len(self), dtype=index_dtype)
+        for name in index_dtype.names:
+            retval[name] = self.column(name)
+        return retval
+
+    def record_ids(self):
+        '''
+        Returns the record ID's present in the file.
+        '''
+        return list(self.meta['record_types'])
+
+    def offsets(self, REC_ID):
+        '''
+        Returns the offsets of the REC_ID records (an empty array if there are none)
+        '''
+        if REC_ID not in self.meta['record_types']:
+            return np.zeros(0, dtype=np.uint64)
+        return self.column('offsets/%s' % REC_ID)
+
+    def part_count(self):
+        return len(self.column('parts/PIR'))
+
+    def test_numbers(self):
+        return self.column('tests/TEST_NUM')
+
+    def postings(self, TEST_NUM):
+        '''
+        Returns (offsets, parts) of the records with TEST_NUM.
+        '''
+        numbers = self.column('tests/TEST_NUM')
+        position = int(np.searchsorted(numbers, TEST_NUM))
+        if position == len(numbers) or numbers[position] != TEST_NUM:
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int32)
+        start, stop = self.column('tests/start')[position:position + 2].tolist()
+        return self.column('offset')[self.column('tests/row')[start:stop]], self.column('tests/part')[start:stop]
+
+    def is_valid_for(self, FileName=None):
+        '''
+        Returns True if the index (still) matches the size and mtime of FileName.
+        '''
+        if FileName is None:
+            FileName = self.FileName
+        try:
+            stat = os.stat(FileName)
+        except OSError:
+            return False
+        return stat.st_size == self.meta['size'] and stat.st_mtime_ns == self.meta['mtime']
+
+    def save(self, SidecarName=None):
+        '''
+        Writes the index to SidecarName (default : next to the STDF file), returns the name written to.
+        '''
+        if SidecarName is None:
+            SidecarName = sidecar_name(self.FileName)
+        names = self.names()
+        arrays = [np.ascontiguousarray(self.column(name)) for name in names]
+        arrays = [array.astype(array.dtype.newbyteorder('<')) for array in arrays]
+        meta = dict(self.meta)
+        meta['columns'] = {}
+        # the column offsets depend on the meta length, so repeat until that is stable
+        meta_length = 0
+        while True:
+            offset = _header.size + meta_length
+            for name, array in zip(names, arrays):
+                meta['columns'][name] = [array.dtype.str, offset, len(array)]
+                offset += _padded(array.nbytes)
+            meta_bytes = json.dumps(meta).encode('utf-8')
+            if _padded(len(meta_bytes)) == meta_length:
+                break
+            meta_length = _padded(len(meta_bytes))
+        meta_bytes += b' ' * (meta_length - len(meta_bytes))
+        temporary = '%s.%s.tmp' % (SidecarName, os.getpid())
+        with open(temporary, 'wb') as fd:
+            fd.write(_header.pack(sidecar_magic, sidecar_version, 0, len(meta_bytes)))
+            fd.write(meta_bytes)
+            for array in arrays:
+                fd.write(array.tobytes())
+                fd.write(b'\x00' * (_padded(array.nbytes) - array.nbytes))
+        os.replace(temporary, SidecarName)
+        self.meta = meta
+        return SidecarName
+
+
+def _padded(size):
+    return (size + 7) & ~7
+
+
+def build_STDF_index(FileName, content_hash=True, workers=1):
+    '''
+    Scans FileName and returns its (in memory) STDFIndex.
+    Uncompressed files can be scanned by multiple worker processes (None = all cpu's)
+    The content hash (md5 of the uncompressed data) is optional as it means reading the whole file once more.
+    '''
+    if not is_STDF(FileName):
+        raise STDFError("'%s' is not an STDF file" % FileName)
+    stat = os.stat(FileName)
+    compressed = is_supported_compressed_STDF_file(FileName)
+    if compressed:
+        endian, version, index, HEAD_NUM, SITE_NUM, TEST_NUM = _scan_stream(FileName)
+    else:
+        endian, version, index, HEAD_NUM, SITE_NUM, TEST_NUM = _scan_uncompressed(FileName, workers)
+    columns = _columns_from_scan(version, index, HEAD_NUM, SITE_NUM, TEST_NUM)
+    meta = {
+        'source' : os.path.basename(FileName),
+        'size' : stat.st_size,
+        'mtime' : stat.st_mtime_ns,
+        'hash' : '',
+        'compressed' : compressed,
+        'endian' : endian,
+        'version' : version,
+        'records' : len(index),
+        'uncompressed_size' : int(index['offset'][-1]) + 4 + int(index['REC_LEN'][-1]) if len(index) else 0,
+        'record_types' : _record_types(version, index),
+        'columns' : {name : [columns[name].dtype.str, 0, len(columns[name])] for name in columns},
+    }
+    if content_hash:
+        from ATE.utils.hashing import file_contents_hash
+        meta['hash'] = file_contents_hash(FileName)
+    return STDFIndex(FileName, meta, columns)
+
+
+def load_STDF_index(FileName, SidecarName=None):
+    '''
+    Returns the STDFIndex of FileName from its sidecar, None if there is no (valid) sidecar.
+    Only the header is read, the columns are mapped when accessed.
+    '''
+    if SidecarName is None:
+        SidecarName = sidecar_name(FileName)
+    try:
+        with open(SidecarName, 'rb') as fd:
+            header = fd.read(_header.size)
+            if len(header) != _header.size:
+                return None
+            magic, version, _, meta_length = _header.unpack(header)
+            if magic != sidecar_magic or version != sidecar_version:
+                return None
+            meta = json.loads(fd.read(meta_length).decode('utf-8'))
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    retval = STDFIndex(FileName, meta, mm=mm)
+    if not retval.is_valid_for(FileName):
+        retval.close()
+        return None
+    return retval
+
+
+def get_STDF_index(FileName, content_hash=True, save=True, workers=1):
+    '''
+    Returns the STDFIndex of FileName, from the sidecar if it is valid, otherwise it is build (and saved if possible).
+    '''
+    retval = load_STDF_index(FileName)
+    if retval is None:
+        retval = build_STDF_index(FileName, content_hash, workers)
+        if save:
+            try:
+                retval.save()
+            except OSError: # no write access next to the STDF file, use the in-memory index
+                pass
+    return retval
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    for attempt in ['first', 'second']:
+        start = time.time()
+        index = get_STDF_index(FileName)
+        print("%s open : %s records, %s parts, %s tests in %.3f seconds" % (attempt, len(index), index.part_count(), len(index.test_numbers()), time.time() - start))
+        index.close()
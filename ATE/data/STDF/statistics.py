@@ -0,0 +1,476 @@
+'''
+Created on Oct 18, 2026
+
+Single pass (online) statistics of the parametric test results of STDF files.
+
+The PTR's are collected as raw bytes and handed over in batches (one NumPy
+structured array per batch) to per test (TEST_NUM, HEAD_NUM, SITE_NUM)
+accumulators, the results of an MPR are taken as samples of its test. An
+accumulator (TestStatistics) holds :
+
+    - the TSR counts and tallies (EXEC_CNT, FAIL_CNT, ALRM_CNT, TEST_MIN,
+      TEST_MAX, TST_SUMS and TST_SQRS).
+    - the Welford moments (count, mean, M2) of the valid results, a batch is
+      added with the parallel (Chan et al.) update, so it is numerically
+      stable and partial results can be merged.
+    - a fixed bin histogram over the test limits (plus the under/over flows).
+    - a t-digest like quantile sketch (QuantileSketch).
+
+The limits (and UNITS, TEST_TXT) of a test are taken from the first PTR (or
+MPR) of that test that has an OPT_FLAG, as the STDF specification asks. So the
+memory use is proportional to the number of tests, not to the number of
+parts, and everything is mergeable (chunks, files, processes) :
+
+    statistics = statistics_from_file('lot.std')
+    test = statistics.select()[1000]     # all heads/sites merged
+    test.mean, test.stdev(), test.Cpk(), test.quantile(0.5)
+    statistics.to_dict(1, 0)             # {TEST_NUM : {...}} of head 1, site 0
+
+    total = statistics_from_files(FileNames, workers=8)
+'''
+import concurrent.futures
+import math
+import struct
+
+import numpy as np
+
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.stream import records_from_stream
+
+
+class QuantileSketch(object):
+    '''
+    A t-digest like (merging) sketch of a distribution : the values are kept as centroids (mean, weight) that
+    are small in the tails and bigger in the middle (the k2 scale function, log(q / (1 - q))), so there are
+    O(compression) centroids and the quantiles are most accurate in the tails. Sketches can be merged.
+    '''
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []   # the values that are not merged in the centroids yet
+        self.buffered = 0
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.buffer.append(values)
+        self.buffered += len(values)
+        self.count += len(values)
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        if self.buffered >= 20 * self.compression:
+            self._compress()
+
+    def _compress(self, means=(), weights=()):
+        means = np.concatenate([self.means] + self.buffer + list(means))
+        weights = np.concatenate([self.weights] + [np.ones(len(values)) for values in self.buffer] + list(weights))
+        self.buffer = []
+        self.buffered = 0
+        if not len(means):
+            return
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+        q = (cumulative - weights / 2) / total
+        normalizer = 4 * math.log(max(total / self.compression, 1.0)) + 24
+        k = np.floor(self.compression / normalizer * np.log(q / (1 - q)))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def merge(self, other):
+        '''
+        Merges the other sketch into this one.
+        '''
+        if not other.count:
+            return
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._compress([other.means] + other.buffer, [other.weights] + [np.ones(len(values)) for values in other.buffer])
+
+    def quantile(self, q):
+        '''
+        Returns the (estimated) q quantile(s), q is a number or an array of numbers between 0 and 1.
+        '''
+        if self.buffer:
+            self._compress()
+        if not self.count:
+            return math.nan if np.isscalar(q) else np.full(len(q), math.nan)
+        cumulative = np.cumsum(self.weights)
+        positions = np.r_[0.0, cumulative - self.weights / 2, cumulative[-1]]
+        values = np.r_[self.minimum, self.means, self.maximum]
+        retval = np.interp(np.asarray(q, dtype=np.float64) * cumulative[-1], positions, values)
+        return float(retval) if np.isscalar(q) else retval
+
+
+class TestStatistics(object):
+    '''
+    The online statistics of the results of one test (on one head/site, or merged over heads/sites).
+    '''
+    __test__ = False # (not a pytest test class)
+
+    def __init__(self, TEST_NUM, HEAD_NUM=255, SITE_NUM=0, LO_LIMIT=None, HI_LIMIT=None, UNITS='', TEST_TXT='', bins=64, compression=200):
+        self.TEST_NUM = TEST_NUM
+        self.HEAD_NUM = HEAD_NUM
+        self.SITE_NUM = SITE_NUM
+        self.LO_LIMIT = LO_LIMIT
+        self.HI_LIMIT = HI_LIMIT
+        self.UNITS = UNITS
+        self.TEST_TXT = TEST_TXT
+        self.EXEC_CNT = 0
+        self.FAIL_CNT = 0
+        self.ALRM_CNT = 0
+        self.count = 0      # the number of valid results
+        self.mean = 0.0
+        self.M2 = 0.0       # the sum of the squared deviations from the mean
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sums = 0.0
+        self.squares = 0.0
+        self.sketch = QuantileSketch(compression)
+        self.edges = None
+        self.histogram = None # counts of [under, edges[0]..edges[1], ..., over]
+        if LO_LIMIT is not None and HI_LIMIT is not None and HI_LIMIT > LO_LIMIT and bins:
+            margin = (HI_LIMIT - LO_LIMIT) / 2
+            self.edges = np.linspace(LO_LIMIT - margin, HI_LIMIT + margin, bins + 1)
+            self.histogram = np.zeros(bins + 2, dtype=np.int64)
+
+    def __repr__(self):
+        return "TestStatistics(TEST_NUM=%s, HEAD_NUM=%s, SITE_NUM=%s, count=%s, mean=%s)" % (self.TEST_NUM, self.HEAD_NUM, self.SITE_NUM, self.count, self.mean)
+
+    def executed(self, TEST_FLG):
+        '''
+        Counts the executions, TEST_FLG is an (uint8) array of the TEST_FLG's (or one TEST_FLG)
+        '''
+        if np.isscalar(TEST_FLG):
+            self.EXEC_CNT += 1
+            self.FAIL_CNT += 1 if TEST_FLG & 0x80 else 0
+            self.ALRM_CNT += 1 if TEST_FLG & 0x01 else 0
+        else:
+            self.EXEC_CNT += len(TEST_FLG)
+            self.FAIL_CNT += int(np.count_nonzero(TEST_FLG & 0x80))
+            self.ALRM_CNT += int(np.count_nonzero(TEST_FLG & 0x01))
+
+    def add(self, results):
+        '''
+        Adds the (valid) results (an array), the non finite results are ignored.
+        '''
+        results = np.asarray(results, dtype=np.float64)
+        results = results[np.isfinite(results)]
+        count = len(results)
+        if not count:
+            return
+        mean = float(results.mean())
+        M2 = float(np.square(results - mean).sum())
+        self._combine(count, mean, M2)
+        self.minimum = min(self.minimum, float(results.min()))
+        self.maximum = max(self.maximum, float(results.max()))
+        self.sums += float(results.sum())
+        self.squares += float(np.square(results).sum())
+        self.sketch.add(results)
+        if self.histogram is not None:
+            self.histogram += np.bincount(np.searchsorted(self.edges, results, side='right'), minlength=len(self.histogram))
+
+    def _combine(self, count, mean, M2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.M2 += M2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def merge(self, other):
+        '''
+        Merges the statistics of other (the same test on another site, chunk, file, ...) into this one.
+        '''
+        self.EXEC_CNT += other.EXEC_CNT
+        self.FAIL_CNT += other.FAIL_CNT
+        self.ALRM_CNT += other.ALRM_CNT
+        if other.count:
+            self._combine(other.count, other.mean, other.M2)
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            self.sums += other.sums
+            self.squares += other.squares
+            self.sketch.merge(other.sketch)
+        if self.histogram is not None:
+            if other.histogram is not None and np.array_equal(self.edges, other.edges):
+                self.histogram += other.histogram
+            elif other.count: # (not comparable any more)
+                self.edges = self.histogram = None
+        return self
+
+    def variance(self):
+        return self.M2 / (self.count - 1) if self.count > 1 else math.nan
+
+    def stdev(self):
+        return math.sqrt(self.variance()) if self.count > 1 else math.nan
+
+    def Cp(self):
+        '''
+        Returns (HI_LIMIT - LO_LIMIT) / 6 sigma (None without the two limits)
+        '''
+        if self.LO_LIMIT is None or self.HI_LIMIT is None:
+            return None
+        sigma = self.stdev()
+        return (self.HI_LIMIT - self.LO_LIMIT) / (6 * sigma) if sigma > 0 else math.inf
+
+    def Cpk(self):
+        '''
+        Returns min(HI_LIMIT - mean, mean - LO_LIMIT) / 3 sigma (one sided with one limit, None without limits)
+        '''
+        distances = [limit - self.mean for limit in [self.HI_LIMIT] if limit is not None]
+        distances += [self.mean - limit for limit in [self.LO_LIMIT] if limit is not None]
+        if not distances or not self.count:
+            return None
+        sigma = self.stdev()
+        return min(distances) / (3 * sigma) if sigma > 0 else math.inf
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def to_dict(self):
+        '''
+        Returns the statistics with the TSR names for what is in a TSR.
+        '''
+        return {
+            'TEST_NUM' : self.TEST_NUM,
+            'HEAD_NUM' : self.HEAD_NUM,
+            'SITE_NUM' : self.SITE_NUM,
+            'EXEC_CNT' : self.EXEC_CNT,
+            'FAIL_CNT' : self.FAIL_CNT,
+            'ALRM_CNT' : self.ALRM_CNT,
+            'TEST_NAM' : self.TEST_TXT,
+            'TEST_MIN' : self.minimum if self.count else None,
+            'TEST_MAX' : self.maximum if self.count else None,
+            'TST_SUMS' : self.sums,
+            'TST_SQRS' : self.squares,
+            'LO_LIMIT' : self.LO_LIMIT,
+            'HI_LIMIT' : self.HI_LIMIT,
+            'UNITS' : self.UNITS,
+            'count' : self.count,
+            'mean' : self.mean if self.count else None,
+            'stdev' : self.stdev(),
+            'Cp' : self.Cp(),
+            'Cpk' : self.Cpk(),
+            'median' : self.quantile(0.5),
+        }
+
+
+class OnlineStatistics(object):
+    '''
+    The TestStatistics of all tests, keyed on (TEST_NUM, HEAD_NUM, SITE_NUM).
+    '''
+
+    def __init__(self, bins=64, compression=200):
+        self.bins = bins
+        self.compression = compression
+        self.tests = {}   # (TEST_NUM, HEAD_NUM, SITE_NUM) -> TestStatistics
+        self.limits = {}  # TEST_NUM -> (LO_LIMIT, HI_LIMIT, UNITS, TEST_TXT)
+
+    def __len__(self):
+        return len(self.tests)
+
+    def __getitem__(self, key):
+        return self.tests[key]
+
+    def __contains__(self, key):
+        return key in self.tests
+
+    def set_limits(self, TEST_NUM, LO_LIMIT=None, HI_LIMIT=None, UNITS='', TEST_TXT=''):
+        '''
+        Sets the limits of a test (the first setting is kept), they should be set before the first result.
+        '''
+        if TEST_NUM not in self.limits:
+            self.limits[TEST_NUM] = (LO_LIMIT, HI_LIMIT, UNITS, TEST_TXT)
+
+    def accumulator(self, TEST_NUM, HEAD_NUM, SITE_NUM):
+        key = (TEST_NUM, HEAD_NUM, SITE_NUM)
+        retval = self.tests.get(key)
+        if retval is None:
+            LO_LIMIT, HI_LIMIT, UNITS, TEST_TXT = self.limits.get(TEST_NUM, (None, None, '', ''))
+            retval = self.tests[key] = TestStatistics(TEST_NUM, HEAD_NUM, SITE_NUM, LO_LIMIT, HI_LIMIT, UNITS, TEST_TXT,
+                                                      self.bins, self.compression)
+        return retval
+
+    def feed(self, TEST_NUM, HEAD_NUM, SITE_NUM, RESULT, TEST_FLG=None):
+        '''
+        Feeds a batch of (PTR) results, all arguments are arrays of the same length (or HEAD_NUM/SITE_NUM a number).
+        A result with bit 1 (result not valid) of its TEST_FLG set is counted, but not used.
+        '''
+        TEST_NUM = np.asarray(TEST_NUM, dtype=np.uint64)
+        RESULT = np.asarray(RESULT, dtype=np.float64)
+        TEST_FLG = np.zeros(len(TEST_NUM), dtype=np.uint8) if TEST_FLG is None else np.asarray(TEST_FLG, dtype=np.uint8)
+        keys = (TEST_NUM << np.uint64(16)) | (np.asarray(HEAD_NUM, dtype=np.uint64) << np.uint64(8)) | np.asarray(SITE_NUM, dtype=np.uint64)
+        keys = np.broadcast_to(keys, TEST_NUM.shape)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        stops = np.r_[starts[1:], len(keys)]
+        for start, stop in zip(starts, stops):
+            key = int(keys[start])
+            selection = order[start:stop]
+            flags = TEST_FLG[selection]
+            accumulator = self.accumulator(key >> 16, (key >> 8) & 0xFF, key & 0xFF)
+            accumulator.executed(flags)
+            accumulator.add(RESULT[selection][(flags & 0x02) == 0])
+
+    def _limits_from(self, REC, REC_SUB, TEST_NUM, position, endian):
+        '''
+        Picks up the limits of a PTR (REC_SUB 10) or MPR (REC_SUB 15), position is the offset of its TEST_TXT.
+        '''
+        size = len(REC)
+        if position >= size:
+            return
+        TEST_TXT = bytes(REC[position + 1:position + 1 + REC[position]]).decode('utf-8', 'replace')
+        position += 1 + REC[position]
+        if position >= size: # no ALARM_ID
+            return
+        position += 1 + REC[position]
+        if position + 12 > size: # no OPT_FLAG .. HI_LIMIT
+            return
+        OPT_FLAG = REC[position]
+        LO_LIMIT, HI_LIMIT = struct.unpack_from(endian + 'ff', REC, position + 4)
+        position += 12
+        if REC_SUB == 15: # START_IN, INCR_IN and RTN_INDX come before the UNITS of an MPR
+            position += 8 + 2 * struct.unpack_from(endian + 'H', REC, 12)[0]
+        UNITS = bytes(REC[position + 1:position + 1 + REC[position]]).decode('utf-8', 'replace') if position < size else ''
+        self.set_limits(TEST_NUM, None if OPT_FLAG & 0x50 else LO_LIMIT, None if OPT_FLAG & 0xA0 else HI_LIMIT, UNITS, TEST_TXT)
+
+    def feed_records(self, records, endian, batch_size=65536):
+        '''
+        Feeds the PTR's and MPR's of records (an iterator of (REC_LEN, REC_TYP, REC_SUB, REC), like
+        records_from_stream yields), returns self.
+        '''
+        fixed = np.dtype([('TEST_NUM', endian + 'u4'), ('HEAD_NUM', 'u1'), ('SITE_NUM', 'u1'),
+                          ('TEST_FLG', 'u1'), ('PARM_FLG', 'u1'), ('RESULT', endian + 'f4')])
+        U4 = struct.Struct(endian + 'I')
+        MPR_fixed = struct.Struct(endian + 'IBBBBHH')
+        R4 = np.dtype(endian + 'f4')
+        limits = self.limits
+        chunks = []
+
+        def flush():
+            batch = np.frombuffer(b''.join(chunks), dtype=fixed)
+            del chunks[:]
+            self.feed(batch['TEST_NUM'], batch['HEAD_NUM'], batch['SITE_NUM'], batch['RESULT'], batch['TEST_FLG'])
+
+        for REC_LEN, REC_TYP, REC_SUB, REC in records:
+            if REC_TYP != 15:
+                continue
+            if REC_SUB == 10: # PTR
+                if REC_LEN >= 12:
+                    chunks.append(REC[4:16])
+                    if REC_LEN > 12:
+                        TEST_NUM = U4.unpack_from(REC, 4)[0]
+                        if TEST_NUM not in limits:
+                            self._limits_from(REC, REC_SUB, TEST_NUM, 16, endian)
+                elif REC_LEN >= 4: # no (valid) RESULT
+                    short = bytearray(12)
+                    short[:REC_LEN] = REC[4:]
+                    short[6] |= 0x02
+                    chunks.append(bytes(short))
+                if len(chunks) >= batch_size:
+                    flush()
+            elif REC_SUB == 15 and REC_LEN >= 12: # MPR
+                TEST_NUM, HEAD_NUM, SITE_NUM, TEST_FLG, _, RTN_ICNT, RSLT_CNT = MPR_fixed.unpack_from(REC, 4)
+                position = 16 + (RTN_ICNT + 1) // 2
+                if TEST_NUM not in limits:
+                    self._limits_from(REC, REC_SUB, TEST_NUM, position + 4 * RSLT_CNT, endian)
+                accumulator = self.accumulator(TEST_NUM, HEAD_NUM, SITE_NUM)
+                accumulator.executed(TEST_FLG)
+                if not TEST_FLG & 0x02 and position + 4 * RSLT_CNT <= len(REC):
+                    accumulator.add(np.frombuffer(REC, dtype=R4, count=RSLT_CNT, offset=position))
+        if chunks:
+            flush()
+        return self
+
+    def merge(self, other):
+        '''
+        Merges the statistics of other (another chunk, file, process ...) into this one, returns self.
+        '''
+        for TEST_NUM, limits in other.limits.items():
+            self.set_limits(TEST_NUM, *limits)
+        for key, statistics in other.tests.items():
+            if key in self.tests:
+                self.tests[key].merge(statistics)
+            else:
+                self.tests[key] = statistics
+        return self
+
+    def select(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns {TEST_NUM : TestStatistics} of a head/site, HEAD_NUM=255 merges all heads and SITE_NUM=255 all
+        the sites of a head (like the TSR's with HEAD_NUM=255).
+        '''
+        retval = {}
+        for (TEST_NUM, head, site), statistics in sorted(self.tests.items()):
+            if (HEAD_NUM != 255 and head != HEAD_NUM) or (SITE_NUM != 255 and site != SITE_NUM):
+                continue
+            if HEAD_NUM != 255 and SITE_NUM != 255:
+                retval[TEST_NUM] = statistics
+                continue
+            total = retval.get(TEST_NUM)
+            if total is None:
+                LO_LIMIT, HI_LIMIT, UNITS, TEST_TXT = self.limits.get(TEST_NUM, (None, None, '', ''))
+                total = retval[TEST_NUM] = TestStatistics(TEST_NUM, HEAD_NUM, 0 if HEAD_NUM == 255 else SITE_NUM, LO_LIMIT, HI_LIMIT,
+                                                          UNITS, TEST_TXT, self.bins, self.compression)
+            total.merge(statistics)
+        return retval
+
+    def to_dict(self, HEAD_NUM=255, SITE_NUM=255):
+        return {TEST_NUM : statistics.to_dict() for TEST_NUM, statistics in self.select(HEAD_NUM, SITE_NUM).items()}
+
+
+def statistics_from_file(FileName, batch_size=65536, bins=64, compression=200):
+    '''
+    Returns the OnlineStatistics of the (STDF V4, compressed or not) file, in one pass.
+    '''
+    probe, fd = open_STDF(FileName)
+    if fd is None:
+        raise STDFError("'%s' is not an STDF file" % FileName)
+    with fd:
+        if probe.version != 'V4':
+            raise STDFError("statistics_from_file : '%s' is a %s file, only V4 is supported" % (FileName, probe.version))
+        statistics = OnlineStatistics(bins, compression)
+        return statistics.feed_records(records_from_stream(fd, probe.endian), probe.endian, batch_size)
+
+
+def statistics_from_files(FileNames, workers=None, batch_size=65536, bins=64, compression=200):
+    '''
+    Returns the merged OnlineStatistics of the files, the files are processed in parallel by workers processes
+    (in this process with workers=1).
+    '''
+    retval = OnlineStatistics(bins, compression)
+    if workers == 1:
+        for FileName in FileNames:
+            retval.merge(statistics_from_file(FileName, batch_size, bins, compression))
+        return retval
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for statistics in executor.map(statistics_from_file, FileNames, *zip(*[(batch_size, bins, compression)] * len(FileNames))):
+            retval.merge(statistics)
+    return retval
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    start = time.time()
+    statistics = statistics_from_file(FileName)
+    elapsed = time.time() - start
+    print("statistics : %s tests/sites in %.3f seconds" % (len(statistics), elapsed))
+    for TEST_NUM, test in list(statistics.select().items())[:5]:
+        print("  %s : n=%s mean=%.4g stdev=%.4g Cpk=%s median=%.4g" % (TEST_NUM, test.count, test.mean, test.stdev(), test.Cpk(), test.quantile(0.5)))
@@ -0,0 +1,94 @@
+'''
+Created on Oct 18, 2026
+
+Buffered record parsing of (compressed) STDF streams.
+
+The (decompressed) data is read in big blocks by a background thread (see
+ATE.utils.compression.ReadAheadReader) and the records are cut out of those
+blocks, so there are no per-record read calls and the decompression overlaps
+with the parsing.
+'''
+import struct
+
+from ATE.data.STDF import instrumentation
+from ATE.utils.compression import ReadAheadReader
+from ATE.utils.compression import open_decompressed
+
+
+def records_from_blocks(blocks, endian):
+    '''
+    Yields (REC_LEN, REC_TYP, REC_SUB, REC) for the records in the consecutive blocks (bytes like objects),
+    REC (including the header) is a bytes object. A truncated record at the end is dropped.
+    '''
+    header = struct.Struct(endian + 'HBB')
+    unpack_from = header.unpack_from
+    carry = bytearray()
+    for block in blocks:
+        size = len(block)
+        offset = 0
+        if carry: # a record that started in the previous block
+            if len(carry) < 4:
+                offset = min(4 - len(carry), size)
+                carry += block[:offset]
+                if len(carry) < 4:
+                    continue
+            REC_LEN, REC_TYP, REC_SUB = unpack_from(carry, 0)
+            take = min(4 + REC_LEN - len(carry), size - offset)
+            carry += block[offset:offset + take]
+            offset += take
+            if len(carry) < 4 + REC_LEN:
+                continue
+            yield REC_LEN, REC_TYP, REC_SUB, bytes(carry)
+            carry = bytearray()
+        end = size - 4
+        while offset <= end:
+            REC_LEN, REC_TYP, REC_SUB = unpack_from(block, offset)
+            next_offset = offset + 4 + REC_LEN
+            if next_offset > size:
+                break
+            yield REC_LEN, REC_TYP, REC_SUB, bytes(block[offset:next_offset])
+            offset = next_offset
+        if offset < size:
+            carry += block[offset:]
+
+
+def records_from_stream(fd, endian, block_size=1024*1024, buffers=4):
+    '''
+    Yields (REC_LEN, REC_TYP, REC_SUB, REC) from the (binary) file object fd, read by a background thread.
+    The records are counted if instrumentation is enabled (see ATE.data.STDF.instrumentation)
+    '''
+    records = records_from_blocks(ReadAheadReader(fd, block_size, buffers), endian)
+    if instrumentation.current is not None:
+        return instrumentation.current.count_records(records)
+    return records
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from ATE.data.STDF.scanner import endian_and_version_from_FAR
+
+    FileName = sys.argv[1]
+    with open_decompressed(FileName) as fd:
+        endian, _ = endian_and_version_from_FAR(fd.read(6))
+
+    start = time.time()
+    with open_decompressed(FileName) as fd:
+        count = 0
+        unpack = struct.Struct(endian + 'HBB').unpack
+        while True:
+            header = fd.read(4)
+            if len(header) != 4:
+                break
+            REC_LEN, REC_TYP, REC_SUB = unpack(header)
+            footer = fd.read(REC_LEN)
+            count += 1
+    serial = time.time() - start
+    print("per record reads     : %s records in %.3f seconds" % (count, serial))
+
+    start = time.time()
+    with open_decompressed(FileName) as fd:
+        count = sum(1 for _ in records_from_stream(fd, endian))
+    pipelined = time.time() - start
+    print("read ahead pipeline  : %s records in %.3f seconds (%.1fx)" % (count, pipelined, serial / pipelined))
@@ -0,0 +1,331 @@
+'''
+Created on Oct 18, 2026
+
+Streaming subset (filter) of an STDF file.
+
+The records are read as raw bytes (see ATE.data.STDF.stream) and selected on
+the values at their fixed offsets (REC_TYP/REC_SUB, HEAD_NUM/SITE_NUM and
+TEST_NUM, like HEAD_NUM_and_SITE_NUM_from_record and TEST_NUM_from_record
+do), nothing is unpacked. The selected records are copied as they are to the
+output, only the NUM_TEST of a PRR (when tests are dropped) and the counts of
+a WRR (when parts are dropped) are patched in place.
+
+A part (PIR .. PRR of a head/site) is selected on its head, site, index (the
+n'th PIR in the file, starting at 0, the same numbering as the sidecar index)
+and the wafer it is on. The summary records (TSR, HBR, SBR and PCR) of the
+source are dropped and made anew (before the MRR) from the selected parts.
+
+    subset_file('lot.std', 'customer.std.xz', sites=[0], test_numbers=[1000, 1001], compression='lzma')
+'''
+import struct
+
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import id_to_ts
+from ATE.data.STDF.stream import records_from_stream
+from ATE.data.STDF.writer import STDFWriter
+from ATE.data.STDF.writer import _cn
+
+FAR_TS, MIR_TS, MRR_TS = (0, 10), (1, 10), (1, 20)
+PCR_TS, HBR_TS, SBR_TS, TSR_TS = (1, 30), (1, 40), (1, 50), (10, 30)
+WIR_TS, WRR_TS = (2, 10), (2, 20)
+PIR_TS, PRR_TS = (5, 10), (5, 20)
+TEST_TYPES = {10 : 'P', 15 : 'M', 20 : 'F'} # REC_SUB of PTR, MPR, FTR -> TSR TEST_TYP
+
+
+def _selector(selection):
+    '''
+    Returns a function that tells if a value is selected (None = everything), selection can be a collection,
+    a range, a slice (the stop can be None) or a function.
+    '''
+    if selection is None:
+        return None
+    if callable(selection):
+        return selection
+    if isinstance(selection, slice):
+        start = 0 if selection.start is None else selection.start
+        step = 1 if selection.step is None else selection.step
+        stop = selection.stop
+        return lambda value: value >= start and (stop is None or value < stop) and (value - start) % step == 0
+    if isinstance(selection, range):
+        return selection.__contains__
+    return frozenset(selection).__contains__
+
+
+class SummaryTally(object):
+    '''
+    What is needed to make the summary records of the selected (or merged) parts.
+    '''
+
+    def __init__(self):
+        self.parts = {}       # (HEAD_NUM, SITE_NUM) -> [PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT]
+        self.hard_bins = {}   # (HEAD_NUM, SITE_NUM, HBIN_NUM) -> [count, passed]
+        self.soft_bins = {}   # (HEAD_NUM, SITE_NUM, SBIN_NUM) -> [count, passed]
+        self.tests = {}       # (HEAD_NUM, SITE_NUM, TEST_NUM) -> [TEST_TYP, EXEC_CNT, FAIL_CNT, ALRM_CNT, count, min, max, sum, squares]
+        self.bin_names = {HBR_TS : {}, SBR_TS : {}} # BIN_NUM -> (PF, NAM) from the source
+        self.test_names = {}  # TEST_NUM -> TEST_NAM from the source TSR's (or the first PTR)
+
+    def part(self, HEAD_NUM, SITE_NUM, PART_FLG, HARD_BIN, SOFT_BIN):
+        counts = self.parts.setdefault((HEAD_NUM, SITE_NUM), [0, 0, 0, 0])
+        good = not PART_FLG & 0x18
+        counts[0] += 1
+        counts[1] += 1 if PART_FLG & 0x03 else 0
+        counts[2] += 1 if PART_FLG & 0x04 else 0
+        counts[3] += 1 if good else 0
+        for bins, BIN_NUM in [(self.hard_bins, HARD_BIN), (self.soft_bins, SOFT_BIN)]:
+            if BIN_NUM == 65535:
+                continue
+            tally = bins.setdefault((HEAD_NUM, SITE_NUM, BIN_NUM), [0, False])
+            tally[0] += 1
+            tally[1] = tally[1] or good
+
+    def supersede(self, HEAD_NUM, SITE_NUM, PART_FLG, HARD_BIN, SOFT_BIN):
+        '''
+        Takes a (retested) part out of the GOOD_CNT and the bins, it stays in the PART_CNT.
+        '''
+        if not PART_FLG & 0x18:
+            self.parts[(HEAD_NUM, SITE_NUM)][3] -= 1
+        for bins, BIN_NUM in [(self.hard_bins, HARD_BIN), (self.soft_bins, SOFT_BIN)]:
+            tally = bins.get((HEAD_NUM, SITE_NUM, BIN_NUM))
+            if tally is not None:
+                tally[0] -= 1
+
+    def test(self, REC_SUB, HEAD_NUM, SITE_NUM, TEST_NUM, TEST_FLG, RESULT):
+        tally = self.tests.get((HEAD_NUM, SITE_NUM, TEST_NUM))
+        if tally is None:
+            tally = self.tests[(HEAD_NUM, SITE_NUM, TEST_NUM)] = [TEST_TYPES[REC_SUB], 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0]
+        tally[1] += 1
+        if TEST_FLG & 0x80:
+            tally[2] += 1
+        if TEST_FLG & 0x01:
+            tally[3] += 1
+        if RESULT is not None and not TEST_FLG & 0x02:
+            if tally[4]:
+                tally[5] = min(tally[5], RESULT)
+                tally[6] = max(tally[6], RESULT)
+            else:
+                tally[5] = tally[6] = RESULT
+            tally[4] += 1
+            tally[7] += RESULT
+            tally[8] += RESULT * RESULT
+
+    def test_record(self, REC, TEST_NUM, R4):
+        '''
+        Tallies a (raw) PTR, MPR or FTR, R4 is the (endian) struct of a float.
+        '''
+        REC_LEN = len(REC) - 4
+        if REC[3] == 10 and REC_LEN > 12 and TEST_NUM not in self.test_names:
+            self.test_names[TEST_NUM] = bytes(REC[17:17 + REC[16]]).decode('utf-8', 'replace')
+        RESULT = R4.unpack_from(REC, 12)[0] if REC[3] == 10 and REC_LEN >= 12 else None
+        self.test(REC[3], REC[8], REC[9], TEST_NUM, REC[10] if REC_LEN >= 7 else 0, RESULT)
+
+    def source_record(self, TS, REC, endian):
+        '''
+        Picks up the names from the source summary records.
+        '''
+        if TS in self.bin_names and len(REC) >= 13:
+            BIN_NUM = struct.unpack_from(endian + 'H', REC, 6)[0]
+            PF = REC[12:13].decode('latin-1')
+            NAM = bytes(REC[14:14 + REC[13]]).decode('utf-8', 'replace') if len(REC) > 13 else ''
+            if BIN_NUM not in self.bin_names[TS] or REC[4] == 255:
+                self.bin_names[TS][BIN_NUM] = (PF, NAM)
+        elif TS == TSR_TS and len(REC) >= 24:
+            TEST_NUM = struct.unpack_from(endian + 'I', REC, 7)[0]
+            NAM = bytes(REC[24:24 + REC[23]]).decode('utf-8', 'replace')
+            if NAM:
+                self.test_names[TEST_NUM] = NAM
+
+    @staticmethod
+    def _merged(tallies, key_size, merge):
+        '''
+        Adds the all heads/sites (HEAD_NUM = 255) tallies to tallies (keyed by (HEAD_NUM, SITE_NUM, ...))
+        '''
+        merged = {}
+        for key, tally in tallies.items():
+            total = (255, 0) + key[2:key_size]
+            if total in merged:
+                merge(merged[total], tally)
+            else:
+                merged[total] = list(tally)
+        return list(tallies.items()) + list(merged.items())
+
+    def records(self, endian):
+        '''
+        Returns the packed TSR's, HBR's, SBR's and PCR's (per site and for all heads/sites)
+        '''
+        retval = []
+        header = struct.Struct(endian + 'HBB')
+
+        def merge_test(total, tally):
+            for position in [1, 2, 3, 7, 8]:
+                total[position] += tally[position]
+            if tally[4]:
+                total[5] = min(total[5], tally[5]) if total[4] else tally[5]
+                total[6] = max(total[6], tally[6]) if total[4] else tally[6]
+                total[4] += tally[4]
+        tsr_fixed = struct.Struct(endian + 'BBcIIII')
+        tsr_stats = struct.Struct(endian + 'Bfffff')
+        for (HEAD_NUM, SITE_NUM, TEST_NUM), tally in self._merged(self.tests, 3, merge_test):
+            TEST_TYP, EXEC_CNT, FAIL_CNT, ALRM_CNT, count, minimum, maximum, sums, squares = tally
+            body = tsr_fixed.pack(HEAD_NUM, SITE_NUM, TEST_TYP.encode('latin-1'), TEST_NUM, EXEC_CNT, FAIL_CNT, ALRM_CNT)
+            body += _cn(self.test_names.get(TEST_NUM, '')) + _cn('') + _cn('')
+            OPT_FLAG = 0xCC if count else 0xFF # (TEST_TIM is never valid)
+            body += tsr_stats.pack(OPT_FLAG, 0.0, minimum, maximum, sums, squares)
+            retval.append(header.pack(len(body), *TSR_TS) + body)
+
+        def merge_bin(total, tally):
+            total[0] += tally[0]
+            total[1] = total[1] or tally[1]
+        bin_fixed = struct.Struct(endian + 'BBHIc')
+        for TS, bins in [(HBR_TS, self.hard_bins), (SBR_TS, self.soft_bins)]:
+            for (HEAD_NUM, SITE_NUM, BIN_NUM), (count, passed) in self._merged(bins, 3, merge_bin):
+                PF, NAM = self.bin_names[TS].get(BIN_NUM, ('P' if passed else 'F', ''))
+                body = bin_fixed.pack(HEAD_NUM, SITE_NUM, BIN_NUM, count, (PF or ' ').encode('latin-1')[:1]) + _cn(NAM)
+                retval.append(header.pack(len(body), *TS) + body)
+
+        def merge_parts(total, tally):
+            for position in range(4):
+                total[position] += tally[position]
+        pcr = struct.Struct(endian + 'BBIIIII')
+        for (HEAD_NUM, SITE_NUM), (PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT) in self._merged(self.parts, 2, merge_parts):
+            body = pcr.pack(HEAD_NUM, SITE_NUM, PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT, 4294967295)
+            retval.append(header.pack(len(body), *PCR_TS) + body)
+        return retval
+
+
+def subset_file(Source, Destination, heads=None, sites=None, parts=None, wafers=None, test_numbers=None,
+                exclude=None, summary=True, compression=None, **kwargs):
+    '''
+    Writes the selected records of (the STDF V4 file) Source to Destination, returns the number of parts written.
+
+    heads, sites, parts (the part index), wafers (WAFER_ID's) and test_numbers select what is kept, each can
+    be a collection, a range, a slice or a function (None = all). exclude is a list of record ID's to drop
+    (eg: ['DTR', 'GDR']). With summary, the TSR/HBR/SBR/PCR's are made anew for the selected parts.
+    The other keyword arguments are passed to the STDFWriter (eg: workers, buffer_size)
+    '''
+    probe, fd = open_STDF(Source)
+    if fd is None:
+        raise STDFError("'%s' is not an STDF file" % Source)
+    if probe.version != 'V4':
+        fd.close()
+        raise STDFError("subset_file : '%s' is a %s file, only V4 is supported" % (Source, probe.version))
+    endian = probe.endian
+    head_selected = _selector(heads)
+    site_selected = _selector(sites)
+    part_selected = _selector(parts)
+    wafer_selected = _selector(wafers)
+    test_selected = _selector(test_numbers)
+    ID2TS = id_to_ts('V4')
+    excluded = set(ID2TS[REC_ID] for REC_ID in (exclude or []))
+    regenerated = set([PCR_TS, HBR_TS, SBR_TS, TSR_TS]) if summary else set()
+
+    U2 = struct.Struct(endian + 'H')
+    U4 = struct.Struct(endian + 'I')
+    R4 = struct.Struct(endian + 'f')
+    WRR_counts = struct.Struct(endian + 'IIII')
+    tally = SummaryTally()
+    open_parts = {}       # (HEAD_NUM, SITE_NUM) -> [selected, kept tests]
+    wafer_of_head = {}    # HEAD_NUM -> [selected, PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT]
+    part_index = 0
+    written = 0
+    summary_written = False
+
+    with fd, STDFWriter(Destination, endian=endian, compression=compression, part_buffers=False, **kwargs) as writer:
+        write = writer.write_raw
+        for REC_LEN, REC_TYP, REC_SUB, REC in records_from_stream(fd, endian):
+            TS = (REC_TYP, REC_SUB)
+            if REC_TYP == 15 and REC_SUB in TEST_TYPES: # PTR, MPR, FTR
+                if TS in excluded or REC_LEN < 6:
+                    continue
+                part = open_parts.get((REC[8], REC[9]))
+                if part is None: # a test outside of a part
+                    if (head_selected and not head_selected(REC[8])) or (site_selected and not site_selected(REC[9])):
+                        continue
+                elif not part[0]:
+                    continue
+                TEST_NUM = U4.unpack_from(REC, 4)[0]
+                if test_selected and not test_selected(TEST_NUM):
+                    continue
+                write(REC)
+                if part is not None:
+                    part[1] += 1
+                if summary:
+                    tally.test_record(REC, TEST_NUM, R4)
+            elif TS == PIR_TS:
+                HEAD_NUM, SITE_NUM = REC[4], REC[5]
+                wafer = wafer_of_head.get(HEAD_NUM)
+                selected = ((not head_selected or head_selected(HEAD_NUM)) and
+                            (not site_selected or site_selected(SITE_NUM)) and
+                            (not part_selected or part_selected(part_index)) and
+                            (wafer[0] if wafer is not None else not wafer_selected))
+                part_index += 1
+                open_parts[(HEAD_NUM, SITE_NUM)] = [selected, 0]
+                if selected:
+                    write(REC)
+            elif TS == PRR_TS:
+                part = open_parts.pop((REC[4], REC[5]), None)
+                if part is not None and not part[0]:
+                    continue
+                if part is not None and test_selected and REC_LEN >= 5: # NUM_TEST of the kept tests
+                    REC = bytearray(REC)
+                    U2.pack_into(REC, 7, part[1])
+                write(REC)
+                written += 1
+                PART_FLG = REC[6] if REC_LEN >= 3 else 0
+                HARD_BIN = U2.unpack_from(REC, 9)[0] if REC_LEN >= 7 else 65535
+                SOFT_BIN = U2.unpack_from(REC, 11)[0] if REC_LEN >= 9 else 65535
+                tally.part(REC[4], REC[5], PART_FLG, HARD_BIN, SOFT_BIN)
+                wafer = wafer_of_head.get(REC[4])
+                if wafer is not None:
+                    wafer[1] += 1
+                    wafer[2] += 1 if PART_FLG & 0x03 else 0
+                    wafer[3] += 1 if PART_FLG & 0x04 else 0
+                    wafer[4] += 0 if PART_FLG & 0x18 else 1
+            elif TS == FAR_TS: # (the writer made one)
+                continue
+            elif TS in regenerated:
+                tally.source_record(TS, REC, endian)
+            elif TS == WIR_TS:
+                WAFER_ID = bytes(REC[11:11 + REC[10]]).decode('utf-8', 'replace') if REC_LEN >= 7 else ''
+                selected = not wafer_selected or wafer_selected(WAFER_ID)
+                wafer_of_head[REC[4]] = [selected, 0, 0, 0, 0]
+                if selected and TS not in excluded:
+                    write(REC)
+            elif TS == WRR_TS:
+                wafer = wafer_of_head.pop(REC[4], None)
+                if wafer is not None and not wafer[0]:
+                    continue
+                if TS in excluded:
+                    continue
+                if wafer is not None and REC_LEN >= 22 and (part_selected or head_selected or site_selected):
+                    REC = bytearray(REC)
+                    WRR_counts.pack_into(REC, 10, *wafer[1:])
+                write(REC)
+            elif TS == MRR_TS:
+                if summary and not summary_written:
+                    for record in tally.records(endian):
+                        write(record)
+                    summary_written = True
+                if TS not in excluded:
+                    write(REC)
+            elif TS not in excluded:
+                write(REC)
+        if summary and not summary_written:
+            for record in tally.records(endian):
+                write(record)
+    return written
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    Destination = FileName + '.subset.std'
+    start = time.time()
+    parts = subset_file(FileName, Destination, sites=[0, 1], test_numbers=range(0, 1000, 2))
+    elapsed = time.time() - start
+    size = os.path.getsize(FileName)
+    print("subset : %s parts, %.1f MB in %.3f seconds (%.1f MB/s)" % (parts, size / 1e6, elapsed, size / 1e6 / elapsed))
+    os.remove(Destination)
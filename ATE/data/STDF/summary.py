@@ -0,0 +1,325 @@
+'''
+Created on Oct 18, 2026
+
+Tail-first reader of the lot summary (MRR, PCR, HBR, SBR and TSR records).
+
+In a V4 file the summary records are the last records of the file, so they
+can be read without parsing the body. As a record header is in front of the
+record, the REC_LEN chain can not be walked backwards, instead a window at
+the end of the file is examined :
+
+    - for every byte offset in the window the next offset (offset + 4 + REC_LEN)
+      is calculated (vectorized), offsets with an unknown REC_TYP/REC_SUB are
+      dead ends.
+    - pointer jumping (next = next[next], log2(window) times) tells what
+      offsets have a chain that ends exactly at the end of the file.
+    - the first such offset starts the chain that is used, the summary block is
+      the trailing run of summary records in that chain. The block is only
+      accepted if at least 'depth' other records precede it in the chain (so
+      that a false start has merged with the real chain), otherwise the window
+      is doubled.
+
+So the work is O(summary size), not O(file size). For compressed files the
+record offsets come from the sidecar index (if there is one, see
+ATE.data.STDF.sidecar), otherwise the file is streamed.
+
+    summary = read_summary(FileName)
+    summary.part_count()               # PCR of all heads/sites
+    summary.hard_bins(1, 0)            # {HBIN_NUM : HBIN_CNT} of head 1, site 0
+    summary.MRR.get_value('FINISH_T')
+'''
+import mmap
+import struct
+
+import numpy as np
+
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.scanner import endian_and_version_from_FAR
+from ATE.data.STDF.scanner import valid_record_types
+from ATE.data.STDF.utils import is_STDF
+from ATE.data.STDF.utils import is_supported_compressed_STDF_file
+from ATE.data.STDF.utils import records_from_file
+
+# the records of the summary block
+SUMMARY_TS = {(1, 20) : 'MRR', (1, 30) : 'PCR', (1, 40) : 'HBR', (1, 50) : 'SBR', (10, 30) : 'TSR'}
+# records that are allowed anywhere, so also in the summary block
+TOLERATED_TS = [(50, 10), (50, 30)] # GDR, DTR
+
+
+class STDFSummary(object):
+    '''
+    The summary records of an STDF file (as LazyRecords) and the tallies made from them.
+
+    HEAD_NUM=255 selects the 'all heads' records (or the sum of the per head/site records if there are none),
+    SITE_NUM=255 selects the sum of the per site records of HEAD_NUM.
+    '''
+
+    def __init__(self, FileName, endian, version, records, offset):
+        self.FileName = FileName
+        self.endian = endian
+        self.version = version
+        self.offset = offset # of the summary block (in the uncompressed data)
+        self.records = [lazy_record_object(version, endian, TS, REC) for TS, REC in records]
+        self.MRR = None
+        self.PCR = []
+        self.HBR = []
+        self.SBR = []
+        self.TSR = []
+        for record in self.records:
+            if record.id == 'MRR':
+                self.MRR = record
+            elif record.id in SUMMARY_TS.values():
+                getattr(self, record.id).append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _select(records, HEAD_NUM, SITE_NUM):
+        if HEAD_NUM == 255:
+            retval = [record for record in records if record.get_value('HEAD_NUM') == 255]
+            if retval:
+                return retval
+            return records
+        if SITE_NUM == 255:
+            return [record for record in records if record.get_value('HEAD_NUM') == HEAD_NUM]
+        return [record for record in records if record.get_value('HEAD_NUM') == HEAD_NUM and record.get_value('SITE_NUM') == SITE_NUM]
+
+    def _count(self, Field, HEAD_NUM, SITE_NUM):
+        records = self._select(self.PCR, HEAD_NUM, SITE_NUM)
+        if not records:
+            return None
+        values = [record.get_value(Field) for record in records]
+        if 4294967295 in values: # missing
+            return None
+        return sum(values)
+
+    def part_count(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns PART_CNT (None if there is no PCR for HEAD_NUM/SITE_NUM)
+        '''
+        return self._count('PART_CNT', HEAD_NUM, SITE_NUM)
+
+    def good_count(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns GOOD_CNT (None if there is no PCR for HEAD_NUM/SITE_NUM or if it is missing)
+        '''
+        return self._count('GOOD_CNT', HEAD_NUM, SITE_NUM)
+
+    def _bins(self, records, Prefix, HEAD_NUM, SITE_NUM):
+        retval = {}
+        for record in self._select(records, HEAD_NUM, SITE_NUM):
+            BIN_NUM = record.get_value('%s_NUM' % Prefix)
+            retval[BIN_NUM] = retval.get(BIN_NUM, 0) + record.get_value('%s_CNT' % Prefix)
+        return dict(sorted(retval.items()))
+
+    def hard_bins(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns a (sorted) dictionary HBIN_NUM -> HBIN_CNT
+        '''
+        return self._bins(self.HBR, 'HBIN', HEAD_NUM, SITE_NUM)
+
+    def soft_bins(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns a (sorted) dictionary SBIN_NUM -> SBIN_CNT
+        '''
+        return self._bins(self.SBR, 'SBIN', HEAD_NUM, SITE_NUM)
+
+    def to_dict(self):
+        return {
+            'part_count' : self.part_count(),
+            'good_count' : self.good_count(),
+            'hard_bins' : self.hard_bins(),
+            'soft_bins' : self.soft_bins(),
+            'MRR' : None if self.MRR is None else self.MRR.to_dict(),
+        }
+
+
+def _valid_table(version):
+    '''
+    Returns a boolean lookup table over REC_TYP * 256 + REC_SUB of the valid record types.
+    '''
+    retval = np.zeros(65536, dtype=bool)
+    for REC_TYP, REC_SUB in valid_record_types(version):
+        retval[REC_TYP * 256 + REC_SUB] = True
+    return retval
+
+
+def chains_to_end(buffer, endian, valid):
+    '''
+    Returns a boolean array that is True for the offsets in buffer from where the REC_LEN chain (of valid record
+    types, see _valid_table) ends exactly at the end of buffer.
+    '''
+    size = len(buffer)
+    if size < 4:
+        return np.zeros(0, dtype=bool)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    count = size - 3
+    low, high = (data[:count], data[1:count + 1]) if endian == '<' else (data[1:count + 1], data[:count])
+    target = np.arange(count, dtype=np.int64) + 4 + (low.astype(np.int64) | (high.astype(np.int64) << 8))
+    END, DEAD = size, size + 1
+    target[~valid[data[2:count + 2].astype(np.int64) * 256 + data[3:count + 3]]] = DEAD
+    target[target > size] = DEAD
+    jump = np.full(size + 2, DEAD, dtype=np.int64)
+    jump[:count] = target
+    jump[END] = END
+    while True:
+        jumped = jump[jump]
+        if np.array_equal(jumped, jump):
+            break
+        jump = jumped
+    return jump[:count] == END
+
+
+def _chain(buffer, endian, offset, stop):
+    '''
+    Returns [(offset, REC_LEN, (REC_TYP, REC_SUB))] of the REC_LEN chain in buffer from offset up to stop.
+    '''
+    unpack_from = struct.Struct(endian + 'HBB').unpack_from
+    retval = []
+    while offset <= stop - 4:
+        REC_LEN, REC_TYP, REC_SUB = unpack_from(buffer, offset)
+        if offset + 4 + REC_LEN > stop:
+            break
+        retval.append((offset, REC_LEN, (REC_TYP, REC_SUB)))
+        offset += 4 + REC_LEN
+    return retval
+
+
+def _trailing_run(types):
+    '''
+    Returns the index in types (a list of (REC_TYP, REC_SUB)) where the trailing run of summary records starts.
+    '''
+    start = len(types)
+    for position in range(len(types) - 1, -1, -1):
+        if types[position] not in SUMMARY_TS and types[position] not in TOLERATED_TS:
+            break
+        start = position
+    return start
+
+
+def _summary_uncompressed(FileName, window, depth):
+    '''
+    Returns endian, version, [(TS, REC)] and the offset of the summary block of an uncompressed file.
+    '''
+    with open(FileName, 'rb') as fd:
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        endian, version = endian_and_version_from_FAR(mm[:6])
+        size = len(mm)
+        valid = _valid_table(version)
+        while True:
+            start = max(0, size - window)
+            if start == 0: # the complete file, just walk the chain from the FAR
+                chain = _chain(mm, endian, 0, size)
+                break
+            buffer = mm[start:size]
+            reaching = np.flatnonzero(chains_to_end(buffer, endian, valid))
+            if len(reaching):
+                chain = _chain(mm, endian, start + int(reaching[0]), size)
+                if _trailing_run([TS for _, _, TS in chain]) >= depth:
+                    break
+            window *= 2
+        first = _trailing_run([TS for _, _, TS in chain])
+        records = [(TS, mm[offset:offset + 4 + REC_LEN]) for offset, REC_LEN, TS in chain[first:]]
+        offset = chain[first][0] if first < len(chain) else (chain[-1][0] + 4 + chain[-1][1] if chain else 0)
+        return endian, version, records, offset
+    finally:
+        mm.close()
+
+
+def _summary_compressed(FileName):
+    '''
+    Returns endian, version, [(TS, REC)] and the offset of the summary block of a compressed file,
+    using the sidecar index if there is one, otherwise the file is streamed.
+    '''
+    from ATE.data.STDF.sidecar import load_STDF_index
+    index = load_STDF_index(FileName)
+    if index is None:
+        from ATE.utils.compression import open_decompressed
+        with open_decompressed(FileName) as fd:
+            endian, version = endian_and_version_from_FAR(fd.read(6))
+        records = []
+        offset = position = 0
+        for REC_LEN, REC_TYP, REC_SUB, REC in records_from_file(FileName):
+            position += 4 + REC_LEN
+            if (REC_TYP, REC_SUB) in SUMMARY_TS or (REC_TYP, REC_SUB) in TOLERATED_TS:
+                records.append(((REC_TYP, REC_SUB), REC))
+            else:
+                records = []
+                offset = position
+        return endian, version, records, offset
+    from ATE.utils.seekable import open_seekable
+    with index:
+        TS = index.column('REC_TYP').astype(np.int64) * 256 + index.column('REC_SUB')
+        others = np.flatnonzero(~np.isin(TS, [REC_TYP * 256 + REC_SUB for REC_TYP, REC_SUB in list(SUMMARY_TS) + TOLERATED_TS]))
+        first = int(others[-1]) + 1 if len(others) else 0
+        offsets = index.column('offset')[first:].tolist()
+        lengths = index.column('REC_LEN')[first:].tolist()
+        types = [divmod(value, 256) for value in TS[first:].tolist()]
+        offset = offsets[0] if offsets else index.meta['uncompressed_size']
+        records = []
+        if offsets:
+            with open_seekable(FileName) as fd:
+                fd.seek(offsets[0])
+                block = fd.read(offsets[-1] + 4 + lengths[-1] - offsets[0])
+            for record_offset, REC_LEN, TS in zip(offsets, lengths, types):
+                start = record_offset - offsets[0]
+                records.append((TS, block[start:start + 4 + REC_LEN]))
+        return index.endian, index.version, records, offset
+
+
+def read_summary(FileName, window=64*1024, depth=8):
+    '''
+    Returns the STDFSummary of FileName, None if FileName is not an STDF file.
+    window is the initial size of the tail that is examined, it is doubled until the summary block is found.
+    '''
+    if not is_STDF(FileName):
+        return None
+    if is_supported_compressed_STDF_file(FileName):
+        endian, version, records, offset = _summary_compressed(FileName)
+    else:
+        endian, version, records, offset = _summary_uncompressed(FileName, window, depth)
+    if version != 'V4':
+        raise STDFError("read_summary : '%s' is a %s file, only V4 has the summary at the end" % (FileName, version))
+    return STDFSummary(FileName, endian, version, records, offset)
+
+
+def count_parts(FileName):
+    '''
+    Returns the number of parts (PRR's) in FileName, from the PCR if present, otherwise the PRR's are counted.
+    Returns None if FileName is not an STDF file.
+    '''
+    summary = read_summary(FileName)
+    if summary is None:
+        return None
+    retval = summary.part_count()
+    if retval is not None:
+        return retval
+    from ATE.data.STDF.sidecar import load_STDF_index
+    index = load_STDF_index(FileName)
+    if index is not None:
+        with index:
+            return index.part_count()
+    if is_supported_compressed_STDF_file(FileName):
+        return sum(1 for _, REC_TYP, REC_SUB, _ in records_from_file(FileName) if (REC_TYP, REC_SUB) == (5, 20))
+    from ATE.data.STDF.scanner import STDFScanner
+    with STDFScanner(FileName) as scanner:
+        return int(scanner.mask('PRR').sum())
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    start = time.time()
+    summary = read_summary(FileName)
+    tail = time.time() - start
+    print("tail first : %s summary records in %.3f seconds, %s" % (len(summary), tail, summary.to_dict()))
+
+    start = time.time()
+    count = sum(1 for _, REC_TYP, REC_SUB, _ in records_from_file(FileName) if (REC_TYP, REC_SUB) in SUMMARY_TS)
+    forward = time.time() - start
+    print("forward    : %s summary records in %.3f seconds (%.0fx)" % (count, forward, forward / tail))
@@ -0,0 +1,286 @@
+'''
+Created on Oct 18, 2026
+
+Deterministic synthetic STDF (V4) lots, for tests and benchmarks.
+
+A lot is FAR, MIR, WCR, then per wafer WIR, the parts and WRR, followed by the
+summary (TSR's, HBR's, SBR's and PCR's, see ATE.data.STDF.subset.SummaryTally)
+and the MRR. The parts are tested in touchdowns of 'sites' dies, a part has
+the PTR's, MPR's and FTR's (in that order) of the test program :
+
+    - ftr_ratio and mpr_ratio are the fractions of the tests that are FTR's
+      and MPR's (with 'pins' results), the others are PTR's.
+    - every test fails with the same probability, so that about fail_rate of
+      the parts fail. The results of a test are normal around a per test
+      mean, the limits are at 6 sigma, a fail is at 7 sigma.
+    - the first failing test of a part decides its (hard and soft) bin, the
+      good parts are in bin 1.
+    - a retest_rate fraction of the dies of a wafer (of the lot if wafers=0)
+      is tested again at the end of the wafer, those PRR's have the 'retest'
+      PART_FLG bit (bit 1 on a wafer, bit 0 for packaged parts) set.
+
+Everything is drawn from one np.random.RandomState(seed), so a seed gives the
+same file (for an endian), whatever the compression. write_synthetic_lot
+returns what it wrote (the part, retest, good and record counts) so readers
+can be checked against it. parts_for_size gives the number of parts for a
+(decompressed) file size :
+
+    truth = write_synthetic_lot('lot.std.xz', parts=parts_for_size(1 << 30), compression='lzma')
+'''
+import math
+
+import numpy as np
+
+from ATE.data.STDF.records import MIR, MRR, WCR, WIR, WRR, STDFError
+from ATE.data.STDF.subset import HBR_TS, SBR_TS, SummaryTally
+from ATE.data.STDF.writer import STDFWriter
+
+FIRST_TEST = 1000
+FAIL_BINS = 8
+START_T = 1600000000
+
+
+def _test_counts(tests, ftr_ratio, mpr_ratio):
+    FTRs = int(round(tests * ftr_ratio))
+    MPRs = int(round(tests * mpr_ratio))
+    if min(ftr_ratio, mpr_ratio) < 0 or FTRs + MPRs > tests:
+        raise STDFError("synthetic lot : ftr_ratio (%s) and mpr_ratio (%s) don't fit %s tests" % (ftr_ratio, mpr_ratio, tests))
+    return tests - FTRs - MPRs, MPRs, FTRs
+
+
+def parts_for_size(size, tests=100, sites=4, ftr_ratio=0.1, mpr_ratio=0.1, retest_rate=0.02, pins=4, **kwargs):
+    '''
+    Returns the (approximate) number of parts for a lot of size bytes (decompressed), the other arguments are
+    those of write_synthetic_lot.
+    '''
+    PTRs, MPRs, FTRs = _test_counts(tests, ftr_ratio, mpr_ratio)
+    part = 6 + 24 + 8 + 16 * PTRs + (16 + 4 * pins) * MPRs + 11 * FTRs # PIR, PRR (with PART_ID) and the tests
+    return max(1, int(size / (part * (1.0 + retest_rate))))
+
+
+class _Lot(object):
+    '''
+    The test program and the tallies of a synthetic lot.
+    '''
+
+    def __init__(self, endian, random, tests, ftr_ratio, mpr_ratio, fail_rate, pins, sites):
+        self.endian = endian
+        self.random = random
+        self.PTRs, self.MPRs, self.FTRs = _test_counts(tests, ftr_ratio, mpr_ratio)
+        self.pins = pins
+        self.sites = sites
+        self.TEST_NUM = np.arange(FIRST_TEST, FIRST_TEST + tests, dtype=np.uint32)
+        self.fail_probability = 1.0 - (1.0 - fail_rate) ** (1.0 / max(tests, 1))
+        self.mean = random.uniform(-1.0, 1.0, tests)
+        self.sigma = random.uniform(0.01, 0.1, tests)
+        # TSR tallies per site and test : EXEC_CNT, FAIL_CNT, (result) count, min, max, sum, sum of squares
+        self.EXEC_CNT = np.zeros((sites, tests), dtype=np.int64)
+        self.FAIL_CNT = np.zeros((sites, tests), dtype=np.int64)
+        self.count = np.zeros((sites, tests), dtype=np.int64)
+        self.minimum = np.full((sites, tests), np.inf)
+        self.maximum = np.full((sites, tests), -np.inf)
+        self.sums = np.zeros((sites, tests))
+        self.squares = np.zeros((sites, tests))
+        self.tally = SummaryTally()
+        self.tally.bin_names[HBR_TS][1] = self.tally.bin_names[SBR_TS][1] = ('P', 'PASS')
+        for BIN_NUM in range(2, 2 + FAIL_BINS):
+            self.tally.bin_names[HBR_TS][BIN_NUM] = self.tally.bin_names[SBR_TS][BIN_NUM] = ('F', 'FAIL_%d' % (BIN_NUM - 1))
+        for test, TEST_NUM in enumerate(self.TEST_NUM.tolist()):
+            self.tally.test_names[TEST_NUM] = self.name(test)
+        self.MPR_dtype = np.dtype([('REC_LEN', endian + 'u2'), ('REC_TYP', 'u1'), ('REC_SUB', 'u1'), ('TEST_NUM', endian + 'u4'),
+                                   ('HEAD_NUM', 'u1'), ('SITE_NUM', 'u1'), ('TEST_FLG', 'u1'), ('PARM_FLG', 'u1'),
+                                   ('RTN_ICNT', endian + 'u2'), ('RSLT_CNT', endian + 'u2'), ('RTN_RSLT', endian + 'f4', (pins,))])
+        self.FTR_dtype = np.dtype([('REC_LEN', endian + 'u2'), ('REC_TYP', 'u1'), ('REC_SUB', 'u1'), ('TEST_NUM', endian + 'u4'),
+                                   ('HEAD_NUM', 'u1'), ('SITE_NUM', 'u1'), ('TEST_FLG', 'u1')])
+
+    def name(self, test):
+        kind = 'ptr' if test < self.PTRs else 'mpr' if test < self.PTRs + self.MPRs else 'ftr'
+        return '%s_%d' % (kind, FIRST_TEST + test)
+
+    def define(self, writer):
+        for test in range(self.PTRs):
+            limit = 6 * self.sigma[test]
+            writer.define_ptr(int(self.TEST_NUM[test]), self.name(test), lo_limit=float(self.mean[test] - limit),
+                              hi_limit=float(self.mean[test] + limit), units='V')
+
+    def results(self, count):
+        '''
+        Returns (results, fails) of count parts : results[part, test, pin] (float32) and fails[part, test].
+        '''
+        tests = len(self.TEST_NUM)
+        fails = self.random.random_sample((count, tests)) < self.fail_probability
+        deviation = self.random.standard_normal((count, tests, self.pins))
+        deviation = np.clip(deviation, -5.0, 5.0)
+        side = np.where(self.random.random_sample((count, tests)) < 0.5, -7.0, 7.0)
+        deviation[fails] = side[fails][:, None]
+        return (self.mean[None, :, None] + deviation * self.sigma[None, :, None]).astype(np.float32), fails
+
+    def add(self, sites, results, fails):
+        '''
+        Adds the tests of parts (on sites) to the TSR tallies, the PTR results are the first pin.
+        '''
+        PTRs = self.PTRs
+        values = results[:, :PTRs, 0].astype(np.float64)
+        for site in np.unique(sites).tolist():
+            selected = sites == site
+            self.EXEC_CNT[site] += np.count_nonzero(selected)
+            self.FAIL_CNT[site] += np.count_nonzero(fails[selected], axis=0)
+            if PTRs:
+                self.count[site, :PTRs] += np.count_nonzero(selected)
+                self.minimum[site, :PTRs] = np.minimum(self.minimum[site, :PTRs], values[selected].min(axis=0))
+                self.maximum[site, :PTRs] = np.maximum(self.maximum[site, :PTRs], values[selected].max(axis=0))
+                self.sums[site, :PTRs] += values[selected].sum(axis=0)
+                self.squares[site, :PTRs] += np.square(values[selected]).sum(axis=0)
+
+    def write_tests(self, writer, site, results, fails):
+        '''
+        Writes the test records of one part (on site).
+        '''
+        PTRs, MPRs = self.PTRs, self.MPRs
+        TEST_FLG = np.where(fails, 0x80, 0).astype(np.uint8)
+        if PTRs:
+            writer.write_ptrs(self.TEST_NUM[:PTRs], 1, site, TEST_FLG[:PTRs], results[:PTRs, 0])
+        if MPRs:
+            records = np.zeros(MPRs, dtype=self.MPR_dtype)
+            records['REC_LEN'] = self.MPR_dtype.itemsize - 4
+            records['REC_TYP'], records['REC_SUB'] = 15, 15
+            records['TEST_NUM'] = self.TEST_NUM[PTRs:PTRs + MPRs]
+            records['HEAD_NUM'], records['SITE_NUM'] = 1, site
+            records['TEST_FLG'] = TEST_FLG[PTRs:PTRs + MPRs]
+            records['RSLT_CNT'] = self.pins
+            records['RTN_RSLT'] = results[PTRs:PTRs + MPRs]
+            self._write_block(writer, records, site)
+        if self.FTRs:
+            records = np.zeros(self.FTRs, dtype=self.FTR_dtype)
+            records['REC_LEN'] = self.FTR_dtype.itemsize - 4
+            records['REC_TYP'], records['REC_SUB'] = 15, 20
+            records['TEST_NUM'] = self.TEST_NUM[PTRs + MPRs:]
+            records['HEAD_NUM'], records['SITE_NUM'] = 1, site
+            records['TEST_FLG'] = TEST_FLG[PTRs + MPRs:]
+            self._write_block(writer, records, site)
+
+    def _write_block(self, writer, records, site):
+        writer.write_raw(records.tobytes(), 1, site)
+        writer.records += len(records) - 1
+
+    def summary_records(self):
+        '''
+        Returns the packed TSR's, HBR's, SBR's and PCR's.
+        '''
+        for site in range(self.sites):
+            for test, TEST_NUM in enumerate(self.TEST_NUM.tolist()):
+                if not self.EXEC_CNT[site, test]:
+                    continue
+                TEST_TYP = 'P' if test < self.PTRs else 'M' if test < self.PTRs + self.MPRs else 'F'
+                count = int(self.count[site, test])
+                self.tally.tests[(1, site, TEST_NUM)] = [TEST_TYP, int(self.EXEC_CNT[site, test]), int(self.FAIL_CNT[site, test]), 0, count,
+                                                         float(self.minimum[site, test]) if count else 0.0,
+                                                         float(self.maximum[site, test]) if count else 0.0,
+                                                         float(self.sums[site, test]), float(self.squares[site, test])]
+        return self.tally.records(self.endian)
+
+
+def write_synthetic_lot(FileName, parts=1000, tests=100, sites=4, wafers=1, ftr_ratio=0.1, mpr_ratio=0.1, retest_rate=0.02,
+                        compression=None, endian='<', seed=0, fail_rate=0.1, pins=4, block_size=4096):
+    '''
+    Writes a synthetic lot of parts dies (plus the retests) to FileName, see the module docstring.
+    wafers=0 is a packaged (final test) lot without WIR/WRR's and die coordinates.
+    Returns {'parts' : PRR's, 'dies', 'retests', 'good' : good PRR's, 'good_dies' : good after the retests,
+    'records', 'wafers', 'tests' : {'PTR', 'MPR', 'FTR'}, 'seed'}
+    '''
+    if parts < 1 or sites < 1 or not 1 <= tests or not 0 <= retest_rate <= 1 or wafers < 0:
+        raise STDFError("write_synthetic_lot : invalid lot (parts=%s, tests=%s, sites=%s, wafers=%s, retest_rate=%s)" % (parts, tests, sites, wafers, retest_rate))
+    random = np.random.RandomState(seed)
+    lot = _Lot(endian, random, tests, ftr_ratio, mpr_ratio, fail_rate, pins, sites)
+    retval = {'parts' : 0, 'dies' : parts, 'retests' : 0, 'good' : 0, 'good_dies' : 0, 'records' : 0, 'wafers' : wafers,
+              'tests' : {'PTR' : lot.PTRs, 'MPR' : lot.MPRs, 'FTR' : lot.FTRs}, 'seed' : seed}
+    with STDFWriter(FileName, endian=endian, compression=compression) as writer:
+        mir = MIR('V4', endian)
+        for field, value in [('SETUP_T', START_T), ('START_T', START_T), ('STAT_NUM', 1), ('MODE_COD', 'P'),
+                             ('LOT_ID', 'SYN%d' % seed), ('PART_TYP', 'SYNTHETIC'), ('NODE_NAM', 'synthetic'),
+                             ('TSTR_TYP', 'synthetic'), ('JOB_NAM', 'synthetic'), ('JOB_REV', '1')]:
+            mir.set_value(field, value)
+        writer.write_record(mir)
+        if wafers:
+            wcr = WCR('V4', endian)
+            for field, value in [('WF_FLAT', 'D'), ('POS_X', 'R'), ('POS_Y', 'D')]:
+                wcr.set_value(field, value)
+            writer.write_record(wcr)
+        lot.define(writer)
+        for wafer, dies in enumerate(np.array_split(np.arange(parts), max(wafers, 1))):
+            WAFER_ID = 'W%02d' % (wafer + 1)
+            if wafers:
+                wir = WIR('V4', endian)
+                for field, value in [('HEAD_NUM', 1), ('SITE_GRP', 255), ('START_T', START_T), ('WAFER_ID', WAFER_ID)]:
+                    wir.set_value(field, value)
+                writer.write_record(wir)
+            counts = _write_wafer(writer, lot, dies, wafers > 0, retest_rate, block_size)
+            for key in counts:
+                retval[key] += counts[key]
+            if wafers:
+                wrr = WRR('V4', endian)
+                for field, value in [('HEAD_NUM', 1), ('SITE_GRP', 255), ('FINISH_T', START_T), ('PART_CNT', counts['parts']),
+                                     ('RTST_CNT', counts['retests']), ('ABRT_CNT', 0), ('GOOD_CNT', counts['good']),
+                                     ('FUNC_CNT', 4294967295), ('WAFER_ID', WAFER_ID)]:
+                    wrr.set_value(field, value)
+                writer.write_record(wrr)
+        for record in lot.summary_records():
+            writer.write_raw(record)
+        mrr = MRR('V4', endian)
+        mrr.set_value('FINISH_T', START_T)
+        writer.write_record(mrr)
+        retval['records'] = writer.records
+    return retval
+
+
+def _write_wafer(writer, lot, dies, on_wafer, retest_rate, block_size):
+    '''
+    Writes the parts of dies (the numbers of the dies of a wafer) and their retests.
+    '''
+    random, sites = lot.random, lot.sites
+    retests = np.sort(random.choice(len(dies), int(round(retest_rate * len(dies))), replace=False))
+    jobs = np.concatenate([np.arange(len(dies)), retests])
+    side = int(math.ceil(math.sqrt(len(dies))))
+    first = {} # die -> (PART_FLG, HARD_BIN, SOFT_BIN, SITE_NUM) of the (latest) test
+    retval = {'parts' : 0, 'retests' : 0, 'good' : 0, 'good_dies' : 0}
+    for start in range(0, len(jobs), block_size * sites):
+        block = jobs[start:start + block_size * sites]
+        results, fails = lot.results(len(block))
+        block_sites = np.arange(len(block)) % sites
+        lot.add(block_sites, results, fails)
+        failed = fails.any(axis=1)
+        first_fail = np.argmax(fails, axis=1)
+        bins = np.where(failed, 2 + first_fail % FAIL_BINS, 1).tolist()
+        for touchdown in range(0, len(block), sites):
+            numbers = range(touchdown, min(touchdown + sites, len(block)))
+            for number in numbers:
+                writer.write_pir(1, int(block_sites[number]))
+            for number in numbers:
+                site = int(block_sites[number])
+                die = int(block[number])
+                lot.write_tests(writer, site, results[number], fails[number])
+                retest = start + number >= len(dies)
+                PART_FLG = (0x08 if failed[number] else 0) | ((0x02 if on_wafer else 0x01) if retest else 0)
+                X, Y = (die % side, die // side) if on_wafer else (-32768, -32768)
+                number_of_die = int(dies[die])
+                writer.write_prr(1, site, bins[number], bins[number], PART_FLG, len(lot.TEST_NUM), X, Y, part_id=str(number_of_die + 1))
+                if retest:
+                    lot.tally.supersede(1, first[die][3], *first[die][:3])
+                    retval['retests'] += 1
+                lot.tally.part(1, site, PART_FLG, bins[number], bins[number])
+                first[die] = (PART_FLG, bins[number], bins[number], site)
+                retval['parts'] += 1
+                retval['good'] += 0 if failed[number] else 1
+    retval['good_dies'] = sum(1 for PART_FLG, _, _, _ in first.values() if not PART_FLG & 0x18)
+    return retval
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    size = float(sys.argv[2]) * 1024 * 1024 if len(sys.argv) > 2 else 100 * 1024 * 1024
+    start = time.time()
+    truth = write_synthetic_lot(FileName, parts=parts_for_size(size))
+    print("%s parts (%s records) written in %.3f seconds" % (truth['parts'], truth['records'], time.time() - start))
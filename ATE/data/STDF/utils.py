@@ -9,12 +9,9 @@ import struct
 import sys
 
 from ATE.data.STDF.records import *
-from ATE.utils.compression import default_compression
-from ATE.utils.compression import get_deflated_file_size
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.probe import probe_file
 from ATE.utils.compression import supported_compressions
-from ATE.utils.compression import supported_compressions_extensions
-from ATE.utils.magicnumber import extension_from_magic_number_in_file
-from ATE.utils.magicnumber import is_compressed_file
 from ATE.utils.varia import os_is_case_sensitive
 from ATE.utils.varia import path_is_writeable_by_me
 
@@ -1672,10 +1669,11 @@ def has_pretty_STDF_extension(FileName):
     here xx are the supported compression extensions
     '''
     if not has_valid_STDF_extension(FileName): return False # based on filename
-    if not is_STDF(FileName): return False # based on contents
-    if is_compressed_file(FileName, list(supported_compressions_extensions)):
-        ext = extension_from_magic_number_in_file(FileName)
-        if len(ext)==1 and (FileName.upper().endswith(".STD%s" % ext[0].upper()) or FileName.upper().endswith('.STDF%s' % ext[0].upper())): return True
+    probe = probe_file(FileName)
+    if probe is None or not probe.is_STDF: return False # based on contents
+    if probe.compression:
+        ext = supported_compressions[probe.compression]
+        if FileName.upper().endswith(".STD%s" % ext.upper()) or FileName.upper().endswith('.STDF%s' % ext.upper()): return True
     else:
         if FileName.upper().endswith(".STD") or FileName.upper().endswith('.STDF'): return True
     return False
@@ -1712,94 +1710,50 @@ def is_STDF(FileName):
     (that is the magic number of an STDF file) if so return True, False otherwise.
 
     Note, it is checked if the file is compressed (only supports gzip, bz2 and lzma), if so,
-    the uncompressed file is examined.
+    the uncompressed file is examined. The result is cached, see ATE.data.STDF.probe
     '''
-    if not os.path.exists(FileName):
-        return False
-
-    if not os.path.isfile(FileName):
-        return False
-
-    if is_compressed_file(FileName, ['.gz', '.xz', '.bz2']):
-        extension = extension_from_magic_number_in_file(FileName)[0]
-        if extension == '.gz':
-            import gzip
-            with gzip.open(FileName, 'rb') as fd:
-                FAR = fd.read(4)
-                REC_TYP, REC_SUB = struct.unpack('BB', FAR[2:4])
-                if REC_TYP == 0 and REC_SUB == 10:
-                    return True
-                else:
-                    return False
-        elif extension == '.bz2':
-            import bz2
-            with bz2.open(FileName, 'rb') as fd:
-                FAR = fd.read(4)
-                REC_TYP, REC_SUB = struct.unpack('BB', FAR[2:4])
-                if REC_TYP == 0 and REC_SUB == 10:
-                    return True
-                else:
-                    return False
-        elif extension == '.xz':
-            import lzma
-            with lzma.open(FileName, 'rb') as fd:
-                FAR = fd.read(4)
-                REC_TYP, REC_SUB = struct.unpack('BB', FAR[2:4])
-                if REC_TYP == 0 and REC_SUB == 10:
-                    return True
-                else:
-                    return False
-        else:
-            raise Exception("Shouldn't reach this point (%s)" % extension)
-    else:
-        with open(FileName, 'rb') as fd:
-            FAR = fd.read(4)
-            REC_TYP, REC_SUB = struct.unpack('BB', FAR[2:4])
-            if REC_TYP == 0 and REC_SUB == 10:
-                return True
-            else:
-                return False
+    probe = probe_file(FileName)
+    return probe is not None and probe.is_STDF
 
 def is_supported_compressed_STDF_file(FileName):
     '''
     Returns True if FileName is a supported compressed file, False otherwise
     '''
-    if not is_STDF(FileName): return False
-    ext = extension_from_magic_number_in_file(FileName, supported_compressions_extensions)
-    if len(ext)!=1: return False
-    return True
+    probe = probe_file(FileName)
+    return probe is not None and probe.is_STDF and probe.compression != ''
 
 def endian_and_version_from_file(FileName):
     '''
     Returns the endian and version from FileName.
     if something went wrong, both are empty strings.
     '''
-    tmp = records_from_file(FileName)
-    endian = ''
-    version = ''
-    if tmp!=None: # success
-        endian = tmp.endian
-        version = tmp.version
-    return endian, version
+    probe = probe_file(FileName)
+    if probe is None or not probe.is_STDF:
+        return '', ''
+    return probe.endian, probe.version
 
 def MIR_from_file(FileName):
     '''
     return *THE* MIR object from FileName.
     '''
-    endian, version = endian_and_version_from_file(FileName)
-    if endian=='' or version=='': return MIR()
-    for _, REC_TYP, REC_SUB, REC in records_from_file(FileName):
-        if REC_TYP==1 and REC_SUB==10: break
-    return MIR(version, endian, REC)
+    probe = probe_file(FileName)
+    if probe is None or not probe.is_STDF: return MIR()
+    retval = probe.MIR()
+    if retval is None and not probe.header_complete: # (a huge header)
+        for _, REC_TYP, REC_SUB, REC in records_from_file(FileName):
+            if REC_TYP==1 and REC_SUB==10:
+                return MIR(probe.version, probe.endian, REC)
+    return retval if retval is not None else MIR()
 
 def SDRs_from_file(FileName):
     '''
     return the SDR(s) objects from FileName.
     '''
+    probe = probe_file(FileName)
+    if probe is None or not probe.is_STDF: return []
+    if probe.header_complete:
+        return [REC for _, REC_TYP, REC_SUB, REC in probe.header_records() if (REC_TYP, REC_SUB) == (1, 80)]
     retval = []
-    endian, version = endian_and_version_from_file(FileName)
-    print(endian, version)
-    if endian=='' or version=='': return retval
     for _, REC_TYP, REC_SUB, REC in records_from_file(FileName):
         if (REC_TYP, REC_SUB) not in [(0, 10), (0, 20),(1, 10),(1, 70), (1, 80)]: break
         if (REC_TYP, REC_SUB) == (1, 80):
@@ -1853,16 +1807,16 @@ def TEST_NUM_from_record(record, endian):
     Note: TEST_NUM is for these records always located on offset 4..7
 
                 REC_TYP   REC_SUB   TEST_NUM (V4)
-           PTR      15       10       4:7
-           MPR      15       15       4:7
-           FTR      15       20       4:7
+           PTR      15       10       4:8
+           MPR      15       15       4:8
+           FTR      15       20       4:8
 
           Also note that endian is important here!
     '''
     REC_TYP, REC_SUB = TS_from_record(record)
     TEST_NUM = -1
     if REC_TYP == 15 and REC_SUB in [10, 15, 20]:
-        TEST_NUM = struct.unpack("%sI" % endian, record[4:7])
+        TEST_NUM, = struct.unpack("%sI" % endian, record[4:8])
     return TEST_NUM
 
 class records_from_file(object):
@@ -1870,40 +1824,21 @@ class records_from_file(object):
     This is a *QUICK* iterator class that returns the next record from an STDF file each time it is called.
     It is fast because it doesn't check versions, extensions and it doesn't unpack the record and skips unknown records.
     It does support gzip, bz2 and lzma compression.
+    The file is read (and decompressed) in big blocks by a background thread, see ATE.data.STDF.stream
     '''
     def __init__(self, FileName):
         self.fd = None
+        self.records = None
         if not isinstance(FileName, str): return
-        if not os.path.exists(FileName): return
-        if not os.path.isfile(FileName): return
-        if not is_STDF(FileName): return
-        if is_supported_compressed_STDF_file(FileName):
-            ext = extension_from_magic_number_in_file(FileName)
-            if len(ext)!=1: return
-            compression = supported_compressions_extensions[ext[0]]
-            if compression=='lzma':
-                import lzma
-                self.fd = lzma.open(FileName, 'rb')
-            elif compression=='bz2':
-                import bz2
-                self.fd = bz2.open(FileName, 'rb')
-            elif compression=='gzip':
-                import gzip
-                self.fd = gzip.open(FileName, 'rb')
-            else:
-                raise Exception("the %s compression is supported but not fully implemented." % compression)
-        else:
-            self.fd = open(FileName, 'rb')
-        buff = self.fd.read(6)
-        CPU_TYPE, STDF_VER = struct.unpack('BB', buff[4:])
-        if CPU_TYPE == 1: self.endian = '>'
-        elif CPU_TYPE == 2: self.endian = '<'
-        else: self.endian = '?'
-        self.version = 'V%s' % STDF_VER
-        self.fd.seek(0)
+        probe, self.fd = open_STDF(FileName) # (one open, also for compressed files)
+        if self.fd == None: return
+        self.endian = probe.endian
+        self.version = probe.version
         self.unpack_fmt = '%sHBB' % self.endian
 
     def __del__(self):
+        if self.records != None:
+            self.records.close()
         if self.fd != None:
             self.fd.close()
 
@@ -1911,16 +1846,12 @@ class records_from_file(object):
         return self
 
     def __next__(self):
-        while self.fd!=None:
-            while True:
-                header = self.fd.read(4)
-                if len(header)!=4:
-                    raise StopIteration
-                REC_LEN, REC_TYP, REC_SUB = struct.unpack(self.unpack_fmt, header)
-                footer = self.fd.read(REC_LEN)
-                if len(footer)!=REC_LEN:
-                    raise StopIteration
-                return REC_LEN, REC_TYP, REC_SUB, header+footer
+        if self.fd == None:
+            raise StopIteration
+        if self.records == None:
+            from ATE.data.STDF.stream import records_from_stream
+            self.records = records_from_stream(self.fd, self.endian)
+        return next(self.records)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,331 @@
+'''
+Created on Oct 18, 2026
+
+Vectorized wafer maps.
+
+The parts (X_COORD, Y_COORD and a value per part, like the HARD_BIN or a test
+result) are rasterized into dense 2-D NumPy arrays, all at once : the
+coordinates are turned into a linear (pixel) index and the values are scattered
+into the map, when a die is tested more than once the last part wins (retest).
+
+The orientation comes from the WCR : POS_X ('L' or 'R') and POS_Y ('U' or 'D')
+tell in what direction the coordinates go up. Row 0 of a map is the top and
+column 0 the left, so with POS_X='R' and POS_Y='U' the X coordinates go up to
+the right and the Y coordinates go up to the top. Missing (' ') directions
+default to 'R' and 'D' (row = Y).
+
+All wafers of a lot are rasterized into one 3-D cube (wafer, row, column) with
+common bounds, so stacked maps (the mean of a parameter, the fraction of the
+wafers where a die is in bin 1, ...) are reductions over the first axis.
+
+    maps = wafer_maps_from_file('lot.std')
+    maps.map('W01', 'HARD_BIN')               # 2-D array (cached)
+    maps.add_test(1000)                       # the results of PTR 1000 as parameter 'TEST_1000'
+    maps.stacked('HARD_BIN', 'fraction', value=1)
+'''
+import collections
+import warnings
+
+import numpy as np
+
+from ATE.data.STDF import instrumentation
+from ATE.data.STDF.records import STDFError
+
+default_orientation = ('R', 'D')
+missing_coordinate = -32768
+stack_reducers = ['mean', 'sum', 'min', 'max', 'count', 'fraction']
+
+
+def orientation_from_WCR(WCR):
+    '''
+    Returns (POS_X, POS_Y) of a WCR (a record object or None), missing directions get the default orientation.
+    '''
+    if WCR is None:
+        return default_orientation
+    POS_X = (WCR.get_value('POS_X') or ' ').strip().upper()
+    POS_Y = (WCR.get_value('POS_Y') or ' ').strip().upper()
+    return (POS_X if POS_X in ['L', 'R'] else default_orientation[0], POS_Y if POS_Y in ['U', 'D'] else default_orientation[1])
+
+
+def bounds_of(X_COORD, Y_COORD):
+    '''
+    Returns (X_MIN, X_MAX, Y_MIN, Y_MAX) of the (valid) coordinates, None if there are none.
+    '''
+    X_COORD = np.asarray(X_COORD)
+    Y_COORD = np.asarray(Y_COORD)
+    valid = (X_COORD != missing_coordinate) & (Y_COORD != missing_coordinate)
+    if not valid.any():
+        return None
+    return int(X_COORD[valid].min()), int(X_COORD[valid].max()), int(Y_COORD[valid].min()), int(Y_COORD[valid].max())
+
+
+def _pixels(X_COORD, Y_COORD, bounds, orientation):
+    '''
+    Returns (pixel index, valid mask, (rows, columns)) of the coordinates.
+    '''
+    X_MIN, X_MAX, Y_MIN, Y_MAX = bounds
+    POS_X, POS_Y = orientation
+    X_COORD = np.asarray(X_COORD, dtype=np.int64)
+    Y_COORD = np.asarray(Y_COORD, dtype=np.int64)
+    columns = X_COORD - X_MIN if POS_X == 'R' else X_MAX - X_COORD
+    rows = Y_COORD - Y_MIN if POS_Y == 'D' else Y_MAX - Y_COORD
+    shape = (Y_MAX - Y_MIN + 1, X_MAX - X_MIN + 1)
+    valid = ((X_COORD != missing_coordinate) & (Y_COORD != missing_coordinate) &
+             (columns >= 0) & (columns < shape[1]) & (rows >= 0) & (rows < shape[0]))
+    return rows * shape[1] + columns, valid, shape
+
+
+def _fill_value(dtype, fill):
+    if fill is not None:
+        return fill
+    return np.nan if np.dtype(dtype).kind in 'fc' else -1
+
+
+def _scatter(size, pixels, values, fill):
+    '''
+    Returns a 1-D array of size with the values at pixels, the last value wins for a pixel that is given more than once.
+    '''
+    retval = np.full(size, fill, dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+    if len(pixels):
+        order = np.argsort(pixels, kind='stable')
+        pixels = pixels[order]
+        last = np.flatnonzero(np.r_[pixels[1:] != pixels[:-1], True]) # the last of each run of equal pixels
+        retval[pixels[last]] = values[order[last]]
+    return retval
+
+
+def rasterize(X_COORD, Y_COORD, values, orientation=default_orientation, bounds=None, fill=None):
+    '''
+    Returns (map, bounds) : the values rasterized in a 2-D array (row 0 = top) and (X_MIN, X_MAX, Y_MIN, Y_MAX).
+    Dies without a value get fill (default NaN for float values, -1 for integers).
+    '''
+    values = np.asarray(values)
+    if bounds is None:
+        bounds = bounds_of(X_COORD, Y_COORD)
+        if bounds is None:
+            return np.zeros((0, 0), dtype=values.dtype), None
+    pixels, valid, shape = _pixels(X_COORD, Y_COORD, bounds, orientation)
+    retval = _scatter(shape[0] * shape[1], pixels[valid], values[valid], _fill_value(values.dtype, fill))
+    return retval.reshape(shape), bounds
+
+
+def wafer_cube(X_COORD, Y_COORD, wafers, values, orientation=default_orientation, bounds=None, fill=None):
+    '''
+    Returns (wafer_ids, cube, bounds) : the values of all wafers rasterized in a 3-D array (wafer, row, column)
+    with common bounds, wafers holds the wafer (id) of every part and wafer_ids are the (sorted) wafers of the cube.
+    '''
+    values = np.asarray(values)
+    wafer_ids, inverse = np.unique(np.asarray(wafers), return_inverse=True)
+    if bounds is None:
+        bounds = bounds_of(X_COORD, Y_COORD)
+        if bounds is None:
+            return wafer_ids, np.zeros((len(wafer_ids), 0, 0), dtype=values.dtype), None
+    pixels, valid, shape = _pixels(X_COORD, Y_COORD, bounds, orientation)
+    size = shape[0] * shape[1]
+    pixels = inverse.reshape(-1).astype(np.int64) * size + pixels
+    cube = _scatter(len(wafer_ids) * size, pixels[valid], values[valid], _fill_value(values.dtype, fill))
+    return wafer_ids, cube.reshape((len(wafer_ids),) + shape), bounds
+
+
+def stack(cube, how='mean', value=None, fill=None):
+    '''
+    Reduces a wafer cube to one map : the 'mean', 'sum', 'min' or 'max' of the values, the 'count' of the wafers
+    with a value or the 'fraction' of the wafers (with a value) where the value is value (eg: the bin 1 fraction).
+    fill is the value of the dies without a value (default NaN or -1, see rasterize).
+    '''
+    if how not in stack_reducers:
+        raise STDFError("stack : how should be one of %s, not '%s'" % (stack_reducers, how))
+    fill = _fill_value(cube.dtype, fill)
+    present = ~np.isnan(cube) if isinstance(fill, float) and np.isnan(fill) else cube != fill
+    count = present.sum(axis=0)
+    if how == 'count':
+        return count
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning) # (all NaN dies)
+        if how == 'fraction':
+            return np.where(count > 0, ((cube == value) & present).sum(axis=0) / count, np.nan)
+        data = np.where(present, cube, np.nan).astype(np.float64)
+        if how == 'sum':
+            return np.where(count > 0, np.nansum(data, axis=0), np.nan)
+        return {'mean' : np.nanmean, 'min' : np.nanmin, 'max' : np.nanmax}[how](data, axis=0)
+
+
+class WaferMaps(object):
+    '''
+    The wafer maps of a lot : per part columns (X_COORD, Y_COORD, wafer and parameters) and a cache of the
+    rasterized maps per (wafer, parameter) and of the cubes per parameter.
+    '''
+
+    def __init__(self, X_COORD, Y_COORD, wafers, orientation=default_orientation, parameters=None, cache_size=256):
+        self.X_COORD = np.asarray(X_COORD)
+        self.Y_COORD = np.asarray(Y_COORD)
+        self.wafers = np.asarray(wafers)
+        self.orientation = orientation
+        self.parameters = {}
+        self.bounds = bounds_of(self.X_COORD, self.Y_COORD)
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict() # (wafer, parameter) or (None, parameter) -> map or (wafer_ids, cube)
+        self.hits = 0
+        self.misses = 0
+        self.FileName = None
+        self.index = None
+        self.part = None # the part (PIR) index of every PRR, for add_test
+        for name, values in (parameters or {}).items():
+            self.add_parameter(name, values)
+
+    def __len__(self):
+        return len(self.X_COORD)
+
+    def wafer_ids(self):
+        return np.unique(self.wafers).tolist()
+
+    def add_parameter(self, name, values):
+        '''
+        Adds (or replaces) a parameter, values holds a value for every part.
+        '''
+        values = np.asarray(values)
+        if len(values) != len(self.X_COORD):
+            raise STDFError("WaferMaps.add_parameter : '%s' has %s values for %s parts" % (name, len(values), len(self.X_COORD)))
+        self.parameters[name] = values
+        for key in [key for key in self._cache if key[1] == name]:
+            del self._cache[key]
+
+    def add_test(self, TEST_NUM, name=None):
+        '''
+        Adds the RESULT of the PTR's with TEST_NUM as parameter (default name 'TEST_<TEST_NUM>', NaN if not tested),
+        only for maps made by wafer_maps_from_file. Returns the name.
+        '''
+        if self.FileName is None:
+            raise STDFError("WaferMaps.add_test : the maps are not made from a file")
+        from ATE.data.STDF.columns import extract_ptr_columns
+        name = 'TEST_%s' % TEST_NUM if name is None else name
+        columns = extract_ptr_columns(self.FileName, ['TEST_NUM', 'RESULT'], self.index)
+        selected = (columns['TEST_NUM'] == TEST_NUM) & (columns['part'] >= 0)
+        results = np.full(int(self.part.max()) + 1 if len(self.part) else 0, np.nan, dtype=np.float64)
+        results[columns['part'][selected]] = columns['RESULT'][selected]
+        self.add_parameter(name, results[self.part] if len(results) else np.zeros(0))
+        return name
+
+    def _cached(self, key, make):
+        retval = self._cache.get(key)
+        if retval is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            if instrumentation.current is not None:
+                instrumentation.current.cache('wafer_maps', True)
+            return retval
+        self.misses += 1
+        if instrumentation.current is not None:
+            instrumentation.current.cache('wafer_maps', False)
+        retval = self._cache[key] = make()
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return retval
+
+    def _parameter(self, parameter):
+        if parameter not in self.parameters:
+            raise STDFError("WaferMaps : unknown parameter '%s' (%s)" % (parameter, ', '.join(self.parameters)))
+        return self.parameters[parameter]
+
+    def map(self, wafer, parameter='HARD_BIN', fill=None):
+        '''
+        Returns the 2-D map of the parameter of the wafer (the bounds are the same for all wafers of the lot).
+        '''
+        values = self._parameter(parameter)
+
+        def make():
+            selection = self.wafers == wafer
+            if not selection.any():
+                raise STDFError("WaferMaps : unknown wafer '%s'" % wafer)
+            return rasterize(self.X_COORD[selection], self.Y_COORD[selection], values[selection], self.orientation, self.bounds, fill)[0]
+        return self._cached((wafer, parameter, fill), make)
+
+    def cube(self, parameter='HARD_BIN', fill=None):
+        '''
+        Returns (wafer_ids, cube) of the parameter, see wafer_cube.
+        '''
+        values = self._parameter(parameter)
+        return self._cached((None, parameter, fill), lambda: wafer_cube(self.X_COORD, self.Y_COORD, self.wafers, values,
+                                                                        self.orientation, self.bounds, fill)[:2])
+
+    def stacked(self, parameter='HARD_BIN', how='mean', value=None, fill=None):
+        '''
+        Returns the stacked map of all wafers, see stack.
+        '''
+        return stack(self.cube(parameter, fill)[1], how, value, fill)
+
+
+def wafer_maps_from_file(FileName, index=None, cache_size=256):
+    '''
+    Returns the WaferMaps of an STDF (V4) file, with the parameters 'HARD_BIN', 'SOFT_BIN' and 'PART_PF' (1 = good).
+    The PRR's are extracted as columns (see ATE.data.STDF.columns), the wafer of a part is the last WIR of its head
+    in front of the PRR and the orientation comes from the (first) WCR.
+    The (sidecar) index is build if None and then closed when done, an index that is passed is kept (as the index
+    of the maps, for add_test) and stays the caller's to close.
+    '''
+    from ATE.data.STDF.columns import extract_columns
+    from ATE.data.STDF.lazy import lazy_record_object
+    from ATE.data.STDF.sidecar import get_STDF_index
+    from ATE.utils.seekable import open_seekable
+
+    if index is None:
+        index = get_STDF_index(FileName, content_hash=False)
+        try:
+            retval = wafer_maps_from_file(FileName, index, cache_size)
+        finally:
+            index.close()
+        retval.index = None # (add_test gets the index again)
+        return retval
+    PRR = extract_columns(FileName, 'PRR', ['HEAD_NUM', 'X_COORD', 'Y_COORD', 'HARD_BIN', 'SOFT_BIN', 'PART_FLG'], index)
+    wafers = np.full(len(PRR['offset']), '', dtype=object)
+    WIR_offsets = index.offsets('WIR')
+    WCR = None
+    with open_seekable(FileName) as fd:
+        def record(offset):
+            fd.seek(int(offset))
+            header = fd.read(4)
+            REC_LEN = int.from_bytes(header[:2], 'little' if index.endian == '<' else 'big')
+            return header + fd.read(REC_LEN)
+        if len(WIR_offsets):
+            WIRs = [lazy_record_object(index.version, index.endian, 'WIR', record(offset)) for offset in WIR_offsets]
+            WIR_HEAD_NUM = np.array([WIR.get_value('HEAD_NUM') for WIR in WIRs])
+            WAFER_ID = np.array([WIR.get_value('WAFER_ID') for WIR in WIRs], dtype=object)
+            for HEAD_NUM in np.unique(PRR['HEAD_NUM']):
+                own = np.flatnonzero(WIR_HEAD_NUM == HEAD_NUM)
+                if not len(own): # (the WIR's of an other head)
+                    own = np.arange(len(WIRs))
+                selection = PRR['HEAD_NUM'] == HEAD_NUM
+                position = np.searchsorted(WIR_offsets[own], PRR['offset'][selection]) - 1
+                wafers[selection] = np.where(position >= 0, WAFER_ID[own][np.maximum(position, 0)], '')
+        WCR_offsets = index.offsets('WCR')
+        if len(WCR_offsets):
+            WCR = lazy_record_object(index.version, index.endian, 'WCR', record(WCR_offsets[0]))
+    PART_PF = np.where(PRR['PART_FLG'] & 0x18, 0, 1).astype(np.int8)
+    retval = WaferMaps(PRR['X_COORD'], PRR['Y_COORD'], wafers.astype(str), orientation_from_WCR(WCR),
+                       {'HARD_BIN' : PRR['HARD_BIN'], 'SOFT_BIN' : PRR['SOFT_BIN'], 'PART_PF' : PART_PF}, cache_size)
+    retval.FileName = FileName
+    retval.index = index
+    parts_PRR = index.column('parts/PRR')
+    order = np.argsort(parts_PRR, kind='stable')
+    retval.part = order[np.searchsorted(parts_PRR[order], PRR['offset'])]
+    return retval
+
+
+if __name__ == '__main__':
+    import time
+
+    wafers, dies = 25, 50000
+    side = int(np.sqrt(dies * 4 / np.pi)) + 1
+    X, Y = np.meshgrid(np.arange(side) - side // 2, np.arange(side) - side // 2)
+    inside = X ** 2 + Y ** 2 <= (side // 2) ** 2
+    X, Y = X[inside][:dies], Y[inside][:dies]
+    X_COORD, Y_COORD = np.tile(X, wafers), np.tile(Y, wafers)
+    WAFER = np.repeat(np.arange(wafers), len(X))
+    HARD_BIN = np.random.randint(1, 8, len(X_COORD)).astype(np.uint16)
+    start = time.time()
+    wafer_ids, cube, bounds = wafer_cube(X_COORD, Y_COORD, WAFER, HARD_BIN, ('R', 'U'))
+    elapsed = time.time() - start
+    print("wafer cube : %s wafers x %s dies -> %s in %.3f seconds" % (wafers, len(X), cube.shape, elapsed))
+    start = time.time()
+    stack(cube, 'fraction', value=1)
+    print("stacked bin 1 fraction in %.3f seconds" % (time.time() - start))
@@ -0,0 +1,463 @@
+'''
+Created on Oct 18, 2026
+
+Buffered STDF (V4) writer for datalogging on the tester.
+
+Instead of building record objects field by field, the STDFWriter has typed
+emit methods (write_ptr, write_ftr, write_pir, write_prr, ...) that pack the
+record straight into a pre-allocated bytearray with pre-compiled structs.
+
+    - Every site has its own part buffer, opened by write_pir and closed by
+      write_prr, so the records of a part end up together in the file (even
+      when the sites are tested in parallel).
+    - The records are collected in one big buffer that is written to the
+      file in one go when it is full, or every 'group_commit' parts.
+    - The static part of a PTR (text, limits, units, ...) can be defined once
+      with define_ptr, it is then emitted with the first PTR of that test in
+      the file only, all other PTR's are the minimal 16 byte records. As the
+      part buffers are written in PRR order, the PTR that gets the definition
+      is picked when a part buffer goes to the file.
+    - write_ptrs packs all the results of a site in one (NumPy) go.
+    - With compression the data is compressed in independent blocks by a pool
+      of threads (see ATE.utils.compression.BlockCompressor).
+
+    with STDFWriter('lot.std', compression='lzma') as writer:
+        writer.write_record(mir)
+        writer.define_ptr(1000, 'Idd', lo_limit=0.0, hi_limit=0.001, units='A')
+        for site in sites:
+            writer.write_pir(1, site)
+        ...
+        writer.write_ptr(1000, 1, site, 0, result)
+        ...
+        writer.write_prr(1, site, hard_bin=1, soft_bin=1)
+'''
+import os
+import struct
+
+import numpy as np
+
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import sys_endian
+from ATE.utils.compression import BlockCompressor
+from ATE.utils.compression import default_compression
+
+
+def _cn(value):
+    '''
+    Packs a C*n (or B*n) field, value is a string or bytes.
+    '''
+    if value is None:
+        return b'\x00'
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if len(value) > 255:
+        value = value[:255]
+    return bytes((len(value),)) + value
+
+
+class _Part(object):
+    '''
+    The (re-used) buffer of the part that is being tested on a site
+    '''
+    __slots__ = ('buffer', 'used', 'tests', 'open', 'pending')
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.used = 0
+        self.tests = 0
+        self.open = False
+        self.pending = [] # (offset, size, test_num) of the PTR's of defined tests that might get the definition
+
+
+class STDFWriter(object):
+    '''
+    Fast, buffered STDF V4 writer.
+
+    FileName     : the file to write (a file object is also accepted)
+    endian       : '<' or '>', default is the endian of the system
+    compression  : None, True (= default_compression) or one of 'lzma', 'gzip', 'bz2'
+    buffer_size  : the size of the write buffer, data is written when it is full
+    group_commit : if not None, the buffer is also written every group_commit parts
+    fsync        : os.fsync the file on every group commit (uncompressed only)
+    part_buffers : collect the records of a part per site (between PIR and PRR)
+    workers      : the number of compression threads
+    '''
+
+    def __init__(self, FileName, endian=None, compression=None, buffer_size=4*1024*1024, group_commit=None, fsync=False, part_buffers=True, workers=None):
+        if endian is None:
+            endian = sys_endian()
+        if endian not in ['<', '>']:
+            raise STDFError("STDFWriter : unsupported endian '%s'" % endian)
+        self.endian = endian
+        self.version = 'V4'
+        if compression is True:
+            compression = default_compression
+        self.compression = compression
+        self.keep_open = not isinstance(FileName, str)
+        if compression:
+            self.fd = BlockCompressor(FileName, compression, workers=workers)
+        elif self.keep_open:
+            self.fd = FileName
+        else:
+            self.fd = open(FileName, 'wb', buffering=0)
+        self.buffer = bytearray(buffer_size)
+        self.used = 0
+        self.group_commit = group_commit
+        self.fsync = fsync
+        self.part_buffers = part_buffers
+        self.parts = {}
+        self.parts_done = 0
+        self.records = 0
+        self.ptr_first = {}
+        self.closed = False
+
+        self.header = struct.Struct(endian + 'HBB')
+        self.ptr = struct.Struct(endian + 'HBBIBBBBf')
+        self.ptr_fixed = struct.Struct(endian + 'IBBBBf')
+        self.ptr_limits = struct.Struct(endian + 'Bbbbff')
+        self.ptr_specs = struct.Struct(endian + 'ff')
+        self.ftr = struct.Struct(endian + 'HBBIBBB')
+        self.pir = struct.Struct(endian + 'HBBBB')
+        self.prr = struct.Struct(endian + 'HBBBBBHHHhhI')
+        self.ptr_dtype = np.dtype([('REC_LEN', endian + 'u2'), ('REC_TYP', 'u1'), ('REC_SUB', 'u1'),
+                                   ('TEST_NUM', endian + 'u4'), ('HEAD_NUM', 'u1'), ('SITE_NUM', 'u1'),
+                                   ('TEST_FLG', 'u1'), ('PARM_FLG', 'u1'), ('RESULT', endian + 'f4')])
+        self.write_raw(self.header.pack(2, 0, 10) + bytes((2 if endian == '<' else 1, 4))) # FAR
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #
+    # buffer management
+    #
+
+    def _append(self, data):
+        '''
+        Appends (the bytes like) data to the write buffer
+        '''
+        size = len(data)
+        if self.used + size > len(self.buffer):
+            self._drain()
+            if size > len(self.buffer):
+                self.fd.write(data)
+                return
+        self.buffer[self.used:self.used + size] = data
+        self.used += size
+
+    def _drain(self):
+        '''
+        Writes the buffer to the file (one big write)
+        '''
+        if self.used:
+            with memoryview(self.buffer) as view:
+                self.fd.write(view[:self.used])
+            self.used = 0
+
+    def commit(self):
+        '''
+        Writes everything buffered (except the open parts) to the file, and syncs it to disk if fsync is set.
+        '''
+        self._drain()
+        if hasattr(self.fd, 'flush'):
+            self.fd.flush()
+        if self.fsync and not self.compression and hasattr(self.fd, 'fileno'):
+            os.fsync(self.fd.fileno())
+
+    def _part(self, head, site):
+        '''
+        Returns the open part of (head, site), None if there is none.
+        '''
+        part = self.parts.get((head, site))
+        if part is not None and part.open:
+            return part
+        return None
+
+    def _reserve(self, head, site, size):
+        '''
+        Returns (buffer, offset) where size bytes of a record for (head, site) are to be packed.
+        '''
+        part = self.parts.get((head, site)) if self.part_buffers else None
+        if part is not None and part.open:
+            if part.used + size > len(part.buffer):
+                part.buffer.extend(bytes(max(len(part.buffer), size)))
+            offset = part.used
+            part.used += size
+            part.tests += 1
+            return part.buffer, offset
+        if self.used + size > len(self.buffer):
+            self._drain()
+            if size > len(self.buffer):
+                self.buffer.extend(bytes(size))
+        offset = self.used
+        self.used += size
+        return self.buffer, offset
+
+    def write_raw(self, record, head=None, site=None):
+        '''
+        Writes a packed record (including the header), in the part of (head, site) if that is open.
+        '''
+        part = self._part(head, site) if head is not None else None
+        if part is not None:
+            size = len(record)
+            if part.used + size > len(part.buffer):
+                part.buffer.extend(bytes(max(len(part.buffer), size)))
+            part.buffer[part.used:part.used + size] = record
+            part.used += size
+            if record[2] == 15:
+                part.tests += 1
+        else:
+            self._append(record)
+        self.records += 1
+
+    def write_record(self, record):
+        '''
+        Writes a record object (or a packed record). PIR's, PRR's and the test records (REC_TYP 15) are routed
+        to the part buffers like the fast emit methods do.
+        '''
+        if not isinstance(record, (bytes, bytearray, memoryview)):
+            if record.endian != self.endian:
+                raise STDFError("STDFWriter.write_record : %s has endian '%s' while the file is '%s'" % (record.id, record.endian, self.endian))
+            record = record.__repr__()
+        REC_TYP, REC_SUB = record[2], record[3]
+        if (REC_TYP, REC_SUB) == (5, 10):
+            self._open_part(record[4], record[5])
+            self.write_raw(record, record[4], record[5])
+        elif (REC_TYP, REC_SUB) == (5, 20):
+            self.write_raw(record, record[4], record[5])
+            self._close_part(record[4], record[5])
+        elif REC_TYP == 15 and len(record) >= 10:
+            self.write_raw(record, record[8], record[9])
+        else:
+            self.write_raw(record)
+
+    #
+    # parts
+    #
+
+    def _open_part(self, head, site):
+        if not self.part_buffers:
+            return
+        part = self.parts.get((head, site))
+        if part is None:
+            part = self.parts[(head, site)] = _Part(64 * 1024)
+        elif part.open: # the previous part on this site was never closed, write it as it is
+            self._close_part(head, site, False)
+        part.open = True
+        part.used = 0
+        part.tests = 0
+        part.pending = []
+
+    def _close_part(self, head, site, count=True):
+        part = self._part(head, site)
+        if part is not None:
+            with memoryview(part.buffer) as view:
+                if part.pending:
+                    self._append_defined(view[:part.used], part.pending)
+                else:
+                    self._append(view[:part.used])
+            part.open = False
+            part.used = 0
+            part.pending = []
+        if count:
+            self.parts_done += 1
+            if self.group_commit and self.parts_done % self.group_commit == 0:
+                self.commit()
+
+    def _append_defined(self, view, pending):
+        '''
+        Appends the part in view, the first PTR (in pending) of a test that is still defined gets the definition.
+        '''
+        start = 0
+        for offset, size, test_num in pending:
+            tail = self.ptr_first.pop(test_num, None)
+            if tail is None:
+                continue
+            self._append(view[start:offset])
+            self._append(self.header.pack(12 + len(tail), 15, 10))
+            self._append(view[offset + 4:offset + 16])
+            self._append(tail)
+            start = offset + size
+        self._append(view[start:])
+
+    def write_pir(self, head, site):
+        '''
+        Writes a PIR and opens the part buffer of (head, site)
+        '''
+        self._open_part(head, site)
+        buffer, offset = self._reserve(head, site, 6)
+        self.pir.pack_into(buffer, offset, 2, 5, 10, head, site)
+        part = self._part(head, site)
+        if part is not None:
+            part.tests = 0
+        self.records += 1
+
+    def write_prr(self, head, site, hard_bin, soft_bin=0xFFFF, part_flg=0, num_test=None, x=-32768, y=-32768, test_t=0, part_id='', part_txt=''):
+        '''
+        Writes a PRR and the part of (head, site), num_test defaults to the number of test records in the part.
+        '''
+        part = self._part(head, site)
+        if num_test is None:
+            num_test = part.tests if part is not None else 0
+        tail = _cn(part_id) + _cn(part_txt)
+        size = 21 + len(tail)
+        buffer, offset = self._reserve(head, site, size)
+        if part is not None:
+            part.tests -= 1
+        self.prr.pack_into(buffer, offset, size - 4, 5, 20, head, site, part_flg, num_test, hard_bin, soft_bin, x, y, test_t)
+        buffer[offset + 21:offset + size] = tail
+        self.records += 1
+        self._close_part(head, site)
+
+    #
+    # test records
+    #
+
+    def define_ptr(self, test_num, text='', lo_limit=None, hi_limit=None, units='', res_scal=0, llm_scal=0, hlm_scal=0,
+                   lo_spec=None, hi_spec=None, c_resfmt='', c_llmfmt='', c_hlmfmt='', opt_flag=None, alarm=''):
+        '''
+        Defines the static data of PTR test_num, that is written with the first PTR of test_num in the file (only).
+        opt_flag is derived from the limits/specs that are None, unless it is given.
+        '''
+        if opt_flag is None:
+            opt_flag = 0x02 # bit 1 is reserved and must be set
+            if lo_spec is None: opt_flag |= 0x04
+            if hi_spec is None: opt_flag |= 0x08
+            if lo_limit is None: opt_flag |= 0x40
+            if hi_limit is None: opt_flag |= 0x80
+        tail = _cn(text) + _cn(alarm)
+        tail += self.ptr_limits.pack(opt_flag, res_scal, llm_scal, hlm_scal, lo_limit or 0.0, hi_limit or 0.0)
+        tail += _cn(units) + _cn(c_resfmt) + _cn(c_llmfmt) + _cn(c_hlmfmt)
+        tail += self.ptr_specs.pack(lo_spec or 0.0, hi_spec or 0.0)
+        self.ptr_first[test_num] = tail
+
+    def write_ptr(self, test_num, head, site, flags, result, parm_flags=0, text=None):
+        '''
+        Writes a PTR, the static data of define_ptr is added to the first PTR of test_num in the file.
+        Without definition (or after the first one) the PTR ends at RESULT (or TEST_TXT if text is given).
+        '''
+        tail = None
+        part = None
+        if self.ptr_first and test_num in self.ptr_first:
+            part = self._part(head, site)
+            if part is None: # straight to the file (buffer), so this is the first one
+                tail = self.ptr_first.pop(test_num)
+        if tail is None:
+            if text is None:
+                buffer, offset = self._reserve(head, site, 16)
+                self.ptr.pack_into(buffer, offset, 12, 15, 10, test_num, head, site, flags, parm_flags, result)
+                if part is not None:
+                    part.pending.append((offset, 16, test_num))
+                self.records += 1
+                return
+            tail = _cn(text)
+        buffer, offset = self._reserve(head, site, 16 + len(tail))
+        self.ptr.pack_into(buffer, offset, 12 + len(tail), 15, 10, test_num, head, site, flags, parm_flags, result)
+        buffer[offset + 16:offset + 16 + len(tail)] = tail
+        if part is not None:
+            part.pending.append((offset, 16 + len(tail), test_num))
+        self.records += 1
+
+    def write_ptrs(self, test_nums, head, site, flags, results, parm_flags=0):
+        '''
+        Writes a PTR for every element of test_nums (and flags, results, parm_flags which can be arrays or scalars)
+        for (head, site) in one go.
+        '''
+        test_nums = np.asarray(test_nums)
+        part = self._part(head, site)
+        defined = []
+        if self.ptr_first:
+            defined = [(number, test_num) for number, test_num in enumerate(test_nums.tolist()) if test_num in self.ptr_first]
+        if defined and part is None:
+            flags = np.broadcast_to(flags, test_nums.shape).tolist()
+            results = np.broadcast_to(results, test_nums.shape).tolist()
+            parm_flags = np.broadcast_to(parm_flags, test_nums.shape).tolist()
+            for test_num, flag, result, parm_flag in zip(test_nums.tolist(), flags, results, parm_flags):
+                self.write_ptr(test_num, head, site, flag, result, parm_flag)
+            return
+        records = np.empty(len(test_nums), dtype=self.ptr_dtype)
+        records['REC_LEN'] = 12
+        records['REC_TYP'] = 15
+        records['REC_SUB'] = 10
+        records['TEST_NUM'] = test_nums
+        records['HEAD_NUM'] = head
+        records['SITE_NUM'] = site
+        records['TEST_FLG'] = flags
+        records['PARM_FLG'] = parm_flags
+        records['RESULT'] = results
+        data = records.view(np.uint8).reshape(-1)
+        buffer, offset = self._reserve(head, site, len(data))
+        buffer[offset:offset + len(data)] = data.data
+        if part is not None:
+            part.tests += len(test_nums) - 1 # (_reserve counted 1)
+            part.pending.extend((offset + 16 * number, 16, test_num) for number, test_num in defined)
+        self.records += len(test_nums)
+
+    def write_ftr(self, test_num, head, site, flags):
+        '''
+        Writes a (minimal) FTR, use write_record for the full FTR.
+        '''
+        buffer, offset = self._reserve(head, site, 11)
+        self.ftr.pack_into(buffer, offset, 7, 15, 20, test_num, head, site, flags)
+        self.records += 1
+
+    def close(self):
+        '''
+        Writes the open parts (as they are) and the buffer, and closes the file.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        for head, site in list(self.parts):
+            if self._part(head, site) is not None:
+                self._close_part(head, site, False)
+        self._drain()
+        if self.compression or not self.keep_open:
+            self.fd.close()
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    from ATE.data.STDF.records import PTR
+
+    sites, tests = 16, 2000
+    FileName = os.path.join(tempfile.mkdtemp(), 'writer.std')
+
+    start = time.time()
+    with open(FileName, 'wb') as fd:
+        for site in range(sites):
+            for test in range(tests // sites):
+                ptr = PTR('V4', '<')
+                ptr.set_value('TEST_NUM', test)
+                ptr.set_value('HEAD_NUM', 1)
+                ptr.set_value('SITE_NUM', site)
+                ptr.set_value('RESULT', 1.5)
+                fd.write(ptr.__repr__())
+    print("record objects : %s PTR's in %.3f ms" % (tests, (time.time() - start) * 1000))
+
+    with STDFWriter(FileName) as writer:
+        for test in range(tests):
+            writer.define_ptr(test, 'test_%d' % test, lo_limit=0.0, hi_limit=2.0, units='V')
+        for run in range(3):
+            start = time.time()
+            for site in range(sites):
+                writer.write_pir(1, site)
+            for test in range(tests // sites):
+                for site in range(sites):
+                    writer.write_ptr(test, 1, site, 0, 1.5)
+            for site in range(sites):
+                writer.write_prr(1, site, 1, 1)
+            print("write_ptr      : %s PTR's in %.3f ms" % (tests, (time.time() - start) * 1000))
+        results = np.full(tests // sites, 1.5, dtype=np.float32)
+        test_nums = np.arange(tests // sites)
+        for run in range(3):
+            start = time.time()
+            for site in range(sites):
+                writer.write_pir(1, site)
+                writer.write_ptrs(test_nums, 1, site, 0, results)
+                writer.write_prr(1, site, 1, 1)
+            print("write_ptrs     : %s PTR's in %.3f ms" % (tests, (time.time() - start) * 1000))
@@ -0,0 +1,504 @@
+'''
+Created on Oct 18, 2026
+
+Incremental bin and yield summary of the parts (PRR's) of an STDF file.
+
+A YieldEngine consumes the PRR's (and the WIR/WRR's for the wafers) of a file,
+either from a record stream or straight from the PRR/WIR/WRR offsets of the
+sidecar index (see ATE.data.STDF.sidecar), and maintains :
+
+    - the PCR counts and the hard/soft bin counts per head/site (the tally
+      of ATE.data.STDF.subset, so HBR/SBR/PCR records can be made).
+    - the final bins : a part that is retested (same wafer and X/Y, or the
+      same PART_ID with the retest bit of PART_FLG set, see
+      ATE.data.STDF.merge) is taken out of the bins and the good count, it
+      stays in the PART_CNT.
+    - the per wafer tested/retested/good counts and yield.
+
+The engine remembers how far (in bytes) it got in the file, its state can be
+saved to a checkpoint next to the file (FileName + '.yld', SQLite) and resumed
+later, so for a file that is still growing (a lot that is being tested) a live
+summary only costs the new parts : the counts are small (per site, bin and
+wafer), the retest entries (one per part) stay in the checkpoint, a resumed
+engine only reads the entries that a new part might supersede and a save only
+writes the entries that were added or superseded since the last save.
+
+    engine = live_summary('lot.std')   # loads the checkpoint, reads the new parts, saves the checkpoint
+    engine.lot_yield(), engine.hard_bins(), engine.wafer_yields()
+'''
+import json
+import os
+import sqlite3
+import struct
+import zlib
+
+import numpy as np
+
+from ATE.data.STDF.merge import _Retests
+from ATE.data.STDF.merge import _WAFER_ID
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.stream import records_from_stream
+from ATE.data.STDF.subset import SummaryTally
+from ATE.utils.seekable import open_seekable
+
+yield_extension = '.yld'
+yield_version = 2
+WIR_TS, WRR_TS, PRR_TS = (2, 10), (2, 20), (5, 20)
+check_size = 256 # the bytes in front of the offset that are checked when resuming
+
+schema = '''
+CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, HEAD_NUM INTEGER, SITE_NUM INTEGER, PART_FLG INTEGER,
+                                    HARD_BIN INTEGER, SOFT_BIN INTEGER, WAFER_ID BLOB, superseded INTEGER);
+CREATE TABLE IF NOT EXISTS last (key TEXT PRIMARY KEY, entry INTEGER);
+'''
+
+
+def yield_checkpoint_name(FileName):
+    '''
+    Returns the name of the yield checkpoint of FileName.
+    '''
+    return FileName + yield_extension
+
+
+def _check(fd, offset):
+    '''
+    Returns the crc32 of the check_size bytes in front of offset.
+    '''
+    start = max(offset - check_size, 0)
+    fd.seek(start)
+    return zlib.crc32(fd.read(offset - start))
+
+
+def _key_list(key):
+    return [key.decode('latin-1')] if isinstance(key, bytes) else [key[0].decode('latin-1'), key[1], key[2]]
+
+
+def _list_key(key):
+    return key[0].encode('latin-1') if len(key) == 1 else (key[0].encode('latin-1'), key[1], key[2])
+
+
+def _connect(Name):
+    connection = sqlite3.connect(Name)
+    connection.executescript(schema)
+    return connection
+
+
+class _Resolved(dict):
+    '''
+    The last entries (see merge._Retests) of the retest resolver of a YieldEngine that has a checkpoint : the keys
+    that are not in memory are looked up in the checkpoint, flush writes the keys and entries that were touched.
+
+    An entry is [HEAD_NUM, SITE_NUM, PART_FLG, HARD_BIN, SOFT_BIN, WAFER_ID, superseded, id in the checkpoint or None]
+    '''
+
+    def __init__(self, connection, Name):
+        super().__init__()
+        self.connection = connection
+        self.Name = os.path.abspath(Name)
+        self.rows = {} # id -> the entry read from the checkpoint (an entry can be under 2 keys)
+
+    def _entry(self, row, rows):
+        entry = self.rows.get(row[0]) or rows.get(row[0])
+        if entry is None:
+            entry = rows[row[0]] = list(row[1:6]) + [bytes(row[6]), bool(row[7]), row[0]]
+        return entry
+
+    def get(self, key, default=None):
+        entry = dict.get(self, key)
+        if entry is None:
+            row = self.connection.execute('SELECT entries.* FROM last JOIN entries ON last.entry = entries.id WHERE last.key = ?',
+                                          (json.dumps(_key_list(key)),)).fetchone()
+            if row is not None:
+                entry = self._entry(row, self.rows)
+                dict.__setitem__(self, key, entry)
+        return default if entry is None else entry
+
+    def everything(self):
+        '''
+        Yields the (key, entry) of all the keys, in the checkpoint or in memory.
+        '''
+        rows = {}
+        for text, *row in self.connection.execute('SELECT last.key, entries.* FROM last JOIN entries ON last.entry = entries.id ORDER BY last.rowid'):
+            key = _list_key(json.loads(text))
+            if key not in self:
+                yield key, self._entry(row, rows)
+        yield from dict.items(self)
+
+    def flush(self):
+        '''
+        Writes the keys and entries in memory to the checkpoint (the caller commits) and forgets them.
+        '''
+        cursor = self.connection.cursor()
+        entries = {id(entry) : entry for entry in list(dict.values(self)) + list(self.rows.values())}
+        for entry in entries.values():
+            if entry[7] is None:
+                cursor.execute('INSERT INTO entries (HEAD_NUM, SITE_NUM, PART_FLG, HARD_BIN, SOFT_BIN, WAFER_ID, superseded) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?)', entry[:7])
+                entry[7] = cursor.lastrowid
+            else:
+                cursor.execute('UPDATE entries SET superseded = ? WHERE id = ?', (entry[6], entry[7]))
+        last = [(entry[7], json.dumps(_key_list(key))) for key, entry in dict.items(self)]
+        cursor.executemany('UPDATE last SET entry = ? WHERE key = ?', last) # (keeps the rowid, so the order, of a key)
+        cursor.executemany('INSERT OR IGNORE INTO last (entry, key) VALUES (?, ?)', last)
+        dict.clear(self)
+        self.rows.clear()
+
+
+class YieldEngine(object):
+    '''
+    The incremental bin/yield summary of an STDF file, see the module docstring.
+    '''
+
+    def __init__(self, FileName=None, retests=True):
+        self.FileName = FileName
+        self.retests = retests
+        self.endian = None
+        self.offset = 0      # the end of the last consumed record in the (uncompressed) file
+        self.check = 0       # _check(offset)
+        self.tally = SummaryTally()
+        self.superseded = {} # (HEAD_NUM, SITE_NUM) -> number of retested (superseded) parts
+        self.wafers = {}     # WAFER_ID -> [PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT] (RTST_CNT = superseded parts)
+        self.wafer_of_head = {} # HEAD_NUM -> WAFER_ID
+        self.resolver = None
+
+    def __len__(self):
+        return self.part_count()
+
+    def _set_endian(self, endian):
+        if self.endian is None:
+            self.endian = endian
+        elif self.endian != endian:
+            raise STDFError("YieldEngine : the endian changed from '%s' to '%s'" % (self.endian, endian))
+        if self.resolver is None:
+            self.resolver = _Retests(endian)
+        self.U2 = struct.Struct(endian + 'H')
+
+    def record(self, REC):
+        '''
+        Consumes one (raw) record, only PRR's, WIR's and WRR's are looked at.
+        '''
+        TS = (REC[2], REC[3])
+        if TS == PRR_TS:
+            self.part(REC)
+        elif TS == WIR_TS:
+            self.wafer_of_head[REC[4]] = _WAFER_ID(REC)
+        elif TS == WRR_TS:
+            self.wafer_of_head.pop(REC[4], None)
+
+    def part(self, PRR):
+        '''
+        Consumes a (raw) PRR.
+        '''
+        size = len(PRR)
+        HEAD_NUM, SITE_NUM = PRR[4], PRR[5]
+        PART_FLG = PRR[6] if size > 6 else 0
+        HARD_BIN = self.U2.unpack_from(PRR, 9)[0] if size >= 11 else 65535
+        SOFT_BIN = self.U2.unpack_from(PRR, 11)[0] if size >= 13 else 65535
+        WAFER_ID = self.wafer_of_head.get(HEAD_NUM, b'')
+        good = not PART_FLG & 0x18
+        self.tally.part(HEAD_NUM, SITE_NUM, PART_FLG, HARD_BIN, SOFT_BIN)
+        if WAFER_ID:
+            wafer = self.wafers.setdefault(WAFER_ID, [0, 0, 0, 0])
+            wafer[0] += 1
+            wafer[2] += 1 if PART_FLG & 0x04 else 0
+            wafer[3] += 1 if good else 0
+        if not self.retests:
+            return
+        entry = [HEAD_NUM, SITE_NUM, PART_FLG, HARD_BIN, SOFT_BIN, WAFER_ID, False, None]
+        previous, _ = self.resolver.supersedes(PRR, WAFER_ID, entry)
+        if previous is None or previous[6]: # (a part is superseded only once)
+            return
+        previous[6] = True
+        self.tally.supersede(*previous[:5])
+        key = (previous[0], previous[1])
+        self.superseded[key] = self.superseded.get(key, 0) + 1
+        wafer = self.wafers.get(previous[5])
+        if wafer is not None:
+            wafer[1] += 1
+            wafer[3] -= 0 if previous[2] & 0x18 else 1
+
+    def feed(self, records, endian):
+        '''
+        Consumes the records (an iterator of (REC_LEN, REC_TYP, REC_SUB, REC)) that follow self.offset,
+        returns the number of parts consumed.
+        '''
+        self._set_endian(endian)
+        parts = self.part_count()
+        offset = self.offset
+        for REC_LEN, REC_TYP, REC_SUB, REC in records:
+            offset += 4 + REC_LEN
+            if REC_TYP == 5 and REC_SUB == 20:
+                self.part(REC)
+            elif REC_TYP == 2:
+                self.record(REC)
+        self.offset = offset
+        return self.part_count() - parts
+
+    def update(self, FileName=None):
+        '''
+        Consumes the records of FileName (default : the file of the engine) that were added since the last update,
+        returns the number of new parts. If the file was not just appended to, the engine starts over.
+        '''
+        FileName = self.FileName if FileName is None else FileName
+        probe, fd = open_STDF(FileName)
+        if fd is None:
+            raise STDFError("'%s' is not an STDF file" % FileName)
+        with fd:
+            if probe.version != 'V4':
+                raise STDFError("YieldEngine : '%s' is a %s file, only V4 is supported" % (FileName, probe.version))
+            if self.offset and (self.endian != probe.endian or self.offset > probe.size and not probe.compression
+                                or _check(fd, self.offset) != self.check):
+                self.close()
+                self.__init__(FileName, self.retests)
+            self.FileName = FileName
+            fd.seek(self.offset)
+            parts = self.feed(records_from_stream(fd, probe.endian), probe.endian)
+            self.check = _check(fd, self.offset)
+        return parts
+
+    def update_from_index(self, index, FileName=None):
+        '''
+        Consumes the PRR/WIR/WRR's of the (sidecar) index that follow self.offset, the records are read with
+        positioned reads instead of streaming the file. Returns the number of new parts.
+        '''
+        FileName = index.FileName if FileName is None else FileName
+        self._set_endian(index.endian)
+        offsets = np.concatenate([index.offsets(REC_ID).astype(np.uint64) for REC_ID in ['PRR', 'WIR', 'WRR']])
+        offsets = np.sort(offsets[offsets >= self.offset]).tolist()
+        parts = self.part_count()
+        with open_seekable(FileName) as fd:
+            for offset in offsets:
+                fd.seek(offset)
+                header = fd.read(4)
+                REC = header + fd.read(self.U2.unpack_from(header, 0)[0])
+                self.record(REC)
+            if len(index):
+                self.offset = int(index.column('offset')[-1]) + 4 + int(index.column('REC_LEN')[-1])
+            self.check = _check(fd, self.offset)
+        self.FileName = FileName
+        return self.part_count() - parts
+
+    def _count(self, counts, HEAD_NUM, SITE_NUM):
+        return sum(count for (head, site), count in counts if (HEAD_NUM == 255 or head == HEAD_NUM) and (SITE_NUM == 255 or site == SITE_NUM))
+
+    def part_count(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        The number of parts tested (retests included, like the PCR)
+        '''
+        return self._count(((key, counts[0]) for key, counts in self.tally.parts.items()), HEAD_NUM, SITE_NUM)
+
+    def retest_count(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        The number of parts that are superseded by a retest.
+        '''
+        return self._count(self.superseded.items(), HEAD_NUM, SITE_NUM)
+
+    def good_count(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        The number of (finally) good parts.
+        '''
+        return self._count(((key, counts[3]) for key, counts in self.tally.parts.items()), HEAD_NUM, SITE_NUM)
+
+    def lot_yield(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        The final yield (good / (tested - retested)), None if nothing is tested.
+        '''
+        parts = self.part_count(HEAD_NUM, SITE_NUM) - self.retest_count(HEAD_NUM, SITE_NUM)
+        return self.good_count(HEAD_NUM, SITE_NUM) / parts if parts else None
+
+    def _bins(self, bins, HEAD_NUM, SITE_NUM):
+        retval = {}
+        for (head, site, BIN_NUM), (count, _) in sorted(bins.items()):
+            if (HEAD_NUM == 255 or head == HEAD_NUM) and (SITE_NUM == 255 or site == SITE_NUM):
+                retval[BIN_NUM] = retval.get(BIN_NUM, 0) + count
+        return retval
+
+    def hard_bins(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns {HARD_BIN : final count}
+        '''
+        return self._bins(self.tally.hard_bins, HEAD_NUM, SITE_NUM)
+
+    def soft_bins(self, HEAD_NUM=255, SITE_NUM=255):
+        '''
+        Returns {SOFT_BIN : final count}
+        '''
+        return self._bins(self.tally.soft_bins, HEAD_NUM, SITE_NUM)
+
+    def wafer_yields(self):
+        '''
+        Returns {WAFER_ID : {'tested', 'retested', 'aborted', 'good', 'yield'}}
+        '''
+        retval = {}
+        for WAFER_ID, (PART_CNT, RTST_CNT, ABRT_CNT, GOOD_CNT) in self.wafers.items():
+            retval[WAFER_ID.decode('utf-8', 'replace')] = {
+                'tested' : PART_CNT, 'retested' : RTST_CNT, 'aborted' : ABRT_CNT, 'good' : GOOD_CNT,
+                'yield' : GOOD_CNT / (PART_CNT - RTST_CNT) if PART_CNT > RTST_CNT else None}
+        return retval
+
+    def records(self):
+        '''
+        Returns the packed HBR's, SBR's and PCR's (per site and for all heads/sites) of the final bins.
+        '''
+        return self.tally.records(self.endian or '<')
+
+    def _items(self):
+        if self.resolver is None:
+            return []
+        last = self.resolver.last
+        return last.everything() if isinstance(last, _Resolved) else last.items()
+
+    def to_dict(self):
+        '''
+        Returns the (JSON serializable) state of the engine.
+        '''
+        retval = self._state()
+        entries, positions, last = [], {}, []
+        for key, entry in self._items(): # (an entry can be under 2 keys)
+            if id(entry) not in positions:
+                positions[id(entry)] = len(entries)
+                entries.append(entry[:5] + [entry[5].decode('latin-1'), entry[6]])
+            last.append([_key_list(key), positions[id(entry)]])
+        retval.update({'entries' : entries, 'last' : last})
+        return retval
+
+    def _state(self):
+        '''
+        The state of the engine without the retest entries.
+        '''
+        tally = self.tally
+        return {
+            'version' : yield_version,
+            'FileName' : self.FileName,
+            'retests' : self.retests,
+            'endian' : self.endian,
+            'offset' : self.offset,
+            'check' : self.check,
+            'parts' : [list(key) + counts for key, counts in tally.parts.items()],
+            'hard_bins' : [list(key) + tally_ for key, tally_ in tally.hard_bins.items()],
+            'soft_bins' : [list(key) + tally_ for key, tally_ in tally.soft_bins.items()],
+            'superseded' : [list(key) + [count] for key, count in self.superseded.items()],
+            'wafers' : [[WAFER_ID.decode('latin-1')] + counts for WAFER_ID, counts in self.wafers.items()],
+            'wafer_of_head' : [[HEAD_NUM, WAFER_ID.decode('latin-1')] for HEAD_NUM, WAFER_ID in self.wafer_of_head.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get('version') != yield_version:
+            raise STDFError("YieldEngine : unsupported checkpoint version %s" % state.get('version'))
+        retval = cls(state['FileName'], state['retests'])
+        retval.offset = state['offset']
+        retval.check = state['check']
+        if state['endian'] is not None:
+            retval._set_endian(state['endian'])
+        tally = retval.tally
+        tally.parts = {tuple(row[:2]) : row[2:] for row in state['parts']}
+        tally.hard_bins = {tuple(row[:3]) : row[3:] for row in state['hard_bins']}
+        tally.soft_bins = {tuple(row[:3]) : row[3:] for row in state['soft_bins']}
+        retval.superseded = {tuple(row[:2]) : row[2] for row in state['superseded']}
+        retval.wafers = {row[0].encode('latin-1') : row[1:] for row in state['wafers']}
+        retval.wafer_of_head = {HEAD_NUM : WAFER_ID.encode('latin-1') for HEAD_NUM, WAFER_ID in state['wafer_of_head']}
+        entries = [entry[:5] + [entry[5].encode('latin-1'), entry[6], None] for entry in state.get('entries', [])]
+        for key, position in state.get('last', []):
+            retval.resolver.last[_list_key(key)] = entries[position]
+        return retval
+
+    def save(self, Name=None):
+        '''
+        Writes the state of the engine to Name (default : next to the file), returns the name written to.
+        If the engine was loaded from (or saved to) Name, only what changed since is written.
+        '''
+        if Name is None:
+            Name = yield_checkpoint_name(self.FileName)
+        last = None if self.resolver is None else self.resolver.last
+        if isinstance(last, _Resolved) and last.Name == os.path.abspath(Name):
+            with last.connection:
+                last.flush()
+                last.connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?)', ('engine', json.dumps(self._state())))
+            return Name
+        temporary = '%s.%s.tmp' % (Name, os.getpid())
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        connection = _connect(temporary)
+        try:
+            resolved = _Resolved(connection, temporary)
+            copies = {}
+            for key, entry in self._items():
+                if id(entry) not in copies:
+                    copies[id(entry)] = entry[:7] + [None]
+                dict.__setitem__(resolved, key, copies[id(entry)])
+            with connection:
+                resolved.flush()
+                connection.execute('INSERT INTO state VALUES (?, ?)', ('engine', json.dumps(self._state())))
+        finally:
+            connection.close()
+        if isinstance(last, _Resolved):
+            last.connection.close()
+        os.replace(temporary, Name)
+        if self.resolver is not None:
+            self.resolver.last = _Resolved(_connect(Name), Name)
+        return Name
+
+    def close(self):
+        '''
+        Closes the checkpoint (if any), the engine can't be used any more.
+        '''
+        if self.resolver is not None and isinstance(self.resolver.last, _Resolved):
+            self.resolver.last.connection.close()
+
+
+def load_yield_engine(FileName, Name=None):
+    '''
+    Returns the YieldEngine saved for FileName (None if there is no (usable) checkpoint)
+    '''
+    if Name is None:
+        Name = yield_checkpoint_name(FileName)
+    if not os.path.isfile(Name):
+        return None
+    connection = None
+    try:
+        connection = _connect(Name)
+        retval = YieldEngine.from_dict(json.loads(connection.execute("SELECT value FROM state WHERE name = 'engine'").fetchone()[0]))
+    except (sqlite3.Error, TypeError, ValueError, KeyError, STDFError):
+        if connection is not None:
+            connection.close()
+        return None
+    if retval.resolver is None:
+        connection.close()
+    else:
+        retval.resolver.last = _Resolved(connection, Name)
+    return retval
+
+
+def live_summary(FileName, save=True, retests=True):
+    '''
+    Returns the up to date YieldEngine of FileName, resuming from (and updating) its checkpoint.
+    '''
+    engine = load_yield_engine(FileName)
+    if engine is not None and engine.retests != retests:
+        engine.close()
+        engine = None
+    if engine is None:
+        engine = YieldEngine(FileName, retests)
+    engine.update(FileName)
+    if save:
+        engine.save(yield_checkpoint_name(FileName))
+    return engine
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    Name = yield_checkpoint_name(FileName)
+    if os.path.exists(Name):
+        os.remove(Name)
+    for _ in range(2):
+        start = time.time()
+        engine = live_summary(FileName)
+        print("live summary : %s parts, yield %s, in %.3f seconds" % (engine.part_count(), engine.lot_yield(), time.time() - start))
+        engine.close()
+    os.remove(Name)
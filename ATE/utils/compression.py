@@ -4,13 +4,19 @@ Created on Sep 13, 2019
 @author: hoeren
 '''
 import bz2
+import collections
+import concurrent.futures
 import gzip
 import lzma
+import mmap
 import os
+import queue
+import struct
 import sys
+import threading
+import zlib
 
 import tqdm
-from ATE.utils import DT
 from ATE.utils.magicnumber import extension_from_magic_number_in_file
 
 supported_compressions = {'lzma' : '.xz', 'gzip' : '.gz', 'bz2' : '.bz2'}
@@ -20,116 +26,430 @@ default_compression = 'lzma'
 if default_compression not in supported_compressions:
     raise KeyError("%s not in %s" % (default_compression, supported_compressions))
 
-def deflate(FileNames, compression=default_compression, progress=True, bs=128*1024, use_hash=False):
+default_levels = {'lzma' : 6, 'gzip' : 9, 'bz2' : 9}
+default_block_size = 4 * 1024 * 1024
+
+def compression_of_file(FileName):
     '''
-    compresses all give 'FileNames'
+    Returns the (supported) compression of FileName ('lzma', 'gzip' or 'bz2'), '' if not compressed.
+    '''
+    ext = extension_from_magic_number_in_file(FileName, list(supported_compressions_extensions))
+    if len(ext) == 1:
+        return supported_compressions_extensions[ext[0]]
+    return ''
 
-    TODO: add the hashing possibility
+def open_decompressed(FileName):
+    '''
+    Returns a (binary, read only) file object for the uncompressed contents of FileName.
+    '''
+    compression = compression_of_file(FileName)
+    if compression == 'lzma':
+        return lzma.open(FileName, 'rb')
+    elif compression == 'bz2':
+        return bz2.open(FileName, 'rb')
+    elif compression == 'gzip':
+        return gzip.open(FileName, 'rb')
+    return open(FileName, 'rb')
+
+class ReadAheadReader(object):
+    '''
+    Reads a file object in a background thread into a ring of pre-allocated buffers.
+
+    For compressed files the decompression (lzma, bz2 and zlib release the GIL) runs in the background thread,
+    while the consumer works on the previous block(s). Iterating yields memoryviews of the blocks, a block is
+    given back to the ring (and thus overwritten!) when the next one is asked for.
+    '''
+    def __init__(self, fd, block_size=1024*1024, buffers=4):
+        if buffers < 2:
+            raise ValueError("ReadAheadReader needs at least 2 buffers")
+        self.fd = fd
+        self.block_size = block_size
+        self.free = queue.Queue()
+        self.full = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(bytearray(block_size))
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._reader, name='ReadAheadReader', daemon=True)
+        self.thread.start()
+
+    def _reader(self):
+        try:
+            while not self.stop.is_set():
+                try:
+                    buffer = self.free.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                view = memoryview(buffer)
+                filled = 0
+                while filled < self.block_size: # readinto of the compressed streams may return less than asked for
+                    count = self.fd.readinto(view[filled:])
+                    if not count:
+                        break
+                    filled += count
+                view.release()
+                self.full.put((buffer, filled, None))
+                if filled < self.block_size:
+                    break
+        except Exception as e: # handed over to the consumer
+            self.full.put((None, 0, e))
+
+    def __iter__(self):
+        previous = None
+        try:
+            while True:
+                buffer, filled, exception = self.full.get()
+                if previous is not None:
+                    self.free.put(previous)
+                    previous = None
+                if exception is not None:
+                    raise exception
+                if filled:
+                    yield memoryview(buffer)[:filled]
+                previous = buffer
+                if filled < self.block_size:
+                    return
+        finally:
+            self.close()
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+
+def xz_vli_encode(value):
+    '''
+    Returns the xz variable length integer encoding of value
     '''
-    def comp(FileName, compression='lzma', annotation='', bs=128*1024, progress=False, indent=0, callback=None):
-        lbl = "Compressing %s : '%s' with %s" % (annotation, os.path.split(FileName)[1], compression)
-        ttl = os.stat(FileName)[6]
-        dt = DT(FileName)
-        pb = tqdm.tqdm(total=ttl, desc=lbl, unit='B', unit_scale=True, leave=False, disable=not progress, position=indent)
-        ext = supported_compressions[compression]
-        if compression=='lzma':
-            with open(FileName, 'rb') as fdi, lzma.open(FileName+ext, 'wb') as fdo:
-                chunk = fdi.read(bs)
-                while len(chunk) == bs:
-                    fdo.write(chunk)
-                    pb.update(bs)
-                    if progress and callback!=None: callback(bs)
-                    chunk = fdi.read(bs)
-                fdo.write(chunk)
-                pb.update(bs)
-                if progress and callback!=None: callback(bs)
-            os.utime(FileName+ext, times=(dt.epoch, dt.epoch))
-        elif compression=='bz2':
-            with open(FileName, 'rb') as fdi, bz2.open(FileName+ext, 'wb') as fdo:
-                chunk = fdi.read(bs)
-                while len(chunk) == bs:
-                    fdo.write(chunk)
-                    pb.update(bs)
-                    if progress and callback!=None: callback(bs)
-                    chunk = fdi.read(bs)
-                fdo.write(chunk)
-                pb.update(bs)
-                if progress and callback!=None: callback(bs)
-            os.utime(FileName+ext, times=(dt.epoch, dt.epoch))
-        elif compression=='gzip':
-            with open(FileName, 'rb') as fdi, gzip.open(FileName+ext, 'wb') as fdo:
-                chunk = fdi.read(bs)
-                while len(chunk) == bs:
-                    fdo.write(chunk)
-                    pb.update(bs)
-                    if progress and callback!=None: callback(bs)
-                    chunk = fdi.read(bs)
-                fdo.write(chunk)
-                pb.update(bs)
-                if progress and callback!=None: callback(bs)
-            os.utime(FileName+ext, times=(dt.epoch, dt.epoch))
+    retval = bytearray()
+    while value >= 0x80:
+        retval.append((value & 0x7F) | 0x80)
+        value >>= 7
+    retval.append(value)
+    return bytes(retval)
+
+def xz_vli_decode(buffer, position):
+    '''
+    Decodes the xz variable length integer at position in buffer, returns (value, next position)
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+_xz_stream_header = lzma.compress(b'')[:12] # the check (CRC64) is the same for all blocks
+
+def compress_block(data, compression=default_compression, level=None):
+    '''
+    Compresses data on its own.
+    For 'lzma' (block, unpadded size, uncompressed size) is returned, the block is to be put in an xz stream
+    (see BlockCompressor), for 'gzip' and 'bz2' a complete gzip member or bz2 stream is returned.
+    '''
+    if level is None:
+        level = default_levels[compression]
+    if compression == 'lzma':
+        stream = lzma.compress(data, preset=level)
+        index_size = (struct.unpack('<I', stream[-8:-4])[0] + 1) * 4
+        index_start = len(stream) - 12 - index_size
+        count, position = xz_vli_decode(stream, index_start + 1)
+        if count != 1:
+            raise Exception("Expected 1 xz block, got %s" % count)
+        unpadded, position = xz_vli_decode(stream, position)
+        uncompressed, position = xz_vli_decode(stream, position)
+        return stream[12:index_start], unpadded, uncompressed
+    elif compression == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    elif compression == 'bz2':
+        return bz2.compress(data, level)
+    raise Exception("don't know how to handle '%s' compression" % compression)
+
+class BlockCompressor(object):
+    '''
+    Write only file object that compresses the written data in independent blocks by a pool of threads
+    (lzma, zlib and bz2 release the GIL), the compressed blocks are written in order.
+
+    The output is a standard file : for 'lzma' a multi block .xz stream, for 'gzip' a multi member .gz file and
+    for 'bz2' a multi stream .bz2 file. The blocks are also the checkpoints of ATE.utils.seekable.
+    '''
+    def __init__(self, FileName, compression=default_compression, level=None, block_size=default_block_size, workers=None):
+        if compression not in supported_compressions:
+            raise Exception("don't know how to handle '%s' compression" % compression)
+        if isinstance(FileName, str):
+            self.fd = open(FileName, 'wb')
+            self.keep_open = False
         else:
-            raise Exception("Supported but un-implemented compression '%s'" % compression)
-        pb.close()
+            self.fd = FileName
+            self.keep_open = True
+        self.compression = compression
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers if workers else os.cpu_count()
+        self.pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='BlockCompressor')
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.records = [] # xz index records (unpadded size, uncompressed size)
+        self.blocks = 0
+        self.closed = False
+        if compression == 'lzma':
+            self.fd.write(_xz_stream_header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.block_size:
+            view = memoryview(self.buffer)
+            done = 0
+            while len(self.buffer) - done >= self.block_size:
+                self._submit(bytes(view[done:done + self.block_size]))
+                done += self.block_size
+            view.release()
+            del self.buffer[:done]
+        return len(data)
+
+    def _submit(self, block):
+        self.blocks += 1
+        self.pending.append(self.pool.submit(compress_block, block, self.compression, self.level))
+        while len(self.pending) > 2 * self.workers: # bound the memory
+            self._write(self.pending.popleft().result())
 
+    def _write(self, result):
+        if self.compression == 'lzma':
+            block, unpadded, uncompressed = result
+            self.fd.write(block)
+            self.records.append((unpadded, uncompressed))
+        else:
+            self.fd.write(result)
+
+    def _xz_tail(self):
+        '''
+        Returns the xz index and stream footer for the written blocks
+        '''
+        index = bytearray(b'\x00')
+        index += xz_vli_encode(len(self.records))
+        for unpadded, uncompressed in self.records:
+            index += xz_vli_encode(unpadded) + xz_vli_encode(uncompressed)
+        index += b'\x00' * (-len(index) % 4)
+        index += struct.pack('<I', zlib.crc32(index))
+        footer = struct.pack('<I', len(index) // 4 - 1) + _xz_stream_header[6:8]
+        return bytes(index) + struct.pack('<I', zlib.crc32(footer)) + footer + b'YZ'
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.buffer or (self.compression != 'lzma' and not self.blocks):
+                self._submit(bytes(self.buffer)) # (gzip and bz2 need at least one member/stream)
+                self.buffer = bytearray()
+            while self.pending:
+                self._write(self.pending.popleft().result())
+            if self.compression == 'lzma':
+                self.fd.write(self._xz_tail())
+        finally:
+            self.pool.shutdown()
+            if not self.keep_open:
+                self.fd.close()
+
+def _copy_times(Source, Destination):
+    stat = os.stat(Source)
+    os.utime(Destination, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+def deflate_file(FileName, compression=default_compression, level=None, block_size=default_block_size, workers=None, bs=1024*1024, callback=None):
+    '''
+    Compresses FileName to FileName + extension (with a BlockCompressor), the times of FileName are copied.
+    callback (if not None) is called with the number of bytes processed.
+    Returns the name of the compressed file.
+    '''
+    OutName = FileName + supported_compressions[compression]
+    with open(FileName, 'rb') as fdi, BlockCompressor(OutName, compression, level, block_size, workers) as fdo:
+        while True:
+            chunk = fdi.read(bs)
+            if not chunk:
+                break
+            fdo.write(chunk)
+            if callback is not None:
+                callback(len(chunk))
+    _copy_times(FileName, OutName)
+    return OutName
+
+def _pool_map(function, FileNames, processes, label, progress, **kwargs):
+    '''
+    Runs function(FileName, **kwargs) for all FileNames in a pool of processes, returns the results in order.
+    '''
+    total = sum(os.path.getsize(FileName) for FileName in FileNames)
+    pb = tqdm.tqdm(total=total, desc=label, unit='B', unit_scale=True, leave=False, disable=not progress)
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = {pool.submit(function, FileName, **kwargs) : FileName for FileName in FileNames}
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+            pb.update(os.path.getsize(futures[future]))
+        retval = [future.result() for future in futures]
+    pb.close()
+    return retval
+
+def deflate(FileNames, compression=default_compression, progress=True, bs=1024*1024, use_hash=False, level=None, block_size=default_block_size, workers=None):
+    '''
+    compresses all give 'FileNames'
+
+    A single file is compressed by a pool of 'workers' threads (default : all cores), a list of files is
+    compressed by a pool of 'workers' processes (a file per process).
+    Returns the name(s) of the compressed file(s).
+
+    TODO: add the hashing possibility
+    '''
     if compression not in supported_compressions:
         raise Exception("don't know how to handle '%s' compression" % compression)
 
     if isinstance(FileNames, str): # single file
-        comp(FileNames, progress=progress)
+        lbl = "Compressing '%s' with %s" % (os.path.split(FileNames)[1], compression)
+        pb = tqdm.tqdm(total=os.path.getsize(FileNames), desc=lbl, unit='B', unit_scale=True, leave=False, disable=not progress)
+        retval = deflate_file(FileNames, compression, level, block_size, workers, bs, pb.update)
+        pb.close()
+        return retval
     if isinstance(FileNames, list): # multiple files
         label = "%s progress of %d files" % (compression, len(FileNames))
-        total = 0
-        for FileName in FileNames:
-            total+=os.stat(FileName)[6]
-        tpb = tqdm.tqdm(total=total, desc=label, unit='B', unit_scale=True, leave=False, disable=not progress)
-        for FileNumber, FileName in enumerate(FileNames):
-            annotation = 'file %s/%s' % (FileNumber+1, len(FileNames))
-            comp(FileName, annotation = annotation, progress=progress, indent=1, callback=tpb.update)
-        tpb.close()
+        return _pool_map(deflate_file, FileNames, workers, label, progress, compression=compression, level=level, block_size=block_size, workers=1, bs=bs)
+
+def decompressed_blocks(FileName, workers=None, bs=1024*1024):
+    '''
+    Yields the decompressed contents of FileName in order.
+    The blocks of multi block .xz and .bz2 files are decompressed by a pool of 'workers' threads, other
+    files are decompressed as a stream (in chunks of bs).
+    '''
+    from ATE.utils.seekable import bz2_block
+    from ATE.utils.seekable import bz2_boundaries
+    from ATE.utils.seekable import bz2_decompress_block
+    from ATE.utils.seekable import xz_checkpoints
+
+    def xz_job(header, block):
+        return lzma.LZMADecompressor(lzma.FORMAT_XZ).decompress(header + block)
+
+    def bz2_job(data, start, end):
+        try:
+            return bz2_decompress_block(data, start, end)
+        except (OSError, ValueError, EOFError):
+            return None # a false block magic, handled in order
+
+    compression = compression_of_file(FileName)
+    workers = workers if workers else os.cpu_count()
+    jobs = [] # (function, arguments, first bit, end bit)
+    boundaries = []
+    with open(FileName, 'rb') as fd:
+        if compression == 'lzma':
+            checkpoints, _ = xz_checkpoints(fd, os.path.getsize(FileName))
+            if len(checkpoints) > 1:
+                with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for _, offset, size, stream_start in checkpoints:
+                        jobs.append((xz_job, (mm[stream_start:stream_start + 12], mm[offset:offset + size]), None, None))
+        elif compression == 'bz2' and os.path.getsize(FileName):
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                blocks, ends = bz2_boundaries(mm)
+                boundaries = sorted(blocks + ends)
+                if len(blocks) > 1:
+                    for start in blocks:
+                        end = boundaries[boundaries.index(start) + 1]
+                        jobs.append((bz2_job, (mm[start // 8:(end + 7) // 8], start % 8, start % 8 + end - start), start, end))
+    if not jobs:
+        with open_decompressed(FileName) as fd:
+            while True:
+                data = fd.read(bs)
+                if not data:
+                    return
+                yield data
+    with open(FileName, 'rb') as fd, concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='decompressed_blocks') as pool:
+        pending = collections.deque()
+        jobs = collections.deque(jobs)
+        done = 0
+        while jobs or pending:
+            while jobs and len(pending) < 2 * workers: # bound the memory
+                function, arguments, start, end = jobs.popleft()
+                pending.append((start, end, pool.submit(function, *arguments)))
+            start, end, future = pending.popleft()
+            if start is not None and start < done:
+                continue # a false bz2 block magic inside the previous block
+            data = future.result()
+            position = boundaries.index(end) if data is None else None
+            while data is None: # extend the block over the false magic
+                position += 1
+                if position >= len(boundaries):
+                    raise OSError("Invalid bz2 block at bit %s" % start)
+                end = boundaries[position]
+                try:
+                    data = bz2_block(fd, start, end)
+                except (OSError, ValueError, EOFError):
+                    pass
+            if end is not None:
+                done = end
+            if data:
+                yield data
+
+def inflate_file(FileName, workers=None, bs=1024*1024, callback=None):
+    '''
+    De-compresses FileName (which must have the extension of its compression) next to it, the times of FileName are
+    copied. callback (if not None) is called with the number of (uncompressed) bytes written.
+    Returns the name of the de-compressed file.
+    '''
+    compression = compression_of_file(FileName)
+    if compression == '':
+        raise Exception("'%s' is not a (supported) compressed file" % FileName)
+    ext = supported_compressions[compression]
+    if not FileName.endswith(ext):
+        raise Exception("'%s' is %s compressed, but doesn't have the '%s' extension" % (FileName, compression, ext))
+    OutName = FileName[:-len(ext)]
+    with open(OutName, 'wb') as fdo:
+        for data in decompressed_blocks(FileName, workers, bs):
+            fdo.write(data)
+            if callback is not None:
+                callback(len(data))
+    _copy_times(FileName, OutName)
+    return OutName
 
-def inflate(FileNames, progress=True, bs=128*1024):
+def inflate(FileNames, progress=True, bs=1024*1024, workers=None):
     '''
     de-compress *ALL* given FileNames
+
+    The blocks of a single file are de-compressed by a pool of 'workers' threads (default : all cores), a list of
+    files is de-compressed by a pool of 'workers' processes (a file per process).
+    Returns the name(s) of the de-compressed file(s).
     '''
-    def decomp(FileName, compression='lzma', annotation='', bs=128*1024, progress=False, indent=0, callback=None):
-        pass
+    if isinstance(FileNames, str): # single file
+        lbl = "De-compressing '%s'" % os.path.split(FileNames)[1]
+        pb = tqdm.tqdm(desc=lbl, unit='B', unit_scale=True, leave=False, disable=not progress)
+        retval = inflate_file(FileNames, workers, bs, pb.update)
+        pb.close()
+        return retval
+    if isinstance(FileNames, list): # multiple files
+        label = "de-compression progress of %d files" % len(FileNames)
+        return _pool_map(inflate_file, FileNames, workers, label, progress, workers=1, bs=bs)
 
 def get_deflated_file_size(FileName):
     '''
     This function returns the (deflated) file size of FileName.
 
-    if FileName is a compressed file, but not supported, -1 is returned.
     if FileName is not (recognized) as a compressed file, the filesize is returned.
+    For a compressed file the size comes from its checkpoint index (see ATE.utils.seekable), for .xz files
+    that is read from the xz index at the end of the file, for .gz and .bz2 files the index is build (and saved
+    next to the file) the first time.
     '''
-    compression = ''
-    ext = extension_from_magic_number_in_file(FileName, list(supported_compressions_extensions))
-    if len(ext) == 1:
-        compression = supported_compressions_extensions[ext[0]]
-
-    if compression=='lzma':
-        with lzma.open(FileName, 'rb') as fd:
-            fd.seek(0, 2)
-            size = fd.tell()
-    elif compression=='bz2':
-        with bz2.open(FileName, 'rb') as fd:
-            fd.seek(0, 2)
-            size = fd.tell()
-    elif compression=='gzip':
-        with gzip.open(FileName, 'rb') as fd:
-            fd.seek(0, 2)
-            size = fd.tell()
-    else:
-        with open(FileName, 'rb') as fd:
-            fd.seek(0,2)
-            size = fd.tell()
-    return size
+    if compression_of_file(FileName) == '':
+        return os.path.getsize(FileName)
+    from ATE.utils.seekable import get_checkpoint_index
+    return get_checkpoint_index(FileName).size
 
 if __name__ == '__main__':
-    from ATE.Data.Formats.STDF import get_stdf_files, get_stdf_gz_files, get_stdf_bz2_files, get_stdf_zx_files
-    from myconsole import stdf_resources
+    import time
 
-    stdf_files = get_stdf_files(stdf_resources)
-    deflate(stdf_files, compression='gzip') # gzip
-    deflate(stdf_files, compression='bz2') # bz2
-    deflate(stdf_files) # lzma, default
+    FileName = sys.argv[1]
+    for compression in supported_compressions:
+        start = time.time()
+        OutName = deflate(FileName, compression, progress=False)
+        print("%-4s : %s -> %s bytes in %.3f seconds" % (compression, os.path.getsize(FileName), os.path.getsize(OutName), time.time() - start))
+        os.remove(OutName)
@@ -5,20 +5,37 @@ Created on Aug 15, 2019
 
 The hashing algorithm used is md5!
 '''
-import bz2
-import gzip
-import lzma
 import os
 from hashlib import md5 as hasher
 
-from ATE.Data.Formats.STDF.utils import is_STDF
-from ATE.utils.compression import supported_compressions
-from ATE.utils.magicnumber import (
-    extension_from_magic_number_in_file,
-    is_compressed_file
-)
+from ATE.data.STDF.probe import open_STDF
 
 
+class HashingReader(object):
+    '''
+    Wraps a (binary) file object, everything that is read through it is hashed.
+    Use it to hash the contents while parsing them (one pass), hexdigest() hashes what is not read yet.
+    '''
+    def __init__(self, fd):
+        self.fd = fd
+        self.hash = hasher()
+
+    def readinto(self, buffer):
+        count = self.fd.readinto(buffer)
+        if count:
+            self.hash.update(memoryview(buffer)[:count])
+        return count
+
+    def read(self, size=-1):
+        data = self.fd.read(size)
+        self.hash.update(data)
+        return data
+
+    def hexdigest(self):
+        for chunk in iter(lambda: self.fd.read(1024 * 1024), b''):
+            self.hash.update(chunk)
+        return self.hash.hexdigest()
+
 def file_contents_hash(FileName):
     '''
     This function returns the md5 (hex) digest (in string format) of the file contents of FileName.
@@ -26,38 +43,11 @@ def file_contents_hash(FileName):
     created from the uncompressed contents!
     if something goes wrong, an empty string is returned.
     '''
-    retval = ''
-    if os.path.exists(FileName) and os.path.isfile(FileName) and is_STDF(FileName):
-        _hash = hasher()
-        if is_compressed_file(FileName, supported_compressions):
-            compression_lookup = dict((v,k) for k,v in supported_compressions.items())
-            ext = extension_from_magic_number_in_file(FileName)
-            if len(ext)!=1:
-                raise Exception("WTF!")
-            compression = compression_lookup[ext]
-            if compression=='lzma':
-                with lzma.open(FileName, 'rb') as fd:
-                    for chunk in iter(lambda: fd.read(_hash.block_size), b''):
-                        _hash.update(chunk)
-                retval = _hash.hexdigest()
-            elif compression=='bz2':
-                with bz2.open(FileName, 'rb') as fd:
-                    for chunk in iter(lambda: fd.read(_hash.block_size), b''):
-                        _hash.update(chunk)
-                retval = _hash.hexdigest()
-            elif compression=='gzip':
-                with gzip.open(FileName, 'rb') as fd:
-                    for chunk in iter(lambda: fd.read(_hash.block_size), b''):
-                        _hash.update(chunk)
-                retval = _hash.hexdigest()
-            else:
-                raise Exception("Supported but un-implemented compression '%s'" % compression)
-        else:
-            with open(FileName, 'rb') as fd:
-                for chunk in iter(lambda: fd.read(_hash.block_size), b''):
-                    _hash.update(chunk)
-            retval = _hash.hexdigest()
-    return retval
+    _, fd = open_STDF(FileName)
+    if fd is None: # not (an) STDF (file)
+        return ''
+    with fd:
+        return HashingReader(fd).hexdigest()
 
 def is_hash_name(FileName):
     '''
@@ -104,6 +104,23 @@ def is_image_file(FileName, extensions_of_interest=image_extensions):
             return True
     return False
 
+magic_number_length = max(offset + len(pattern) for extension in extensions for magic_number in extensions[extension] for offset, pattern in magic_number)
+
+def extension_from_magic_number(buffer, extensions_of_interest=known_extensions):
+    '''
+    Same as extension_from_magic_number_in_file, but on the first bytes of a file (buffer), to determine the type
+    of a file that is already read. buffer should hold at least magic_number_length bytes (unless the file is shorter)
+    '''
+    retval = []
+    for extension in extensions:
+        if extension not in extensions_of_interest or extension in retval:
+            continue
+        for magic_number in extensions[extension]:
+            if all(buffer[offset:offset + len(pattern)] == pattern for offset, pattern in magic_number):
+                retval.append(extension)
+                break
+    return retval
+
 def extension_from_magic_number_in_file(FileName, extensions_of_interest=known_extensions):
     '''
     This function will try to determine the type of 'FileName' by looking at it's contents.
@@ -112,36 +129,12 @@ def extension_from_magic_number_in_file(FileName, extensions_of_interest=known_e
     Note: it doesn't look at the extension of a filename like 'mimetypes' does !
     Ref: https://en.wikipedia.org/wiki/List_of_file_signatures
     '''
-    debug = False
-    prv = []
-    if debug: print(FileName)
-    if os.path.exists(FileName) and os.path.isfile(FileName):
+    try:
         with open(FileName, 'rb') as fd:
-            for extension in extensions:
-                possibilities = len(extensions[extension])
-                if debug: print("\t'%s'" % extension)
-                for possibility, magic_number in enumerate(extensions[extension]):
-                    parts = len(magic_number)
-                    if debug: print("\t\tPossibility %s/%s has %s parts: '%s'" % (possibility+1, possibilities, parts, magic_number))
-                    tmp = []
-                    for part, definition in enumerate(magic_number):
-                        offset, pattern = definition
-                        if debug: print("\t\t\t part=%s/%s : offset = %d, magic = %s, lenght = %d bytes" % (part+1, parts, definition[0], definition[1], len(pattern)), end = '')
-                        fd.seek(offset)
-                        data = fd.read(len(pattern))
-                        if debug: print(" --> %s == %s ? " % (data, pattern), end='')
-                        if data == pattern:
-                            tmp.append(extension)
-                            if debug: print('YES')
-                        else:
-                            if debug: print('NO')
-                    if len(tmp) == parts:
-                        prv.append(extension)
-    retval = []
-    for ext in prv:
-        if ext in extensions_of_interest:
-            retval.append(ext)
-    return retval
+            buffer = fd.read(magic_number_length)
+    except OSError: # doesn't exist, is a directory, ...
+        return []
+    return extension_from_magic_number(buffer, extensions_of_interest)
 
 if __name__ == '__main__':
     from ATE import package_root
@@ -0,0 +1,554 @@
+'''
+Created on Oct 18, 2026
+
+Random access into compressed files by means of a checkpoint index.
+
+A checkpoint is a place in the compressed file where decompression can be
+(re)started, together with the offset in the uncompressed data it corresponds
+to. Reading at an arbitrary (uncompressed) offset then only costs the
+decompression from the nearest checkpoint before it, instead of everything
+from the start of the file.
+
+    lzma : the blocks of the .xz stream(s). The block boundaries and their
+           uncompressed sizes are in the xz index at the end of the file, so
+           the checkpoints (and the uncompressed size) are known by reading
+           only the tail of the file. Note that a single block .xz file (what
+           lzma.open writes) has only one checkpoint, multi block files are
+           written by 'xz -T0', 'xz --block-size=...' or the parallel
+           compressor in this package.
+    bz2  : the blocks of the .bz2 stream(s), located by their (bit aligned)
+           block magic. A block is decompressed on its own by wrapping it in
+           a new single block stream.
+    gzip : the members of a (multi member) .gz file, plus 'dictionary
+           snapshots' (copies of the zlib decompressor) taken every 'spacing'
+           bytes while decompressing. The snapshots can not be saved, so
+           they live in the (process wide) index cache and grow as the file is
+           read.
+
+The uncompressed size and the bz2/gzip checkpoints need one pass over the
+file, so they are saved next to the file (FileName + '.ckp') and re-used as
+long as size and mtime of the file didn't change.
+
+    with open_seekable('lot.std.xz') as fd:
+        fd.seek(123456)
+        header = fd.read(4)
+'''
+import bisect
+import bz2
+import collections
+import io
+import json
+import lzma
+import mmap
+import os
+import re
+import struct
+import zlib
+
+import numpy as np
+
+from ATE.utils.compression import compression_of_file
+from ATE.utils.compression import xz_vli_decode
+
+checkpoint_extension = '.ckp'
+checkpoint_version = 1
+default_spacing = 4 * 1024 * 1024
+cache_size = 64 # (checkpoint indexes kept in the process wide cache)
+
+_xz_header_magic = b'\xFD7zXZ\x00'
+_xz_footer_magic = b'YZ'
+_bz2_block_magic = 0x314159265359
+_bz2_eos_magic = 0x177245385090
+_chunk_size = 64 * 1024
+
+
+def checkpoint_name(FileName):
+    '''
+    Returns the name of the (saved) checkpoint index of FileName
+    '''
+    return FileName + checkpoint_extension
+
+
+def xz_checkpoints(fd, size):
+    '''
+    Returns the list of (uncompressed offset, block offset, block size, stream header offset) of the xz blocks in fd
+    and the uncompressed size. Only the stream footers, indexes and headers are read.
+    '''
+    streams = []
+    end = size
+    while end > 0:
+        if end < 24:
+            raise lzma.LZMAError("Truncated xz stream")
+        fd.seek(end - 12)
+        footer = fd.read(12)
+        if footer[8:] == b'\x00\x00\x00\x00': # stream padding
+            end -= 4
+            continue
+        if footer[10:] != _xz_footer_magic:
+            raise lzma.LZMAError("Invalid xz stream footer")
+        index_size = (struct.unpack('<I', footer[4:8])[0] + 1) * 4
+        index_start = end - 12 - index_size
+        fd.seek(index_start)
+        index = fd.read(index_size)
+        if index[0] != 0:
+            raise lzma.LZMAError("Invalid xz index")
+        count, position = xz_vli_decode(index, 1)
+        blocks = []
+        for _ in range(count):
+            unpadded, position = xz_vli_decode(index, position)
+            uncompressed, position = xz_vli_decode(index, position)
+            blocks.append(((unpadded + 3) & ~3, uncompressed))
+        stream_start = index_start - sum(block[0] for block in blocks) - 12
+        fd.seek(stream_start)
+        if stream_start < 0 or fd.read(6) != _xz_header_magic:
+            raise lzma.LZMAError("Invalid xz stream header")
+        streams.append((stream_start, blocks))
+        end = stream_start
+    checkpoints = []
+    uncompressed_offset = 0
+    for stream_start, blocks in reversed(streams):
+        offset = stream_start + 12
+        for block_size, uncompressed in blocks:
+            checkpoints.append((uncompressed_offset, offset, block_size, stream_start))
+            offset += block_size
+            uncompressed_offset += uncompressed
+    return checkpoints, uncompressed_offset
+
+
+def _xz_decode(fd, checkpoints, first):
+    '''
+    Yields the decompressed data from the block checkpoints[first] on.
+    '''
+    for _, offset, block_size, stream_start in checkpoints[first:]:
+        fd.seek(stream_start)
+        decompressor = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+        decompressor.decompress(fd.read(12)) # the stream header (holds the check type)
+        fd.seek(offset)
+        remaining = block_size
+        while remaining:
+            data = fd.read(min(_chunk_size, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            data = decompressor.decompress(data)
+            if data:
+                yield data
+
+
+def _bz2_patterns(magic):
+    '''
+    Returns for the 8 bit alignments of the 48 bit magic (needle, value, mask, alignment).
+    The needle are the 5 bytes that are completely covered by the magic.
+    '''
+    retval = []
+    for alignment in range(8):
+        value = (magic << (8 - alignment)).to_bytes(7, 'big')
+        mask = (((1 << 48) - 1) << (8 - alignment)).to_bytes(7, 'big')
+        retval.append((value[1:6], int.from_bytes(value, 'big'), int.from_bytes(mask, 'big'), alignment))
+    return retval
+
+
+def bz2_boundaries(buffer):
+    '''
+    Returns the sorted bit offsets of the block magics and those of the end of stream magics in buffer.
+    '''
+    retval = []
+    size = len(buffer)
+    for magic in [_bz2_block_magic, _bz2_eos_magic]:
+        offsets = []
+        for needle, value, mask, alignment in _bz2_patterns(magic):
+            for match in re.finditer(re.escape(needle), buffer):
+                first = match.start() - 1
+                if first < 0:
+                    continue
+                window = bytes(buffer[first:first + 7]).ljust(7, b'\x00')
+                if int.from_bytes(window, 'big') & mask == value:
+                    if first * 8 + alignment + 48 <= size * 8:
+                        offsets.append(first * 8 + alignment)
+        retval.append(sorted(offsets))
+    return retval
+
+
+def _bits(data):
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+
+_bz2_stream_header = _bits(b'BZh9')
+_bz2_eos_bits = _bits(_bz2_eos_magic.to_bytes(6, 'big'))
+
+
+def bz2_decompress_block(data, start, end):
+    '''
+    Decompresses the bz2 block that occupies the bits [start, end) of data.
+    The block is wrapped in a single block stream, its CRC is also the combined CRC of that stream.
+    '''
+    bits = _bits(data)[start:end]
+    stream = np.concatenate([_bz2_stream_header, bits, _bz2_eos_bits, bits[48:80]])
+    return bz2.decompress(np.packbits(stream).tobytes())
+
+
+def bz2_block(fd, start, end):
+    '''
+    Decompresses the bz2 block that occupies the bits [start, end) of fd.
+    '''
+    fd.seek(start // 8)
+    return bz2_decompress_block(fd.read((end + 7) // 8 - start // 8), start % 8, start % 8 + end - start)
+
+
+def bz2_checkpoints(fd, size):
+    '''
+    Returns the list of (uncompressed offset, first bit, end bit) of the bz2 blocks in fd and the uncompressed size.
+    Every block is decompressed once (to know its size and to weed out false magics).
+    '''
+    if size == 0:
+        return [], 0
+    with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        blocks, ends = bz2_boundaries(buffer)
+    boundaries = sorted(blocks + ends)
+    checkpoints = []
+    uncompressed_offset = 0
+    done = 0
+    for start in blocks:
+        if start < done:
+            continue # a false magic inside the previous block
+        position = bisect.bisect_right(boundaries, start)
+        while position < len(boundaries):
+            end = boundaries[position]
+            try:
+                data = bz2_block(fd, start, end)
+                break
+            except (OSError, ValueError, EOFError): # a false magic, the block continues
+                position += 1
+        else:
+            raise OSError("Invalid bz2 block at bit %s" % start)
+        checkpoints.append((uncompressed_offset, start, end))
+        uncompressed_offset += len(data)
+        done = end
+    return checkpoints, uncompressed_offset
+
+
+def _bz2_decode(fd, checkpoints, first):
+    for _, start, end in checkpoints[first:]:
+        data = bz2_block(fd, start, end)
+        if data:
+            yield data
+
+
+class CheckpointIndex(object):
+    '''
+    The checkpoints of a compressed file.
+
+    checkpoints is a list of tuples, sorted on their first element, the uncompressed offset.
+    The rest of the tuple depends on the compression (see the *_checkpoints functions).
+    '''
+
+    def __init__(self, FileName, compression, size, checkpoints, spacing=default_spacing):
+        self.FileName = FileName
+        self.compression = compression
+        self.size = size
+        self.checkpoints = [tuple(checkpoint) for checkpoint in checkpoints]
+        self.offsets = [checkpoint[0] for checkpoint in self.checkpoints]
+        self.spacing = spacing
+        stat = os.stat(FileName)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.snapshot_offsets = [] # gzip only, in memory
+        self.snapshots = []
+
+    def __len__(self):
+        return len(self.checkpoints) + len(self.snapshots)
+
+    def is_valid_for(self, FileName=None):
+        '''
+        Returns True if the index (still) matches the size and mtime of FileName.
+        '''
+        if FileName is None:
+            FileName = self.FileName
+        try:
+            stat = os.stat(FileName)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == self.stat
+
+    def checkpoint_offset(self, position):
+        '''
+        Returns the uncompressed offset of the closest checkpoint at or before position.
+        '''
+        retval = 0
+        index = bisect.bisect_right(self.offsets, position) - 1
+        if index >= 0:
+            retval = self.offsets[index]
+        index = bisect.bisect_right(self.snapshot_offsets, position) - 1
+        if index >= 0:
+            retval = max(retval, self.snapshot_offsets[index])
+        return retval
+
+    def decode(self, fd, position):
+        '''
+        Returns (offset, generator) where the generator yields the decompressed data of fd starting at the
+        (uncompressed) offset, which is the closest checkpoint at or before position.
+        '''
+        index = bisect.bisect_right(self.offsets, position) - 1
+        if self.compression == 'lzma':
+            index = max(index, 0)
+            if not self.checkpoints:
+                return 0, iter(())
+            return self.checkpoints[index][0], _xz_decode(fd, self.checkpoints, index)
+        if self.compression == 'bz2':
+            index = max(index, 0)
+            if not self.checkpoints:
+                return 0, iter(())
+            return self.checkpoints[index][0], _bz2_decode(fd, self.checkpoints, index)
+        offset, compressed_offset, state = 0, 0, None
+        if index >= 0:
+            offset, compressed_offset = self.checkpoints[index]
+        snapshot = bisect.bisect_right(self.snapshot_offsets, position) - 1
+        if snapshot >= 0 and self.snapshot_offsets[snapshot] > offset:
+            offset = self.snapshot_offsets[snapshot]
+            compressed_offset, state = self.snapshots[snapshot]
+        return offset, self._gzip_decode(fd, offset, compressed_offset, state)
+
+    def add_snapshot(self, offset, compressed_offset, state):
+        index = bisect.bisect_left(self.snapshot_offsets, offset)
+        if index < len(self.snapshot_offsets) and self.snapshot_offsets[index] == offset:
+            return
+        self.snapshot_offsets.insert(index, offset)
+        self.snapshots.insert(index, (compressed_offset, state))
+
+    def _gzip_decode(self, fd, offset, compressed_offset, state, members=None):
+        '''
+        Yields the decompressed data from (offset, compressed_offset) on. A copy of the decompressor is added as
+        snapshot every 'spacing' bytes, the start of the members is appended to members (if not None).
+        '''
+        decompressor = state.copy() if state is not None else zlib.decompressobj(31)
+        fd.seek(compressed_offset)
+        next_snapshot = (offset // self.spacing + 1) * self.spacing
+        while True:
+            data = fd.read(_chunk_size)
+            if not data:
+                return
+            compressed_offset += len(data)
+            while data:
+                output = decompressor.decompress(data, _chunk_size)
+                data = decompressor.unconsumed_tail
+                if decompressor.eof: # (the rest of the input is both in unconsumed_tail and unused_data)
+                    position = compressed_offset - len(decompressor.unused_data)
+                elif offset + len(output) >= next_snapshot:
+                    self.add_snapshot(offset + len(output), compressed_offset - len(data), decompressor.copy())
+                    next_snapshot = ((offset + len(output)) // self.spacing + 1) * self.spacing
+                if output:
+                    offset += len(output)
+                    yield output
+                if decompressor.eof:
+                    fd.seek(position)
+                    if fd.read(2) != b'\x1f\x8b': # end of the file (or trailing garbage)
+                        return
+                    fd.seek(position)
+                    compressed_offset = position
+                    if members is not None:
+                        members.append((offset, position))
+                    decompressor = zlib.decompressobj(31)
+                    break
+
+    def to_dict(self):
+        return {'version' : checkpoint_version,
+                'size' : self.stat[0],
+                'mtime' : self.stat[1],
+                'compression' : self.compression,
+                'uncompressed_size' : self.size,
+                'checkpoints' : [list(checkpoint) for checkpoint in self.checkpoints]}
+
+    def save(self, Name=None):
+        '''
+        Writes the index (without the snapshots) to Name (default : next to the file), returns the name written to.
+        '''
+        if Name is None:
+            Name = checkpoint_name(self.FileName)
+        temporary = '%s.%s.tmp' % (Name, os.getpid())
+        with open(temporary, 'w') as fd:
+            json.dump(self.to_dict(), fd)
+        os.replace(temporary, Name)
+        return Name
+
+
+def build_checkpoint_index(FileName, spacing=default_spacing):
+    '''
+    Builds the CheckpointIndex of FileName (which must be compressed).
+    For lzma only the tail of the file is read, bz2 and gzip need a pass over the file.
+    '''
+    compression = compression_of_file(FileName)
+    if compression == '':
+        raise ValueError("'%s' is not compressed" % FileName)
+    size = os.path.getsize(FileName)
+    with open(FileName, 'rb') as fd:
+        if compression == 'lzma':
+            checkpoints, uncompressed_size = xz_checkpoints(fd, size)
+        elif compression == 'bz2':
+            checkpoints, uncompressed_size = bz2_checkpoints(fd, size)
+        else:
+            retval = CheckpointIndex(FileName, compression, 0, [], spacing)
+            members = [(0, 0)]
+            uncompressed_size = sum(len(data) for data in retval._gzip_decode(fd, 0, 0, None, members))
+            retval.size = uncompressed_size
+            retval.checkpoints = members
+            retval.offsets = [member[0] for member in members]
+            return retval
+    return CheckpointIndex(FileName, compression, uncompressed_size, checkpoints, spacing)
+
+
+def load_checkpoint_index(FileName, Name=None, spacing=default_spacing):
+    '''
+    Returns the saved CheckpointIndex of FileName, None if there is no (valid) one.
+    '''
+    if Name is None:
+        Name = checkpoint_name(FileName)
+    try:
+        with open(Name, 'r') as fd:
+            meta = json.load(fd)
+        stat = os.stat(FileName)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != checkpoint_version or (meta['size'], meta['mtime']) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    return CheckpointIndex(FileName, meta['compression'], meta['uncompressed_size'], meta['checkpoints'], spacing)
+
+
+_indexes = collections.OrderedDict()
+
+def get_checkpoint_index(FileName, save=True, spacing=default_spacing):
+    '''
+    Returns the CheckpointIndex of FileName, from the process wide cache, from the saved index or freshly build
+    (and saved if possible).
+    '''
+    key = os.path.realpath(FileName)
+    retval = _indexes.get(key)
+    if retval is not None and retval.is_valid_for(FileName):
+        _indexes.move_to_end(key)
+        return retval
+    retval = None
+    if compression_of_file(FileName) != 'lzma': # the xz index is cheaper than loading a saved one
+        retval = load_checkpoint_index(FileName, spacing=spacing)
+    if retval is None:
+        retval = build_checkpoint_index(FileName, spacing)
+        if save and retval.compression != 'lzma':
+            try:
+                retval.save()
+            except OSError: # no write access next to the file, use the in-memory index
+                pass
+    _indexes[key] = retval
+    _indexes.move_to_end(key)
+    while len(_indexes) > cache_size:
+        _indexes.popitem(last=False)
+    return retval
+
+
+class SeekableReader(io.RawIOBase):
+    '''
+    Read only, seekable, file object on the uncompressed contents of a compressed file.
+
+    Reading forward continues the running decompressor, a seek restarts the decompression from the closest
+    checkpoint only if that is before the seek target and after the current decompressor position.
+    '''
+
+    def __init__(self, FileName, index=None):
+        super().__init__()
+        self.name = FileName
+        self.index = index if index is not None else get_checkpoint_index(FileName)
+        self.fd = open(FileName, 'rb')
+        self.position = 0
+        self._decoder = None
+        self._buffer = b''
+        self._buffer_offset = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.index.size + offset
+        else:
+            raise ValueError("Invalid whence (%s)" % whence)
+        if position < 0:
+            raise ValueError("Negative seek position %s" % position)
+        self.position = position
+        return position
+
+    def _fill(self, position):
+        '''
+        Makes the buffer hold position (the buffer is empty at the end of the data)
+        '''
+        decoded = self._buffer_offset + len(self._buffer)
+        if self._decoder is None or position < self._buffer_offset or self.index.checkpoint_offset(position) > decoded:
+            self._buffer_offset, self._decoder = self.index.decode(self.fd, position)
+            self._buffer = b''
+        while self._buffer_offset + len(self._buffer) <= position:
+            self._buffer_offset += len(self._buffer)
+            self._buffer = next(self._decoder, b'')
+            if not self._buffer:
+                self._decoder = None
+                break
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(self.index.size - self.position, 0)
+        parts = []
+        while size > 0 and self.position < self.index.size:
+            if not self._buffer_offset <= self.position < self._buffer_offset + len(self._buffer):
+                self._fill(self.position)
+                if not self._buffer:
+                    break
+            start = self.position - self._buffer_offset
+            part = self._buffer[start:start + size]
+            parts.append(part)
+            self.position += len(part)
+            size -= len(part)
+        return b''.join(parts)
+
+    def readall(self):
+        return self.read(-1)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.fd.close()
+            self._decoder = None
+        super().close()
+
+
+def open_seekable(FileName):
+    '''
+    Returns a seekable (binary, read only) file object on the uncompressed contents of FileName.
+    '''
+    if compression_of_file(FileName) == '':
+        return open(FileName, 'rb')
+    return SeekableReader(FileName)
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import time
+
+    FileName = sys.argv[1]
+    start = time.time()
+    index = get_checkpoint_index(FileName)
+    print("checkpoint index : %s checkpoints, %s bytes uncompressed, in %.3f seconds" % (len(index), index.size, time.time() - start))
+    positions = sorted(random.randrange(max(index.size, 1)) for _ in range(100))
+    start = time.time()
+    with open_seekable(FileName) as fd:
+        for position in reversed(positions):
+            fd.seek(position)
+            fd.read(256)
+    print("100 random reads : %.3f seconds" % (time.time() - start))
@@ -0,0 +1,57 @@
+import lzma
+
+import numpy as np
+import pytest
+
+from ATE.data.Metis.metis import Metis
+
+
+def test_import_and_pull_in(stdf_file, tmp_path):
+    FileName, _ = stdf_file(parts=7, sites=2, tests=3)
+    metis = Metis(str(tmp_path / 'store'), chunk_size=100) # a few parts per chunk
+    lot = metis.import_stdf(FileName, progress=False)
+    assert metis.lots() == [lot]
+    manifest = metis.manifest(lot)
+    assert manifest['parts'] == 7
+    assert len(manifest['chunks']) > 1
+    assert manifest['tests'] == {'100' : 'P', '101' : 'P', '102' : 'P'}
+    assert manifest['static']['LOT_ID'] == 'LOT1'
+
+    df = metis.pull_in(['LOT_ID', 'PART', 'SITE_NUM', 'HARD_BIN', 'X_COORD', 'PART_ID', 101, 'T102_FLG'])
+    assert df['LOT_ID'].tolist() == ['LOT1'] * 7
+    assert df['PART'].tolist() == list(range(7))
+    assert df['SITE_NUM'].tolist() == [0, 1, 0, 1, 0, 1, 0]
+    assert df['HARD_BIN'].tolist() == [1, 2, 1, 2, 1, 2, 1]
+    assert df['X_COORD'].tolist() == list(range(7))
+    assert df['PART_ID'].tolist() == [str(part + 1) for part in range(7)]
+    assert df['T101'].tolist() == [float(part * 10 + 1) for part in range(7)]
+    assert df['T102_FLG'].tolist() == [0] * 7
+    assert sorted(df) == sorted(metis.pulled)
+
+
+def test_multiple_lots(stdf_file, tmp_path):
+    FileName, _ = stdf_file(parts=3, sites=1, tests=2)
+    with open(FileName, 'rb') as fd:
+        data = fd.read()
+    with lzma.open(str(tmp_path / 'other.std.xz'), 'wb') as fd:
+        fd.write(data)
+    metis = Metis(str(tmp_path / 'store'))
+    metis.import_stdf(FileName, progress=False, lot='first')
+    metis.import_stdf(str(tmp_path / 'other.std.xz'), progress=False)
+    assert metis.lots() == ['first', 'other']
+    chunks = list(metis.iter_chunks('LOT,100,999'))
+    assert [chunk['LOT'][0] for chunk in chunks] == ['first', 'other']
+    assert all(np.isnan(chunk['T999']).all() for chunk in chunks)
+
+    metis.pull_in('LOT,100')
+    metis.save()
+    restored = Metis(str(tmp_path / 'store')).restore()
+    assert restored['T100'].tolist() == [0.0, 10.0, 20.0] * 2
+
+
+def test_hdf5_store(stdf_file, tmp_path):
+    pytest.importorskip('h5py')
+    FileName, _ = stdf_file(parts=3, sites=1, tests=2)
+    metis = Metis(str(tmp_path / 'store'), backend='hdf5')
+    metis.import_stdf(FileName, progress=False)
+    assert metis.pull_in('PART_ID,101')['T101'].tolist() == [1.0, 11.0, 21.0]
@@ -0,0 +1,70 @@
+import os
+
+from ATE.data.STDF.catalog import STDFCatalog
+from ATE.data.STDF.records import MIR, MRR, SDR, WIR, WRR
+from ATE.data.STDF.writer import STDFWriter
+from ATE.utils.hashing import file_contents_hash
+
+
+def _lot(FileName, LOT_ID, PART_TYP, NODE_NAM, START_T, parts=3, compression=None):
+    with STDFWriter(FileName, endian='<', compression=compression) as writer:
+        mir = MIR('V4', '<')
+        for name, value in [('LOT_ID', LOT_ID), ('PART_TYP', PART_TYP), ('NODE_NAM', NODE_NAM), ('START_T', START_T), ('SETUP_T', START_T)]:
+            mir.set_value(name, value)
+        writer.write_record(mir)
+        sdr = SDR('V4', '<')
+        sdr.set_value('CARD_ID', 'card-7')
+        writer.write_record(sdr)
+        wir = WIR('V4', '<')
+        wir.set_value('HEAD_NUM', 1)
+        wir.set_value('WAFER_ID', 'W01')
+        wir.set_value('START_T', START_T + 10)
+        writer.write_record(wir)
+        for part in range(parts):
+            writer.write_pir(1, 0)
+            writer.write_ptr(100, 1, 0, 0, 1.0)
+            writer.write_prr(1, 0, hard_bin=1)
+        wrr = WRR('V4', '<')
+        wrr.set_value('HEAD_NUM', 1)
+        wrr.set_value('PART_CNT', parts)
+        writer.write_record(wrr)
+        mrr = MRR('V4', '<')
+        mrr.set_value('FINISH_T', START_T + 100)
+        writer.write_record(mrr)
+
+
+def test_catalog(tmp_path):
+    Root = tmp_path / 'archive'
+    (Root / 'X' / 'week1').mkdir(parents=True)
+    first = str(Root / 'X' / 'week1' / 'lot1.std')
+    second = str(Root / 'X' / 'lot2.std.xz')
+    _lot(first, 'LOT1', 'X', 'tester-Y', 1000)
+    _lot(second, 'LOT2', 'X', 'tester-Z', 2000, parts=5, compression='lzma')
+    with open(str(Root / 'notes.txt'), 'w') as fd:
+        fd.write('not an STDF file')
+    with open(first + '.sdx', 'wb') as fd:
+        fd.write(b'ignored')
+    with open(first + '.yld', 'wb') as fd:
+        fd.write(b'ignored')
+
+    with STDFCatalog(str(tmp_path / 'catalog.sqlite3')) as catalog:
+        assert catalog.update(str(Root), workers=2, batch_size=1) == {'cataloged' : 3, 'unchanged' : 0, 'removed' : 0, 'errors' : 0}
+        assert len(catalog) == 2
+        lots = catalog.lots(PART_TYP='X', NODE_NAM='tester-Y', since=500, until=1500)
+        assert [(lot['LOT_ID'], lot['path'], lot['parts']) for lot in lots] == [('LOT1', first, 3)]
+        assert [lot['LOT_ID'] for lot in catalog.lots(PART_TYP='X')] == ['LOT1', 'LOT2']
+        files = {row['path'] : row for row in catalog.query('SELECT * FROM files')}
+        assert files[second]['compression'] == 'lzma'
+        assert files[second]['hash'] == file_contents_hash(second) != ''
+        assert files[str(Root / 'notes.txt')]['is_stdf'] == 0
+        wafers = catalog.query('SELECT WAFER_ID, START_T, PART_CNT FROM wafers JOIN files ON files.id = file_id WHERE path = ?', (second,))
+        assert wafers == [{'WAFER_ID' : 'W01', 'START_T' : 2010, 'PART_CNT' : 5}]
+        assert catalog.query('SELECT CARD_ID FROM sdr') == [{'CARD_ID' : 'card-7'}] * 2
+        assert catalog.query('SELECT FINISH_T FROM mrr ORDER BY FINISH_T') == [{'FINISH_T' : 1100}, {'FINISH_T' : 2100}]
+
+        assert catalog.update(str(Root), workers=1) == {'cataloged' : 0, 'unchanged' : 3, 'removed' : 0, 'errors' : 0}
+        _lot(first, 'LOT1', 'X', 'tester-Y', 1000, parts=4)
+        os.remove(second)
+        assert catalog.update(str(Root), workers=1) == {'cataloged' : 1, 'unchanged' : 1, 'removed' : 1, 'errors' : 0}
+        assert [(lot['LOT_ID'], lot['parts']) for lot in catalog.lots()] == [('LOT1', 4)]
+        assert catalog.query('SELECT COUNT(*) AS count FROM wafers') == [{'count' : 1}]
@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+from ATE.data.STDF.codec import RecordCodec, bit_array, bytes_from_bit_array, bytes_from_nibble_array, nibble_array
+from ATE.data.STDF.codec import numerical_array, bytes_from_numerical_array, record_codec, decode_Vn, encode_Vn
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.records import FTR, GDR, MPR, PTR, STDFError
+
+
+def make_PTR(endian='<'):
+    record = PTR('V4', endian)
+    record.set_value('TEST_NUM', 1000)
+    record.set_value('HEAD_NUM', 1)
+    record.set_value('SITE_NUM', 3)
+    record.set_value('RESULT', 1.25)
+    record.set_value('TEST_TXT', 'Idd_standby')
+    record.set_value('OPT_FLAG', ['0'] * 8)
+    record.set_value('LO_LIMIT', 0.5)
+    record.set_value('HI_LIMIT', 2.5)
+    record.set_value('UNITS', 'A')
+    return record
+
+
+def test_PTR_round_trip():
+    for endian in ['<', '>']:
+        packed = make_PTR(endian).__repr__()
+        record = PTR('V4', endian, packed)
+        assert record.missing_fields == 0
+        assert record.get_value('TEST_NUM') == 1000
+        assert record.get_value('SITE_NUM') == 3
+        assert record.get_value('RESULT') == 1.25
+        assert record.get_value('TEST_TXT') == 'Idd_standby'
+        assert record.get_value('UNITS') == 'A'
+        assert record.__repr__() == packed
+
+
+def test_PTR_truncated():
+    packed = bytearray(make_PTR().__repr__()[:28])
+    packed[0:2] = (24).to_bytes(2, 'little')
+    record = PTR('V4', '<', bytes(packed))
+    assert record.get_value('TEST_TXT') == 'Idd_standby'
+    assert record.get_value('OPT_FLAG') == ['1'] * 8
+    assert record.missing_fields == 13
+
+
+def test_FTR_and_MPR_arrays():
+    record = FTR('V4', '<')
+    record.set_value('TEST_NUM', 2000)
+    record.fields['RTN_ICNT']['Value'] = 3
+    record.fields['RTN_INDX']['Value'] = [1, 2, 3]
+    record.fields['RTN_STAT']['Value'] = [[1], [2], [3]]
+    record.fields['FAIL_PIN']['Value'] = ['1', '0', '1']
+    unpacked = FTR('V4', '<', record.__repr__())
+    assert unpacked.fields['RTN_INDX']['Value'] == [1, 2, 3]
+    assert unpacked.fields['RTN_STAT']['Value'] == [[1], [2], [3]]
+    assert unpacked.fields['FAIL_PIN']['Value'] == ['1', '0', '1']
+
+    record = MPR('V4', '>')
+    record.set_value('TEST_NUM', 3000)
+    record.fields['RSLT_CNT']['Value'] = 4
+    record.fields['RTN_RSLT']['Value'] = [0.5, 1.5, 2.5, 3.5]
+    unpacked = MPR('V4', '>', record.__repr__())
+    assert unpacked.fields['RTN_RSLT']['Value'] == [0.5, 1.5, 2.5, 3.5]
+
+
+def test_codec_is_cached():
+    assert record_codec(PTR('V4', '<')) is record_codec(PTR('V4', '<'))
+    assert record_codec(PTR('V4', '<')) is not record_codec(PTR('V4', '>'))
+
+
+def test_numpy_arrays():
+    data = bytes([0b10000001, 0b00000011])
+    assert bit_array(data).tolist() == [1, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1, 1]
+    assert bit_array(data, 10, lsb_first=True).tolist() == [1, 0, 0, 0, 0, 0, 0, 1, 1, 1]
+    assert bytes_from_bit_array(['1', '0', '1']) == bytes([0b10100000])
+    assert bytes_from_bit_array([1, 1, 0, 0, 0, 0, 0, 0, 1], lsb_first=True) == bytes([0b00000011, 0b00000001])
+    assert nibble_array(bytes([0x21, 0x03]), 3).tolist() == [1, 2, 3]
+    assert bytes_from_nibble_array([1, 2, 3]) == bytes([0x21, 0x03])
+    values = np.arange(100, dtype=np.uint16)
+    for endian in ['<', '>']:
+        packed = bytes_from_numerical_array(values, 'xU*2', endian)
+        assert numerical_array(b'xx' + packed, 'U*2', 100, endian, offset=2).tolist() == values.tolist()
+    with pytest.raises(STDFError):
+        bytes_from_numerical_array([70000], 'U*2', '<')
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_big_FTR_round_trip(endian):
+    pins = 1024
+    random = np.random.RandomState(4)
+    FAIL_PIN = random.randint(0, 2, pins)
+    RTN_STAT = random.randint(0, 16, pins)
+    record = FTR('V4', endian)
+    record.set_value('TEST_NUM', 2000)
+    record.set_value('RTN_INDX', np.arange(pins, dtype=np.uint16))
+    record.set_value('RTN_STAT', RTN_STAT) # (a flat list of nibbles is accepted)
+    record.set_value('FAIL_PIN', [str(bit) for bit in FAIL_PIN])
+    packed = record.__repr__()
+    unpacked = FTR('V4', endian, packed)
+    assert unpacked.get_value('RTN_INDX') == list(range(pins))
+    assert unpacked.get_value('RTN_STAT') == [[nibble] for nibble in RTN_STAT.tolist()]
+    assert unpacked.get_value('FAIL_PIN') == [str(bit) for bit in FAIL_PIN]
+    assert unpacked.__repr__() == packed
+
+    lazy = lazy_record_object('V4', endian, 'FTR', packed)
+    assert lazy.get_array('RTN_INDX').dtype == np.dtype(endian + 'u2')
+    assert np.array_equal(lazy.get_array('RTN_STAT'), RTN_STAT)
+    assert np.array_equal(lazy.get_array('FAIL_PIN'), FAIL_PIN)
+    assert lazy.get_array('PGM_INDX').size == 0
+    assert lazy.get_array('TEST_NUM') == 2000
+    assert lazy.get_value('FAIL_PIN') == unpacked.get_value('FAIL_PIN')
+
+
+def test_bit_list_arrays_and_set_value():
+    record = MPR('V4', '<')
+    record.set_value('TEST_NUM', 3000)
+    record.set_value('RTN_RSLT', [0.5, 1, 2.5])
+    assert (record.get_value('RSLT_CNT'), MPR('V4', '<', record.__repr__()).get_value('RTN_RSLT')) == (3, [0.5, 1.0, 2.5])
+
+    fields = {'REC_LEN' : {'#' : 0, 'Type' : 'U*2', 'Ref' : None, 'Value' : None, 'Missing' : None},
+              'REC_TYP' : {'#' : 1, 'Type' : 'U*1', 'Ref' : None, 'Value' : 99, 'Missing' : None},
+              'REC_SUB' : {'#' : 2, 'Type' : 'U*1', 'Ref' : None, 'Value' : 1, 'Missing' : None},
+              'CNT'     : {'#' : 3, 'Type' : 'U*2', 'Ref' : None, 'Value' : 2, 'Missing' : 0},
+              'MASKS'   : {'#' : 4, 'Type' : 'xD*n', 'Ref' : 'CNT', 'Value' : [['1', '0', '1'], ['0'] * 9], 'Missing' : []},
+              'BYTES'   : {'#' : 5, 'Type' : 'xB*n', 'Ref' : 'CNT', 'Value' : [['1'] * 8, ['0', '1'] * 8], 'Missing' : []}}
+
+    class Record(object):
+        id = 'TST'
+        missing_fields = 0
+
+    obj = Record()
+    obj.fields = fields
+    obj.endian = '<'
+    codec = RecordCodec(fields, '<')
+    packed = codec.pack(obj)
+    assert packed[4:] == b'\x02\x00' + b'\x03\x00\x05' + b'\x09\x00\x00\x00' + b'\x01\xff' + b'\x02\x55\x55'
+    for name in ['MASKS', 'BYTES']:
+        value = fields[name]['Value']
+        fields[name]['Value'] = None
+        codec.unpack(obj, packed)
+        assert fields[name]['Value'] == value
+    codec.unpack(obj, packed, arrays=True)
+    assert [bits.tolist() for bits in fields['MASKS']['Value']] == [[1, 0, 1], [0] * 9]
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_GDR_generic_data(endian):
+    items = [('C*n', 'trim'), ('B*0', None), ('U*1', 200), ('U*2', 513), ('U*4', 70000), ('I*1', -3), ('I*2', -300),
+             ('I*4', -70000), ('R*4', 1.5), ('R*8', -0.1), ('D*n', ['1', '0', '1']), ('N*1', 7), ('B*n', ['1'] + ['0'] * 7)]
+    record = GDR('V4', endian)
+    record.set_value('GEN_DATA', items)
+    packed = record.__repr__()
+    decoded = GDR('V4', endian, packed)
+    assert decoded.get_value('FLD_CNT') == len(items)
+    assert decoded.get_value('GEN_DATA') == items
+    assert decoded.__repr__() == packed
+    assert lazy_record_object('V4', endian, 'GDR', packed).get_value('GEN_DATA') == items
+    assert record.Vn_decode(record.Vn_encode(items, endian), endian) == items
+    assert decode_Vn(encode_Vn(items, endian), endian, count=2) == (items[:2], 7)
+    record.set_value('GEN_DATA', [(13, 3)]) # by type code
+    assert record.get_value('GEN_DATA') == [('N*1', 3)] and record.get_value('FLD_CNT') == 1
+
+    with pytest.raises(STDFError):
+        decode_Vn(b'\x09\x00', endian) # (9 is not a V*n type)
+    with pytest.raises(STDFError):
+        decode_Vn(b'\x0a\x05ab', endian)
+    with pytest.raises(STDFError):
+        record.set_value('GEN_DATA', [('U*1', 256)])
@@ -0,0 +1,113 @@
+import lzma
+
+import numpy as np
+
+from ATE.data.STDF import columns as columns_module
+from ATE.data.STDF.columns import extract_columns
+from ATE.data.STDF.columns import extract_gdr_columns
+from ATE.data.STDF.columns import extract_ptr_columns
+from ATE.data.STDF.columns import to_matrix
+from ATE.data.STDF.records import GDR
+from ATE.data.STDF.records import MIR
+from ATE.data.STDF.records import MPR
+from ATE.data.STDF.records import PTR
+from ATE.data.STDF.utils import TEST_NUM_from_record
+from ATE.data.STDF.writer import STDFWriter
+
+
+def test_extract_ptr_columns(stdf_file):
+    for endian in ['<', '>']:
+        FileName, records = stdf_file(endian=endian, parts=5, sites=2, tests=3)
+        columns = extract_ptr_columns(FileName, fields=['TEST_NUM', 'SITE_NUM', 'TEST_FLG', 'RESULT', 'TEST_TXT', 'LO_LIMIT'])
+        ptrs = [PTR('V4', endian, record) for record in records if record[2:4] == b'\x0f\x0a']
+        assert columns['TEST_NUM'].dtype == np.uint32
+        assert columns['RESULT'].dtype == np.float32
+        assert columns['TEST_NUM'].tolist() == [ptr.get_value('TEST_NUM') for ptr in ptrs]
+        assert columns['SITE_NUM'].tolist() == [ptr.get_value('SITE_NUM') for ptr in ptrs]
+        assert columns['RESULT'].tolist() == [ptr.get_value('RESULT') for ptr in ptrs]
+        assert columns['TEST_TXT'].tolist() == [ptr.get_value('TEST_TXT') for ptr in ptrs]
+        assert columns['LO_LIMIT'].tolist() == [0.0] * len(ptrs)
+        assert columns['TEST_FLG'].tolist() == [0] * len(ptrs)
+        assert (columns['RESULT'] == (columns['part'] * 10 + columns['TEST_NUM'] - 100)).all()
+
+
+def test_extract_columns_closes_the_mapped_file(stdf_file, monkeypatch):
+    FileName, _ = stdf_file(parts=2, sites=1, tests=2)
+    buffers = []
+    records_buffer = columns_module._records_buffer
+
+    def recording(*args):
+        buffer, offsets = records_buffer(*args)
+        buffers.append(buffer)
+        return buffer, offsets
+
+    monkeypatch.setattr(columns_module, '_records_buffer', recording)
+    columns = extract_ptr_columns(FileName)
+    assert buffers[0].closed
+
+    indexes = []
+    get_STDF_index = columns_module.get_STDF_index
+
+    def loading(*args, **kwargs):
+        indexes.append(get_STDF_index(*args, **kwargs))
+        return indexes[-1]
+
+    monkeypatch.setattr(columns_module, 'get_STDF_index', loading)
+    extract_ptr_columns(FileName) # (the sidecar is saved now, so it is mapped)
+    assert indexes[0].mm is None and indexes[0]._columns == {} # closed
+    assert columns['RESULT'].tolist() == [float(part * 10 + TEST_NUM - 100) for part in range(2) for TEST_NUM in [100, 101]]
+
+
+def test_extract_arrays(tmp_path):
+    FileName = str(tmp_path / 'mpr.std')
+    records = [b'\x02\x00\x00\x0a\x02\x04']
+    for count in [3, 0, 2]:
+        mpr = MPR('V4', '<')
+        mpr.set_value('TEST_NUM', 10 + count)
+        mpr.fields['RTN_ICNT']['Value'] = count
+        mpr.fields['RTN_STAT']['Value'] = [[index + 1] for index in range(count)]
+        mpr.fields['RSLT_CNT']['Value'] = count
+        mpr.fields['RTN_RSLT']['Value'] = [float(index) / 2 for index in range(count)]
+        records.append(mpr.__repr__())
+    with lzma.open(FileName + '.xz', 'wb') as fd:
+        fd.write(b''.join(records))
+    columns = extract_columns(FileName + '.xz', 'MPR', ['TEST_NUM', 'RTN_STAT', 'RTN_RSLT'])
+    assert columns['TEST_NUM'].tolist() == [13, 10, 12]
+    assert columns['RTN_STAT'].tolist() == [1, 2, 3, 1, 2]
+    assert columns['RTN_RSLT_start'].tolist() == [0, 3, 3, 5]
+    assert columns['RTN_RSLT'].tolist() == [0.0, 0.5, 1.0, 0.0, 0.5]
+
+
+def test_TEST_NUM_from_record():
+    ptr = PTR('V4', '>')
+    ptr.set_value('TEST_NUM', 123456)
+    ptr.set_value('HEAD_NUM', 1)
+    ptr.set_value('SITE_NUM', 1)
+    assert TEST_NUM_from_record(ptr.__repr__(), '>') == 123456
+
+
+def test_extract_gdr_columns(tmp_path):
+    for endian in ['<', '>']:
+        FileName = str(tmp_path / 'gdr.std')
+        trims = [[('U*1', 3), ('R*4', 0.5), ('C*n', 'vref')], [('B*0', None), ('I*2', -4)], [('D*n', ['1', '1']), ('N*1', 9), ('U*4', 7), ('R*8', 2.0)]]
+        with STDFWriter(FileName, endian=endian, part_buffers=False) as writer:
+            writer.write_record(MIR('V4', endian))
+            writer.write_record(GDR('V4', endian)) # outside of a part, no items
+            for part, items in enumerate(trims):
+                writer.write_pir(1, 0)
+                record = GDR('V4', endian)
+                record.set_value('GEN_DATA', items)
+                writer.write_record(record)
+                writer.write_prr(1, 0, hard_bin=1)
+        columns = extract_gdr_columns(FileName)
+        assert columns['FLD_CNT'].tolist() == [0, 3, 2, 4]
+        assert columns['part'].tolist() == [-1, 0, 1, 2]
+        assert columns['GEN_DATA_start'].tolist() == [0, 0, 3, 5, 9]
+        assert columns['GEN_DATA_TYPE'].tolist() == [1, 7, 10, 0, 5, 12, 13, 3, 8]
+        values = columns['GEN_DATA']
+        assert values[[0, 1, 4, 6, 7, 8]].tolist() == [3.0, 0.5, -4.0, 9.0, 7.0, 2.0]
+        assert np.isnan(values[[2, 3, 5]]).all()
+        assert columns['GEN_DATA_TEXT'][2] == 'vref' and columns['GEN_DATA_TEXT'][5] == b'\x03'
+        matrix = to_matrix(values, columns['GEN_DATA_start'])
+        assert matrix.shape == (4, 4)
+        assert matrix[1, :2].tolist() == [3.0, 0.5] and np.isnan(matrix[2, 2:]).all()
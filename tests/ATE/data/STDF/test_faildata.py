@@ -0,0 +1,75 @@
+import numpy as np
+
+from ATE.data.STDF.faildata import FailBitmap, fail_bitmaps_from_file
+from ATE.data.STDF.records import BSR, MIR, MTR, STR
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _STR(endian, SITE_NUM, pins, cycles, CYC_BASE=0):
+    record = STR('V4', endian)
+    for field, value in [('CONT_FLG', 0), ('TEST_NUM', 100), ('HEAD_NUM', 1), ('SITE_NUM', SITE_NUM), ('CYC_BASE', CYC_BASE),
+                         ('CYC_SIZE', 4), ('PMR_SIZE', 2), ('CYC_OFST', cycles), ('PMR_INDX', pins)]:
+        record.set_value(field, value)
+    return record
+
+
+def _MTR(endian, rows, columns, STRT_ADR=0, words=[]):
+    record = MTR('V4', endian, BSR__ADDR_SIZ=4, BSR__WC_SIZ=2)
+    for field, value in [('CONT_FLG', 0), ('TEST_NUM', 200), ('HEAD_NUM', 1), ('SITE_NUM', 0), ('ASR_REF', 0), ('ROW_SIZE', 2),
+                         ('COL_SIZE', 1), ('ROW_ARR', rows), ('COL_ARR', columns), ('BSR_IDX', 3), ('STRT_ADR', STRT_ADR),
+                         ('WORD_CNT', len(words) // 4), ('WORDS', words)]:
+        record.set_value(field, value)
+    return record
+
+
+def test_fail_bitmaps_from_file(tmp_path):
+    for endian in ['<', '>']:
+        FileName = str(tmp_path / 'fails.std')
+        with STDFWriter(FileName, endian=endian, part_buffers=False) as writer:
+            writer.write_record(MIR('V4', endian))
+            bsr = BSR('V4', endian)
+            for field, value in [('BSR_IDX', 3), ('BIT_TYP', 0), ('ADDR_SIZ', 4), ('WC_SIZ', 2), ('WRD_SIZ', 4)]:
+                bsr.set_value(field, value)
+            writer.write_record(bsr)
+            writer.write_pir(1, 0)
+            writer.write_pir(1, 1)
+            writer.write_record(_STR(endian, 0, [1, 2, 1], [5, 6, 5], CYC_BASE=1 << 40))
+            writer.write_record(_STR(endian, 1, [0], [9]))
+            writer.write_record(_MTR(endian, [300, 2], [7, 1]))
+            writer.write_record(_MTR(endian, [2], [1], STRT_ADR=10, words=[0, 1, 0, 0] + [0, 0, 0, 0] + [1, 0, 0, 1])) # (continuation)
+            writer.write_prr(1, 0, hard_bin=0)
+            writer.write_prr(1, 1, hard_bin=1)
+            writer.write_pir(1, 0)
+            writer.write_prr(1, 0, hard_bin=1) # no fails
+            writer.write_record(_STR(endian, 0, [4], [4]))
+
+        parts = list(fail_bitmaps_from_file(FileName, compact_size=2, block_size=64))
+        assert [part[:3] for part in parts] == [(0, 1, 0), (1, 1, 1), (-1, 1, 0)]
+        bitmaps = parts[0][3]
+        assert sorted(bitmaps) == [('MTR', 200), ('STR', 100)]
+        scan = bitmaps[('STR', 100)]
+        assert (scan.fails, len(scan)) == (3, 2)
+        assert [array.tolist() for array in scan.addresses()] == [[1, 2], [(1 << 40) + 5, (1 << 40) + 6]]
+        memory = bitmaps[('MTR', 200)]
+        rows, columns = memory.addresses()
+        assert list(zip(rows.tolist(), columns.tolist())) == [(2, 1), (10, 1), (12, 0), (12, 3), (300, 7)]
+        assert memory.shape() == (301, 8)
+        assert memory.bitmap((13, 4)).tolist()[10:] == [[False, True, False, False], [False] * 4, [True, False, False, True]]
+        assert parts[1][3][('STR', 100)].bitmap().tolist() == [[False] * 9 + [True]]
+
+
+def test_fail_bitmap():
+    bitmap = FailBitmap(compact_size=4)
+    rows = np.random.RandomState(4).randint(0, 64, 1000)
+    columns = np.random.RandomState(5).randint(0, 100, 1000)
+    for chunk in range(10):
+        bitmap.add(rows[chunk * 100:(chunk + 1) * 100], columns[chunk * 100:(chunk + 1) * 100])
+    dense = np.zeros((64, 100), dtype=bool)
+    dense[rows, columns] = True
+    assert (bitmap.fails, len(bitmap)) == (1000, np.count_nonzero(dense))
+    assert np.array_equal(bitmap.bitmap((64, 100)), dense)
+    assert np.array_equal(bitmap.bitmap((64, 100), packed=True), np.packbits(dense, axis=1))
+    other = FailBitmap()
+    other.add([70], [0])
+    bitmap.merge(other)
+    assert (bitmap.fails, bitmap.shape()) == (1001, (71, 100))
@@ -0,0 +1,66 @@
+from ATE.data.STDF import instrumentation
+from ATE.data.STDF.instrumentation import Progress, instrumented
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.parts import PartReader
+from ATE.data.STDF.records import PTR
+from ATE.data.STDF.statistics import statistics_from_file
+from ATE.data.STDF.synthetic import write_synthetic_lot
+from ATE.data.STDF.utils import records_from_file
+
+
+def test_instrumented(tmp_path):
+    FileName = str(tmp_path / 'lot.std')
+    truth = write_synthetic_lot(FileName, parts=40, tests=10, sites=2)
+    reports = []
+    assert instrumentation.current is None
+    with instrumented(progress=reports.append, interval=3600) as stats:
+        assert instrumentation.current is stats
+        statistics_from_file(FileName)
+        record = PTR('V4', '<')
+        for field, value in [('TEST_NUM', 1), ('HEAD_NUM', 1), ('SITE_NUM', 0), ('RESULT', 1.5)]:
+            record.set_value(field, value)
+        packed = record.__repr__()
+        PTR('V4', '<', packed)
+        with PartReader(FileName) as reader:
+            reader.part(3)
+            reader.part(3)
+    assert instrumentation.current is None
+
+    counters = stats.as_dict()
+    assert sum(entry['count'] for entry in counters['records'].values()) == truth['records']
+    PTRs = [REC for _, REC_TYP, REC_SUB, REC in records_from_file(FileName) if (REC_TYP, REC_SUB) == (15, 10)]
+    assert counters['records']['PTR'] == {'count' : len(PTRs), 'bytes' : sum(len(REC) for REC in PTRs)}
+    assert counters['decode']['PTR']['count'] == 1 and counters['pack']['PTR']['bytes'] == len(packed)
+    assert counters['caches']['parts'] == {'hits' : 1, 'misses' : 1, 'hit_rate' : 0.5}
+    assert counters['caches']['codec']['hits'] >= 1
+    assert [report['stage'] for report in reports] == ['read'] # less than PROGRESS_RECORDS records : only the final one
+    assert reports[-1]['done'] == reports[-1]['total'] == sum(entry['bytes'] for entry in counters['records'].values())
+
+    text = stats.prometheus()
+    assert '# TYPE stdf_records_total counter' in text
+    assert 'stdf_records_total{record="PTR"} %s' % len(PTRs) in text
+    assert 'stdf_cache_misses_total{cache="parts"} 1' in text
+
+
+def test_instrumented_lazy_records():
+    record = PTR('V4', '<')
+    for field, value in [('TEST_NUM', 1), ('HEAD_NUM', 1), ('SITE_NUM', 0), ('RESULT', 1.5), ('UNITS', 'V')]:
+        record.set_value(field, value)
+    packed = record.__repr__()
+    with instrumented() as stats:
+        lazy = lazy_record_object('V4', '<', 'PTR', packed)
+        assert lazy.get_value('SITE_NUM') == 0 # (a fixed position field, not a decode)
+        assert lazy.get_value('RESULT') == 1.5
+        assert lazy.get_value('UNITS') == 'V' # (cached)
+        assert lazy.get_array('RESULT') == 1.5
+    decode = stats.as_dict()['decode']['PTR']
+    assert (decode['count'], decode['bytes']) == (2, 2 * len(packed)) and decode['seconds'] > 0
+
+
+def test_progress_throttle():
+    reports = []
+    progress = Progress(reports.append, interval=3600)
+    assert progress.update('import', 1, 10)
+    assert not any(progress.update('import', done, 10) for done in range(2, 10))
+    assert progress.update('import', 10, 10)
+    assert [report['done'] for report in reports] == [1, 10]
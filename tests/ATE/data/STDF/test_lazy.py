@@ -0,0 +1,44 @@
+from ATE.data.STDF.lazy import LazyRecord
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.lazy import record_schema
+from ATE.data.STDF.records import MPR
+from ATE.data.STDF.records import create_record_object
+from ATE.data.STDF.records import records_from_file
+
+
+def test_lazy_matches_eager(stdf_file):
+    FileName, records = stdf_file(parts=3, sites=2, tests=2)
+    for _, REC_TYP, REC_SUB, lazy in records_from_file(FileName, unpack='lazy'):
+        assert isinstance(lazy, LazyRecord)
+        eager = create_record_object('V4', '<', (REC_TYP, REC_SUB), bytes(lazy))
+        assert lazy.id == eager.id
+        assert lazy.to_dict(True) == eager.to_dict(True)
+        assert lazy.get_fields('REC_TYP') == eager.get_fields('REC_TYP')
+
+
+def test_fixed_fields_are_decoded_alone(stdf_file):
+    _, records = stdf_file(parts=1, sites=1, tests=1)
+    PTR = lazy_record_object('V4', '<', 'PTR', records[3])
+    assert PTR.get_value('SITE_NUM') == 0
+    assert PTR.get_value(3) == 100 # TEST_NUM
+    assert sorted(PTR.values) == ['SITE_NUM', 'TEST_NUM']
+    assert not PTR.is_decoded()
+    assert PTR.get_value('TEST_TXT') == 'test_0'
+    assert PTR.is_decoded()
+    assert record_schema('V4', '<', (15, 10)) is PTR.schema
+
+
+def test_lazy_arrays_and_missing():
+    record = MPR('V4', '>')
+    record.set_value('TEST_NUM', 3000)
+    record.fields['RSLT_CNT']['Value'] = 2
+    record.fields['RTN_RSLT']['Value'] = [0.5, 1.5]
+    packed = record.__repr__()
+    assert MPR('V4', '>', packed).get_value('RTN_RSLT') == [0.5, 1.5]
+    lazy = create_record_object('V4', '>', 'MPR', packed, lazy=True)
+    assert lazy.get_value('RTN_RSLT') == [0.5, 1.5]
+    truncated = packed[:4 + 4 + 2 + 1]
+    truncated = bytes([0, 7]) + truncated[2:]
+    lazy = lazy_record_object('V4', '>', 'MPR', truncated)
+    assert lazy.get_value('TEST_NUM') == 3000
+    assert lazy.get_value('TEST_FLG') == MPR('V4', '>', truncated).get_value('TEST_FLG')
@@ -0,0 +1,174 @@
+import lzma
+
+import pytest
+
+from ATE.data.STDF import merge
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.merge import merge_files
+from ATE.data.STDF.records import MIR, MRR, SDR, STDFError, WIR, WRR
+from ATE.data.STDF.subset import subset_file
+from ATE.data.STDF.summary import read_summary
+from ATE.data.STDF.synthetic import write_synthetic_lot
+from ATE.data.STDF.utils import records_from_file
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _objects(FileName):
+    return [lazy_record_object('V4', '<', (REC_TYP, REC_SUB), REC) for _, REC_TYP, REC_SUB, REC in records_from_file(FileName)]
+
+
+def _file(FileName, START_T, FINISH_T, dies, HEAD_NUM=1, WAFER_ID='W1', endian='<', compression=None, NODE_NAM='tester-1'):
+    '''
+    dies is a list of (X, Y, HARD_BIN, PART_FLG), parts are tested on 2 sites.
+    '''
+    with STDFWriter(FileName, endian=endian, compression=compression) as writer:
+        mir = MIR('V4', endian)
+        for name, value in [('LOT_ID', 'LOT1'), ('START_T', START_T), ('SETUP_T', START_T)]:
+            mir.set_value(name, value)
+        writer.write_record(mir)
+        sdr = SDR('V4', endian)
+        sdr.set_value('HAND_ID', NODE_NAM)
+        writer.write_record(sdr)
+        wir = WIR('V4', endian)
+        wir.set_value('HEAD_NUM', HEAD_NUM)
+        wir.set_value('WAFER_ID', WAFER_ID)
+        writer.write_record(wir)
+        for index, (X, Y, HARD_BIN, PART_FLG) in enumerate(dies):
+            site = index % 2
+            writer.write_pir(HEAD_NUM, site)
+            writer.write_ptr(100, HEAD_NUM, site, 0x80 if PART_FLG & 0x08 else 0, float(X))
+            writer.write_prr(HEAD_NUM, site, hard_bin=HARD_BIN, soft_bin=HARD_BIN, part_flg=PART_FLG, x=X, y=Y, part_id=str(index + 1))
+        wrr = WRR('V4', endian)
+        wrr.set_value('HEAD_NUM', HEAD_NUM)
+        wrr.set_value('WAFER_ID', WAFER_ID)
+        wrr.set_value('FINISH_T', FINISH_T)
+        wrr.set_value('PART_CNT', len(dies))
+        writer.write_record(wrr)
+        mrr = MRR('V4', endian)
+        mrr.set_value('FINISH_T', FINISH_T)
+        writer.write_record(mrr)
+
+
+def test_merge_split_files(tmp_path):
+    first = str(tmp_path / 'lot_1.std')
+    second = str(tmp_path / 'lot_2.std.xz')
+    _file(first, 1000, 1100, [(0, 0, 1, 0), (1, 0, 1, 0), (2, 0, 2, 0x08)])
+    _file(second, 1100, 1200, [(3, 0, 1, 0), (4, 0, 1, 0)], compression='lzma', NODE_NAM='tester-2')
+    Destination = str(tmp_path / 'lot.std')
+    assert merge_files([second, first], Destination) == 5
+    objects = _objects(Destination)
+    ids = [obj.id for obj in objects]
+    assert ids[:5] == ['FAR', 'MIR', 'SDR', 'SDR', 'WIR']
+    assert ids.count('WIR') == ids.count('WRR') == 1
+    assert ids[-1] == 'MRR'
+    assert [obj.get_value('HAND_ID') for obj in objects if obj.id == 'SDR'] == ['tester-1', 'tester-2']
+    prrs = [obj for obj in objects if obj.id == 'PRR']
+    assert [(obj.get_value('X_COORD'), obj.get_value('PART_ID')) for obj in prrs] == [(X, str(X + 1)) for X in range(5)]
+    wrr = [obj for obj in objects if obj.id == 'WRR'][0]
+    assert (wrr.get_value('WAFER_ID'), wrr.get_value('PART_CNT'), wrr.get_value('GOOD_CNT'), wrr.get_value('FINISH_T')) == ('W1', 5, 4, 1200)
+    summary = read_summary(Destination)
+    assert (summary.part_count(), summary.good_count()) == (5, 4)
+    assert summary.hard_bins() == {1 : 4, 2 : 1}
+    assert summary.MRR.get_value('FINISH_T') == 1200
+    tsr = [obj for obj in summary.TSR if obj.get_value('HEAD_NUM') == 255][0]
+    assert (tsr.get_value('EXEC_CNT'), tsr.get_value('FAIL_CNT'), tsr.get_value('TST_SUMS')) == (5, 1, 10.0)
+
+
+@pytest.mark.parametrize('retests', ['flag', 'drop', 'keep'])
+def test_merge_retests(tmp_path, retests):
+    first = str(tmp_path / 'lot.std')
+    retest = str(tmp_path / 'retest.std')
+    _file(first, 1000, 1100, [(0, 0, 2, 0x08), (1, 0, 1, 0), (2, 0, 2, 0x08)])
+    _file(retest, 2000, 2100, [(2, 0, 1, 0)])
+    Destination = str(tmp_path / 'merged.std')
+    written = merge_files([first, retest], Destination, retests=retests)
+    prrs = [obj for obj in _objects(Destination) if obj.id == 'PRR']
+    summary = read_summary(Destination)
+    if retests == 'flag':
+        assert written == 4
+        assert [obj.get_value('PART_ID') for obj in prrs] == ['1', '2', '3', '3']
+        assert [obj.get_value('PART_FLG')[6] for obj in prrs] == ['0', '0', '0', '1'] # bit 1 : retest (by coordinates)
+        assert (summary.part_count(), summary.good_count()) == (4, 2)
+        assert summary.hard_bins() == {1 : 2, 2 : 1}
+    elif retests == 'drop':
+        assert written == 3
+        assert [(obj.get_value('X_COORD'), obj.get_value('PART_ID')) for obj in prrs] == [(0, '1'), (1, '2'), (2, '3')]
+        assert (summary.part_count(), summary.good_count()) == (3, 2)
+        assert summary.hard_bins() == {1 : 2, 2 : 1}
+    else:
+        assert written == 4
+        assert [obj.get_value('PART_ID') for obj in prrs] == ['1', '2', '3', '4']
+        assert (summary.part_count(), summary.good_count()) == (4, 2)
+        assert summary.hard_bins() == {1 : 2, 2 : 2}
+
+
+def test_merge_overlapping_files(tmp_path):
+    head_1 = str(tmp_path / 'head_1.std')
+    head_2 = str(tmp_path / 'head_2.std')
+    _file(head_1, 1000, 1400, [(X, 0, 1, 0) for X in range(4)], HEAD_NUM=1, WAFER_ID='W1')
+    _file(head_2, 1000, 1400, [(X, 1, 1, 0) for X in range(4)], HEAD_NUM=2, WAFER_ID='W2')
+    Destination = str(tmp_path / 'merged.std')
+    assert merge_files([head_1, head_2], Destination, renumber=False) == 8
+    objects = _objects(Destination)
+    assert [obj.get_value('HEAD_NUM') for obj in objects if obj.id == 'PRR'] == [1, 2] * 4 # interleaved on time
+    assert [obj.get_value('PART_ID') for obj in objects if obj.id == 'PRR'] == ['1', '1', '2', '2', '3', '3', '4', '4']
+    assert [(obj.id, obj.get_value('HEAD_NUM')) for obj in objects if obj.id in ['WIR', 'WRR']] == [('WIR', 1), ('WIR', 2), ('WRR', 1), ('WRR', 2)]
+    assert read_summary(Destination).part_count(2) == 4
+
+    other = str(tmp_path / 'big_endian.std')
+    _file(other, 1000, 1400, [(0, 0, 1, 0)], endian='>')
+    with pytest.raises(STDFError):
+        merge_files([head_1, other], str(tmp_path / 'mixed.std'))
+
+
+def test_merge_per_site_files_with_equal_times(tmp_path):
+    lot = str(tmp_path / 'lot.std')
+    truth = write_synthetic_lot(lot, parts=301, tests=5, sites=2, wafers=2, retest_rate=0.1, seed=2)
+    sites = [str(tmp_path / ('site_%d.std' % site)) for site in range(2)]
+    for site, FileName in enumerate(sites):
+        subset_file(lot, FileName, sites=[site])
+    Destination = str(tmp_path / 'merged.std')
+    assert merge_files(sites, Destination, renumber=False) == truth['parts']
+    objects = _objects(Destination)
+    wafers = [(obj.id, obj.get_value('WAFER_ID')) for obj in objects if obj.id in ['WIR', 'WRR']]
+    assert [WAFER_ID for _, WAFER_ID in wafers[::2]] == [WAFER_ID for _, WAFER_ID in wafers[1::2]] # never opened again
+    assert [REC_ID for REC_ID, _ in wafers] == ['WIR', 'WRR'] * 2
+    assert sum(obj.get_value('PART_CNT') for obj in objects if obj.id == 'WRR') == truth['parts']
+    summary = read_summary(Destination)
+    assert (summary.part_count(), summary.good_count()) == (truth['parts'], truth['good_dies'])
+
+
+def test_merge_streams_compressed_files_once(tmp_path, monkeypatch):
+    first = str(tmp_path / 'lot.std')
+    retest = str(tmp_path / 'retest.std.xz')
+    _file(first, 1000, 1100, [(X, 0, 1, 0) for X in range(50)])
+    _file(retest, 2000, 2100, [(X, 0, 1, 0) for X in range(50)], compression='lzma')
+    with lzma.open(retest) as fd:
+        size = len(fd.read())
+    decompressed = []
+    read = lzma.LZMAFile.read
+    def counted(self, size=-1):
+        data = read(self, size)
+        decompressed.append(len(data))
+        return data
+    monkeypatch.setattr(lzma.LZMAFile, 'read', counted)
+    assert merge_files([first, retest], str(tmp_path / 'merged.std'), retests='drop') == 50
+    assert sum(decompressed) <= 3 * size + 1024 # the FINISH_T/part count pass, the pre-pass of 'drop' and the merge
+
+
+def test_merge_closes_a_source_that_fails(tmp_path, monkeypatch):
+    FileName = str(tmp_path / 'lot.std')
+    _file(FileName, 1000, 1100, [(0, 0, 1, 0)])
+    opened = []
+    open_STDF = merge.open_STDF
+    def recording(*args):
+        probe, fd = open_STDF(*args)
+        opened.append(fd)
+        return probe, fd
+    def failing(FileName, endian):
+        raise STDFError("no meta")
+    monkeypatch.setattr(merge, 'open_STDF', recording)
+    monkeypatch.setattr(merge, '_file_meta', failing)
+    with pytest.raises(STDFError):
+        merge_files([FileName], str(tmp_path / 'merged.std'))
+    assert len(opened) == 1 and opened[0].closed
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from ATE.data.STDF.parts import PartReader
+from ATE.data.STDF.records import DTR, MIR, STDFError
+from ATE.data.STDF.sidecar import get_STDF_index
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _lot(FileName, compression=None):
+    '''
+    4 parts tested in parallel on 2 sites (interleaved), a DTR between the tests and a last part that is not closed.
+    '''
+    with STDFWriter(FileName, endian='<', compression=compression, part_buffers=False) as writer:
+        writer.write_record(MIR('V4', '<'))
+        writer.define_ptr(1000, 'vdd')
+        for touchdown in range(2):
+            for site in range(2):
+                writer.write_pir(1, site)
+            for site in range(2):
+                writer.write_ptr(1000, 1, site, 0, float(10 * touchdown + site))
+            dtr = DTR('V4', '<')
+            dtr.set_value('TEXT_DAT', 'touchdown %d' % touchdown)
+            writer.write_record(dtr)
+            for site in range(2):
+                writer.write_ptr(1001, 1, site, 0, 1.0)
+            for site in range(2):
+                writer.write_prr(1, site, hard_bin=1 + site, soft_bin=1 + site, part_flg=0x08 if site else 0, x=touchdown, y=site)
+        writer.write_pir(1, 0)
+        writer.write_ptr(1000, 1, 0, 0, 99.0)
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_part_reader(tmp_path, compression):
+    FileName = str(tmp_path / ('lot.std' + ('.gz' if compression else '')))
+    _lot(FileName, compression)
+    with PartReader(FileName, cache_size=2) as reader:
+        assert len(reader) == 5
+        records = reader.part(3) # touchdown 1, site 1
+        assert [obj.id for obj in records] == ['PIR', 'PTR', 'DTR', 'PTR', 'PRR']
+        assert [obj.get_value('SITE_NUM') for obj in records if obj.id != 'DTR'] == [1] * 4
+        assert records[1].get_value('RESULT') == 11.0
+        assert records[2].get_value('TEXT_DAT') == 'touchdown 1'
+        assert [obj.id for obj in reader.part(-1)] == ['PIR', 'PTR']
+        assert reader.part(3) is records
+        assert (reader.hits, reader.misses) == (1, 2)
+        assert [records[1].get_value('RESULT') for records in reader.parts(slice(0, 4, 2))] == [0.0, 10.0]
+        assert reader.part(3) is not records # (evicted)
+        with pytest.raises(STDFError):
+            reader.part(5)
+
+        assert reader.select(bin=2).tolist() == [1, 3]
+        assert reader.select(site=0, good=True).tolist() == [0, 2]
+        assert reader.select(bin=[1, 2], good=False).tolist() == [1, 3]
+        assert [records[-1].get_value('X_COORD') for records in reader.parts_where(site=1)] == [0, 1]
+    with PartReader(FileName) as reader: # (from the sidecar, mapped)
+        index = reader.index
+        assert index.mm is not None
+        reader.part(0)
+    assert index.mm is None # closed with the reader that made it
+    with get_STDF_index(FileName) as index:
+        PartReader(FileName, index).close()
+        assert index.mm is not None # (but not the index of the caller)
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_part_reader_shared_by_threads(tmp_path, compression):
+    FileName = str(tmp_path / ('lot.std' + ('.gz' if compression else '')))
+    _lot(FileName, compression)
+    with PartReader(FileName, cache_size=2) as reader:
+        expected = [[obj.id for obj in reader.part(n)] for n in range(len(reader))]
+        failures = []
+
+        def work(seed):
+            for step in range(200):
+                n = (seed * 7 + step * 3) % len(reader)
+                if [obj.id for obj in reader.part(n)] != expected[n]:
+                    failures.append(n)
+
+        threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert failures == []
+        assert len(reader._cache) <= 2
+        assert reader.hits + reader.misses == len(expected) + 8 * 200
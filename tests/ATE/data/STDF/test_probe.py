@@ -0,0 +1,73 @@
+import builtins
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from ATE.data.STDF.probe import clear_probes
+from ATE.data.STDF.probe import open_STDF
+from ATE.data.STDF.probe import probe_file
+from ATE.data.STDF.utils import MIR_from_file
+from ATE.data.STDF.utils import endian_and_version_from_file
+from ATE.data.STDF.utils import is_STDF
+from ATE.data.STDF.utils import is_supported_compressed_STDF_file
+from ATE.data.STDF.utils import records_from_file
+from ATE.utils.magicnumber import extension_from_magic_number
+
+
+@pytest.mark.parametrize('compression, module', [('', None), ('lzma', lzma), ('gzip', gzip), ('bz2', bz2)])
+def test_probe(stdf_file, compression, module):
+    FileName, records = stdf_file(endian='>', parts=2, sites=1, tests=1)
+    if module is not None:
+        with open(FileName, 'rb') as fd, module.open(FileName + '.c', 'wb') as out:
+            out.write(fd.read())
+        FileName += '.c'
+    probe = probe_file(FileName)
+    assert probe.is_STDF
+    assert probe.compression == compression
+    assert (probe.endian, probe.version) == ('>', 'V4')
+    assert probe.header_complete
+    assert probe.MIR().get_value('LOT_ID') == 'LOT1'
+    assert probe_file(FileName) is probe
+    assert is_supported_compressed_STDF_file(FileName) == (compression != '')
+    assert endian_and_version_from_file(FileName) == ('>', 'V4')
+    assert MIR_from_file(FileName).get_value('LOT_ID') == 'LOT1'
+    assert [record[3] for record in records_from_file(FileName)] == records
+
+
+def test_probe_cache_and_single_open(stdf_file, tmp_path, monkeypatch):
+    FileName, records = stdf_file(parts=2, sites=1, tests=1)
+    clear_probes()
+    opens = []
+    original = builtins.open
+    def counting_open(*args, **kwargs):
+        opens.append(args[0])
+        return original(*args, **kwargs)
+    monkeypatch.setattr(builtins, 'open', counting_open)
+    assert [record[3] for record in records_from_file(FileName)] == records
+    assert is_STDF(FileName) and MIR_from_file(FileName) is not None
+    assert len(opens) == 1
+    monkeypatch.setattr(builtins, 'open', original)
+
+    probe = probe_file(FileName)
+    with open(FileName, 'ab') as fd: # the file changes, so does the probe
+        fd.write(records[-1])
+    assert probe_file(FileName) is not probe
+    assert probe_file(FileName).size == probe.size + len(records[-1])
+
+    other = str(tmp_path / 'other.txt')
+    with open(other, 'wb') as fd:
+        fd.write(b'not an STDF file')
+    assert probe_file(other) is not None and not is_STDF(other)
+    assert open_STDF(other)[1] is None
+    assert probe_file(str(tmp_path)) is None
+    assert probe_file(str(tmp_path / 'nothing.std')) is None
+    assert endian_and_version_from_file(other) == ('', '')
+
+
+def test_magic_number_of_buffer():
+    assert extension_from_magic_number(lzma.compress(b'data')) == ['.xz']
+    assert extension_from_magic_number(gzip.compress(b'data'), ['.gz', '.bz2']) == ['.gz']
+    assert extension_from_magic_number(b'\x02\x00\x00\x0a\x02\x04') == ['.stdf']
+    assert extension_from_magic_number(b'') == []
@@ -0,0 +1,67 @@
+import numpy as np
+
+from ATE.data.STDF.records import PTR
+from ATE.data.STDF.scanner import STDFScanner
+from ATE.data.STDF.scanner import parallel_scan_offsets
+from ATE.data.STDF.scanner import resync
+from ATE.data.STDF.scanner import valid_record_types
+from ATE.data.STDF.utils import records_from_file
+
+
+def test_scanner_index(stdf_file):
+    for endian in ['<', '>']:
+        FileName, records = stdf_file(endian=endian)
+        with STDFScanner(FileName) as scanner:
+            assert scanner.endian == endian
+            assert scanner.version == 'V4'
+            assert len(scanner) == len(records)
+            offsets = np.cumsum([0] + [len(record) for record in records[:-1]])
+            assert scanner.index['offset'].tolist() == offsets.tolist()
+            assert scanner.index['REC_LEN'].tolist() == [len(record) - 4 for record in records]
+            assert [bytes(record) for record in scanner.records()] == records
+
+
+def test_scanner_matches_records_from_file(stdf_file):
+    FileName, _ = stdf_file()
+    with STDFScanner(FileName) as scanner:
+        scanned = [(L, T, S, bytes(R)) for L, T, S, R in scanner]
+    assert scanned == list(records_from_file(FileName))
+
+
+def test_scanner_select(stdf_file):
+    FileName, _ = stdf_file(parts=3, tests=4)
+    scanner = STDFScanner(FileName)
+    assert scanner.mask('PTR').sum() == 12
+    assert len(scanner.offsets('PIR', 'PRR')) == 6
+    results = [PTR(scanner.version, scanner.endian, record).get_value('RESULT') for record in scanner.records('PTR')]
+    assert sorted(results) == sorted(float(part * 10 + test) for part in range(3) for test in range(4))
+    scanner.close()
+
+
+def test_scanner_truncated_file(stdf_file):
+    FileName, records = stdf_file()
+    with open(FileName, 'ab') as fd:
+        fd.write(records[-2][:10])
+    with STDFScanner(FileName) as scanner:
+        assert len(scanner) == len(records)
+
+
+def test_parallel_scan(stdf_file):
+    FileName, records = stdf_file(parts=40, sites=4, tests=10)
+    with STDFScanner(FileName) as scanner:
+        expected = scanner.index['offset'].tolist()
+        endian, version = scanner.endian, scanner.version
+    for chunk_size in [7, 100, 1000, 1 << 20]:
+        chunks = parallel_scan_offsets(FileName, endian, version, workers=1, chunk_size=chunk_size)
+        assert chunks.tolist() == expected
+    assert parallel_scan_offsets(FileName, endian, version, workers=2, chunk_size=1000).tolist() == expected
+    with STDFScanner(FileName, workers=2) as scanner:
+        assert scanner.index['offset'].tolist() == expected
+
+
+def test_resync():
+    record = b'\x02\x00\x00\x0a\x02\x04' + b'\x01\x00\x01\x0a\x00' * 10
+    valid_ts = valid_record_types('V4')
+    assert resync(record, '<', 1, len(record), valid_ts) == 6
+    assert resync(record, '<', 0, len(record), valid_ts) == 0
+    assert resync(b'\xff' * 20, '<', 0, 20, valid_ts) is None
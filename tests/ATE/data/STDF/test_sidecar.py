@@ -0,0 +1,128 @@
+import lzma
+import os
+
+import numpy as np
+
+from ATE.data.STDF.parts import PartReader
+from ATE.data.STDF.records import MIR
+from ATE.data.STDF.records import PTR
+from ATE.data.STDF.records import objects_from_indexed_file
+from ATE.data.STDF.records import save_STDF_index
+from ATE.data.STDF.scanner import STDFScanner
+from ATE.data.STDF.sidecar import build_STDF_index
+from ATE.data.STDF.sidecar import get_STDF_index
+from ATE.data.STDF.sidecar import load_STDF_index
+from ATE.data.STDF.sidecar import sidecar_name
+from ATE.data.STDF.synthetic import write_synthetic_lot
+from ATE.data.STDF.utils import records_from_file
+from ATE.data.STDF.writer import STDFWriter
+
+
+def test_sidecar_round_trip(stdf_file):
+    FileName, records = stdf_file(parts=5, sites=2, tests=3)
+    assert load_STDF_index(FileName) is None
+    built = get_STDF_index(FileName)
+    assert os.path.exists(sidecar_name(FileName))
+    loaded = load_STDF_index(FileName)
+    assert loaded is not None
+    assert loaded.meta['hash'] == built.meta['hash'] != ''
+    assert len(loaded) == len(records)
+    for name in built.names():
+        assert loaded.column(name).tolist() == built.column(name).tolist()
+    with STDFScanner(FileName) as scanner:
+        assert loaded.column('offset').tolist() == scanner.index['offset'].tolist()
+    loaded.close()
+
+
+def test_sidecar_parts_and_postings(stdf_file):
+    FileName, records = stdf_file(parts=5, sites=2, tests=3)
+    index = build_STDF_index(FileName, content_hash=False)
+    assert index.part_count() == 5
+    assert (index.column('parts/PRR') > index.column('parts/PIR')).all()
+    assert index.column('parts/SITE_NUM').tolist() == [0, 1, 0, 1, 0]
+    assert index.test_numbers().tolist() == [100, 101, 102]
+    offsets, parts = index.postings(101)
+    assert parts.tolist() == [0, 1, 2, 3, 4]
+    with open(FileName, 'rb') as fd:
+        data = fd.read()
+    for offset, part in zip(offsets.tolist(), parts.tolist()):
+        ptr = PTR('V4', '<', data[offset:offset + len(records[2 + 2])])
+        assert ptr.get_value('TEST_NUM') == 101
+        assert ptr.get_value('RESULT') == float(part * 10 + 1)
+    assert len(index.postings(999)[0]) == 0
+
+
+def test_sidecar_aborted_part(tmp_path):
+    FileName = str(tmp_path / 'aborted.std')
+    with STDFWriter(FileName, endian='<', part_buffers=False) as writer:
+        writer.write_record(MIR('V4', '<'))
+        writer.write_pir(1, 1)
+        writer.write_pir(1, 0)
+        writer.write_ptr(100, 1, 0, 0, 1.0) # aborted, no PRR
+        writer.write_pir(1, 0)
+        writer.write_ptr(100, 1, 0, 0, 2.0)
+        writer.write_prr(1, 0, hard_bin=1)
+        writer.write_prr(1, 1, hard_bin=1)
+        writer.write_prr(1, 1, hard_bin=1) # a PRR without PIR
+    index = build_STDF_index(FileName, content_hash=False)
+    PRRs = index.column('offsets/PRR').tolist()
+    assert index.column('parts/SITE_NUM').tolist() == [1, 0, 0]
+    assert index.column('parts/PRR').tolist() == [PRRs[1], -1, PRRs[0]]
+    with PartReader(FileName, index) as reader:
+        assert [record.id for record in reader.part(1)] == ['PIR', 'PTR']
+        assert [record.id for record in reader.part(2)] == ['PIR', 'PTR', 'PRR']
+        assert reader.part(2)[1].get_value('RESULT') == 2.0
+
+
+def test_sidecar_stores_the_offsets_once(tmp_path):
+    FileName = str(tmp_path / 'lot.std')
+    write_synthetic_lot(FileName, parts=200, tests=20)
+    assert save_STDF_index(FileName) == sidecar_name(FileName)
+    assert os.path.getsize(sidecar_name(FileName)) < os.path.getsize(FileName)
+    index = load_STDF_index(FileName)
+    assert [name for name in index.names() if 'offset' in name] == ['offset']
+    assert (index.column('offset').dtype, index.column('tests/row').dtype, index.column('tests/part').dtype) == (np.uint32, np.uint32, np.int32)
+    offsets, offset = {}, 0
+    for REC_LEN, REC_TYP, REC_SUB, _ in records_from_file(FileName):
+        offsets.setdefault((REC_TYP, REC_SUB), []).append(offset)
+        offset += 4 + REC_LEN
+    assert index.offsets('PTR').tolist() == offsets[(15, 10)]
+    assert index.offsets('GDR').tolist() == []
+    assert sorted(index.column('tests/offset').tolist()) == sorted(offsets[(15, 10)] + offsets[(15, 15)] + offsets[(15, 20)])
+    assert len(index.record_ids()) == len(offsets) and 'PRR' in index.record_ids()
+    index.close()
+
+
+def test_sidecar_is_invalidated(stdf_file):
+    FileName, _ = stdf_file()
+    get_STDF_index(FileName, content_hash=False).close()
+    with open(FileName, 'ab') as fd:
+        fd.write(b'\x00')
+    assert load_STDF_index(FileName) is None
+
+
+def test_sidecar_compressed(stdf_file):
+    FileName, records = stdf_file()
+    with open(FileName, 'rb') as fd:
+        data = fd.read()
+    with lzma.open(FileName + '.xz', 'wb') as fd:
+        fd.write(data)
+    plain = build_STDF_index(FileName)
+    compressed = build_STDF_index(FileName + '.xz')
+    assert compressed.meta['compressed']
+    assert compressed.meta['hash'] == plain.meta['hash']
+    for name in plain.names():
+        assert compressed.column(name).tolist() == plain.column(name).tolist()
+
+
+def test_objects_from_compressed_indexed_file(stdf_file):
+    FileName, records = stdf_file(parts=5, sites=2, tests=3)
+    index = build_STDF_index(FileName, content_hash=False)
+    with open(FileName, 'rb') as fd, open(FileName + '.xz', 'wb') as fdo:
+        data = fd.read()
+        for start in range(0, len(data), 256): # multi stream, so multiple checkpoints
+            fdo.write(lzma.compress(data[start:start + 256]))
+    results = [record.fields['RESULT']['Value'] for record in objects_from_indexed_file(FileName + '.xz', index, ['PTR'])]
+    assert sorted(results) == sorted(float(part * 10 + test) for part in range(5) for test in range(3))
+    offsets = {'PRR' : index.offsets('PRR').tolist()[::-1]}
+    assert len(list(objects_from_indexed_file(FileName + '.xz', offsets))) == 5
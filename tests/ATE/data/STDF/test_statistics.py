@@ -0,0 +1,109 @@
+import math
+import struct
+
+import numpy as np
+import pytest
+
+from ATE.data.STDF.records import MIR
+from ATE.data.STDF.statistics import OnlineStatistics
+from ATE.data.STDF.statistics import QuantileSketch
+from ATE.data.STDF.statistics import statistics_from_file
+from ATE.data.STDF.statistics import statistics_from_files
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _lot(FileName, results, compression=None):
+    '''
+    results is a (parts, sites) array of the results of test 1000 (limits 0 .. 10), test 2000 has no limits.
+    '''
+    with STDFWriter(FileName, endian='<', compression=compression) as writer:
+        writer.write_record(MIR('V4', '<'))
+        writer.define_ptr(1000, 'vdd', lo_limit=0.0, hi_limit=10.0, units='V')
+        writer.define_ptr(2000, 'idd')
+        for row in results:
+            for site, result in enumerate(row):
+                writer.write_pir(1, site)
+                writer.write_ptr(1000, 1, site, 0x80 if not 0.0 <= result <= 10.0 else 0, result)
+                writer.write_ptr(2000, 1, site, 0x02, 0.0) # result not valid
+                body = struct.pack('<IBBBBHH2x3f', 3000, 1, site, 0, 0, 3, 3, result, result + 1, result + 2) + b'\x03mpr\x00'
+                body += struct.pack('<Bbbbffff3H', 0x02, 0, 0, 0, -1.0, 20.0, 3.0, 0.5, 1, 2, 3) + b'\x01V' # .. START_IN, INCR_IN, RTN_INDX, UNITS
+                writer.write_record(struct.pack('<HBB', len(body), 15, 15) + body) # MPR
+                writer.write_prr(1, site, hard_bin=1)
+
+
+def test_statistics_of_file(tmp_path):
+    results = np.random.RandomState(1).normal(5.0, 1.5, size=(500, 4)).astype(np.float32)
+    FileName = str(tmp_path / 'lot.std.gz')
+    _lot(FileName, results, compression='gzip')
+    statistics = statistics_from_file(FileName, batch_size=100)
+    assert len(statistics) == 3 * 4
+
+    site = statistics[(1000, 1, 2)]
+    values = results[:, 2].astype(np.float64)
+    assert (site.EXEC_CNT, site.count) == (500, 500)
+    assert site.FAIL_CNT == np.count_nonzero((values < 0) | (values > 10))
+    assert site.mean == pytest.approx(values.mean())
+    assert site.stdev() == pytest.approx(values.std(ddof=1))
+    assert (site.minimum, site.maximum) == (values.min(), values.max())
+    assert (site.LO_LIMIT, site.HI_LIMIT, site.UNITS, site.TEST_TXT) == (0.0, 10.0, 'V', 'vdd')
+    assert site.Cpk() == pytest.approx(min(10.0 - values.mean(), values.mean()) / (3 * values.std(ddof=1)))
+    assert site.histogram.sum() == 500
+
+    total = statistics.select()[1000]
+    values = results.reshape(-1).astype(np.float64)
+    assert (total.HEAD_NUM, total.EXEC_CNT) == (255, 2000)
+    assert total.mean == pytest.approx(values.mean())
+    assert total.Cp() == pytest.approx(10.0 / (6 * values.std(ddof=1)))
+    assert total.quantile(0.5) == pytest.approx(np.median(values), abs=0.05)
+    assert total.quantile(0.01) == pytest.approx(np.quantile(values, 0.01), abs=0.1)
+    TSR = total.to_dict()
+    assert (TSR['TEST_NUM'], TSR['TST_SUMS'], TSR['TST_SQRS']) == (1000, pytest.approx(values.sum()), pytest.approx(np.square(values).sum()))
+
+    idd = statistics.select()[2000]
+    assert (idd.EXEC_CNT, idd.count, idd.Cpk()) == (2000, 0, None)
+    assert math.isnan(idd.stdev())
+    mpr = statistics.select(1, 0)[3000]
+    assert (mpr.EXEC_CNT, mpr.count) == (500, 1500)
+    assert (mpr.LO_LIMIT, mpr.HI_LIMIT, mpr.UNITS, mpr.TEST_TXT) == (-1.0, 20.0, 'V', 'mpr')
+    assert mpr.mean == pytest.approx(results[:, 0].astype(np.float64).mean() + 1)
+
+
+def test_statistics_merge(tmp_path):
+    results = np.random.RandomState(2).uniform(-1.0, 11.0, size=(300, 2)).astype(np.float32)
+    FileNames = [str(tmp_path / ('lot_%d.std' % part)) for part in range(3)]
+    for part, FileName in enumerate(FileNames):
+        _lot(FileName, results[part * 100:(part + 1) * 100])
+    merged = statistics_from_files(FileNames, workers=2)
+    whole = str(tmp_path / 'whole.std')
+    _lot(whole, results)
+    single = statistics_from_file(whole)
+    for key, statistics in single.tests.items():
+        other = merged[key]
+        assert (other.EXEC_CNT, other.FAIL_CNT, other.count) == (statistics.EXEC_CNT, statistics.FAIL_CNT, statistics.count)
+        assert other.mean == pytest.approx(statistics.mean)
+        assert other.M2 == pytest.approx(statistics.M2)
+        if statistics.histogram is not None:
+            assert np.array_equal(other.histogram, statistics.histogram)
+
+    online = OnlineStatistics()
+    online.feed([7, 7, 8], 1, 0, [1.0, 3.0, 5.0])
+    online.feed(np.array([7]), 1, 0, np.array([7.0]), np.array([0x80]))
+    assert (online[(7, 1, 0)].mean, online[(7, 1, 0)].FAIL_CNT, online[(8, 1, 0)].count) == (pytest.approx(11.0 / 3), 1, 1) # (a fail is a valid result)
+
+
+def test_quantile_sketch():
+    values = np.random.RandomState(3).exponential(size=100000)
+    ordered = np.sort(values)
+    sketch = QuantileSketch()
+    halves = QuantileSketch(), QuantileSketch()
+    for chunk in np.array_split(values, 50):
+        sketch.add(chunk)
+        halves[len(halves[0]) >= 50000].add(chunk)
+    halves[0].merge(halves[1])
+    q = np.array([0.001, 0.01, 0.1, 0.5, 0.9, 0.99, 0.999])
+    for estimate in [sketch.quantile(q), halves[0].quantile(q)]:
+        rank = np.searchsorted(ordered, estimate) / len(values)
+        assert np.all(np.abs(rank - q) <= 0.15 * np.minimum(q, 1 - q)) # the rank error is relative to the tail
+    assert len(sketch.means) <= 120
+    assert (sketch.quantile(0.0), sketch.quantile(1.0)) == (values.min(), values.max())
+    assert math.isnan(QuantileSketch().quantile(0.5))
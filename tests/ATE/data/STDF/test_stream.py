@@ -0,0 +1,35 @@
+import gzip
+import io
+import lzma
+
+from ATE.data.STDF.stream import records_from_blocks
+from ATE.data.STDF.stream import records_from_stream
+from ATE.data.STDF.utils import records_from_file
+from ATE.utils.compression import ReadAheadReader
+
+
+def test_records_from_blocks(stdf_file):
+    _, records = stdf_file(parts=4, sites=2, tests=3)
+    data = b''.join(records)
+    for block_size in [1, 3, 5, 64, len(data)]:
+        blocks = [data[start:start + block_size] for start in range(0, len(data), block_size)]
+        assert [record[3] for record in records_from_blocks(blocks, '<')] == records
+    assert [record[3] for record in records_from_blocks([data[:-3]], '<')] == records[:-1]
+
+
+def test_read_ahead_reader():
+    data = bytes(range(256)) * 1000
+    blocks = [bytes(block) for block in ReadAheadReader(io.BytesIO(data), block_size=1000, buffers=2)]
+    assert b''.join(blocks) == data
+    assert len(blocks) == 256
+
+
+def test_records_from_compressed_file(stdf_file):
+    FileName, records = stdf_file(parts=4, sites=2, tests=3)
+    data = b''.join(records)
+    for extension, module in [('.xz', lzma), ('.gz', gzip)]:
+        with module.open(FileName + extension, 'wb') as fd:
+            fd.write(data)
+        assert [record[3] for record in records_from_file(FileName + extension)] == records
+        with module.open(FileName + extension, 'rb') as fd:
+            assert [record[3] for record in records_from_stream(fd, '<', block_size=100, buffers=2)] == records
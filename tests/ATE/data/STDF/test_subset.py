@@ -0,0 +1,70 @@
+from ATE.data.STDF.lazy import lazy_record_object
+from ATE.data.STDF.records import MIR, MRR, WIR, WRR
+from ATE.data.STDF.subset import subset_file
+from ATE.data.STDF.summary import read_summary
+from ATE.data.STDF.utils import records_from_file
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _objects(FileName):
+    return [lazy_record_object('V4', '<', (REC_TYP, REC_SUB), REC) for _, REC_TYP, REC_SUB, REC in records_from_file(FileName)]
+
+
+def test_subset_sites_and_tests(stdf_file, tmp_path):
+    FileName, records = stdf_file(parts=6, sites=2, tests=3)
+    Destination = str(tmp_path / 'subset.std')
+    assert subset_file(FileName, Destination, sites=[1], test_numbers=[101]) == 3
+    objects = _objects(Destination)
+    ids = [obj.id for obj in objects]
+    assert ids[:2] == ['FAR', 'MIR']
+    assert ids[2:11] == ['PIR', 'PTR', 'PRR'] * 3
+    assert ids[11:] == ['TSR', 'TSR', 'HBR', 'HBR', 'SBR', 'SBR', 'PCR', 'PCR', 'MRR']
+    kept = [bytes(obj) for obj in objects if obj.id == 'PTR']
+    assert kept == [REC for REC in records if REC[2:4] == b'\x0f\x0a' and REC[9] == 1 and REC[4] == 101]
+    assert all(obj.get_value('NUM_TEST') == 1 for obj in objects if obj.id == 'PRR')
+    tsr = [obj for obj in objects if obj.id == 'TSR'][-1]
+    assert (tsr.get_value('HEAD_NUM'), tsr.get_value('TEST_NUM'), tsr.get_value('EXEC_CNT'), tsr.get_value('TEST_NAM')) == (255, 101, 3, 'test_1')
+    assert (tsr.get_value('TEST_MIN'), tsr.get_value('TEST_MAX'), tsr.get_value('TST_SUMS')) == (11.0, 51.0, 11.0 + 31.0 + 51.0)
+    summary = read_summary(Destination)
+    assert summary.part_count() == 3
+    assert summary.hard_bins() == {2 : 3} # the odd parts are on site 1
+    assert summary.hard_bins(1, 1) == {2 : 3}
+
+
+def test_subset_parts_compressed(stdf_file, tmp_path):
+    FileName, records = stdf_file(parts=6, sites=2, tests=2)
+    Destination = str(tmp_path / 'subset.std.gz')
+    assert subset_file(FileName, Destination, parts=slice(2, None, 2), exclude=['PTR'], compression='gzip') == 2
+    objects = _objects(Destination)
+    assert [obj.id for obj in objects if obj.id in ['PIR', 'PTR', 'PRR']] == ['PIR', 'PRR'] * 2
+    assert [obj.get_value('PART_ID') for obj in objects if obj.id == 'PRR'] == ['3', '5']
+    assert read_summary(Destination).part_count() == 2
+
+
+def test_subset_wafers(tmp_path):
+    FileName = str(tmp_path / 'wafers.std')
+    with STDFWriter(FileName, endian='<') as writer:
+        writer.write_record(MIR('V4', '<'))
+        for WAFER_ID, parts in [('W1', 3), ('W2', 4)]:
+            wir = WIR('V4', '<')
+            wir.set_value('HEAD_NUM', 1)
+            wir.set_value('WAFER_ID', WAFER_ID)
+            writer.write_record(wir)
+            for part in range(parts):
+                writer.write_pir(1, part % 2)
+                writer.write_ptr(100, 1, part % 2, 0, float(part))
+                writer.write_prr(1, part % 2, hard_bin=1, part_flg=0x08 if part == 0 else 0)
+            wrr = WRR('V4', '<')
+            wrr.set_value('HEAD_NUM', 1)
+            wrr.set_value('WAFER_ID', WAFER_ID)
+            wrr.set_value('PART_CNT', parts)
+            writer.write_record(wrr)
+        writer.write_record(MRR('V4', '<'))
+    Destination = str(tmp_path / 'W2.std')
+    assert subset_file(FileName, Destination, wafers=['W2'], sites=[0]) == 2
+    objects = _objects(Destination)
+    assert [obj.get_value('WAFER_ID') for obj in objects if obj.id in ['WIR', 'WRR']] == ['W2', 'W2']
+    wrr = [obj for obj in objects if obj.id == 'WRR'][0]
+    assert (wrr.get_value('PART_CNT'), wrr.get_value('GOOD_CNT')) == (2, 1)
+    pcr = [obj for obj in objects if obj.id == 'PCR'][-1]
+    assert (pcr.get_value('HEAD_NUM'), pcr.get_value('PART_CNT'), pcr.get_value('GOOD_CNT')) == (255, 2, 1)
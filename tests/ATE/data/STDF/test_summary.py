@@ -0,0 +1,95 @@
+import lzma
+
+import pytest
+
+from ATE.data.STDF.records import HBR, MRR, PCR, SBR, TSR
+from ATE.data.STDF.records import get_partcount_from_file
+from ATE.data.STDF.sidecar import get_STDF_index
+from ATE.data.STDF.summary import read_summary
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _summary_records(endian, sites):
+    records = []
+    for HEAD_NUM, SITE_NUM, count in [(1, site, 10 + site) for site in range(sites)] + [(255, 0, sum(10 + site for site in range(sites)))]:
+        for Record, Prefix in [(HBR, 'HBIN'), (SBR, 'SBIN')]:
+            for BIN_NUM in [1, 2]:
+                record = Record('V4', endian)
+                record.set_value('HEAD_NUM', HEAD_NUM)
+                record.set_value('SITE_NUM', SITE_NUM)
+                record.set_value('%s_NUM' % Prefix, BIN_NUM)
+                record.set_value('%s_CNT' % Prefix, count - 3 if BIN_NUM == 1 else 3)
+                record.set_value('%s_NAM' % Prefix, 'bin %s' % BIN_NUM)
+                records.append(record)
+        tsr = TSR('V4', endian)
+        tsr.set_value('HEAD_NUM', HEAD_NUM)
+        tsr.set_value('SITE_NUM', SITE_NUM)
+        tsr.set_value('TEST_NUM', 100)
+        records.append(tsr)
+        pcr = PCR('V4', endian)
+        pcr.set_value('HEAD_NUM', HEAD_NUM)
+        pcr.set_value('SITE_NUM', SITE_NUM)
+        pcr.set_value('PART_CNT', count)
+        pcr.set_value('GOOD_CNT', count - 3)
+        records.append(pcr)
+    mrr = MRR('V4', endian)
+    mrr.set_value('FINISH_T', 1234567)
+    mrr.set_value('USR_DESC', 'done')
+    records.append(mrr)
+    return records
+
+
+def _lot(FileName, endian='<', parts=20, sites=4, compression=None):
+    with STDFWriter(FileName, endian=endian, compression=compression) as writer:
+        writer.define_ptr(100, 'test', lo_limit=0.0, hi_limit=1.0)
+        for part in range(0, parts, sites):
+            for site in range(sites):
+                writer.write_pir(1, site)
+                for test in range(10):
+                    writer.write_ptr(100 + test, 1, site, 0, 0.1 * test)
+                writer.write_prr(1, site, hard_bin=1, x=part, y=site, part_id=str(part + site))
+        for record in _summary_records(endian, sites):
+            writer.write_record(record)
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+@pytest.mark.parametrize('window', [16, 64, 64 * 1024])
+def test_summary_from_the_tail(tmp_path, endian, window):
+    FileName = str(tmp_path / 'lot.std')
+    _lot(FileName, endian)
+    summary = read_summary(FileName, window=window)
+    assert [record.id for record in summary.records[-2:]] == ['PCR', 'MRR']
+    assert len(summary) == 5 * 6 + 1
+    assert summary.part_count() == 46
+    assert summary.good_count() == 43
+    assert summary.part_count(1) == 46
+    assert summary.part_count(1, 2) == 12
+    assert summary.hard_bins() == {1 : 43, 2 : 3}
+    assert summary.soft_bins(1, 0) == {1 : 7, 2 : 3}
+    assert summary.MRR.get_value('FINISH_T') == 1234567
+    assert summary.MRR.get_value('USR_DESC') == 'done'
+    with open(FileName, 'rb') as fd:
+        data = fd.read()
+    assert summary.offset == len(data) - sum(len(record) for record in summary.records)
+    assert get_partcount_from_file(FileName) == 46
+
+
+def test_summary_of_compressed_file(tmp_path):
+    FileName = str(tmp_path / 'lot.std.xz')
+    _lot(FileName, compression='lzma')
+    streamed = read_summary(FileName)
+    get_STDF_index(FileName, content_hash=False)
+    indexed = read_summary(FileName)
+    assert indexed.to_dict() == streamed.to_dict()
+    assert indexed.offset == streamed.offset
+    assert indexed.part_count(1, 3) == 13
+
+
+def test_partcount_without_PCR(stdf_file, tmp_path):
+    FileName, _ = stdf_file(parts=5, sites=2, tests=2)
+    assert read_summary(FileName).PCR == []
+    assert get_partcount_from_file(FileName) == 5
+    with open(FileName, 'rb') as fd, lzma.open(FileName + '.xz', 'wb') as out:
+        out.write(fd.read())
+    assert get_partcount_from_file(FileName + '.xz') == 5
+    assert get_partcount_from_file(str(tmp_path / 'nothing.std')) is None
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from ATE.data.STDF.benchmark import BENCHMARKS, parse_size, run_benchmarks
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.sidecar import build_STDF_index
+from ATE.data.STDF.summary import read_summary
+from ATE.data.STDF.synthetic import write_synthetic_lot
+from ATE.data.STDF.utils import records_from_file
+
+
+def test_synthetic_lot_is_deterministic(tmp_path):
+    names = [str(tmp_path / name) for name in ['a.std', 'b.std', 'c.std', 'd.std.xz']]
+    truths = [write_synthetic_lot(names[0], parts=50, seed=3), write_synthetic_lot(names[1], parts=50, seed=3),
+              write_synthetic_lot(names[2], parts=50, seed=4), write_synthetic_lot(names[3], parts=50, seed=3, compression='lzma')]
+    contents = [open(name, 'rb').read() for name in names[:3]]
+    assert contents[0] == contents[1] and contents[0] != contents[2]
+    assert truths[0] == truths[1] == truths[3]
+    assert b''.join(REC for _, _, _, REC in records_from_file(names[3])) == contents[0]
+    with pytest.raises(STDFError):
+        write_synthetic_lot(names[0], tests=10, ftr_ratio=0.6, mpr_ratio=0.6)
+
+
+def test_synthetic_lot_matches_its_truth(tmp_path):
+    for endian, wafers in [('<', 2), ('>', 0)]:
+        FileName = str(tmp_path / 'lot.std')
+        truth = write_synthetic_lot(FileName, parts=200, tests=20, sites=3, wafers=wafers, retest_rate=0.1, endian=endian, seed=1)
+        assert (truth['dies'], truth['retests'], truth['parts']) == (200, 20, 220)
+        assert truth['tests'] == {'PTR' : 16, 'MPR' : 2, 'FTR' : 2}
+        index = build_STDF_index(FileName, content_hash=False)
+        assert (len(index.column('parts/PIR')), len(index.column('offset'))) == (truth['parts'], truth['records'])
+        assert len(index.column('tests/offset')) == truth['parts'] * 20
+        index.close()
+        assert read_summary(FileName).part_count() == truth['parts']
+        counts = {}
+        for _, REC_TYP, REC_SUB, _ in records_from_file(FileName):
+            counts[(REC_TYP, REC_SUB)] = counts.get((REC_TYP, REC_SUB), 0) + 1
+        assert counts.get((2, 10), 0) == counts.get((2, 20), 0) == wafers
+        assert counts[(15, 15)] == counts[(15, 20)] == 2 * truth['parts']
+        assert 0 < truth['good_dies'] <= truth['dies']
+
+
+def test_run_benchmarks(tmp_path):
+    assert (parse_size('64K'), parse_size('1.5M'), parse_size(1000)) == (65536, 1572864, 1000)
+    results = run_benchmarks(size='200K', repeat=1, sample=100, directory=str(tmp_path), tests=20)
+    assert list(results['benchmarks']) == list(BENCHMARKS)
+    assert results['benchmarks']['iterate']['items'] == results['meta']['lot']['records']
+    assert results['benchmarks']['summary']['items'] == results['meta']['lot']['parts']
+    assert all(result['MB_per_second'] > 0 for result in results['benchmarks'].values())
+    json.dumps(results)
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(STDFError):
+        run_benchmarks(names=['nothing'])
+    instrumented = run_benchmarks(size='100K', names=['iterate', 'unpack'], repeat=1, sample=10, directory=str(tmp_path), instrument=True)
+    assert instrumented['benchmarks']['iterate']['counters']['records']['PTR']['count'] > 0
+    assert instrumented['benchmarks']['unpack']['counters']['decode']['PTR']['count'] == 10
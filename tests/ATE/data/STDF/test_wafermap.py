@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from ATE.data.STDF import sidecar
+from ATE.data.STDF.records import MIR, STDFError, WCR, WIR, WRR, wafer_map
+from ATE.data.STDF.wafermap import rasterize, stack, wafer_cube, wafer_maps_from_file
+from ATE.data.STDF.writer import STDFWriter
+
+
+def test_rasterize_orientation():
+    X = np.array([0, 1, 2, 0])
+    Y = np.array([0, 0, 1, 1])
+    values = np.array([1, 2, 3, 4], dtype=np.uint16)
+    down, bounds = rasterize(X, Y, values)
+    assert bounds == (0, 2, 0, 1)
+    assert down.tolist() == [[1, 2, -1], [4, -1, 3]]
+    up, _ = rasterize(X, Y, values, ('L', 'U'))
+    assert up.tolist() == [[3, -1, 4], [-1, 2, 1]]
+    floats, _ = rasterize(X, Y, values.astype(np.float32))
+    assert np.isnan(floats[0, 2])
+
+    retest, _ = rasterize([0, 0, 1, 0], [0, 0, 0, -32768], [2, 1, 5, 9]) # the last (valid) part of a die wins
+    assert retest.tolist() == [[1, 5]]
+
+
+def test_wafer_cube_and_stack():
+    X = np.array([0, 1, 0, 1, 0])
+    Y = np.array([0, 0, 0, 0, 1])
+    wafers = np.array(['W2', 'W2', 'W1', 'W1', 'W1'])
+    HARD_BIN = np.array([1, 2, 1, 1, 3])
+    wafer_ids, cube, bounds = wafer_cube(X, Y, wafers, HARD_BIN)
+    assert wafer_ids.tolist() == ['W1', 'W2']
+    assert cube.tolist() == [[[1, 1], [3, -1]], [[1, 2], [-1, -1]]]
+    assert stack(cube, 'count').tolist() == [[2, 2], [1, 0]]
+    fraction = stack(cube, 'fraction', value=1)
+    assert fraction[0].tolist() == [1.0, 0.5] and fraction[1, 0] == 0.0 and np.isnan(fraction[1, 1])
+    assert stack(cube, 'mean')[0].tolist() == [1.0, 1.5]
+    with pytest.raises(STDFError):
+        stack(cube, 'median')
+
+    maps = wafer_map({'X_COORD' : X, 'Y_COORD' : Y, 'LOT_ID' : ['L'] * 5, 'WAFER_ID' : wafers, 'HARD_BIN' : HARD_BIN})
+    assert sorted(maps) == [('L', 'W1'), ('L', 'W2')]
+    assert np.array_equal(maps[('L', 'W1')], cube[0])
+
+
+def test_wafer_maps_from_file(tmp_path, monkeypatch):
+    FileName = str(tmp_path / 'lot.std')
+    with STDFWriter(FileName, endian='<') as writer:
+        writer.write_record(MIR('V4', '<'))
+        wcr = WCR('V4', '<')
+        wcr.set_value('POS_X', 'R')
+        wcr.set_value('POS_Y', 'U')
+        writer.write_record(wcr)
+        writer.define_ptr(1000, 'vdd')
+        for WAFER_ID, dies in [('W1', [(0, 0, 1), (1, 0, 2), (1, 0, 1)]), ('W2', [(0, 1, 1)])]:
+            wir = WIR('V4', '<')
+            wir.set_value('HEAD_NUM', 1)
+            wir.set_value('WAFER_ID', WAFER_ID)
+            writer.write_record(wir)
+            for X, Y, HARD_BIN in dies:
+                writer.write_pir(1, 0)
+                writer.write_ptr(1000, 1, 0, 0, float(10 * X + Y + HARD_BIN))
+                writer.write_prr(1, 0, hard_bin=HARD_BIN, soft_bin=HARD_BIN, part_flg=0 if HARD_BIN == 1 else 0x08, x=X, y=Y)
+            wrr = WRR('V4', '<')
+            wrr.set_value('HEAD_NUM', 1)
+            wrr.set_value('WAFER_ID', WAFER_ID)
+            writer.write_record(wrr)
+    maps = wafer_maps_from_file(FileName)
+    assert maps.index is None # (the index it made is closed)
+    assert (maps.orientation, maps.wafer_ids(), maps.bounds) == (('R', 'U'), ['W1', 'W2'], (0, 1, 0, 1))
+    assert maps.map('W1').tolist() == [[-1, -1], [1, 1]] # Y up : row 0 is Y = 1, the retest of (1, 0) passed
+    assert maps.map('W1', 'PART_PF').tolist() == [[-1, -1], [1, 1]]
+    maps.map('W1')
+    assert (maps.hits, maps.misses) == (1, 2)
+    name = maps.add_test(1000)
+    assert maps.map('W1', name)[1].tolist() == [1.0, 11.0]
+    assert maps.map('W2', name)[0, 0] == 2.0
+    assert maps.stacked('HARD_BIN', 'count').tolist() == [[1, 0], [1, 1]]
+
+    indexes = []
+    get_STDF_index = sidecar.get_STDF_index
+
+    def loading(*args, **kwargs):
+        indexes.append(get_STDF_index(*args, **kwargs))
+        return indexes[-1]
+
+    monkeypatch.setattr(sidecar, 'get_STDF_index', loading)
+    assert wafer_maps_from_file(FileName).wafer_ids() == ['W1', 'W2']
+    assert len(indexes) == 1 and indexes[0].mm is None and indexes[0]._columns == {} # (mapped from the sidecar, closed)
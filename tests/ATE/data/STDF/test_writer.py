@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from ATE.data.STDF.records import MIR
+from ATE.data.STDF.records import STDFError
+from ATE.data.STDF.records import create_record_object
+from ATE.data.STDF.utils import records_from_file
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _log(writer, parts=2, sites=3, tests=4):
+    for part in range(parts):
+        for site in range(sites):
+            writer.write_pir(1, site)
+        for test in range(tests): # sites tested in parallel
+            for site in range(sites):
+                writer.write_ptr(100 + test, 1, site, 0, part * 10 + test + site / 10)
+        for site in range(sites):
+            writer.write_prr(1, site, hard_bin=1 + site % 2, soft_bin=1, x=part, y=-part, part_id=str(part))
+
+
+def _objects(FileName, endian='<'):
+    return [create_record_object('V4', endian, (REC_TYP, REC_SUB), REC) for _, REC_TYP, REC_SUB, REC in records_from_file(FileName)]
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_round_trip_and_contiguous_parts(tmp_path, endian):
+    FileName = str(tmp_path / 'writer.std')
+    with STDFWriter(FileName, endian=endian) as writer:
+        writer.define_ptr(100, 'Idd', lo_limit=0.0, hi_limit=2.0, units='A')
+        _log(writer)
+    objects = _objects(FileName, endian)
+    assert [obj.id for obj in objects[:3]] == ['FAR', 'PIR', 'PTR']
+    assert objects[0].get_value('CPU_TYPE') == (2 if endian == '<' else 1)
+    # every part is PIR, PTR*4, PRR of a single site
+    parts = [objects[1 + 6 * index:1 + 6 * (index + 1)] for index in range(6)]
+    for part in parts:
+        assert [obj.id for obj in part] == ['PIR'] + ['PTR'] * 4 + ['PRR']
+        assert len(set(obj.get_value('SITE_NUM') for obj in part)) == 1
+        assert part[-1].get_value('NUM_TEST') == 4
+    first = parts[0][1]
+    assert first.get_value('TEST_TXT') == 'Idd'
+    assert first.get_value('UNITS') == 'A'
+    assert first.get_value('HI_LIMIT') == 2.0
+    later = parts[1][1]
+    assert [len(REC) for _, _, _, REC in records_from_file(FileName)][7:9] == [6, 16] # PIR, minimal PTR
+    assert later.get_value('TEST_NUM') == 100
+    assert later.get_value('TEST_TXT') == ''
+    assert parts[3][-1].get_value('PART_ID') == '1'
+    assert parts[3][-1].get_value('Y_COORD') == -1
+    assert parts[2][3].get_value('RESULT') == pytest.approx(2.2)
+
+
+def test_batch_compression_and_records(tmp_path):
+    FileName = str(tmp_path / 'writer.std.xz')
+    mir = MIR('V4', '<')
+    mir.set_value('LOT_ID', 'LOT1')
+    with STDFWriter(FileName, endian='<', compression='lzma', buffer_size=64, group_commit=1) as writer:
+        writer.write_record(mir)
+        writer.define_ptr(1, 'first')
+        writer.write_pir(1, 0)
+        writer.write_pir(1, 1)
+        writer.write_ptrs(np.arange(1, 4), 1, 1, 0, np.array([1.5, 2.5, 3.5]))
+        writer.write_ptrs(np.arange(1, 4), 1, 0, 0, [0.5, 1.5, 2.5])
+        writer.write_ftr(7, 1, 0, 0)
+        writer.write_prr(1, 0, hard_bin=1)
+        writer.write_prr(1, 1, hard_bin=2)
+    objects = _objects(FileName)
+    assert [obj.id for obj in objects] == ['FAR', 'MIR', 'PIR', 'PTR', 'PTR', 'PTR', 'FTR', 'PRR', 'PIR', 'PTR', 'PTR', 'PTR', 'PRR']
+    assert objects[1].get_value('LOT_ID') == 'LOT1'
+    assert [obj.get_value('RESULT') for obj in objects[3:6]] == [0.5, 1.5, 2.5]
+    assert objects[3].get_value('TEST_TXT') == 'first' # site 1 logged test 1 first, but site 0 is first in the file
+    assert objects[9].get_value('TEST_TXT') == ''
+    assert objects[7].get_value('NUM_TEST') == 4
+    assert objects[7].get_value('SOFT_BIN') == 65535
+    assert [obj.get_value('RESULT') for obj in objects[9:12]] == [1.5, 2.5, 3.5]
+    assert objects[12].get_value('HARD_BIN') == 2
+
+
+def test_definition_goes_to_the_first_PTR_in_the_file(tmp_path):
+    FileName = str(tmp_path / 'writer.std')
+    with STDFWriter(FileName, endian='<') as writer:
+        writer.define_ptr(1000, 'Idd', lo_limit=0.0, hi_limit=0.001, units='A')
+        writer.define_ptr(2000, 'Vdd', units='V')
+        writer.write_pir(1, 0)
+        writer.write_pir(1, 1)
+        writer.write_ptr(1000, 1, 1, 0, 0.5, text='site1')
+        writer.write_ptr(1000, 1, 0, 0, 0.25)
+        writer.write_ptr(1000, 1, 0, 0, 0.125)
+        writer.write_ptrs([2000, 3000], 1, 1, 0, [1.0, 2.0])
+        writer.write_prr(1, 0, hard_bin=1)
+        writer.write_prr(1, 1, hard_bin=1)
+        writer.write_ptr(2000, 1, 2, 0, 3.0) # no part : straight to the file, after the parts
+    objects = _objects(FileName)
+    PTRs = [obj for obj in objects if obj.id == 'PTR']
+    assert [(obj.get_value('SITE_NUM'), obj.get_value('TEST_NUM'), obj.get_value('TEST_TXT')) for obj in PTRs] == \
+        [(0, 1000, 'Idd'), (0, 1000, ''), (1, 1000, 'site1'), (1, 2000, 'Vdd'), (1, 3000, ''), (2, 2000, '')]
+    assert (PTRs[0].get_value('UNITS'), PTRs[0].get_value('HI_LIMIT'), PTRs[0].get_value('RESULT')) == ('A', pytest.approx(0.001), 0.25)
+    assert PTRs[3].get_value('RESULT') == 1.0 and PTRs[4].get_value('RESULT') == 2.0
+    assert [obj.get_value('NUM_TEST') for obj in objects if obj.id == 'PRR'] == [2, 3]
+
+
+def test_unclosed_parts_are_written(tmp_path):
+    FileName = str(tmp_path / 'writer.std')
+    writer = STDFWriter(FileName, endian='<', part_buffers=True)
+    writer.write_pir(1, 0)
+    writer.write_ptr(5, 1, 0, 0, 1.0, text='five')
+    writer.close()
+    assert [obj.id for obj in _objects(FileName)] == ['FAR', 'PIR', 'PTR']
+    with pytest.raises(STDFError):
+        STDFWriter(str(tmp_path / 'other.std'), endian='=')
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+
+from ATE.data.STDF.instrumentation import instrumented
+from ATE.data.STDF.records import MIR, WIR, WRR
+from ATE.data.STDF.sidecar import get_STDF_index
+from ATE.data.STDF.yields import YieldEngine
+from ATE.data.STDF.yields import live_summary
+from ATE.data.STDF.yields import load_yield_engine
+from ATE.data.STDF.yields import yield_checkpoint_name
+from ATE.data.STDF.utils import records_from_file
+from ATE.data.STDF.writer import STDFWriter
+
+
+def _wafer_lot(FileName):
+    '''
+    Wafer W1 (6 dies, 2 fail) and a retest of the failing dies (one passes now), then wafer W2 (4 dies, all pass).
+    '''
+    with STDFWriter(FileName, endian='<') as writer:
+        writer.write_record(MIR('V4', '<'))
+        for WAFER_ID, dies in [('W1', [(X, 1 if X not in [2, 4] else 5) for X in range(6)] + [(2, 1), (4, 5)]),
+                               ('W2', [(X, 1) for X in range(4)])]:
+            wir = WIR('V4', '<')
+            wir.set_value('HEAD_NUM', 1)
+            wir.set_value('WAFER_ID', WAFER_ID)
+            writer.write_record(wir)
+            for index, (X, HARD_BIN) in enumerate(dies):
+                writer.write_pir(1, index % 2)
+                writer.write_ptr(100, 1, index % 2, 0, 1.0)
+                writer.write_prr(1, index % 2, hard_bin=HARD_BIN, soft_bin=HARD_BIN, part_flg=0x08 if HARD_BIN == 5 else 0, x=X, y=0)
+            wrr = WRR('V4', '<')
+            wrr.set_value('HEAD_NUM', 1)
+            wrr.set_value('WAFER_ID', WAFER_ID)
+            writer.write_record(wrr)
+
+
+def test_final_bins_and_wafer_yield(tmp_path):
+    FileName = str(tmp_path / 'lot.std')
+    _wafer_lot(FileName)
+    engine = YieldEngine(FileName)
+    assert engine.update() == 12
+    assert (engine.part_count(), engine.retest_count(), engine.good_count()) == (12, 2, 9)
+    assert engine.hard_bins() == {1 : 9, 5 : 1}
+    assert engine.lot_yield() == 0.9
+    assert engine.wafer_yields() == {'W1' : {'tested' : 8, 'retested' : 2, 'aborted' : 0, 'good' : 5, 'yield' : 5 / 6},
+                                     'W2' : {'tested' : 4, 'retested' : 0, 'aborted' : 0, 'good' : 4, 'yield' : 1.0}}
+    assert [REC[2:4] for REC in engine.records()].count(b'\x01\x1e') == 3 # the PCR's of site 0, 1 and all
+
+    everything = YieldEngine(FileName, retests=False)
+    everything.update()
+    assert (everything.good_count(), everything.hard_bins()) == (9, {1 : 9, 5 : 3})
+
+    indexed = YieldEngine()
+    assert indexed.update_from_index(get_STDF_index(FileName, save=False), FileName) == 12
+    assert indexed.to_dict()['last'] == engine.to_dict()['last']
+    assert (indexed.hard_bins(), indexed.wafer_yields(), indexed.offset) == (engine.hard_bins(), engine.wafer_yields(), os.path.getsize(FileName))
+
+
+def test_live_summary_of_growing_file(tmp_path):
+    complete = str(tmp_path / 'complete.std')
+    _wafer_lot(complete)
+    with open(complete, 'rb') as fd:
+        data = fd.read()
+    FileName = str(tmp_path / 'growing.std')
+    reference = YieldEngine(complete)
+    reference.update()
+    cuts = [len(data) // 3 + 1, len(data) // 2 + 3, len(data)] # (in the middle of records)
+    start = 0
+    seen = 0
+    for cut in cuts:
+        with open(FileName, 'ab') as fd:
+            fd.write(data[start:cut])
+        start = cut
+        engine = live_summary(FileName)
+        assert engine.offset <= cut
+        assert engine.part_count() >= seen
+        seen = engine.part_count()
+    assert engine.to_dict()['parts'] == reference.to_dict()['parts']
+    assert (engine.hard_bins(), engine.wafer_yields()) == (reference.hard_bins(), reference.wafer_yields())
+
+    resumed = load_yield_engine(FileName)
+    assert resumed.to_dict() == engine.to_dict()
+    assert resumed.update() == 0
+
+    os.remove(FileName) # a new file with the same name : start over
+    with open(FileName, 'wb') as fd:
+        fd.write(data[:len(data) // 2])
+    assert live_summary(FileName).part_count() < reference.part_count()
+    assert os.path.exists(yield_checkpoint_name(FileName))
+
+
+def test_live_summary_reads_only_the_new_records(tmp_path):
+    complete = str(tmp_path / 'complete.std')
+    _wafer_lot(complete)
+    reference = YieldEngine(complete)
+    reference.update()
+    offsets = [0]
+    for REC_LEN, _, _, _ in records_from_file(complete):
+        offsets.append(offsets[-1] + 4 + REC_LEN)
+    cut = offsets[len(offsets) // 2] # (before the retests of W1)
+    with open(complete, 'rb') as fd:
+        data = fd.read()
+    FileName = str(tmp_path / 'growing.std')
+    with open(FileName, 'wb') as fd:
+        fd.write(data[:cut])
+    first = live_summary(FileName)
+    first.close()
+    Name = yield_checkpoint_name(FileName)
+    with sqlite3.connect(Name) as connection:
+        before = connection.execute('SELECT * FROM entries ORDER BY id').fetchall()
+    with open(FileName, 'ab') as fd:
+        fd.write(data[cut:])
+    with instrumented() as stats:
+        engine = live_summary(FileName)
+    read = sum(entry['count'] for entry in stats.as_dict()['records'].values())
+    assert read == len(offsets) - 1 - offsets.index(cut)
+    assert engine.retest_count() == reference.retest_count() == 2
+    assert engine.to_dict()['last'] == reference.to_dict()['last']
+    assert dict.__len__(engine.resolver.last) == 0 # (written and forgotten)
+    engine.close()
+    with sqlite3.connect(Name) as connection:
+        after = connection.execute('SELECT * FROM entries ORDER BY id').fetchall()
+    assert len(after) == reference.part_count() and len(before) == first.part_count()
+    assert [row[:7] for row in after[:len(before)]] == [row[:7] for row in before] # (appended to)
+    assert sum(row[7] for row in after) - sum(row[7] for row in before) == 2 # (the superseded ones are updated)
@@ -0,0 +1,63 @@
+import pytest
+
+from ATE.data.STDF.records import FAR, MIR, MRR, PIR, PRR, PTR
+
+
+def make_stdf(FileName, endian='<', parts=3, sites=2, tests=4):
+    '''
+    Writes a small STDF file (FAR, MIR, parts x (PIR, PTR*tests, PRR), MRR) and returns the list of the packed records.
+    Parts are tested on sites in parallel (all PIR's first, then the PTR's, then the PRR's).
+    '''
+    records = []
+    far = FAR('V4', endian)
+    far.set_value('CPU_TYPE', 2 if endian == '<' else 1)
+    records.append(far.__repr__())
+    mir = MIR('V4', endian)
+    mir.set_value('LOT_ID', 'LOT1')
+    records.append(mir.__repr__())
+    part = 0
+    while part < parts:
+        group = list(range(part, min(part + sites, parts)))
+        for number in group:
+            pir = PIR('V4', endian)
+            pir.set_value('HEAD_NUM', 1)
+            pir.set_value('SITE_NUM', number % sites)
+            records.append(pir.__repr__())
+        for test in range(tests):
+            for number in group:
+                ptr = PTR('V4', endian)
+                ptr.set_value('TEST_NUM', 100 + test)
+                ptr.set_value('HEAD_NUM', 1)
+                ptr.set_value('SITE_NUM', number % sites)
+                ptr.set_value('TEST_FLG', ['0'] * 8)
+                ptr.set_value('RESULT', float(number * 10 + test))
+                ptr.set_value('TEST_TXT', 'test_%d' % test)
+                records.append(ptr.__repr__())
+        for number in group:
+            prr = PRR('V4', endian)
+            prr.set_value('HEAD_NUM', 1)
+            prr.set_value('SITE_NUM', number % sites)
+            prr.set_value('NUM_TEST', tests)
+            prr.set_value('HARD_BIN', 1 + number % 2)
+            prr.set_value('SOFT_BIN', 1 + number % 2)
+            prr.set_value('X_COORD', number)
+            prr.set_value('Y_COORD', -number)
+            prr.set_value('PART_ID', str(number + 1))
+            records.append(prr.__repr__())
+        part += sites
+    records.append(MRR('V4', endian).__repr__())
+    with open(FileName, 'wb') as fd:
+        for record in records:
+            fd.write(record)
+    return records
+
+
+@pytest.fixture
+def stdf_file(tmp_path):
+    '''
+    Factory fixture : stdf_file(name='test.std', **kwargs) returns (path, records), see make_stdf.
+    '''
+    def factory(name='test.std', **kwargs):
+        FileName = str(tmp_path / name)
+        return FileName, make_stdf(FileName, **kwargs)
+    return factory
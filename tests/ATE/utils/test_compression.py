@@ -0,0 +1,71 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import random
+
+import pytest
+
+from ATE.utils.compression import BlockCompressor
+from ATE.utils.compression import decompressed_blocks
+from ATE.utils.compression import deflate
+from ATE.utils.compression import inflate
+from ATE.utils.seekable import build_checkpoint_index
+
+stock = {'lzma' : lzma.decompress, 'gzip' : gzip.decompress, 'bz2' : bz2.decompress}
+
+
+def _data(size=300000):
+    generator = random.Random(7)
+    return bytes(generator.randrange(32) for _ in range(size))
+
+
+@pytest.mark.parametrize('compression', ['lzma', 'gzip', 'bz2'])
+def test_block_compressor(compression):
+    data = _data()
+    fd = io.BytesIO()
+    with BlockCompressor(fd, compression, level=1, block_size=65536, workers=3) as writer:
+        for start in range(0, len(data), 10000):
+            writer.write(data[start:start + 10000])
+    assert stock[compression](fd.getvalue()) == data
+
+
+@pytest.mark.parametrize('compression', ['lzma', 'gzip', 'bz2'])
+def test_block_compressor_empty(compression):
+    fd = io.BytesIO()
+    BlockCompressor(fd, compression).close()
+    assert stock[compression](fd.getvalue()) == b''
+
+
+@pytest.mark.parametrize('compression', ['lzma', 'gzip', 'bz2'])
+def test_deflate_inflate(tmp_path, compression):
+    data = _data()
+    FileName = str(tmp_path / 'data.std')
+    with open(FileName, 'wb') as fd:
+        fd.write(data)
+    os.utime(FileName, (1000000000, 1000000000))
+    OutName = deflate(FileName, compression, progress=False, level=1, block_size=50000, workers=2)
+    assert os.stat(OutName).st_mtime == 1000000000
+    assert len(build_checkpoint_index(OutName).checkpoints) == 6
+    assert b''.join(decompressed_blocks(OutName, workers=2)) == data
+    os.remove(FileName)
+    assert inflate(OutName, progress=False, workers=2) == FileName
+    with open(FileName, 'rb') as fd:
+        assert fd.read() == data
+    assert os.stat(FileName).st_mtime == 1000000000
+
+
+def test_deflate_inflate_files(tmp_path):
+    FileNames = [str(tmp_path / ('data_%s.std' % number)) for number in range(3)]
+    for number, FileName in enumerate(FileNames):
+        with open(FileName, 'wb') as fd:
+            fd.write(_data(10000 * (number + 1)))
+    OutNames = deflate(FileNames, progress=False, workers=2)
+    assert OutNames == [FileName + '.xz' for FileName in FileNames]
+    for FileName in FileNames:
+        os.rename(FileName, FileName + '.orig')
+    assert inflate(OutNames, progress=False, workers=2) == FileNames
+    for FileName in FileNames:
+        with open(FileName, 'rb') as fd, open(FileName + '.orig', 'rb') as original:
+            assert fd.read() == original.read()
@@ -0,0 +1,101 @@
+import bz2
+import collections
+import gzip
+import lzma
+import os
+import random
+
+import pytest
+
+from ATE.utils import seekable
+from ATE.utils.compression import get_deflated_file_size
+from ATE.utils.seekable import build_checkpoint_index
+from ATE.utils.seekable import checkpoint_name
+from ATE.utils.seekable import get_checkpoint_index
+from ATE.utils.seekable import load_checkpoint_index
+from ATE.utils.seekable import open_seekable
+
+
+def _data():
+    generator = random.Random(42)
+    return b''.join(bytes([generator.randrange(16)]) * generator.randrange(1, 50) for _ in range(40000))
+
+
+def _write(FileName, data, compress, pieces):
+    step = (len(data) + pieces - 1) // pieces
+    with open(FileName, 'wb') as fd:
+        for start in range(0, len(data), step):
+            fd.write(compress(data[start:start + step]))
+
+
+@pytest.mark.parametrize('extension, compress', [('.xz', lzma.compress), ('.gz', gzip.compress), ('.bz2', bz2.compress)])
+@pytest.mark.parametrize('pieces', [1, 4])
+def test_random_access(tmp_path, extension, compress, pieces):
+    data = _data()
+    FileName = str(tmp_path / ('data' + extension))
+    _write(FileName, data, compress, pieces)
+    index = build_checkpoint_index(FileName, spacing=100000)
+    assert index.size == len(data)
+    assert len(index.checkpoints) == pieces
+    generator = random.Random(1)
+    with open_seekable(FileName) as fd:
+        for _ in range(30):
+            position = generator.randrange(len(data))
+            size = generator.randrange(1, 3000)
+            fd.seek(position)
+            assert fd.read(size) == data[position:position + size]
+            assert fd.tell() == min(position + size, len(data))
+        fd.seek(-10, os.SEEK_END)
+        assert fd.read() == data[-10:]
+        fd.seek(0)
+        assert fd.read() == data
+
+
+def test_gzip_snapshots(tmp_path):
+    data = _data()
+    FileName = str(tmp_path / 'data.gz')
+    _write(FileName, data, gzip.compress, 1)
+    index = build_checkpoint_index(FileName, spacing=100000)
+    assert len(index.snapshots) >= 5
+    assert index.checkpoint_offset(len(data) - 1) > 0
+    with open_seekable(FileName) as fd:
+        fd.index = index
+        fd.seek(len(data) - 100)
+        assert fd.read(100) == data[-100:]
+
+
+def test_saved_checkpoint_index(tmp_path):
+    data = _data()
+    FileName = str(tmp_path / 'data.bz2')
+    _write(FileName, data, bz2.compress, 3)
+    assert get_deflated_file_size(FileName) == len(data)
+    assert os.path.exists(checkpoint_name(FileName))
+    loaded = load_checkpoint_index(FileName)
+    assert loaded.checkpoints == get_checkpoint_index(FileName).checkpoints
+    with open(FileName, 'ab') as fd:
+        fd.write(bz2.compress(b'more'))
+    assert load_checkpoint_index(FileName) is None
+    assert get_deflated_file_size(FileName) == len(data) + 4
+
+
+def test_checkpoint_index_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(seekable, 'cache_size', 2)
+    monkeypatch.setattr(seekable, '_indexes', collections.OrderedDict())
+    FileNames = [str(tmp_path / ('data%d.bz2' % number)) for number in range(3)]
+    for FileName in FileNames:
+        _write(FileName, b'data', bz2.compress, 1)
+    first = get_checkpoint_index(FileNames[0], save=False)
+    get_checkpoint_index(FileNames[1], save=False)
+    assert get_checkpoint_index(FileNames[0], save=False) is first
+    get_checkpoint_index(FileNames[2], save=False)
+    assert list(seekable._indexes) == [os.path.realpath(FileNames[0]), os.path.realpath(FileNames[2])]
+
+
+def test_uncompressed_size(tmp_path):
+    FileName = str(tmp_path / 'data.bin')
+    with open(FileName, 'wb') as fd:
+        fd.write(b'12345')
+    assert get_deflated_file_size(FileName) == 5
+    with open_seekable(FileName) as fd:
+        fd.seek(2)
+        assert fd.read() == b'345'